@@ -14,6 +14,7 @@
 """Utilities for agents."""
 
 import ast
+import hashlib
 import os
 import numpy as np
 import json
@@ -843,6 +844,11 @@ class HTMLSkeleton():
       self._clean_repeated_siblings()
 
     self.str = self.soup.prettify()
+    # Equal prettified strings mean equal trees, so equality checks compare
+    # this digest instead of walking both soups.
+    self.digest = hashlib.blake2b(
+        self.str.encode('utf-8'), digest_size=16
+    ).digest()
 
   def _remove_attributes(self):
     '''
@@ -927,10 +933,10 @@ class HTMLSkeleton():
   def __eq__(self, value: object) -> bool:
     if not isinstance(value, HTMLSkeleton):
       return False
-    return self.soup == value.soup
+    return self.digest == value.digest
   
   def __ne__(self, value: object) -> bool:
     return not self.__eq__(value)
   
   def __hash__(self) -> int:
-    return hash(self.str)
+    return hash(self.digest)
@@ -15,12 +15,17 @@
 """Base agent."""
 
 import abc
+import asyncio
+from collections.abc import Awaitable, Callable, Generator
 import dataclasses
 import time
-from typing import Any
+from typing import Any, Optional, TypeVar
 
+from android_world.env import asyncio_env
 from android_world.env import interface
 
+_T = TypeVar('_T')
+
 
 @dataclasses.dataclass()
 class AgentInteractionResult:
@@ -36,6 +41,77 @@ class AgentInteractionResult:
   data: dict[str, Any]
 
 
+@dataclasses.dataclass(frozen=True)
+class Call:
+  """A blocking call and its awaitable equivalent, yielded by a step.
+
+  Steps written as generators of calls, e.g.
+
+  ```
+  def _step(self, goal):
+    state = yield base_agent.Call(
+        self.get_post_transition_state, self.aget_post_transition_state
+    )
+    ...
+    return base_agent.AgentInteractionResult(False, step_data)
+  ```
+
+  run blocking with `run_calls` and without blocking with `arun_calls`, so the
+  same code serves `step` and `astep`.
+
+  Attributes:
+    fn: The blocking function.
+    afn: The coroutine function equivalent to `fn`.
+    args: Positional arguments of both.
+    kwargs: Keyword arguments of both.
+  """
+
+  fn: Callable[..., Any]
+  afn: Callable[..., Awaitable[Any]]
+  args: tuple[Any, ...] = ()
+  kwargs: dict[str, Any] = dataclasses.field(default_factory=dict)
+
+
+CallGenerator = Generator[Call, Any, _T]
+
+
+def run_calls(calls: CallGenerator[_T]) -> _T:
+  """Runs the generator, making its calls blocking; returns its return value.
+
+  The result of each call is sent into the generator, and exceptions are
+  raised in it.
+
+  Args:
+    calls: Generator yielding the calls to make.
+  """
+  value, error = None, None
+  while True:
+    try:
+      call = calls.send(value) if error is None else calls.throw(error)
+    except StopIteration as e:
+      return e.value
+    value, error = None, None
+    try:
+      value = call.fn(*call.args, **call.kwargs)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+      error = e
+
+
+async def arun_calls(calls: CallGenerator[_T]) -> _T:
+  """Like `run_calls`, but awaits the calls."""
+  value, error = None, None
+  while True:
+    try:
+      call = calls.send(value) if error is None else calls.throw(error)
+    except StopIteration as e:
+      return e.value
+    value, error = None, None
+    try:
+      value = await call.afn(*call.args, **call.kwargs)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+      error = e
+
+
 class EnvironmentInteractingAgent(abc.ABC):
   """Base class for an agent that directly interacts with and acts on the environment.
 
@@ -58,13 +134,15 @@ class EnvironmentInteractingAgent(abc.ABC):
       transition_pause: The pause before grabbing the state. This is required
         because typically the agent is grabbing state immediatley after an
         action and the screen is still changing. If `None` is provided, then it
-        uses "auto" mode which dynamically adjusts the wait time based on
-        environmental feedback.
+        uses "auto" mode which waits for the last action to take effect, for as
+        long as the environment's wait policy allows; see
+        `interface.AsyncEnv.wait_for_transition`.
 
     Raises:
       ValueError: If the transition pause is negative.
     """
     self._env = env
+    self._aenv: Optional[asyncio_env.AsyncioEnv] = None
     self._name = name
     if transition_pause is not None and transition_pause < 0:
       raise ValueError(
@@ -87,6 +165,14 @@ class EnvironmentInteractingAgent(abc.ABC):
   @env.setter
   def env(self, env: interface.AsyncEnv) -> None:
     self._env = env
+    self._aenv = None
+
+  @property
+  def aenv(self) -> asyncio_env.AsyncioEnv:
+    """Returns the environment with awaitable methods, for `astep`."""
+    if self._aenv is None:
+      self._aenv = asyncio_env.AsyncioEnv(self._env)
+    return self._aenv
 
   def reset(self, go_home: bool = False) -> None:
     """Resets the agent."""
@@ -100,7 +186,7 @@ class EnvironmentInteractingAgent(abc.ABC):
           end=' ',
       )
       start = time.time()
-      state = self.env.get_state(wait_to_stabilize=True)
+      state = self.env.wait_for_transition()
       print(f'Fetched after {time.time() - start:2.1f} seconds.')
       return state
     else:
@@ -123,6 +209,33 @@ class EnvironmentInteractingAgent(abc.ABC):
       Done and agent & observation data.
     """
 
+  async def areset(self, go_home: bool = False) -> None:
+    """Resets the agent without blocking the event loop."""
+    await asyncio.to_thread(self.reset, go_home)
+
+  async def aget_post_transition_state(self) -> interface.State:
+    """Like `get_post_transition_state`, without blocking the event loop."""
+    if self._transition_pause is None:
+      return await self.aenv.wait_for_transition()
+    await asyncio.sleep(self._transition_pause)
+    return await self.aenv.get_state(wait_to_stabilize=False)
+
+  async def astep(self, goal: str) -> AgentInteractionResult:
+    """Performs a step of the agent without blocking the event loop.
+
+    By default `step` runs in a worker thread. Agents that write their step as
+    a generator of `Call`s override this to await their device and LLM calls
+    with `arun_calls` instead, so that a single event loop interleaves many
+    agents.
+
+    Args:
+      goal: The goal.
+
+    Returns:
+      Done and agent & observation data.
+    """
+    return await asyncio.to_thread(self.step, goal)
+
   @property
   def name(self) -> str:
     return self._name
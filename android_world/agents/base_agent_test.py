@@ -0,0 +1,62 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+from absl.testing import absltest
+from android_world.agents import base_agent
+
+
+def _fail(message: str) -> None:
+  raise ValueError(message)
+
+
+async def _afail(message: str) -> None:
+  raise ValueError(message)
+
+
+async def _aadd(a: int, b: int) -> int:
+  await asyncio.sleep(0)
+  return a + b
+
+
+def _calls():
+  total = yield base_agent.Call(lambda a, b: a + b, _aadd, (1,), {'b': 2})
+  try:
+    yield base_agent.Call(_fail, _afail, ('boom',))
+  except ValueError as e:
+    error = str(e)
+  return total, error
+
+
+class RunCallsTest(absltest.TestCase):
+
+  def test_run_calls(self):
+    self.assertEqual(base_agent.run_calls(_calls()), (3, 'boom'))
+
+  def test_arun_calls(self):
+    self.assertEqual(asyncio.run(base_agent.arun_calls(_calls())), (3, 'boom'))
+
+  def test_uncaught_error_propagates(self):
+    def calls():
+      yield base_agent.Call(_fail, _afail, ('boom',))
+
+    with self.assertRaisesRegex(ValueError, 'boom'):
+      base_agent.run_calls(calls())
+    with self.assertRaisesRegex(ValueError, 'boom'):
+      asyncio.run(base_agent.arun_calls(calls()))
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -81,8 +81,6 @@ def process_error_info(original_script, compiled_script, traceback, error,
 class CodeAgent(base_agent.EnvironmentInteractingAgent):
   """code agent"""
 
-  # Wait a few seconds for the screen to stabilize after executing an action.
-  WAIT_AFTER_ACTION_SECONDS = 2.0
   MAX_RETRY_TIMES = 3
 
   FREEZED_CODE = False
@@ -154,7 +152,7 @@ class CodeAgent(base_agent.EnvironmentInteractingAgent):
                 'action_type': 'open_app',
                 'app_name': app_name
             }))
-        time.sleep(self.WAIT_AFTER_ACTION_SECONDS)
+        self.env.wait_for_transition()
         
       if retry_time == 0: # first time
         # generate code
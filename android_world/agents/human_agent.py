@@ -15,7 +15,6 @@
 
 import datetime
 import sys
-import time
 
 from android_world.agents import base_agent
 from android_world.agents import agent_utils
@@ -28,9 +27,6 @@ from android_world.agents.agent_utils import ElementTree
 class HumanAgent(base_agent.EnvironmentInteractingAgent):
   """Human agent; wait for user to indicate they are done."""
 
-  # Wait a few seconds for the screen to stabilize after executing an action.
-  WAIT_AFTER_ACTION_SECONDS = 2.0
-
   def __init__(self,
                env: interface.AsyncEnv,
                save_path: str,
@@ -74,7 +70,7 @@ class HumanAgent(base_agent.EnvironmentInteractingAgent):
     else:
       self.env.execute_action(json_action.JSONAction(**action_details))
 
-    time.sleep(self.WAIT_AFTER_ACTION_SECONDS)
+    self.env.wait_for_transition()
 
     result = {}
     result['elements'] = state.ui_elements
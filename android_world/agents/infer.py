@@ -15,6 +15,7 @@
 """Some LLM inference interface."""
 
 import abc
+import asyncio
 import base64
 import io
 import os
@@ -58,6 +59,19 @@ class LlmWrapper(abc.ABC):
       Text output and raw output.
     """
 
+  async def apredict(self, text_prompt: str) -> tuple[str, Any]:
+    """Like `predict`, without blocking the event loop.
+
+    By default `predict` runs in a worker thread.
+
+    Args:
+      text_prompt: Text prompt.
+
+    Returns:
+      Text output and raw output.
+    """
+    return await asyncio.to_thread(self.predict, text_prompt)
+
 
 class MultimodalLlmWrapper(abc.ABC):
   """Abstract interface for Multimodal LLM."""
@@ -76,6 +90,22 @@ class MultimodalLlmWrapper(abc.ABC):
       Text output and raw output.
     """
 
+  async def apredict_mm(
+      self, text_prompt: str, images: list[np.ndarray]
+  ) -> tuple[str, Any]:
+    """Like `predict_mm`, without blocking the event loop.
+
+    By default `predict_mm` runs in a worker thread.
+
+    Args:
+      text_prompt: Text prompt.
+      images: List of images as numpy ndarray.
+
+    Returns:
+      Text output and raw output.
+    """
+    return await asyncio.to_thread(self.predict_mm, text_prompt, images)
+
 
 class GeminiGcpWrapper(LlmWrapper, MultimodalLlmWrapper):
   """Gemini GCP interface."""
@@ -120,7 +150,7 @@ class GeminiGcpWrapper(LlmWrapper, MultimodalLlmWrapper):
         return output.text, output
       except Exception as e:  # pylint: disable=broad-exception-caught
         counter -= 1
-        print('Error calling LLM, will retry in {retry_delay} seconds')
+        print(f'Error calling LLM, will retry in {retry_delay} seconds.')
         print(e)
         if counter > 0:
           # Expo backoff
@@ -128,6 +158,30 @@ class GeminiGcpWrapper(LlmWrapper, MultimodalLlmWrapper):
           retry_delay *= 2
     return ERROR_CALLING_LLM, None
 
+  async def apredict(self, text_prompt: str) -> tuple[str, Any]:
+    return await self.apredict_mm(text_prompt, [])
+
+  async def apredict_mm(
+      self, text_prompt: str, images: list[np.ndarray]
+  ) -> tuple[str, Any]:
+    counter = self.max_retry
+    retry_delay = 1.0
+    while counter > 0:
+      try:
+        output = await self.llm.generate_content_async(
+            [text_prompt] + [Image.fromarray(image) for image in images]
+        )
+        return output.text, output
+      except Exception as e:  # pylint: disable=broad-exception-caught
+        counter -= 1
+        print(f'Error calling LLM, will retry in {retry_delay} seconds.')
+        print(e)
+        if counter > 0:
+          # Expo backoff
+          await asyncio.sleep(retry_delay)
+          retry_delay *= 2
+    return ERROR_CALLING_LLM, None
+
 
 class Gpt4Wrapper(LlmWrapper, MultimodalLlmWrapper):
   """OpenAI GPT4 wrapper.
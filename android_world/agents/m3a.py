@@ -14,12 +14,10 @@
 
 """A Multimodal Autonomous Agent for Android (M3A)."""
 
-import time
 from android_world.agents import agent_utils
 from android_world.agents import base_agent
 from android_world.agents import infer
 from android_world.agents import m3a_utils
-from android_world.env import adb_utils
 from android_world.env import interface
 from android_world.env import json_action
 from android_world.env import representation_utils
@@ -330,12 +328,13 @@ def _summarize_prompt(
   )
 
 
+# Orientation, logical screen size and physical frame boundary.
+_ScreenGeometry = tuple[int, tuple[int, int], tuple[int, int, int, int]]
+
+
 class M3A(base_agent.EnvironmentInteractingAgent):
   """M3A which stands for Multimodal Autonomous Agent for Android."""
 
-  # Wait a few seconds for the screen to stablize after executing an action.
-  WAIT_AFTER_ACTION_SECONDS = 2.0
-
   def __init__(
       self,
       env: interface.AsyncEnv,
@@ -364,6 +363,29 @@ class M3A(base_agent.EnvironmentInteractingAgent):
     self.history = []
 
   def step(self, goal: str) -> base_agent.AgentInteractionResult:
+    return base_agent.run_calls(self._step(goal))
+
+  async def astep(self, goal: str) -> base_agent.AgentInteractionResult:
+    return await base_agent.arun_calls(self._step(goal))
+
+  def _get_screen_geometry(self) -> _ScreenGeometry:
+    return (
+        self.env.controller.orientation,
+        self.env.logical_screen_size,
+        self.env.controller.physical_frame_boundary,
+    )
+
+  async def _aget_screen_geometry(self) -> _ScreenGeometry:
+    return (
+        await self.aenv.orientation(),
+        await self.aenv.logical_screen_size(),
+        await self.aenv.physical_frame_boundary(),
+    )
+
+  def _step(
+      self, goal: str
+  ) -> base_agent.CallGenerator[base_agent.AgentInteractionResult]:
+    """Performs a step; see `base_agent.Call`."""
     step_data = {
         'raw_screenshot': None,
         'before_screenshot_with_som': None,
@@ -377,11 +399,11 @@ class M3A(base_agent.EnvironmentInteractingAgent):
     }
     print('----------step ' + str(len(self.history) + 1))
 
-    state = self.get_post_transition_state()
-    orientation = adb_utils.get_orientation(self.env.controller)
-    logical_screen_size = self.env.logical_screen_size
-    physical_frame_boundary = adb_utils.get_physical_frame_boundary(
-        self.env.controller
+    state = yield base_agent.Call(
+        self.get_post_transition_state, self.aget_post_transition_state
+    )
+    orientation, logical_screen_size, physical_frame_boundary = yield (
+        base_agent.Call(self._get_screen_geometry, self._aget_screen_geometry)
     )
 
     before_ui_elements = state.ui_elements
@@ -412,12 +434,10 @@ class M3A(base_agent.EnvironmentInteractingAgent):
         self.additional_guidelines,
     )
     step_data['action_prompt'] = action_prompt
-    action_output, raw_response = self.llm.predict_mm(
-        action_prompt,
-        [
-            step_data['raw_screenshot'],
-            before_screenshot,
-        ],
+    action_output, raw_response = yield base_agent.Call(
+        self.llm.predict_mm,
+        self.llm.apredict_mm,
+        (action_prompt, [step_data['raw_screenshot'], before_screenshot]),
     )
 
     if not raw_response:
@@ -502,7 +522,12 @@ class M3A(base_agent.EnvironmentInteractingAgent):
       print('Agent answered with: ' + converted_action.text)
 
     try:
-      self.env.execute_action(converted_action)
+      yield base_agent.Call(
+          self.env.execute_action,
+          self.aenv.execute_action,
+          (converted_action,),
+          {'state': state},
+      )
     except Exception as e:  # pylint: disable=broad-exception-caught
       print('Failed to execute action.')
       print(str(e))
@@ -515,13 +540,11 @@ class M3A(base_agent.EnvironmentInteractingAgent):
           step_data,
       )
 
-    time.sleep(self.WAIT_AFTER_ACTION_SECONDS)
-
-    state = self.env.get_state(wait_to_stabilize=False)
-    orientation = adb_utils.get_orientation(self.env.controller)
-    logical_screen_size = self.env.logical_screen_size
-    physical_frame_boundary = adb_utils.get_physical_frame_boundary(
-        self.env.controller
+    state = yield base_agent.Call(
+        self.env.wait_for_transition, self.aenv.wait_for_transition
+    )
+    orientation, logical_screen_size, physical_frame_boundary = yield (
+        base_agent.Call(self._get_screen_geometry, self._aget_screen_geometry)
     )
 
     after_ui_elements = state.ui_elements
@@ -553,12 +576,10 @@ class M3A(base_agent.EnvironmentInteractingAgent):
         before_ui_elements_list,
         after_ui_elements_list,
     )
-    summary, raw_response = self.llm.predict_mm(
-        summary_prompt,
-        [
-            before_screenshot,
-            after_screenshot,
-        ],
+    summary, raw_response = yield base_agent.Call(
+        self.llm.predict_mm,
+        self.llm.apredict_mm,
+        (summary_prompt, [before_screenshot, after_screenshot]),
     )
 
     if not raw_response:
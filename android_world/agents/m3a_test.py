@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 from typing import Any
 from unittest import mock
 from absl.testing import absltest
@@ -40,6 +41,21 @@ class MockMultimodalLlmWrapper(infer.MultimodalLlmWrapper):
       return infer.ERROR_CALLING_LLM, None
 
 
+class AsyncMockMultimodalLlmWrapper(MockMultimodalLlmWrapper):
+  """Mock multimodal LLM wrapper that must be awaited."""
+
+  def predict_mm(
+      self, text_prompt: str, images: list[np.ndarray]
+  ) -> tuple[str, Any]:
+    raise AssertionError('The blocking predict_mm was called.')
+
+  async def apredict_mm(
+      self, text_prompt: str, images: list[np.ndarray]
+  ) -> tuple[str, Any]:
+    await asyncio.sleep(0)
+    return super().predict_mm(text_prompt, images)
+
+
 class M3AInteractionTest(absltest.TestCase):
 
   def setUp(self):
@@ -130,6 +146,41 @@ class M3AInteractionTest(absltest.TestCase):
     self.assertTrue(step2_data.done)
     self.assertLen(agent.history, 2)
 
+  def test_astep_awaits_llm(self):
+    env = test_utils.FakeAsyncEnv()
+    llm = AsyncMockMultimodalLlmWrapper([
+        (
+            (
+                "Reason: answer question.\nAction: {'action_type': 'answer',"
+                " 'text': 'fake answer.'}"
+            ),
+            'test raw response',
+        ),
+        (
+            'fake summary',
+            'test raw response',
+        ),
+        (
+            (
+                "Reason: completed.\nAction: {'action_type': 'status',"
+                " 'goal_status': 'complete'}"
+            ),
+            'test raw response',
+        ),
+    ])
+    agent = m3a.M3A(env, llm)
+    agent.transition_pause = 0
+
+    async def run_steps():
+      return [await agent.astep('do something') for _ in range(2)]
+
+    step1_data, step2_data = asyncio.run(run_steps())
+
+    self.assertFalse(step1_data.done)
+    self.assertIn('fake summary', step1_data.data['summary'])
+    self.assertTrue(step2_data.done)
+    self.assertLen(agent.history, 2)
+
 
 if __name__ == '__main__':
   absltest.main()
@@ -97,7 +97,7 @@ class RandomAgent(base_agent.EnvironmentInteractingAgent):
     """See base class."""
     state = self.get_post_transition_state()
     action = _generate_random_action(self.env.device_screen_size)
-    self.env.execute_action(action)
+    self.env.execute_action(action, state=state)
     if self._verbose:
       print(action)
     step_data = {
@@ -14,12 +14,10 @@
 
 """T3A: Text-only Autonomous Agent for Android."""
 
-import time
 from android_world.agents import agent_utils
 from android_world.agents import base_agent
 from android_world.agents import infer
 from android_world.agents import m3a_utils
-from android_world.env import adb_utils
 from android_world.env import interface
 from android_world.env import json_action
 from android_world.env import representation_utils
@@ -273,9 +271,6 @@ def _summarize_prompt(
 class T3A(base_agent.EnvironmentInteractingAgent):
   """Text only autonomous agent for Android."""
 
-  # Wait a few seconds for the screen to stablize after executing an action.
-  WAIT_AFTER_ACTION_SECONDS = 2.0
-
   def __init__(
       self,
       env: interface.AsyncEnv,
@@ -303,6 +298,15 @@ class T3A(base_agent.EnvironmentInteractingAgent):
     self.additional_guidelines = task_guidelines
 
   def step(self, goal: str) -> base_agent.AgentInteractionResult:
+    return base_agent.run_calls(self._step(goal))
+
+  async def astep(self, goal: str) -> base_agent.AgentInteractionResult:
+    return await base_agent.arun_calls(self._step(goal))
+
+  def _step(
+      self, goal: str
+  ) -> base_agent.CallGenerator[base_agent.AgentInteractionResult]:
+    """Performs a step; see `base_agent.Call`."""
     step_data = {
         'before_screenshot': None,
         'after_screenshot': None,
@@ -317,8 +321,12 @@ class T3A(base_agent.EnvironmentInteractingAgent):
     }
     print('----------step ' + str(len(self.history) + 1))
 
-    state = self.get_post_transition_state()
-    logical_screen_size = self.env.logical_screen_size
+    state = yield base_agent.Call(
+        self.get_post_transition_state, self.aget_post_transition_state
+    )
+    logical_screen_size = yield base_agent.Call(
+        lambda: self.env.logical_screen_size, self.aenv.logical_screen_size
+    )
 
     ui_elements = state.ui_elements
     before_element_list = _generate_ui_elements_description_list_full(
@@ -339,8 +347,8 @@ class T3A(base_agent.EnvironmentInteractingAgent):
         self.additional_guidelines,
     )
     step_data['action_prompt'] = action_prompt
-    action_output, raw_response = self.llm.predict(
-        action_prompt,
+    action_output, raw_response = yield base_agent.Call(
+        self.llm.predict, self.llm.apredict, (action_prompt,)
     )
     if not raw_response:
       raise RuntimeError('Error calling LLM in action selection phase.')
@@ -398,14 +406,21 @@ class T3A(base_agent.EnvironmentInteractingAgent):
         self.history.append(step_data)
         return base_agent.AgentInteractionResult(False, step_data)
       else:
+        physical_frame_boundary = yield base_agent.Call(
+            lambda: self.env.controller.physical_frame_boundary,
+            self.aenv.physical_frame_boundary,
+        )
+        orientation = yield base_agent.Call(
+            lambda: self.env.controller.orientation, self.aenv.orientation
+        )
         # Add mark for the target ui element, just used for visualization.
         m3a_utils.add_ui_element_mark(
             step_data['before_screenshot'],
             ui_elements[converted_action.index],
             converted_action.index,
             logical_screen_size,
-            adb_utils.get_physical_frame_boundary(self.env.controller),
-            adb_utils.get_orientation(self.env.controller),
+            physical_frame_boundary,
+            orientation,
         )
 
     if converted_action.action_type == 'status':
@@ -422,7 +437,12 @@ class T3A(base_agent.EnvironmentInteractingAgent):
       print('Agent answered with: ' + converted_action.text)
 
     try:
-      self.env.execute_action(converted_action)
+      yield base_agent.Call(
+          self.env.execute_action,
+          self.aenv.execute_action,
+          (converted_action,),
+          {'state': state},
+      )
     except Exception as e:  # pylint: disable=broad-exception-caught
       print(
           'Some error happened executing the action ',
@@ -440,13 +460,16 @@ class T3A(base_agent.EnvironmentInteractingAgent):
           step_data,
       )
 
-    time.sleep(self.WAIT_AFTER_ACTION_SECONDS)
-
-    state = self.env.get_state()
+    state = yield base_agent.Call(
+        self.env.wait_for_transition, self.aenv.wait_for_transition
+    )
+    logical_screen_size = yield base_agent.Call(
+        lambda: self.env.logical_screen_size, self.aenv.logical_screen_size
+    )
     ui_elements = state.ui_elements
     after_element_list = _generate_ui_elements_description_list_full(
         ui_elements,
-        self.env.logical_screen_size,
+        logical_screen_size,
     )
 
     # Save screenshot only for result visualization.
@@ -461,8 +484,8 @@ class T3A(base_agent.EnvironmentInteractingAgent):
         after_element_list,
     )
 
-    summary, raw_response = self.llm.predict(
-        summary_prompt,
+    summary, raw_response = yield base_agent.Call(
+        self.llm.predict, self.llm.apredict, (summary_prompt,)
     )
 
     step_data['summary_prompt'] = summary_prompt
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 from typing import Any
 from absl.testing import absltest
 from android_world.agents import infer
@@ -38,6 +39,20 @@ class MockLlmWrapper(infer.LlmWrapper):
       return infer.ERROR_CALLING_LLM, None
 
 
+class AsyncMockLlmWrapper(MockLlmWrapper):
+  """Mock LLM wrapper that must be awaited."""
+
+  def predict(
+      self,
+      text_prompt: str,
+  ) -> tuple[str, Any]:
+    raise AssertionError("The blocking predict was called.")
+
+  async def apredict(self, text_prompt: str) -> tuple[str, Any]:
+    await asyncio.sleep(0)
+    return super().predict(text_prompt)
+
+
 class T3AInteractionTest(absltest.TestCase):
 
   def test_step_method_with_completion(self):
@@ -89,5 +104,30 @@ class T3AInteractionTest(absltest.TestCase):
     self.assertLen(agent.history, 2)
 
 
+  def test_astep_awaits_llm(self):
+    env = test_utils.FakeAsyncEnv()
+    mock_llm = AsyncMockLlmWrapper([
+        (
+            (
+                "Reason: completed.\nAction: {'action_type': 'answer',"
+                " 'text': 'mock_response'}"
+            ),
+            "fake_response_1",
+        ),
+        (
+            "fake_summary",
+            "fake_response_1",
+        ),
+    ])
+    agent = t3a.T3A(env, mock_llm)
+    agent.transition_pause = 0
+
+    step_data = asyncio.run(agent.astep("do something"))
+
+    self.assertFalse(step_data.done)
+    self.assertIn("fake_summary", step_data.data["summary"])
+    self.assertLen(agent.history, 1)
+
+
 if __name__ == "__main__":
   absltest.main()
@@ -15,17 +15,28 @@
 """Checkpointer class."""
 
 import abc
+from collections.abc import Callable, Iterator
 import datetime
 import gzip
 import io
+import json
 import os
 import pickle
-from typing import Any
+import struct
+import tempfile
+import threading
+from typing import Any, BinaryIO, Optional
+import zlib
 
 from absl import logging
+from android_world.utils import blob_store
+from android_world.utils import compression
+import numpy as np
 
 
 Episode = dict[str, Any]
+# The scalar fields of an episode, e.g. its task template and success.
+EpisodeMetadata = dict[str, Any]
 
 
 def _gzip_pickle(data: Any) -> bytes:
@@ -37,19 +48,40 @@ def _gzip_pickle(data: Any) -> bytes:
   Returns:
       A bytes object containing the gzipped pickled data.
   """
-  pickled_data = io.BytesIO()
-  pickle.dump(data, pickled_data)
-
-  pickled_data.seek(0)  # Reset the stream position to the beginning
   compressed_data = io.BytesIO()
   with gzip.GzipFile(
       fileobj=compressed_data, mode='wb', compresslevel=5
   ) as f_out:
-    f_out.write(pickled_data.getvalue())
+    # Pickle straight into the compressor, without an intermediate copy.
+    pickle.dump(data, f_out, protocol=pickle.HIGHEST_PROTOCOL)
 
   return compressed_data.getvalue()
 
 
+def _atomic_write(filename: str, data: bytes) -> None:
+  """Writes `data` to `filename` so that readers never see a partial file.
+
+  The data is flushed to disk before it replaces `filename`, so the file is
+  complete even after a crash of the machine.
+
+  Args:
+      filename: The destination file.
+      data: The bytes to write.
+  """
+  fd, tmp_filename = tempfile.mkstemp(
+      dir=os.path.dirname(filename) or '.', suffix='.tmp'
+  )
+  try:
+    with os.fdopen(fd, 'wb') as f:
+      f.write(data)
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+  except BaseException:
+    os.remove(tmp_filename)
+    raise
+
+
 def _unzip_and_read_pickle(file_path: str) -> Any:
   """Reads a gzipped pickle file using 'with open', unzips, and unpickles it.
 
@@ -66,17 +98,216 @@ def _unzip_and_read_pickle(file_path: str) -> Any:
     return pickle.load(f_in)
 
 
+# Episode files are a header followed by one frame per episode. A frame is the
+# payload length and CRC-32, followed by the payload, an episode compressed by
+# `compression.dumps`.
+_EPISODES_MAGIC = b'AWCKPT2\n'
+# Episode files whose payloads are zlib-compressed pickles.
+_ZLIB_EPISODES_MAGIC = b'AWCKPT1\n'
+_FRAME_HEADER = struct.Struct('<II')
+_INDEX_VERSION = 2
+# Indexes of this version list the frames only.
+_RECORDS_ONLY_INDEX_VERSION = 1
+
+_EPISODES_SUFFIX = '.episodes'
+_BLOBS_DIRECTORY = 'blobs'
+_INDEX_SUFFIX = '.index.json'
+_LEGACY_SUFFIX = '.pkl.gz'
+
+# (offset, size) of a frame in an episodes file.
+_Record = tuple[int, int]
+
+
+def _episode_metadata(episode: Episode) -> EpisodeMetadata:
+  """Returns the fields of an episode that are plain scalars."""
+  metadata = {}
+  for key, value in episode.items():
+    if isinstance(value, np.generic):
+      value = value.item()
+    if isinstance(key, str) and (
+        value is None or isinstance(value, (str, bool, int, float))
+    ):
+      metadata[key] = value
+  return metadata
+
+
+def _encode_episode(
+    episode: Episode,
+    blobs: Optional[blob_store.BlobStore] = None,
+    codec: str = compression.DEFAULT_CODEC,
+    level: Optional[int] = None,
+) -> bytes:
+  """Returns the frame of an episode, moving its large arrays to `blobs`."""
+  if blobs is not None:
+    episode = blobs.offload(episode)
+  payload = compression.dumps(episode, codec=codec, level=level)
+  return _FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode_episode(
+    payload: bytes,
+    blobs: Optional[blob_store.BlobStore] = None,
+    magic: bytes = _EPISODES_MAGIC,
+) -> Episode:
+  """Inverse of `_encode_episode`; array references load from `blobs`.
+
+  Args:
+    payload: The payload of the episode's frame.
+    blobs: The store the episode's large arrays were moved to, if any.
+    magic: The header of the episodes file the frame is from.
+  """
+  if magic == _ZLIB_EPISODES_MAGIC:
+    decode = lambda: pickle.loads(zlib.decompress(payload))
+  else:
+    decode = lambda: compression.loads(payload)
+  if blobs is None:
+    return decode()
+  with blobs.resolving():
+    return decode()
+
+
+def _read_magic(f: BinaryIO, path: str) -> bytes:
+  """Reads the header of an episodes file."""
+  magic = f.read(len(_EPISODES_MAGIC))
+  if magic not in (_EPISODES_MAGIC, _ZLIB_EPISODES_MAGIC):
+    raise ValueError(f'{path} is not an episodes file.')
+  return magic
+
+
+def _read_frame(f: BinaryIO) -> Optional[bytes]:
+  """Reads the frame at the current position; None if it is not intact."""
+  header = f.read(_FRAME_HEADER.size)
+  if len(header) < _FRAME_HEADER.size:
+    return None
+  length, crc = _FRAME_HEADER.unpack(header)
+  payload = f.read(length)
+  if len(payload) < length or zlib.crc32(payload) != crc:
+    return None
+  return payload
+
+
+def _scan_records(f: BinaryIO, offset: int) -> Iterator[tuple[_Record, bytes]]:
+  """Yields the intact frames from `offset` on, up to a torn or corrupt one."""
+  f.seek(offset)
+  while (payload := _read_frame(f)) is not None:
+    size = _FRAME_HEADER.size + len(payload)
+    yield (offset, size), payload
+    offset += size
+
+
+def _read_records(
+    f: BinaryIO, records: list[_Record]
+) -> Iterator[tuple[_Record, bytes]]:
+  """Yields the listed frames, up to the first one that is not intact."""
+  for offset, size in records:
+    f.seek(offset)
+    payload = _read_frame(f)
+    if payload is None or _FRAME_HEADER.size + len(payload) != size:
+      return
+    yield (offset, size), payload
+
+
+def _read_index(
+    path: str,
+) -> tuple[Optional[list[_Record]], Optional[list[EpisodeMetadata]]]:
+  """Reads an index file.
+
+  Args:
+    path: The index file.
+
+  Returns:
+    The listed frames and the metadata of their episodes. The frames are None
+    if the index is unusable, and the metadata if the index predates it.
+  """
+  try:
+    with open(path) as f:
+      index = json.load(f)
+    if index['version'] not in (_INDEX_VERSION, _RECORDS_ONLY_INDEX_VERSION):
+      return None, None
+    records = [(offset, size) for offset, size in index['records']]
+    metadata = index.get('metadata')
+    if metadata is not None and len(metadata) != len(records):
+      metadata = None
+    return records, metadata
+  except (OSError, ValueError, KeyError, TypeError):
+    return None, None
+
+
+def read_episodes(
+    path: str,
+    records: Optional[list[_Record]] = None,
+    blobs: Optional[blob_store.BlobStore] = None,
+) -> Iterator[Episode]:
+  """Streams the episodes of an episodes file, one at a time.
+
+  Args:
+    path: The episodes file.
+    records: The frames to read, as listed by the file's index. If None or if
+      a listed frame is not intact, the file is scanned from there on instead,
+      up to the first torn or corrupt frame.
+    blobs: The store the episodes' large arrays were moved to, if any. The
+      arrays are read from it when accessed, see `blob_store.BlobRef`.
+
+  Yields:
+    The episodes, in the order they were written.
+
+  Raises:
+    ValueError: If the file is not an episodes file.
+  """
+  with open(path, 'rb') as f:
+    magic = _read_magic(f, path)
+    offset = len(_EPISODES_MAGIC)
+    if records is not None:
+      num_read = 0
+      for (record_offset, size), payload in _read_records(f, records):
+        yield _decode_episode(payload, blobs, magic)
+        offset = record_offset + size
+        num_read += 1
+      if num_read == len(records):
+        return
+      logging.warning('Index of %s is out of date; scanning.', path)
+    for _, payload in _scan_records(f, offset):
+      yield _decode_episode(payload, blobs, magic)
+
+
 class Checkpointer(abc.ABC):
   """Saves and loads the results of an evaluation run."""
 
   @abc.abstractmethod
   def save_episodes(self, task_episodes: list[Episode], task_name: str) -> None:
-    """Saves a task's episodes to disk."""
+    """Saves a task's episodes to disk, replacing any saved before."""
+
+  @abc.abstractmethod
+  def append_episode(self, episode: Episode, task_name: str) -> None:
+    """Adds an episode to the task's saved episodes."""
 
   @abc.abstractmethod
   def load(self) -> list[Episode]:
     """Loads all episodes from disk."""
 
+  @abc.abstractmethod
+  def drop_episodes(
+      self, task_name: str, should_drop: Callable[[EpisodeMetadata], bool]
+  ) -> int:
+    """Removes the task's saved episodes whose metadata match `should_drop`.
+
+    Args:
+      task_name: The task whose episodes to filter.
+      should_drop: Whether to remove an episode, given its metadata.
+
+    Returns:
+      The number of removed episodes.
+    """
+
+  def load_metadata(self) -> list[EpisodeMetadata]:
+    """Loads the scalar fields of all episodes, e.g. their success.
+
+    Returns:
+      The fields of each episode that are None, strings, bools or numbers, in
+      the order `load` returns the episodes.
+    """
+    return [_episode_metadata(episode) for episode in self.load()]
+
 
 class IncrementalCheckpointer(Checkpointer):
   """Saves and loads the results of an evaluation run.
@@ -85,40 +316,341 @@ class IncrementalCheckpointer(Checkpointer):
   checkpointer to save the results of an evaluation run task by task, rather
   than saving the entire dataset at once.
 
+  Each task's episodes are stored in an append-only `<task>.episodes` file,
+  one compressed, checksummed frame per episode, so adding an episode costs
+  only that episode. A `<task>.index.json` file lists the frames that were
+  completely written: appends are flushed to disk before the index is
+  atomically replaced, so a crash mid-append loses at most that episode and
+  never corrupts earlier ones. Saving is thread-safe.
+
+  The index also holds each episode's scalar fields, so `load_metadata` reads
+  the results of a run without reading any episode.
+
+  Large arrays in episodes, such as the screenshots in agents' step data, are
+  moved to a content-addressed store in `<directory>/blobs`, which stores
+  identical arrays once. `load` and `iter_episodes` read them back into the
+  episodes. With `lazy_blobs=True`, episodes hold `blob_store.BlobRef`s in
+  their place instead, which read the array when accessed, e.g. by
+  `np.asarray`.
+
+  Episodes are compressed with zlib by default, or with zstd or lz4 if their
+  packages are installed; see `compression`. Arrays kept in the episodes are
+  read-only when loaded.
+
+  Task files of previous formats, `<task>.pkl.gz` and episodes files of zlib
+  pickles, are still read, and are converted on the next save to the task or
+  by `migrate`.
+
   Attributes:
       directory: The directory to store the task data.
   """
 
-  def __init__(self, directory: str) -> None:
+  def __init__(
+      self,
+      directory: str,
+      blob_min_bytes: Optional[int] = blob_store.DEFAULT_MIN_BYTES,
+      codec: str = compression.DEFAULT_CODEC,
+      compression_level: Optional[int] = None,
+  ) -> None:
+    """Initializes the checkpointer.
+
+    Args:
+      directory: The directory to store the task data.
+      blob_min_bytes: Arrays of at least this many bytes are moved to the blob
+        store. If None, episodes are saved as they are; episodes saved with a
+        blob store are still read.
+      codec: The codec to compress episodes with; one of
+        `compression.CODEC_NAMES`. Episodes compressed with any installed codec
+        are read.
+      compression_level: The codec's compression level, or None for its
+        default.
+
+    Raises:
+      ValueError: If the codec is unknown or its package is not installed.
+    """
+    compression.get_codec(codec)
+    self._codec = codec
+    self._compression_level = compression_level
     self.directory = directory
     os.makedirs(directory, exist_ok=True)
+    self._blobs = blob_store.BlobStore(
+        os.path.join(directory, _BLOBS_DIRECTORY),
+        min_bytes=blob_min_bytes or blob_store.DEFAULT_MIN_BYTES,
+    )
+    self._offload_blobs = blob_min_bytes is not None
+    self._lock = threading.Lock()
+    # Committed frames of the episodes files written by this checkpointer,
+    # and the metadata of their episodes.
+    self._records: dict[str, list[_Record]] = {}
+    self._metadata: dict[str, list[EpisodeMetadata]] = {}
+
+  def _path(self, task_name: str, suffix: str) -> str:
+    return os.path.join(self.directory, f'{task_name}{suffix}')
+
+  def _encode(self, episode: Episode) -> bytes:
+    return _encode_episode(
+        episode,
+        self._blobs if self._offload_blobs else None,
+        codec=self._codec,
+        level=self._compression_level,
+    )
+
+  def _committed(
+      self, task_name: str
+  ) -> tuple[list[_Record], list[EpisodeMetadata]]:
+    """Returns the committed frames of a task's episodes file and metadata.
+
+    Requires the lock. Without a usable index, the episodes are read, and the
+    index is rewritten so that the next run does not need to.
+
+    Args:
+      task_name: The task.
+    """
+    if task_name not in self._records:
+      index_path = self._path(task_name, _INDEX_SUFFIX)
+      records, metadata = _read_index(index_path)
+      if metadata is None:
+        path = self._path(task_name, _EPISODES_SUFFIX)
+        found, metadata = [], []
+        if os.path.exists(path):
+          with open(path, 'rb') as f:
+            magic = _read_magic(f, path)
+            if records is None:
+              frames = _scan_records(f, len(_EPISODES_MAGIC))
+            else:
+              frames = _read_records(f, records)
+            for record, payload in frames:
+              found.append(record)
+              metadata.append(
+                  _episode_metadata(
+                      _decode_episode(payload, self._blobs, magic)
+                  )
+              )
+          try:
+            self._write_index(task_name, found, metadata)
+          except OSError:
+            logging.exception('Could not rewrite %s.', index_path)
+        records = found
+      self._records[task_name] = records
+      self._metadata[task_name] = metadata
+    return self._records[task_name], self._metadata[task_name]
+
+  def _write_index(
+      self,
+      task_name: str,
+      records: list[_Record],
+      metadata: list[EpisodeMetadata],
+  ) -> None:
+    index = {
+        'version': _INDEX_VERSION,
+        'records': records,
+        'metadata': metadata,
+    }
+    _atomic_write(
+        self._path(task_name, _INDEX_SUFFIX), json.dumps(index).encode()
+    )
+    self._records[task_name] = records
+    self._metadata[task_name] = metadata
+
+  def _write_episodes(
+      self,
+      task_name: str,
+      frames: list[bytes],
+      metadata: list[EpisodeMetadata],
+  ) -> None:
+    """Replaces the task's episodes with `frames`; requires the lock."""
+    records = []
+    offset = len(_EPISODES_MAGIC)
+    for frame in frames:
+      records.append((offset, len(frame)))
+      offset += len(frame)
+    _atomic_write(
+        self._path(task_name, _EPISODES_SUFFIX),
+        b''.join([_EPISODES_MAGIC] + frames),
+    )
+    self._write_index(task_name, records, metadata)
+    legacy_path = self._path(task_name, _LEGACY_SUFFIX)
+    if os.path.exists(legacy_path):
+      os.remove(legacy_path)
+
+  def _ensure_current_format(self, task_name: str) -> bool:
+    """Converts the task's episodes to the current format; requires the lock.
+
+    Creates an empty episodes file if the task has no episodes yet.
+
+    Args:
+      task_name: The task.
+
+    Returns:
+      Whether episodes of a previous format were converted.
+    """
+    path = self._path(task_name, _EPISODES_SUFFIX)
+    if os.path.exists(path):
+      with open(path, 'rb') as f:
+        if _read_magic(f, path) == _EPISODES_MAGIC:
+          return False
+      records, _ = self._committed(task_name)
+      episodes = list(read_episodes(path, records, self._blobs))
+      converted = True
+    else:
+      converted = os.path.exists(self._path(task_name, _LEGACY_SUFFIX))
+      episodes = self._load_legacy_task_group(task_name) if converted else []
+    self._write_episodes(
+        task_name,
+        [self._encode(episode) for episode in episodes],
+        [_episode_metadata(episode) for episode in episodes],
+    )
+    return converted
 
   def save_episodes(self, task_episodes: list[Episode], task_name: str):
-    """Saves a task group to disk.
+    """Saves a task group to disk, replacing the task's saved episodes.
 
     Args:
         task_episodes: The task's episodes to save.
         task_name: The unique identifier for the task group.
     """
-    filename = os.path.join(self.directory, f'{task_name}.pkl.gz')
-    with open(filename, 'wb') as f:
-      compressed = _gzip_pickle(task_episodes)
-      f.write(compressed)
-    print(f'Wrote task episodes for {task_name} to {filename}')
+    frames = [self._encode(episode) for episode in task_episodes]
+    metadata = [_episode_metadata(episode) for episode in task_episodes]
+    with self._lock:
+      self._write_episodes(task_name, frames, metadata)
+    print(
+        f'Wrote task episodes for {task_name} to'
+        f' {self._path(task_name, _EPISODES_SUFFIX)}'
+    )
+
+  def append_episode(self, episode: Episode, task_name: str) -> None:
+    """Appends an episode to the task's saved episodes.
 
-  def load(self) -> list[Episode]:
-    """Loads all task groups from disk."""
-    data = []
+    Args:
+        episode: The episode to save.
+        task_name: The unique identifier for the task group.
+    """
+    frame = self._encode(episode)
+    path = self._path(task_name, _EPISODES_SUFFIX)
+    with self._lock:
+      # Start from the episodes in a previous format, if any.
+      self._ensure_current_format(task_name)
+      records, metadata = self._committed(task_name)
+      records = list(records)
+      end = sum(records[-1]) if records else len(_EPISODES_MAGIC)
+      with open(path, 'r+b') as f:
+        # Drop whatever a crashed append left behind.
+        f.truncate(end)
+        f.seek(end)
+        f.write(frame)
+        f.flush()
+        os.fsync(f.fileno())
+      records.append((end, len(frame)))
+      self._write_index(
+          task_name, records, metadata + [_episode_metadata(episode)]
+      )
+    print(f'Appended task episode for {task_name} to {path}')
+
+  def drop_episodes(
+      self, task_name: str, should_drop: Callable[[EpisodeMetadata], bool]
+  ) -> int:
+    """Removes the task's saved episodes whose metadata match `should_drop`.
+
+    The kept episodes are copied as they are, without reading them.
+
+    Args:
+      task_name: The task whose episodes to filter.
+      should_drop: Whether to remove an episode, given its metadata.
+
+    Returns:
+      The number of removed episodes.
+    """
+    path = self._path(task_name, _EPISODES_SUFFIX)
+    with self._lock:
+      if not os.path.exists(path) and not os.path.exists(
+          self._path(task_name, _LEGACY_SUFFIX)
+      ):
+        return 0
+      self._ensure_current_format(task_name)
+      records, metadata = self._committed(task_name)
+      keep = [i for i, m in enumerate(metadata) if not should_drop(dict(m))]
+      if len(keep) == len(records):
+        return 0
+      frames = []
+      with open(path, 'rb') as f:
+        for i in keep:
+          offset, size = records[i]
+          f.seek(offset)
+          frames.append(f.read(size))
+      self._write_episodes(task_name, frames, [metadata[i] for i in keep])
+      return len(records) - len(keep)
+
+  def _task_names(self) -> list[str]:
+    names = set()
     for filename in os.listdir(self.directory):
-      if filename.endswith('.pkl.gz'):
-        task_group_id = filename[:-7]  # Remove ".pkl.gz" extension
-        task_group = self._load_task_group(task_group_id)
-        data.extend(task_group)
-    return data
-
-  def _load_task_group(self, task_group_id: str) -> list[Episode]:
-    """Loads a single task group from disk."""
-    filename = os.path.join(self.directory, f'{task_group_id}.pkl.gz')
+      for suffix in (_EPISODES_SUFFIX, _LEGACY_SUFFIX):
+        if filename.endswith(suffix):
+          names.add(filename[: -len(suffix)])
+    return sorted(names)
+
+  def iter_episodes(self, lazy_blobs: bool = False) -> Iterator[Episode]:
+    """Streams all episodes from disk, one at a time.
+
+    Args:
+      lazy_blobs: Whether to leave the arrays moved to the blob store as
+        `blob_store.BlobRef`s, which read them when accessed, rather than
+        reading them all.
+    """
+    for task_name in self._task_names():
+      path = self._path(task_name, _EPISODES_SUFFIX)
+      if not os.path.exists(path):
+        yield from self._load_legacy_task_group(task_name)
+        continue
+      try:
+        records, _ = _read_index(self._path(task_name, _INDEX_SUFFIX))
+        for episode in read_episodes(path, records, self._blobs):
+          yield episode if lazy_blobs else blob_store.materialize(episode)
+      except ValueError:
+        logging.exception('Could not read %s.', path)
+
+  def load(self, lazy_blobs: bool = False) -> list[Episode]:
+    """Loads all task groups from disk.
+
+    Args:
+      lazy_blobs: See `iter_episodes`.
+    """
+    return list(self.iter_episodes(lazy_blobs=lazy_blobs))
+
+  def load_metadata(self) -> list[EpisodeMetadata]:
+    """Loads the scalar fields of all episodes from the task indexes.
+
+    Returns:
+      The fields of each episode that are None, strings, bools or numbers, in
+      the order `load` returns the episodes.
+    """
+    all_metadata = []
+    with self._lock:
+      for task_name in self._task_names():
+        if os.path.exists(self._path(task_name, _EPISODES_SUFFIX)):
+          _, metadata = self._committed(task_name)
+        else:
+          metadata = [
+              _episode_metadata(episode)
+              for episode in self._load_legacy_task_group(task_name)
+          ]
+        all_metadata.extend(dict(m) for m in metadata)
+    return all_metadata
+
+  def migrate(self) -> int:
+    """Converts task files of previous formats to the current one.
+
+    Returns:
+      The number of converted task files.
+    """
+    with self._lock:
+      return sum(
+          self._ensure_current_format(task_name)
+          for task_name in self._task_names()
+      )
+
+  def _load_legacy_task_group(self, task_group_id: str) -> list[Episode]:
+    """Loads a single task group in the previous format from disk."""
+    filename = self._path(task_group_id, _LEGACY_SUFFIX)
     try:
       return _unzip_and_read_pickle(filename)
     except FileNotFoundError:
@@ -138,6 +670,14 @@ class NullCheckpointer(Checkpointer):
   def save_episodes(self, task_episodes: list[Episode], task_name: str):
     pass
 
+  def append_episode(self, episode: Episode, task_name: str) -> None:
+    pass
+
+  def drop_episodes(
+      self, task_name: str, should_drop: Callable[[EpisodeMetadata], bool]
+  ) -> int:
+    return 0
+
   def load(self) -> list[Episode]:
     return []
 
@@ -0,0 +1,261 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks checkpoint codecs on episodes like those of the M3A agent.
+
+Compares the write and read throughput and the size on disk of
+`IncrementalCheckpointer` with each codec and level against the gzipped
+pickles of the previous format.
+
+Usage:
+  python -m android_world.checkpointer_benchmark \\
+      --configs=zlib:1,zlib:5,zstd:3,lz4:0 --num_steps=10
+"""
+
+from collections.abc import Callable, Sequence
+import contextlib
+import io
+import os
+import pickle
+import tempfile
+import time
+from typing import Any
+
+from absl import app
+from absl import flags
+from android_world import checkpointer as checkpointer_lib
+from android_world import constants
+from android_world.utils import blob_store
+from android_world.utils import compression
+import numpy as np
+
+_CONFIGS = flags.DEFINE_list(
+    'configs',
+    ['zlib:1', 'zlib:5', 'zstd:1', 'zstd:3', 'zstd:9', 'lz4:0'],
+    'Codecs and levels to benchmark, as codec:level. Codecs that are not'
+    ' installed are skipped.',
+)
+_NUM_EPISODES = flags.DEFINE_integer(
+    'num_episodes', 2, 'Number of episodes to checkpoint.'
+)
+_NUM_STEPS = flags.DEFINE_integer(
+    'num_steps', 5, 'Number of steps per episode.'
+)
+_SCREEN_SIZE = flags.DEFINE_list(
+    'screen_size', ['1080', '2400'], 'Width and height of the screenshots.'
+)
+_BLOB_STORE = flags.DEFINE_boolean(
+    'blob_store',
+    False,
+    'Whether to move screenshots to the blob store. Off by default, so that the'
+    ' codecs compress the screenshots.',
+)
+_REPEATS = flags.DEFINE_integer(
+    'repeats', 2, 'Number of timed writes and reads per configuration.'
+)
+
+
+def _make_screen(
+    rng: np.random.Generator, width: int, height: int
+) -> np.ndarray:
+  """Returns a screenshot of a list screen: flat colors and rows of text."""
+  screen = np.full((height, width, 3), 250, dtype=np.uint8)
+  screen[: height // 30] = (33, 33, 33)  # Status bar.
+  screen[height // 30 : height // 12] = rng.integers(0, 256, 3)  # App bar.
+  row_height = height // 16
+  for top in range(height // 12, height, row_height):
+    screen[top + row_height - 2 : top + row_height] = 220  # Divider.
+    # Anti-aliased "text": short runs of dark pixels.
+    text = rng.random((row_height // 3, width // 2)) < 0.3
+    glyphs = np.where(text[..., None], rng.integers(0, 90), 250)
+    rows = slice(top + row_height // 3, top + 2 * row_height // 3)
+    screen[rows, 40 : 40 + width // 2] = glyphs
+  return screen
+
+
+def _add_som(
+    rng: np.random.Generator, screen: np.ndarray, num_elements: int = 20
+) -> np.ndarray:
+  """Returns the screenshot with set-of-marks boxes drawn on it, as M3A does."""
+  marked = screen.copy()
+  height, width, _ = screen.shape
+  for _ in range(num_elements):
+    x0, y0 = rng.integers(0, width - 100), rng.integers(0, height - 100)
+    x1, y1 = x0 + rng.integers(50, 100), y0 + rng.integers(50, 100)
+    color = rng.integers(0, 256, 3)
+    marked[y0 : y0 + 3, x0:x1] = color
+    marked[y1 - 3 : y1, x0:x1] = color
+    marked[y0:y1, x0 : x0 + 3] = color
+    marked[y0:y1, x1 - 3 : x1] = color
+  return marked
+
+
+def make_episode(num_steps: int, width: int, height: int, seed: int = 0):
+  """Returns an episode with the step data of the M3A agent.
+
+  Args:
+    num_steps: Number of steps.
+    width: Width of the screenshots.
+    height: Height of the screenshots.
+    seed: Random seed.
+  """
+  rng = np.random.default_rng(seed)
+  screens = [_make_screen(rng, width, height) for _ in range(num_steps + 1)]
+  prompt = 'You are an agent who can operate an Android phone. ' * 60
+  step_data = {
+      'raw_screenshot': [],
+      'before_screenshot_with_som': [],
+      'after_screenshot_with_som': [],
+      'action_prompt': [],
+      'action_output': [],
+      'action_raw_response': [],
+      'summary_prompt': [],
+      'summary': [],
+      'summary_raw_response': [],
+      constants.STEP_NUMBER: [],
+  }
+  for step in range(num_steps):
+    step_data['raw_screenshot'].append(screens[step])
+    step_data['before_screenshot_with_som'].append(_add_som(rng, screens[step]))
+    step_data['after_screenshot_with_som'].append(
+        _add_som(rng, screens[step + 1])
+    )
+    step_data['action_prompt'].append(prompt + f'Step {step}.')
+    step_data['action_output'].append(
+        'Reason: The note is in the list.\nAction: {"action_type": "click",'
+        f' "index": {step}}}'
+    )
+    step_data['action_raw_response'].append({'choices': [{'text': prompt}]})
+    step_data['summary_prompt'].append(prompt)
+    step_data['summary'].append(f'Clicked element {step}, opening the note.')
+    step_data['summary_raw_response'].append({'choices': [{'text': prompt}]})
+    step_data[constants.STEP_NUMBER].append(step)
+  return {
+      constants.EpisodeConstants.GOAL: 'Delete the note "Groceries".',
+      constants.EpisodeConstants.TASK_TEMPLATE: 'MarkorDeleteNote',
+      constants.EpisodeConstants.EPISODE_DATA: step_data,
+      constants.EpisodeConstants.IS_SUCCESSFUL: 1.0,
+      constants.EpisodeConstants.RUN_TIME: 120.0,
+      constants.EpisodeConstants.EPISODE_LENGTH: num_steps,
+      constants.EpisodeConstants.EXCEPTION_INFO: None,
+      constants.EpisodeConstants.SEED: seed,
+  }
+
+
+def _directory_size(directory: str) -> int:
+  return sum(
+      os.path.getsize(os.path.join(root, name))
+      for root, _, names in os.walk(directory)
+      for name in names
+  )
+
+
+def _best_time(fn: Callable[[], Any]) -> float:
+  best = float('inf')
+  for _ in range(_REPEATS.value):
+    start = time.perf_counter()
+    fn()
+    best = min(best, time.perf_counter() - start)
+  return best
+
+
+def _benchmark_legacy(
+    episodes: list[dict[str, Any]], directory: str
+) -> tuple[float, float, int]:
+  """Returns the write and read time and size of the previous format."""
+  # pylint: disable=protected-access
+  path = os.path.join(directory, 'task.pkl.gz')
+
+  def write():
+    with open(path, 'wb') as f:
+      f.write(checkpointer_lib._gzip_pickle(episodes))
+
+  write_secs = _best_time(write)
+  read_secs = _best_time(lambda: checkpointer_lib._unzip_and_read_pickle(path))
+  return write_secs, read_secs, os.path.getsize(path)
+  # pylint: enable=protected-access
+
+
+def _benchmark_codec(
+    episodes: list[dict[str, Any]], directory: str, codec: str, level: int
+) -> tuple[float, float, int]:
+  """Returns the write and read time and size with a codec."""
+  write_secs = float('inf')
+  for repeat in range(_REPEATS.value):
+    # A new directory per repeat, so that blobs are not deduplicated against
+    # an earlier repeat.
+    checkpointer = checkpointer_lib.IncrementalCheckpointer(
+        os.path.join(directory, str(repeat)),
+        blob_min_bytes=(
+            blob_store.DEFAULT_MIN_BYTES if _BLOB_STORE.value else None
+        ),
+        codec=codec,
+        compression_level=level,
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+      start = time.perf_counter()
+      for episode in episodes:
+        checkpointer.append_episode(episode, 'task')
+      write_secs = min(write_secs, time.perf_counter() - start)
+
+  def read():
+    for _ in checkpointer.iter_episodes():
+      pass
+
+  return write_secs, _best_time(read), _directory_size(checkpointer.directory)
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+
+  width, height = (int(n) for n in _SCREEN_SIZE.value)
+  episodes = [
+      make_episode(_NUM_STEPS.value, width, height, seed=seed)
+      for seed in range(_NUM_EPISODES.value)
+  ]
+  raw_mib = len(pickle.dumps(episodes, protocol=5)) / 2**20
+  print(
+      f'{len(episodes)} episodes of {_NUM_STEPS.value} steps,'
+      f' {raw_mib:.1f} MiB pickled.'
+  )
+  print(
+      f'{"config":>14} {"write MiB/s":>12} {"read MiB/s":>11}'
+      f' {"size MiB":>9} {"ratio":>6}'
+  )
+
+  def report(name: str, write_secs: float, read_secs: float, size: int):
+    print(
+        f'{name:>14} {raw_mib / write_secs:>12.1f}'
+        f' {raw_mib / read_secs:>11.1f} {size / 2**20:>9.2f}'
+        f' {raw_mib * 2**20 / size:>6.1f}'
+    )
+
+  with tempfile.TemporaryDirectory() as directory:
+    report('gzip pickle', *_benchmark_legacy(episodes, directory))
+  for config in _CONFIGS.value:
+    codec, level = config.split(':')
+    try:
+      compression.get_codec(codec)
+    except ValueError as e:
+      print(f'{config:>14} skipped: {e}')
+      continue
+    with tempfile.TemporaryDirectory() as directory:
+      report(
+          config, *_benchmark_codec(episodes, directory, codec, int(level))
+      )
+
+
+if __name__ == '__main__':
+  app.run(main)
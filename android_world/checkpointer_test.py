@@ -12,10 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import concurrent.futures
+import json
 import os
+import pickle
 import tempfile
+from unittest import mock
+import zlib
 from absl.testing import absltest
 from android_world import checkpointer
+from android_world.utils import blob_store
+from android_world.utils import compression
+import numpy as np
 
 
 class CheckpointerTest(absltest.TestCase):
@@ -77,6 +85,196 @@ class CheckpointerTest(absltest.TestCase):
     loaded_data = self.checkpointer.load()
     self.assertEqual([], loaded_data)
 
+  def test_concurrent_saves(self) -> None:
+    """Tests that concurrent writers leave complete files and no temp files."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+      for i in range(32):
+        pool.submit(
+            self.checkpointer.save_episodes,
+            [{'key': i}] * (i % 4 + 1),
+            f'task_group{i % 4}',
+        )
+    loaded_data = self.checkpointer.load()
+    self.assertLen(loaded_data, 1 + 2 + 3 + 4)
+    self.assertCountEqual(
+        os.listdir(self.temp_dir.name),
+        [f'task_group{i}.episodes' for i in range(4)]
+        + [f'task_group{i}.index.json' for i in range(4)],
+    )
+
+  def test_append_episodes(self) -> None:
+    """Tests that appended episodes follow the saved ones."""
+    self.checkpointer.save_episodes([{'key': 0}], 'task_group')
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+      for i in range(1, 9):
+        pool.submit(self.checkpointer.append_episode, {'key': i}, 'task_group')
+    self.checkpointer.append_episode({'key': 0}, 'other_group')
+
+    reloaded = checkpointer.IncrementalCheckpointer(self.temp_dir.name)
+    loaded_data = reloaded.load()
+    self.assertCountEqual(
+        [episode['key'] for episode in loaded_data], list(range(9)) + [0]
+    )
+    self.assertEqual(loaded_data[0], {'key': 0})
+
+  def test_interrupted_append(self) -> None:
+    """Tests that a torn append is ignored and overwritten."""
+    self.checkpointer.append_episode({'key': 1}, 'task_group')
+    path = os.path.join(self.temp_dir.name, 'task_group.episodes')
+    with open(path, 'ab') as f:
+      f.write(b'\x10\x00\x00\x00torn')
+    self.assertEqual(self.checkpointer.load(), [{'key': 1}])
+
+    # Without an index, intact frames are recovered by scanning.
+    os.remove(os.path.join(self.temp_dir.name, 'task_group.index.json'))
+    reloaded = checkpointer.IncrementalCheckpointer(self.temp_dir.name)
+    self.assertEqual(reloaded.load(), [{'key': 1}])
+    reloaded.append_episode({'key': 2}, 'task_group')
+    self.assertEqual(
+        checkpointer.IncrementalCheckpointer(self.temp_dir.name).load(),
+        [{'key': 1}, {'key': 2}],
+    )
+
+  def test_streams_episodes(self) -> None:
+    """Tests that episodes are read one at a time."""
+    self.checkpointer.save_episodes([{'key': 1}, {'key': 2}], 'task_group')
+    episodes = checkpointer.read_episodes(
+        os.path.join(self.temp_dir.name, 'task_group.episodes')
+    )
+    self.assertEqual(next(episodes), {'key': 1})
+    self.assertEqual(list(episodes), [{'key': 2}])
+
+  def test_reads_and_migrates_previous_format(self) -> None:
+    """Tests that .pkl.gz task files are read and converted."""
+    with open(os.path.join(self.temp_dir.name, 'old.pkl.gz'), 'wb') as f:
+      f.write(checkpointer._gzip_pickle([{'key': 1}]))
+    with open(os.path.join(self.temp_dir.name, 'older.pkl.gz'), 'wb') as f:
+      f.write(checkpointer._gzip_pickle([{'key': 2}]))
+    self.assertCountEqual(self.checkpointer.load(), [{'key': 1}, {'key': 2}])
+
+    self.checkpointer.append_episode({'key': 3}, 'old')
+    self.assertEqual(self.checkpointer.migrate(), 1)
+
+    self.assertCountEqual(
+        self.checkpointer.load(), [{'key': 1}, {'key': 2}, {'key': 3}]
+    )
+    self.assertFalse(
+        any(f.endswith('.pkl.gz') for f in os.listdir(self.temp_dir.name))
+    )
+
+  def test_moves_screenshots_to_blob_store(self) -> None:
+    """Tests that large arrays are stored once and loaded back."""
+    screenshot = np.random.default_rng(0).integers(
+        0, 256, (200, 100, 3), dtype=np.uint8
+    )
+    step_data = {'raw_screenshot': [screenshot, screenshot], 'small': [1]}
+    episode = {'goal': 'g', 'episode_data': step_data}
+    self.checkpointer.append_episode(episode, 'task_group')
+
+    self.assertIs(episode['episode_data'], step_data)
+    reloaded = checkpointer.IncrementalCheckpointer(self.temp_dir.name)
+    (loaded,) = reloaded.load()
+    for array in loaded['episode_data']['raw_screenshot']:
+      self.assertIsInstance(array, np.ndarray)
+      np.testing.assert_array_equal(array, screenshot)
+    (loaded,) = reloaded.load(lazy_blobs=True)
+    first, second = loaded['episode_data']['raw_screenshot']
+    self.assertIsInstance(first, blob_store.BlobRef)
+    self.assertEqual(first, second)
+    np.testing.assert_array_equal(np.asarray(first), screenshot)
+    self.assertEqual(loaded['episode_data']['small'], [1])
+    blobs_dir = os.path.join(self.temp_dir.name, 'blobs')
+    self.assertLen([f for _, _, fs in os.walk(blobs_dir) for f in fs], 1)
+
+  def test_loads_metadata_without_reading_episodes(self) -> None:
+    """Tests that the scalar fields of episodes are read from the index."""
+    self.checkpointer.save_episodes(
+        [{'key': 1, 'is_successful': np.float64(1.0), 'data': [1]}], 'task1'
+    )
+    self.checkpointer.append_episode({'key': 2, 'error': None}, 'task2')
+
+    reloaded = checkpointer.IncrementalCheckpointer(self.temp_dir.name)
+    with mock.patch.object(checkpointer, '_decode_episode') as decode:
+      metadata = reloaded.load_metadata()
+
+    decode.assert_not_called()
+    self.assertEqual(
+        metadata,
+        [{'key': 1, 'is_successful': 1.0}, {'key': 2, 'error': None}],
+    )
+
+  def test_upgrades_index_without_metadata(self) -> None:
+    """Tests that indexes listing only the frames get the metadata added."""
+    self.checkpointer.save_episodes([{'key': 1}, {'key': 2}], 'task_group')
+    index_path = os.path.join(self.temp_dir.name, 'task_group.index.json')
+    with open(index_path) as f:
+      index = json.load(f)
+    with open(index_path, 'w') as f:
+      json.dump({'version': 1, 'records': index['records']}, f)
+
+    reloaded = checkpointer.IncrementalCheckpointer(self.temp_dir.name)
+    self.assertEqual(reloaded.load_metadata(), [{'key': 1}, {'key': 2}])
+
+    with open(index_path) as f:
+      self.assertEqual(json.load(f)['metadata'], [{'key': 1}, {'key': 2}])
+
+  def test_drop_episodes(self) -> None:
+    """Tests that matching episodes are removed and the others kept."""
+    for key in range(3):
+      self.checkpointer.append_episode({'key': key, 'data': [key]}, 'task')
+
+    dropped = self.checkpointer.drop_episodes('task', lambda m: m['key'] == 1)
+
+    self.assertEqual(dropped, 1)
+    reloaded = checkpointer.IncrementalCheckpointer(self.temp_dir.name)
+    self.assertEqual(
+        reloaded.load(), [{'key': 0, 'data': [0]}, {'key': 2, 'data': [2]}]
+    )
+    self.assertEqual(reloaded.load_metadata(), [{'key': 0}, {'key': 2}])
+    reloaded.append_episode({'key': 3}, 'task')
+    self.assertLen(reloaded.load(), 3)
+
+  def test_converts_zlib_episodes_files(self) -> None:
+    """Tests that episodes files of zlib pickles are read and converted."""
+    payload = zlib.compress(pickle.dumps({'key': 1}))
+    with open(os.path.join(self.temp_dir.name, 'task.episodes'), 'wb') as f:
+      f.write(checkpointer._ZLIB_EPISODES_MAGIC)
+      header = checkpointer._FRAME_HEADER.pack(
+          len(payload), zlib.crc32(payload)
+      )
+      f.write(header + payload)
+    self.assertEqual(self.checkpointer.load(), [{'key': 1}])
+
+    self.checkpointer.append_episode({'key': 2}, 'task')
+
+    with open(os.path.join(self.temp_dir.name, 'task.episodes'), 'rb') as f:
+      self.assertEqual(
+          f.read(len(checkpointer._EPISODES_MAGIC)),
+          checkpointer._EPISODES_MAGIC,
+      )
+    self.assertEqual(
+        checkpointer.IncrementalCheckpointer(self.temp_dir.name).load(),
+        [{'key': 1}, {'key': 2}],
+    )
+
+  def test_codecs(self) -> None:
+    """Tests that episodes written with any codec are read."""
+    for codec in compression.CODEC_NAMES:
+      try:
+        writer = checkpointer.IncrementalCheckpointer(
+            self.temp_dir.name, codec=codec, compression_level=1
+        )
+      except ValueError:
+        continue  # Not installed.
+      writer.append_episode({'codec': codec, 'data': np.ones(8)}, 'task')
+
+    loaded = checkpointer.IncrementalCheckpointer(self.temp_dir.name).load()
+    self.assertNotEmpty(loaded)
+    for episode in loaded:
+      np.testing.assert_array_equal(episode['data'], np.ones(8))
+    with self.assertRaises(ValueError):
+      checkpointer.IncrementalCheckpointer(self.temp_dir.name, codec='brotli')
+
 
 if __name__ == '__main__':
   absltest.main()
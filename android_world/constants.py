@@ -32,6 +32,8 @@ class EpisodeConstants:
     EPISODE_LENGTH: The length of the episode.
     FINISH_DTIME: The datetime the task finished.
     SEED: The random seed to initialize the current episode's task.
+    INSTANCE_ID: Identifies the task instance and agent of an episode across
+      runs; see `suite_utils.instance_id`.
   """
 
   EPISODE_DATA = 'episode_data'
@@ -46,3 +48,4 @@ class EpisodeConstants:
   EXCEPTION_INFO = 'exception_info'
   FINISH_DTIME = 'finish_dtime'
   SEED = 'seed'
+  INSTANCE_ID = 'instance_id'
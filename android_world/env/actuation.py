@@ -24,6 +24,51 @@ from android_world.env import adb_utils
 from android_world.env import android_world_controller
 from android_world.env import json_action
 from android_world.env import representation_utils
+from android_world.env import ui_stability
+
+# Longest wait for the UI to react before continuing an action, e.g. for a
+# tapped text field to take focus before typing into it.
+_MAX_REACTION_WAIT_SECS = 1.0
+_REACTION_QUIET_WINDOW_SECS = 0.2
+
+
+# Actions whose `index` refers to an element of the current screen.
+_INDEXED_ACTION_TYPES = (
+    json_action.CLICK,
+    json_action.DOUBLE_TAP,
+    json_action.LONG_PRESS,
+    json_action.INPUT_TEXT,
+    json_action.SCROLL,
+)
+
+
+def needs_ui_elements(action: json_action.JSONAction) -> bool:
+  """Returns whether executing `action` reads the UI elements on screen."""
+  return (
+      action.action_type in _INDEXED_ACTION_TYPES and action.index is not None
+  )
+
+
+def _poll_ui_activity(env: env_interface.AndroidEnvInterface) -> float:
+  """Polls UI activity so far; returns the time to wait for activity from."""
+  if isinstance(env, android_world_controller.AndroidWorldController):
+    env.last_a11y_event_time()
+  return time.monotonic()
+
+
+def _wait_for_reaction(
+    env: env_interface.AndroidEnvInterface, since: float
+) -> None:
+  """Waits until the UI reacted to input sent after `since`, within a cap."""
+  if isinstance(env, android_world_controller.AndroidWorldController):
+    ui_stability.wait_for_activity(
+        env.last_a11y_event_time,
+        since,
+        quiet_window_secs=_REACTION_QUIET_WINDOW_SECS,
+        max_wait_secs=_MAX_REACTION_WAIT_SECS,
+    )
+  else:
+    time.sleep(max(0.0, since + _MAX_REACTION_WAIT_SECS - time.monotonic()))
 
 
 def execute_adb_action(
@@ -36,7 +81,8 @@ def execute_adb_action(
 
   Args:
       action: JSONAction object containing the action to be executed.
-      screen_elements: List of UI elements on the screen.
+      screen_elements: List of UI elements on the screen. Only read if
+        `needs_ui_elements(action)`.
       screen_size: The (width, height) of the screen.
       env: The environment to execute the action in.
   """
@@ -77,8 +123,9 @@ def execute_adb_action(
       # First focus on enter text UI element.
       click_action = copy.deepcopy(action)
       click_action.action_type = 'click'
+      since = _poll_ui_activity(env)
       execute_adb_action(click_action, screen_elements, screen_size, env)
-      time.sleep(1.0)
+      _wait_for_reaction(env, since)
       adb_utils.type_text(text, env, timeout_sec=10)
       adb_utils.press_enter_button(env)
     else:
@@ -162,8 +209,9 @@ def execute_adb_action(
 
   elif action.action_type == 'launch_adb_activity':
     if action.activity_nickname == 'app_drawer':
+      since = _poll_ui_activity(env)
       adb_utils.press_home_button(env)
-      time.sleep(1.0)
+      _wait_for_reaction(env, since)
       start_x, start_y = int(screen_size[0] / 2), int(screen_size[1] * 0.9)
       end_x = start_x
       end_y = int(0.3 * screen_size[1])
@@ -0,0 +1,300 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A persistent `adb shell` session that runs many commands.
+
+Every generic ADB request normally spawns a new `adb` client process, which
+costs tens of milliseconds even for a trivial `settings get`. A
+`PersistentShell` keeps one `adb shell` process open and writes commands to
+its stdin. The start and the end of each command's output are marked by a
+unique sentinel line, the latter carrying the command's exit code.
+"""
+
+from collections.abc import Mapping, Sequence
+import dataclasses
+import queue
+import subprocess
+import threading
+import time
+from typing import IO, Optional
+import uuid
+
+from android_env.proto import adb_pb2
+
+# Generic requests that restart adbd or the device, which kills open shells.
+SESSION_RESETTING_COMMANDS = frozenset(
+    ['root', 'unroot', 'reboot', 'remount', 'disable-verity', 'enable-verity']
+)
+
+
+class ShellClosedError(RuntimeError):
+  """Raised when the shell process exited before a command started."""
+
+
+class CommandInterruptedError(RuntimeError):
+  """Raised when the shell failed while a command was running.
+
+  The command may have had effects, so it must not be run again blindly.
+
+  Attributes:
+    timed_out: Whether the command timed out, rather than the shell exiting.
+  """
+
+  def __init__(self, message: str, timed_out: bool):
+    super().__init__(message)
+    self.timed_out = timed_out
+
+
+@dataclasses.dataclass
+class LatencyStats:
+  """Latency of the requests served by one path.
+
+  Attributes:
+    count: Number of requests.
+    total_secs: Total wall time of all requests.
+    max_secs: Slowest request.
+  """
+
+  count: int = 0
+  total_secs: float = 0.0
+  max_secs: float = 0.0
+
+  def add(self, secs: float) -> None:
+    self.count += 1
+    self.total_secs += secs
+    self.max_secs = max(self.max_secs, secs)
+
+  @property
+  def mean_secs(self) -> float:
+    return self.total_secs / self.count if self.count else 0.0
+
+
+@dataclasses.dataclass
+class ShellStats:
+  """Compares shell requests served by the persistent shell and by adb.
+
+  Attributes:
+    persistent: Requests served by the persistent shell.
+    adb: Requests served by spawning an adb client, including fallbacks.
+    fallbacks: Requests the persistent shell could not serve.
+  """
+
+  persistent: LatencyStats = dataclasses.field(default_factory=LatencyStats)
+  adb: LatencyStats = dataclasses.field(default_factory=LatencyStats)
+  fallbacks: int = 0
+
+
+def to_shell_command(request: adb_pb2.AdbRequest) -> Optional[str]:
+  """Returns the shell command equivalent to `request`, if there is one.
+
+  Args:
+    request: An ADB request.
+
+  Returns:
+    The command line that `adb shell` would run for generic `shell` requests
+    and settings get/put requests; None for all other requests.
+  """
+  match request.WhichOneof('command'):
+    case 'generic':
+      args = list(request.generic.args)
+      if len(args) > 1 and args[0] == 'shell':
+        # `adb shell a b` joins its arguments with spaces too.
+        return ' '.join(args[1:])
+    case 'settings':
+      settings = request.settings
+      namespace = adb_pb2.AdbRequest.SettingsRequest.Namespace.Name(
+          settings.name_space
+      ).lower()
+      if namespace == 'unknown':
+        return None
+      match settings.WhichOneof('verb'):
+        case 'get' if settings.get.key:
+          return f'settings get {namespace} {settings.get.key}'
+        case 'put' if settings.put.key and settings.put.value:
+          return (
+              f'settings put {namespace} {settings.put.key}'
+              f' {settings.put.value}'
+          )
+  return None
+
+
+def to_response(
+    request: adb_pb2.AdbRequest, output: bytes, exit_code: int = 0
+) -> adb_pb2.AdbResponse:
+  """Wraps the output of a shell command like the adb call parser would.
+
+  Args:
+    request: The request the command was run for.
+    output: The output of the command.
+    exit_code: The exit code of the command; non-zero codes are reported as
+      an `ADB_ERROR` status, like a failed adb client.
+
+  Returns:
+    The response to `request`.
+  """
+  response = adb_pb2.AdbResponse(status=adb_pb2.AdbResponse.Status.OK)
+  if exit_code != 0:
+    response.status = adb_pb2.AdbResponse.Status.ADB_ERROR
+    response.error_message = (
+        f'Command exited with code {exit_code}:'
+        f' {output.decode(errors="replace")}'
+    )
+  if request.WhichOneof('command') == 'settings':
+    response.settings.output = output
+  else:
+    response.generic.output = output
+  return response
+
+
+def _pump(stream: IO[bytes], lines: queue.Queue[Optional[bytes]]) -> None:
+  """Moves lines from `stream` to `lines`; None marks the end of the stream."""
+  for line in iter(stream.readline, b''):
+    lines.put(line)
+  stream.close()
+  lines.put(None)
+
+
+class PersistentShell:
+  """Runs commands, one at a time, in a long-lived shell process.
+
+  Each command runs in a subshell with stdin closed and stderr merged into
+  stdout, so it behaves like a separate `adb shell <command>` invocation:
+  `cd`, `exit` and variable assignments do not leak into later commands.
+  """
+
+  def __init__(
+      self,
+      command: Sequence[str],
+      env: Optional[Mapping[str, str]] = None,
+  ):
+    """Initializes the shell; the process is started by the first command.
+
+    Args:
+      command: Command starting an interactive shell that reads commands from
+        stdin, e.g. `['adb', '-s', 'emulator-5554', 'shell']`.
+      env: Environment variables of the shell process.
+    """
+    self._command = list(command)
+    self._env = env
+    self._process: Optional[subprocess.Popen[bytes]] = None
+    self._lines: queue.Queue[Optional[bytes]] = queue.Queue()
+    self._lock = threading.Lock()
+
+  @property
+  def is_alive(self) -> bool:
+    return self._process is not None and self._process.poll() is None
+
+  def _start(self) -> None:
+    self._process = subprocess.Popen(
+        self._command,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        env=self._env,
+    )
+    self._lines = queue.Queue()
+    threading.Thread(
+        target=_pump, args=(self._process.stdout, self._lines), daemon=True
+    ).start()
+
+  def run(
+      self, command: str, timeout_sec: Optional[float] = None
+  ) -> tuple[int, bytes]:
+    """Runs `command` and returns its exit code and combined output.
+
+    Args:
+      command: The shell command line.
+      timeout_sec: Maximum time to wait for the command to finish. On timeout
+        the shell is closed, since its output can no longer be attributed.
+
+    Returns:
+      The exit code and the output of the command.
+
+    Raises:
+      TimeoutError: If the command did not start in time.
+      ShellClosedError: If the shell process exited before the command
+        started.
+      CommandInterruptedError: If the command started but did not finish in
+        time, or the shell process exited while running it.
+    """
+    with self._lock:
+      if not self.is_alive:
+        self._start()
+      sentinel = f'__android_world_{uuid.uuid4().hex}__'.encode()
+      # The sentinel is printed once before the command starts, and after it
+      # with the exit code. The leading newline terminates output that lacks
+      # one, so that the sentinel always starts its own line.
+      script = (
+          f"printf '%s\\n' {sentinel.decode()};"
+          f' ( {command}\n) </dev/null 2>&1;'
+          f" printf '\\n%s %d\\n' {sentinel.decode()} $?\n"
+      )
+      try:
+        self._process.stdin.write(script.encode())
+        self._process.stdin.flush()
+      except OSError as e:
+        self._close()
+        raise ShellClosedError(f'Shell is closed: {e}') from e
+
+      deadline = None if timeout_sec is None else time.monotonic() + timeout_sec
+      output = []
+      started = False
+      while True:
+        remaining = None
+        if deadline is not None:
+          remaining = max(0.0, deadline - time.monotonic())
+        try:
+          line = self._lines.get(timeout=remaining)
+        except queue.Empty as e:
+          self._close()
+          message = (
+              f'Shell command timed out after {timeout_sec} s: {command!r}'
+          )
+          if started:
+            raise CommandInterruptedError(message, timed_out=True) from e
+          raise TimeoutError(message) from e
+        if line is None:
+          self._close()
+          if started:
+            raise CommandInterruptedError(
+                f'Shell exited while running {command!r}.', timed_out=False
+            )
+          raise ShellClosedError(f'Shell exited before running {command!r}.')
+        if not started:
+          # Lines before the start marker, e.g. a login banner, are not output
+          # of the command.
+          started = line.rstrip(b'\n') == sentinel
+          continue
+        if line.startswith(sentinel):
+          exit_code = int(line[len(sentinel) :].strip() or -1)
+          # Drop the newline printed before the sentinel.
+          return exit_code, b''.join(output)[:-1]
+        output.append(line)
+
+  def _close(self) -> None:
+    if self._process is None:
+      return
+    if self._process.poll() is None:
+      self._process.kill()
+    self._process.wait()
+    try:
+      self._process.stdin.close()
+    except OSError:
+      pass  # Flushing a pending command into the dead process failed.
+    self._process = None
+
+  def close(self) -> None:
+    """Closes the shell; the next command starts a new one."""
+    with self._lock:
+      self._close()
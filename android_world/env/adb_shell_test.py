@@ -0,0 +1,119 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from absl.testing import absltest
+from android_env.proto import adb_pb2
+from android_world.env import adb_shell
+
+
+class PersistentShellTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    # A local shell stands in for `adb shell`.
+    self.shell = adb_shell.PersistentShell(['sh'])
+    self.addCleanup(self.shell.close)
+
+  def test_run(self):
+    self.assertEqual(self.shell.run('echo hello'), (0, b'hello\n'))
+    self.assertEqual(self.shell.run('printf partial'), (0, b'partial'))
+    self.assertEqual(self.shell.run('echo error >&2; false'), (1, b'error\n'))
+
+  def test_commands_are_isolated(self):
+    self.assertEqual(self.shell.run('cd /; x=1; exit 3'), (3, b''))
+    self.assertEqual(self.shell.run('echo "$x"'), (0, b'\n'))
+    # Commands cannot consume the sentinel from stdin.
+    self.assertEqual(self.shell.run('cat'), (0, b''))
+    self.assertTrue(self.shell.is_alive)
+
+  def test_timeout_restarts_shell(self):
+    with self.assertRaises(adb_shell.CommandInterruptedError) as cm:
+      self.shell.run('sleep 5', timeout_sec=0.5)
+    self.assertTrue(cm.exception.timed_out)
+    self.assertFalse(self.shell.is_alive)
+
+    self.assertEqual(self.shell.run('echo ok'), (0, b'ok\n'))
+
+  def test_shell_exit(self):
+    shell = adb_shell.PersistentShell(['sh', '-c', 'exit 0'])
+
+    with self.assertRaises(adb_shell.ShellClosedError):
+      shell.run('echo ok', timeout_sec=5)
+
+
+class ToShellCommandTest(absltest.TestCase):
+
+  def test_generic_shell(self):
+    request = adb_pb2.AdbRequest(
+        generic=adb_pb2.AdbRequest.GenericRequest(
+            args=['shell', 'dumpsys', 'window']
+        )
+    )
+
+    self.assertEqual(adb_shell.to_shell_command(request), 'dumpsys window')
+
+  def test_settings(self):
+    settings = adb_pb2.AdbRequest.SettingsRequest
+    get = adb_pb2.AdbRequest(
+        settings=settings(
+            name_space=settings.Namespace.GLOBAL,
+            get=settings.Get(key='airplane_mode_on'),
+        )
+    )
+    put = adb_pb2.AdbRequest(
+        settings=settings(
+            name_space=settings.Namespace.SYSTEM,
+            put=settings.Put(key='screen_brightness', value='10'),
+        )
+    )
+
+    self.assertEqual(
+        adb_shell.to_shell_command(get), 'settings get global airplane_mode_on'
+    )
+    self.assertEqual(
+        adb_shell.to_shell_command(put),
+        'settings put system screen_brightness 10',
+    )
+    self.assertEqual(
+        adb_shell.to_response(get, b'1\n').settings.output, b'1\n'
+    )
+
+  def test_error_response(self):
+    request = adb_pb2.AdbRequest(
+        generic=adb_pb2.AdbRequest.GenericRequest(args=['shell', 'false'])
+    )
+
+    response = adb_shell.to_response(request, b'failed\n', exit_code=1)
+
+    self.assertEqual(response.status, adb_pb2.AdbResponse.Status.ADB_ERROR)
+    self.assertIn('failed', response.error_message)
+    self.assertEqual(response.generic.output, b'failed\n')
+
+  def test_unsupported(self):
+    for request in (
+        adb_pb2.AdbRequest(
+            generic=adb_pb2.AdbRequest.GenericRequest(args=['root'])
+        ),
+        adb_pb2.AdbRequest(
+            generic=adb_pb2.AdbRequest.GenericRequest(args=['shell'])
+        ),
+        adb_pb2.AdbRequest(
+            tap=adb_pb2.AdbRequest.Tap(x=1, y=2),
+        ),
+    ):
+      self.assertIsNone(adb_shell.to_shell_command(request))
+
+
+if __name__ == '__main__':
+  absltest.main()
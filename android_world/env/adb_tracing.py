@@ -0,0 +1,480 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-command latency instrumentation for ADB calls.
+
+Every ADB request issued through `AndroidWorldController.execute_adb_call` or
+`adb_utils.issue_generic_request` is classified (tap, swipe, dumpsys, ...),
+timed and attributed to the task and episode step that were current when it
+was issued:
+
+```
+with adb_tracing.task_context(task.name):
+  task.initialize_task(env)
+  for step in range(max_n_steps):
+    with adb_tracing.step_context(step):
+      agent.step(goal)
+
+adb_tracing.get_tracer().write_summary('/tmp/run/adb_profile.json')
+```
+
+Contexts are stored in context variables, so each thread of a parallel run
+attributes its own requests.
+"""
+
+from collections.abc import Callable, Iterator
+import contextlib
+import contextvars
+import copy
+import dataclasses
+import heapq
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Optional
+
+from android_env.proto import adb_pb2
+
+# Command classes.
+TAP = 'tap'
+SWIPE = 'swipe'
+TEXT = 'text'
+KEYEVENT = 'keyevent'
+DUMPSYS = 'dumpsys'
+CONTENT_QUERY = 'content_query'
+FILE_TRANSFER = 'file_transfer'
+BROADCAST = 'broadcast'
+ACTIVITY = 'activity'
+SETTINGS = 'settings'
+BATCH = 'batch'
+SHELL = 'shell'
+OTHER = 'other'
+
+# Upper bounds of the latency histogram buckets, in seconds.
+BUCKET_BOUNDS_SECS = (
+    0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0,
+    math.inf,
+)  # pyformat: disable
+
+_REQUEST_CLASSES = {
+    'tap': TAP,
+    'input_text': TEXT,
+    'press_button': KEYEVENT,
+    'dumpsys': DUMPSYS,
+    'push': FILE_TRANSFER,
+    'pull': FILE_TRANSFER,
+    'send_broadcast': BROADCAST,
+    'start_activity': ACTIVITY,
+    'force_stop': ACTIVITY,
+    'get_current_activity': ACTIVITY,
+    'settings': SETTINGS,
+}
+
+_INPUT_CLASSES = {
+    'tap': TAP,
+    'swipe': SWIPE,
+    'draganddrop': SWIPE,
+    'text': TEXT,
+    'keyevent': KEYEVENT,
+}
+
+_AM_CLASSES = {
+    'broadcast': BROADCAST,
+    'start': ACTIVITY,
+    'force-stop': ACTIVITY,
+}
+
+
+def classify(request: adb_pb2.AdbRequest) -> str:
+  """Returns the command class of `request`, e.g. `TAP` or `DUMPSYS`."""
+  kind = request.WhichOneof('command')
+  if kind != 'generic':
+    return _REQUEST_CLASSES.get(kind, OTHER)
+  args = list(request.generic.args)
+  if not args:
+    return OTHER
+  if args[0] in ('push', 'pull'):
+    return FILE_TRANSFER
+  if args[0] != 'shell':
+    return OTHER
+  # Arguments may be split or passed as one command line.
+  tokens = ' '.join(args[1:]).split()
+  if not tokens:
+    return SHELL
+  match tokens[0]:
+    case '(':
+      # Scripts written by `adb_utils.issue_generic_requests`.
+      return BATCH
+    case 'input':
+      return _INPUT_CLASSES.get(tokens[1] if len(tokens) > 1 else '', SHELL)
+    case 'dumpsys':
+      return DUMPSYS
+    case 'content':
+      return CONTENT_QUERY
+    case 'am':
+      return _AM_CLASSES.get(tokens[1] if len(tokens) > 1 else '', SHELL)
+    case 'settings':
+      return SETTINGS
+  return SHELL
+
+
+def describe(request: adb_pb2.AdbRequest, max_chars: int = 120) -> str:
+  """Returns a short, human-readable description of `request`."""
+  if request.WhichOneof('command') == 'generic':
+    text = ' '.join(request.generic.args)
+  else:
+    text = ' '.join(str(request).split())
+  return text if len(text) <= max_chars else text[: max_chars - 3] + '...'
+
+
+@dataclasses.dataclass(frozen=True)
+class TraceContext:
+  """What the device was doing when a request was issued.
+
+  Attributes:
+    task: Name of the task template being run, if any.
+    step: Episode step of the agent, if any. None during task setup,
+      evaluation and teardown.
+  """
+
+  task: Optional[str] = None
+  step: Optional[int] = None
+
+
+_CONTEXT: contextvars.ContextVar[TraceContext] = contextvars.ContextVar(
+    'adb_trace_context', default=TraceContext()
+)
+
+
+class _CallState:
+  """Tracks whether a call nested in a traced call was recorded."""
+
+  def __init__(self):
+    self.recorded = False
+
+
+# Set while a traced call runs, so nested calls are not counted twice.
+_CALL_STATE: contextvars.ContextVar[Optional[_CallState]] = (
+    contextvars.ContextVar('adb_trace_call_state', default=None)
+)
+
+
+def current_context() -> TraceContext:
+  return _CONTEXT.get()
+
+
+@contextlib.contextmanager
+def task_context(task: Optional[str]) -> Iterator[None]:
+  """Attributes requests issued in the context to `task`."""
+  token = _CONTEXT.set(TraceContext(task=task))
+  try:
+    yield
+  finally:
+    _CONTEXT.reset(token)
+
+
+@contextlib.contextmanager
+def step_context(step: Optional[int]) -> Iterator[None]:
+  """Attributes requests issued in the context to episode step `step`."""
+  token = _CONTEXT.set(dataclasses.replace(_CONTEXT.get(), step=step))
+  try:
+    yield
+  finally:
+    _CONTEXT.reset(token)
+
+
+@dataclasses.dataclass
+class LatencyHistogram:
+  """Latency distribution of one command class.
+
+  Attributes:
+    counts: Number of requests per bucket; see `BUCKET_BOUNDS_SECS`.
+    count: Number of requests.
+    total_secs: Total wall time of all requests.
+    max_secs: Slowest request.
+    timeouts: Number of requests that timed out.
+    errors: Number of requests that failed for other reasons.
+  """
+
+  counts: list[int] = dataclasses.field(
+      default_factory=lambda: [0] * len(BUCKET_BOUNDS_SECS)
+  )
+  count: int = 0
+  total_secs: float = 0.0
+  max_secs: float = 0.0
+  timeouts: int = 0
+  errors: int = 0
+
+  def add(self, secs: float) -> None:
+    self.count += 1
+    self.total_secs += secs
+    self.max_secs = max(self.max_secs, secs)
+    for i, bound in enumerate(BUCKET_BOUNDS_SECS):
+      if secs <= bound:
+        self.counts[i] += 1
+        break
+
+  @property
+  def mean_secs(self) -> float:
+    return self.total_secs / self.count if self.count else 0.0
+
+  def percentile(self, q: float) -> float:
+    """Returns an upper bound of the `q`th percentile, 0 <= q <= 100."""
+    if not self.count:
+      return 0.0
+    rank = q / 100 * self.count
+    cumulative = 0
+    for bound, n in zip(BUCKET_BOUNDS_SECS, self.counts):
+      cumulative += n
+      if cumulative >= rank and n:
+        return min(bound, self.max_secs)
+    return self.max_secs
+
+
+@dataclasses.dataclass(frozen=True)
+class Sample:
+  """One timed ADB request.
+
+  Attributes:
+    command_class: See `classify`.
+    command: See `describe`.
+    latency_secs: Wall time of the request.
+    status: Name of the response status, or the exception type if it raised.
+    task: See `TraceContext`.
+    step: See `TraceContext`.
+  """
+
+  command_class: str
+  command: str
+  latency_secs: float
+  status: str
+  task: Optional[str]
+  step: Optional[int]
+
+
+@dataclasses.dataclass
+class TaskStats:
+  """ADB time spent on one task template.
+
+  Attributes:
+    count: Number of requests.
+    total_secs: Total ADB time.
+    step_secs: ADB time during agent steps; the rest is spent setting up,
+      evaluating and tearing down the task.
+    timeouts: Number of requests that timed out.
+    secs_by_class: ADB time per command class.
+  """
+
+  count: int = 0
+  total_secs: float = 0.0
+  step_secs: float = 0.0
+  timeouts: int = 0
+  secs_by_class: dict[str, float] = dataclasses.field(default_factory=dict)
+
+
+class AdbTracer:
+  """Aggregates timed ADB requests. All methods are thread-safe."""
+
+  def __init__(self, num_slowest: int = 20):
+    """Initializes the tracer.
+
+    Args:
+      num_slowest: Number of slowest requests to keep.
+    """
+    self._num_slowest = num_slowest
+    self._lock = threading.Lock()
+    self.reset()
+
+  def reset(self) -> None:
+    """Drops everything recorded so far."""
+    with self._lock:
+      self._histograms: dict[str, LatencyHistogram] = {}
+      self._tasks: dict[str, TaskStats] = {}
+      self._retries: dict[str, int] = {}
+      # Min-heap of (latency, tiebreaker, sample).
+      self._slowest: list[tuple[float, int, Sample]] = []
+      self._counter = itertools.count()
+
+  def record(
+      self,
+      request: adb_pb2.AdbRequest,
+      latency_secs: float,
+      status: str,
+  ) -> None:
+    """Records one request.
+
+    Args:
+      request: The request.
+      latency_secs: Wall time of the request.
+      status: Name of the response status, e.g. 'OK' or 'TIMEOUT', or the
+        exception type if the request raised.
+    """
+    context = _CONTEXT.get()
+    command_class = classify(request)
+    timed_out = status in ('TIMEOUT', 'TimeoutError')
+    with self._lock:
+      histogram = self._histograms.setdefault(
+          command_class, LatencyHistogram()
+      )
+      histogram.add(latency_secs)
+      histogram.timeouts += timed_out
+      histogram.errors += status != 'OK' and not timed_out
+
+      task = self._tasks.setdefault(context.task or '', TaskStats())
+      task.count += 1
+      task.total_secs += latency_secs
+      if context.step is not None:
+        task.step_secs += latency_secs
+      task.timeouts += timed_out
+      task.secs_by_class[command_class] = (
+          task.secs_by_class.get(command_class, 0.0) + latency_secs
+      )
+
+      if (
+          len(self._slowest) < self._num_slowest
+          or latency_secs > self._slowest[0][0]
+      ):
+        sample = Sample(
+            command_class=command_class,
+            command=describe(request),
+            latency_secs=latency_secs,
+            status=status,
+            task=context.task,
+            step=context.step,
+        )
+        item = (latency_secs, next(self._counter), sample)
+        if len(self._slowest) < self._num_slowest:
+          heapq.heappush(self._slowest, item)
+        else:
+          heapq.heapreplace(self._slowest, item)
+
+  def record_retry(self, label: str) -> None:
+    """Counts a retried request; `label` is e.g. a command class."""
+    with self._lock:
+      self._retries[label] = self._retries.get(label, 0) + 1
+
+  def histograms(self) -> dict[str, LatencyHistogram]:
+    """Returns a snapshot of the latency histograms, by command class."""
+    with self._lock:
+      return copy.deepcopy(self._histograms)
+
+  def task_stats(self) -> dict[str, TaskStats]:
+    """Returns a snapshot of ADB time per task; '' is outside any task."""
+    with self._lock:
+      return copy.deepcopy(self._tasks)
+
+  def retries(self) -> dict[str, int]:
+    with self._lock:
+      return dict(self._retries)
+
+  def slowest(self) -> list[Sample]:
+    """Returns the slowest requests recorded, slowest first."""
+    with self._lock:
+      return [sample for _, _, sample in sorted(self._slowest, reverse=True)]
+
+  def summary(self) -> dict[str, Any]:
+    """Returns a JSON-serializable summary of everything recorded."""
+    histograms = self.histograms()
+    tasks = self.task_stats()
+    return {
+        'total_secs': sum(h.total_secs for h in histograms.values()),
+        'num_requests': sum(h.count for h in histograms.values()),
+        'timeouts': sum(h.timeouts for h in histograms.values()),
+        'retries': self.retries(),
+        'bucket_bounds_secs': [
+            b if b != math.inf else None for b in BUCKET_BOUNDS_SECS
+        ],
+        'by_class': {
+            name: dataclasses.asdict(h)
+            | {
+                'mean_secs': h.mean_secs,
+                'p50_secs': h.percentile(50),
+                'p95_secs': h.percentile(95),
+            }
+            for name, h in sorted(
+                histograms.items(), key=lambda kv: -kv[1].total_secs
+            )
+        },
+        'by_task': {
+            name: dataclasses.asdict(stats)
+            for name, stats in sorted(
+                tasks.items(), key=lambda kv: -kv[1].total_secs
+            )
+        },
+        'slowest': [dataclasses.asdict(s) for s in self.slowest()],
+    }
+
+  def write_summary(self, path: str) -> None:
+    """Writes `summary()` to `path` as JSON, replacing it atomically."""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+      json.dump(self.summary(), f, indent=2)
+    os.replace(tmp_path, path)
+
+
+_DEFAULT_TRACER = AdbTracer()
+
+
+def get_tracer() -> AdbTracer:
+  """Returns the process-wide tracer used by the controller and adb_utils."""
+  return _DEFAULT_TRACER
+
+
+def traced_call(
+    execute: Callable[[adb_pb2.AdbRequest], adb_pb2.AdbResponse],
+    request: adb_pb2.AdbRequest,
+    tracer: Optional[AdbTracer] = None,
+) -> adb_pb2.AdbResponse:
+  """Runs `execute(request)` and records it on `tracer`.
+
+  Calls nested in another traced call, e.g. `issue_generic_request` calling
+  the controller, are only recorded once, by the innermost call, which is the
+  one that knows how the request was served.
+
+  Args:
+    execute: Issues the request, e.g. `env.execute_adb_call`.
+    request: The request.
+    tracer: Where to record; defaults to `get_tracer()`.
+
+  Returns:
+    The response of `execute`.
+  """
+  tracer = tracer or get_tracer()
+  outer = _CALL_STATE.get()
+  if outer is not None:
+    outer.recorded = True
+  state = _CallState()
+  token = _CALL_STATE.set(state)
+  start = time.monotonic()
+  try:
+    response = execute(request)
+  except Exception as e:
+    if not state.recorded:
+      tracer.record(request, time.monotonic() - start, type(e).__name__)
+    raise
+  finally:
+    _CALL_STATE.reset(token)
+  if not state.recorded:
+    tracer.record(request, time.monotonic() - start, _status_name(response))
+  return response
+
+
+def _status_name(response: adb_pb2.AdbResponse) -> str:
+  try:
+    return adb_pb2.AdbResponse.Status.Name(response.status)
+  except (TypeError, ValueError):
+    return 'UNKNOWN'
@@ -0,0 +1,210 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from absl.testing import absltest
+from absl.testing import parameterized
+from android_env.proto import adb_pb2
+from android_world.env import adb_tracing
+
+
+def _generic(*args: str) -> adb_pb2.AdbRequest:
+  return adb_pb2.AdbRequest(
+      generic=adb_pb2.AdbRequest.GenericRequest(args=list(args))
+  )
+
+
+def _response(status=adb_pb2.AdbResponse.Status.OK) -> adb_pb2.AdbResponse:
+  return adb_pb2.AdbResponse(status=status)
+
+
+class ClassifyTest(parameterized.TestCase):
+
+  @parameterized.named_parameters(
+      ('tap', _generic('shell', 'input', 'tap', '1', '2'), adb_tracing.TAP),
+      ('tap_one_arg', _generic('shell', 'input tap 1 2'), adb_tracing.TAP),
+      ('swipe', _generic('shell', 'input swipe 1 2 3 4'), adb_tracing.SWIPE),
+      ('text', _generic('shell', 'input', 'text', 'hi'), adb_tracing.TEXT),
+      ('dumpsys', _generic('shell', 'dumpsys window'), adb_tracing.DUMPSYS),
+      (
+          'content_query',
+          _generic('shell', 'content', 'query', '--uri', 'content://sms'),
+          adb_tracing.CONTENT_QUERY,
+      ),
+      ('pull', _generic('pull', '/sdcard/a', '/tmp/a'), adb_tracing.FILE_TRANSFER),
+      (
+          'broadcast',
+          _generic('shell', 'am', 'broadcast', '-a', 'clipper.get'),
+          adb_tracing.BROADCAST,
+      ),
+      ('batch', _generic('shell', '( ls\n) </dev/null'), adb_tracing.BATCH),
+      ('shell', _generic('shell', 'ls', '/sdcard'), adb_tracing.SHELL),
+      ('root', _generic('root'), adb_tracing.OTHER),
+      (
+          'typed_tap',
+          adb_pb2.AdbRequest(tap=adb_pb2.AdbRequest.Tap(x=1, y=2)),
+          adb_tracing.TAP,
+      ),
+      (
+          'typed_push',
+          adb_pb2.AdbRequest(push=adb_pb2.AdbRequest.Push(path='/sdcard/a')),
+          adb_tracing.FILE_TRANSFER,
+      ),
+  )
+  def test_classify(self, request, expected):
+    self.assertEqual(adb_tracing.classify(request), expected)
+
+
+class LatencyHistogramTest(absltest.TestCase):
+
+  def test_add_and_percentile(self):
+    histogram = adb_tracing.LatencyHistogram()
+    for secs in [0.003] * 9 + [0.4]:
+      histogram.add(secs)
+
+    self.assertEqual(histogram.count, 10)
+    self.assertAlmostEqual(histogram.mean_secs, 0.0427)
+    self.assertEqual(histogram.max_secs, 0.4)
+    self.assertEqual(histogram.percentile(50), 0.005)
+    self.assertEqual(histogram.percentile(100), 0.4)
+
+
+class AdbTracerTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.now = 0.0
+    self.enter_context(
+        mock.patch('time.monotonic', side_effect=lambda: self.now)
+    )
+    self.tracer = adb_tracing.AdbTracer(num_slowest=2)
+
+  def _execute(self, secs, response=None):
+    def execute(request):
+      del request
+      self.now += secs
+      return response or _response()
+
+    return execute
+
+  def test_attributes_requests_to_task_and_step(self):
+    tap = _generic('shell', 'input', 'tap', '1', '2')
+    dumpsys = _generic('shell', 'dumpsys', 'window')
+
+    with adb_tracing.task_context('Task'):
+      adb_tracing.traced_call(self._execute(0.5), dumpsys, self.tracer)
+      with adb_tracing.step_context(3):
+        adb_tracing.traced_call(self._execute(0.125), tap, self.tracer)
+    adb_tracing.traced_call(self._execute(0.25), tap, self.tracer)
+
+    tasks = self.tracer.task_stats()
+    self.assertEqual(tasks['Task'].total_secs, 0.625)
+    self.assertEqual(tasks['Task'].step_secs, 0.125)
+    self.assertEqual(
+        tasks['Task'].secs_by_class,
+        {adb_tracing.DUMPSYS: 0.5, adb_tracing.TAP: 0.125},
+    )
+    self.assertEqual(tasks[''].total_secs, 0.25)
+    slowest = self.tracer.slowest()
+    self.assertEqual(
+        [(s.command_class, s.task, s.step) for s in slowest],
+        [(adb_tracing.DUMPSYS, 'Task', None), (adb_tracing.TAP, None, None)],
+    )
+    self.assertEqual(slowest[0].command, 'shell dumpsys window')
+
+  def test_nested_calls_are_recorded_once_by_the_innermost(self):
+    request = _generic('shell', 'ls')
+    inner_tracer = adb_tracing.AdbTracer()
+
+    adb_tracing.traced_call(
+        lambda r: adb_tracing.traced_call(
+            self._execute(0.1), r, inner_tracer
+        ),
+        request,
+        self.tracer,
+    )
+
+    self.assertEqual(inner_tracer.histograms()[adb_tracing.SHELL].count, 1)
+    self.assertEmpty(self.tracer.histograms())
+
+  def test_timeouts_errors_and_retries(self):
+    request = _generic('shell', 'ls')
+
+    adb_tracing.traced_call(
+        self._execute(1.0, _response(adb_pb2.AdbResponse.Status.TIMEOUT)),
+        request,
+        self.tracer,
+    )
+    adb_tracing.traced_call(
+        self._execute(0.1, _response(adb_pb2.AdbResponse.Status.ADB_ERROR)),
+        request,
+        self.tracer,
+    )
+    with self.assertRaises(TimeoutError):
+      adb_tracing.traced_call(
+          mock.Mock(side_effect=TimeoutError()), request, self.tracer
+      )
+    self.tracer.record_retry(adb_tracing.SHELL)
+
+    histogram = self.tracer.histograms()[adb_tracing.SHELL]
+    self.assertEqual(histogram.count, 3)
+    self.assertEqual(histogram.timeouts, 2)
+    self.assertEqual(histogram.errors, 1)
+    self.assertEqual(self.tracer.retries(), {adb_tracing.SHELL: 1})
+
+  def test_contexts_are_per_thread(self):
+    request = _generic('shell', 'ls')
+
+    def run(task):
+      with adb_tracing.task_context(task):
+        for _ in range(10):
+          adb_tracing.traced_call(self._execute(0.0), request, self.tracer)
+
+    threads = [
+        threading.Thread(target=run, args=(f'Task{i}',)) for i in range(4)
+    ]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    tasks = self.tracer.task_stats()
+    self.assertCountEqual(tasks, [f'Task{i}' for i in range(4)])
+    self.assertTrue(all(stats.count == 10 for stats in tasks.values()))
+
+  def test_write_summary(self):
+    with adb_tracing.task_context('Task'):
+      adb_tracing.traced_call(
+          self._execute(0.2), _generic('shell', 'ls'), self.tracer
+      )
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, 'profile.json')
+      self.tracer.write_summary(path)
+      with open(path) as f:
+        summary = json.load(f)
+
+    self.assertEqual(summary['num_requests'], 1)
+    self.assertAlmostEqual(summary['by_task']['Task']['total_secs'], 0.2)
+    self.assertEqual(summary['by_class'][adb_tracing.SHELL]['count'], 1)
+    self.assertLen(summary['slowest'], 1)
+    self.assertIsNone(summary['bucket_bounds_secs'][-1])
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -14,21 +14,39 @@
 
 """Utilties to interact with the environment using adb."""
 
+import dataclasses
 import os
 import re
+import shlex
 import time
-from typing import Any, Callable, Collection, Iterable, Literal, Optional, TypeVar
+from typing import Any
+from typing import Callable
+from typing import Collection
+from typing import Iterable
+from typing import Literal
+from typing import Optional
+from typing import Sequence
+from typing import TypeVar
 import unicodedata
+import uuid
 from absl import logging
 from android_env import env_interface
 from android_env.components import errors
 from android_env.proto import adb_pb2
+from android_world.env import adb_tracing
 import immutabledict
 
 T = TypeVar('T')
 
 _DEFAULT_TIMEOUT_SECS = 10
 
+# `input text` turns "%s" into a space, so words containing "%" cannot be typed
+# in bulk; they are typed one request at a time instead.
+_BULK_UNSAFE_CHARS = frozenset('%')
+# Longer strings can be typed out of order at the character level, so bulk text
+# is split into `input text` commands of at most this many characters.
+_MAX_BULK_CHUNK_CHARS = 32
+
 # Maps app names to the activity that should be launched to open the app.
 _PATTERN_TO_ACTIVITY = immutabledict.immutabledict({
     'google chrome|chrome': (
@@ -391,6 +409,12 @@ def press_enter_button(
   return response
 
 
+def _to_ascii(text: str) -> str:
+  """Drops characters that `input text` cannot type, after normalizing."""
+  normalized_text = unicodedata.normalize('NFKD', text)
+  return normalized_text.encode('ascii', 'ignore').decode('ascii')
+
+
 def _adb_text_format(text: str) -> str:
   """Prepares text for use with adb."""
   to_escape = [
@@ -411,8 +435,7 @@ def _adb_text_format(text: str) -> str:
   ]
   for char in to_escape:
     text = text.replace(char, '\\' + char)
-  normalized_text = unicodedata.normalize('NFKD', text)
-  return normalized_text.encode('ascii', 'ignore').decode('ascii')
+  return _to_ascii(text)
 
 
 def _split_words_and_newlines(text: str) -> Iterable[str]:
@@ -428,25 +451,12 @@ def _split_words_and_newlines(text: str) -> Iterable[str]:
       yield '\n'
 
 
-def type_text(
-    text: str,
+def _type_words(
+    words: Iterable[str],
     env: env_interface.AndroidEnvInterface,
-    timeout_sec: Optional[float] = _DEFAULT_TIMEOUT_SECS,
+    timeout_sec: Optional[float],
 ) -> None:
-  """Issues an AdbRequest to type the specified text string word-by-word.
-
-  It types word-by-word to fix issue where sometimes long text strings can be
-  typed out of order at the character level. Additionally, long strings can time
-  out and word-by-word fixes this, while allowing us to keep a lot timeout per
-  word.
-
-  Args:
-    text: The text string to be typed.
-    env: The environment.
-    timeout_sec: A timeout to use for this operation. Note: For longer texts,
-      this should be longer as it takes longer to type.
-  """
-  words = _split_words_and_newlines(text)
+  """Types words, as split by `_split_words_and_newlines`, one at a time."""
   for word in words:
     if word == '\n':
       logging.info('Found \\n, pressing enter button.')
@@ -465,6 +475,98 @@ def type_text(
       logging.error('Failed to type word: %r', formatted)
 
 
+def _type_words_in_bulk(
+    words: list[str],
+    env: env_interface.AndroidEnvInterface,
+    timeout_sec: Optional[float],
+) -> None:
+  """Types words in a single adb round trip; see `type_text`."""
+  # Each command with the index of the first word it types.
+  commands: list[tuple[list[str], int]] = []
+  chunk, chunk_start = '', 0
+
+  def flush(end: int) -> None:
+    nonlocal chunk, chunk_start
+    if chunk:
+      commands.append(
+          (['shell', 'input', 'text', shlex.quote(chunk)], chunk_start)
+      )
+    chunk, chunk_start = '', end
+
+  for i, word in enumerate(words):
+    if word == '\n':
+      flush(i)
+      commands.append((['shell', 'input', 'keyevent', 'KEYCODE_ENTER'], i))
+      chunk_start = i + 1
+      continue
+    text = _to_ascii(word)
+    if chunk and len(chunk) + len(text) > _MAX_BULK_CHUNK_CHARS:
+      flush(i)
+    chunk += text
+  flush(len(words))
+  if not commands:
+    return
+
+  logging.info('Typing %d words with %d commands.', len(words), len(commands))
+  # Typing stops at the first failure, so that the rest of the text can be
+  # retyped in order, without typing anything twice.
+  results = issue_generic_requests(
+      [command for command, _ in commands],
+      env,
+      None if timeout_sec is None else timeout_sec * len(commands),
+      stop_on_failure=True,
+  )
+  for result, (_, start) in zip(results, commands):
+    if not result.ok:
+      logging.warning(
+          'Bulk typing failed at %r; typing the rest word by word.',
+          result.command,
+      )
+      _type_words(words[start:], env, timeout_sec)
+      return
+
+
+def type_text(
+    text: str,
+    env: env_interface.AndroidEnvInterface,
+    timeout_sec: Optional[float] = _DEFAULT_TIMEOUT_SECS,
+    bulk: bool = True,
+) -> None:
+  """Issues AdbRequests to type the specified text string.
+
+  By default, the text is typed in bulk: one on-device script types it in
+  chunks of a few words and presses enter for newlines, costing a single adb
+  round trip. Words that cannot be typed in bulk, e.g. those containing "%",
+  are typed in separate requests.
+
+  With `bulk=False`, the text is typed word-by-word, each word in its own
+  request. This fixes an issue where sometimes long text strings can be typed
+  out of order at the character level. Additionally, long strings can time out
+  and word-by-word fixes this, while allowing us to keep a lot timeout per
+  word.
+
+  Args:
+    text: The text string to be typed.
+    env: The environment.
+    timeout_sec: A timeout to use for typing each word, or each chunk in bulk
+      mode.
+    bulk: Whether to type the text in bulk.
+  """
+  words = list(_split_words_and_newlines(text))
+  if not bulk:
+    _type_words(words, env, timeout_sec)
+    return
+  pending = []
+  for word in words:
+    if word != '%s' and not _BULK_UNSAFE_CHARS.isdisjoint(word):
+      _type_words_in_bulk(pending, env, timeout_sec)
+      pending = []
+      _type_words([word], env, timeout_sec)
+    else:
+      pending.append(word)
+  _type_words_in_bulk(pending, env, timeout_sec)
+
+
 def issue_generic_request(
     args: Collection[str] | str,
     env: env_interface.AndroidEnvInterface,
@@ -495,11 +597,12 @@ def issue_generic_request(
     args_str = ' '.join(args)
   logging.info('Issuing generic adb request: %r', args_str)
 
-  response = env.execute_adb_call(
+  response = adb_tracing.traced_call(
+      env.execute_adb_call,
       adb_pb2.AdbRequest(
           generic=adb_pb2.AdbRequest.GenericRequest(args=args),
           timeout_sec=timeout_sec,
-      )
+      ),
   )
   if response.status != adb_pb2.AdbResponse.Status.OK:
     logging.error('Failed to issue generic adb request: %r', args_str)
@@ -507,6 +610,107 @@ def issue_generic_request(
   return response
 
 
+@dataclasses.dataclass(frozen=True)
+class ShellCommandResult:
+  """Result of one command of a batch; see `issue_generic_requests`.
+
+  Attributes:
+    command: The shell command line.
+    output: Combined stdout and stderr of the command.
+    exit_code: Exit code of the command, or None if it never ran because the
+      batch failed.
+  """
+
+  command: str
+  output: bytes
+  exit_code: Optional[int]
+
+  @property
+  def ok(self) -> bool:
+    return self.exit_code == 0
+
+
+def issue_generic_requests(
+    commands: Sequence[Collection[str] | str],
+    env: env_interface.AndroidEnvInterface,
+    timeout_sec: Optional[float] = _DEFAULT_TIMEOUT_SECS,
+    stop_on_failure: bool = False,
+) -> list[ShellCommandResult]:
+  """Issues several independent shell commands in a single adb round trip.
+
+  The commands are combined into one on-device script. They run in order, each
+  in its own subshell, and unless `stop_on_failure` is set, a failing command
+  does not stop later ones.
+
+  Example:
+  ~~~~~~~
+
+  results = issue_generic_requests(
+      [['shell', 'settings', 'put', 'global', 'auto_time', '0'],
+       'shell settings put global auto_time_zone 0'],
+      env,
+  )
+  assert all(result.ok for result in results)
+
+  Args:
+    commands: Shell commands, in the same form as `issue_generic_request`
+      arguments; each must start with `shell`.
+    env: The environment.
+    timeout_sec: A timeout for the whole batch.
+    stop_on_failure: Whether to skip the commands after a failing one; they
+      are returned with no exit code.
+
+  Returns:
+    The result of each command, in order.
+
+  Raises:
+    ValueError: If a command is not a shell command.
+  """
+  command_lines = []
+  for command in commands:
+    args = command.split(' ') if isinstance(command, str) else list(command)
+    if len(args) < 2 or args[0] != 'shell':
+      raise ValueError(f'Only shell commands can be batched, got {command!r}.')
+    command_lines.append(' '.join(args[1:]))
+  if not command_lines:
+    return []
+
+  marker = f'__android_world_batch_{uuid.uuid4().hex}__'
+  # The leading newline terminates output that lacks one, so that every marker
+  # starts its own line.
+  if stop_on_failure:
+    # Exits successfully, so that the results so far are returned.
+    template = (
+        "( {line}\n) </dev/null 2>&1; s=$?; printf '\\n{marker} %d\\n' $s;"
+        ' [ $s -eq 0 ] || exit 0\n'
+    )
+  else:
+    template = "( {line}\n) </dev/null 2>&1; printf '\\n{marker} %d\\n' $?\n"
+  script = ''.join(
+      template.format(line=line, marker=marker) for line in command_lines
+  )
+  response = issue_generic_request(['shell', script], env, timeout_sec)
+
+  exit_codes, outputs = [], []
+  output = b''
+  if response.status == adb_pb2.AdbResponse.Status.OK:
+    output = response.generic.output
+  marker_bytes = marker.encode()
+  for chunk in output.split(b'\n' + marker_bytes + b' '):
+    if exit_codes or outputs:
+      exit_code, _, chunk = chunk.partition(b'\n')
+      exit_codes.append(int(exit_code))
+    outputs.append(chunk)
+
+  results = []
+  for i, line in enumerate(command_lines):
+    if i < len(exit_codes):
+      results.append(ShellCommandResult(line, outputs[i], exit_codes[i]))
+    else:
+      results.append(ShellCommandResult(line, b'', None))
+  return results
+
+
 def get_adb_activity(app_name: str) -> Optional[str]:
   """Get a mapping of regex patterns to ADB activities top Android apps."""
   for pattern, activity in _PATTERN_TO_ACTIVITY.items():
@@ -909,9 +1113,12 @@ def toggle_airplane_mode(
   if on_or_off not in ('on', 'off'):
     raise ValueError('Must be one of on or off.')
   state = '1' if on_or_off == 'on' else '0'
-  return issue_generic_request(
+  response = issue_generic_request(
       ['shell', 'settings', 'put', 'global', 'airplane_mode_on', state], env
   )
+  if hasattr(env, 'invalidate_airplane_mode_cache'):
+    env.invalidate_airplane_mode_cache()  # pytype: disable=attribute-error
+  return response
 
 
 def install_apk(
@@ -1031,6 +1238,12 @@ def get_clipboard_contents(env: env_interface.AndroidEnvInterface) -> str:
   return result
 
 
+def _invalidate_geometry_cache(env: env_interface.AndroidEnvInterface) -> None:
+  """Drops any screen geometry cached by `env`, e.g. by the controller."""
+  if hasattr(env, 'invalidate_geometry_cache'):
+    env.invalidate_geometry_cache()  # pytype: disable=attribute-error
+
+
 def change_orientation(
     orientation: str, env: env_interface.AndroidEnvInterface
 ) -> None:
@@ -1060,6 +1273,7 @@ def change_orientation(
   issue_generic_request(
       command + ['user_rotation', _ORIENTATIONS[orientation]], env
   )
+  _invalidate_geometry_cache(env)
 
 
 def set_clipboard_contents(
@@ -1097,7 +1311,7 @@ def set_clipboard_contents(
 
 def grant_permissions(
     activity_name: str,
-    permission: str,
+    permission: str | Collection[str],
     env: env_interface.AndroidEnvInterface,
 ) -> None:
   """Grants permissions on an activity.
@@ -1110,13 +1324,22 @@ def grant_permissions(
 
   Args:
     activity_name: The name of the activity.
-    permission: The permission to grant.
+    permission: The permission to grant, or several permissions to grant in a
+      single adb round trip.
     env: The AndroidEnv instance.
   """
-  issue_generic_request(
-      ['shell', 'pm', 'grant', activity_name, permission],
-      env,
+  if isinstance(permission, str):
+    issue_generic_request(
+        ['shell', 'pm', 'grant', activity_name, permission],
+        env,
+    )
+    return
+  results = issue_generic_requests(
+      [['shell', 'pm', 'grant', activity_name, p] for p in permission], env
   )
+  for result in results:
+    if not result.ok:
+      logging.error('Failed to grant permission: %r', result.command)
 
 
 def execute_sql_command(
@@ -1475,11 +1698,14 @@ def get_logical_screen_size(
 
 def get_physical_frame_boundary(
     env: env_interface.AndroidEnvInterface,
+    orientation: Optional[int] = None,
 ) -> tuple[int, int, int, int]:
   """Returns the physical frame boundary.
 
   Args:
     env: The AndroidEnv interface.
+    orientation: The current screen orientation, as returned by
+      `get_orientation`. If not provided, it is queried from the device.
 
   Returns:
     First two integers are the coordinates for top left corner, last two are for
@@ -1500,7 +1726,8 @@ def get_physical_frame_boundary(
           and int(m[3]) == 0
       ):
         continue
-      orientation = get_orientation(env)
+      if orientation is None:
+        orientation = get_orientation(env)
       if orientation == 0 or orientation == 2:
         return (int(m[0]), int(m[1]), int(m[2]), int(m[3]))
       return (int(m[1]), int(m[0]), int(m[3]), int(m[2]))
@@ -1558,7 +1785,9 @@ def set_screen_size(
   adb_command = ['shell', f'wm size {width}x{height}']
 
   # Issue the command and return the response
-  return issue_generic_request(adb_command, env)
+  response = issue_generic_request(adb_command, env)
+  _invalidate_geometry_cache(env)
+  return response
 
 
 def retry(n: int) -> Callable[[Any], Any]:
@@ -1575,6 +1804,7 @@ def retry(n: int) -> Callable[[Any], Any]:
           if attempts >= n:
             raise
           print(f'Could not execute {func}. Retrying...')
+          adb_tracing.get_tracer().record_retry(func.__name__)
           time.sleep(2)
         except Exception as exc:
           raise exc
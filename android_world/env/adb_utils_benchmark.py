@@ -0,0 +1,117 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks word-by-word against bulk typing in adb_utils.type_text.
+
+By default the device is simulated: every adb request costs a fixed round trip
+and every `input` invocation on the device a fixed time. With --console_port,
+text is typed on a running emulator instead; focus a text field first.
+
+Usage:
+  python -m android_world.env.adb_utils_benchmark \\
+      --num_words=10,100,500
+"""
+
+from collections.abc import Sequence
+import random
+import re
+import time
+
+from absl import app
+from absl import flags
+from android_env.proto import adb_pb2
+from android_world.env import adb_utils
+from android_world.env import android_world_controller
+
+_NUM_WORDS = flags.DEFINE_list(
+    'num_words',
+    ['10', '100', '500'],
+    'Text lengths, in words, to benchmark.',
+)
+_CONSOLE_PORT = flags.DEFINE_integer(
+    'console_port',
+    None,
+    'Console port of a running emulator to type on. Simulated if unset.',
+)
+_ROUND_TRIP_MS = flags.DEFINE_float(
+    'round_trip_ms', 40.0, 'Simulated cost of one adb request.'
+)
+_INPUT_MS = flags.DEFINE_float(
+    'input_ms', 15.0, 'Simulated cost of one `input` invocation on device.'
+)
+
+_WORDS = ('note', 'meeting', 'tomorrow', 'at', 'the', 'office', 'bring', 'a')
+
+
+class _SimulatedEnv:
+  """Stands in for a device; only models the cost of requests."""
+
+  def __init__(self):
+    self.num_requests = 0
+
+  def execute_adb_call(self, call: adb_pb2.AdbRequest) -> adb_pb2.AdbResponse:
+    self.num_requests += 1
+    num_inputs = 1
+    response = adb_pb2.AdbResponse(status=adb_pb2.AdbResponse.Status.OK)
+    if call.WhichOneof('command') == 'generic':
+      script = ' '.join(call.generic.args[1:])
+      num_inputs = script.count('input ')
+      # Report every command of a batch as successful.
+      markers = re.findall(r'__android_world_batch_\w+?__', script)
+      response.generic.output = b''.join(
+          f'\n{marker} 0\n'.encode() for marker in markers
+      )
+    time.sleep((_ROUND_TRIP_MS.value + num_inputs * _INPUT_MS.value) / 1e3)
+    return response
+
+
+def make_text(num_words: int, seed: int = 0) -> str:
+  """Creates a note-like text with a newline every ten words."""
+  rng = random.Random(seed)
+  words = [rng.choice(_WORDS) for _ in range(num_words)]
+  return '\n'.join(
+      ' '.join(words[i : i + 10]) for i in range(0, num_words, 10)
+  )
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+
+  if _CONSOLE_PORT.value is None:
+    env = _SimulatedEnv()
+  else:
+    env = android_world_controller.get_controller(
+        console_port=_CONSOLE_PORT.value
+    )
+
+  print(f'{"words":>6} {"path":>6} {"secs":>8} {"requests":>9} {"speedup":>8}')
+  for num_words in [int(n) for n in _NUM_WORDS.value]:
+    text = make_text(num_words)
+    baseline_secs = None
+    for path, bulk in (('word', False), ('bulk', True)):
+      num_requests = getattr(env, 'num_requests', 0)
+      start = time.perf_counter()
+      adb_utils.type_text(text, env, bulk=bulk)
+      secs = time.perf_counter() - start
+      num_requests = getattr(env, 'num_requests', 0) - num_requests
+      baseline_secs = baseline_secs or secs
+      print(
+          f'{num_words:>6} {path:>6} {secs:>8.2f} {num_requests:>9}'
+          f' {baseline_secs / secs:>7.1f}x'
+      )
+
+
+if __name__ == '__main__':
+  app.run(main)
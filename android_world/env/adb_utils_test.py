@@ -14,6 +14,7 @@
 
 """Tests for adb_utils."""
 
+import subprocess
 from unittest import mock
 
 from absl.testing import absltest
@@ -185,7 +186,7 @@ class AdbTypingTest(AdbTestSetup):
       mock_execute_adb_call.return_value = adb_pb2.AdbResponse(
           status=adb_pb2.AdbResponse.Status.OK
       )
-      adb_utils.type_text('Type some\ntext', self.mock_env)
+      adb_utils.type_text('Type some\ntext', self.mock_env, bulk=False)
       expected_calls = [
           mock.call(
               adb_pb2.AdbRequest(
@@ -222,6 +223,88 @@ class AdbTypingTest(AdbTestSetup):
       ]
       mock_execute_adb_call.assert_has_calls(expected_calls)
 
+  @mock.patch.object(adb_utils, 'issue_generic_requests', autospec=True)
+  def test_type_text_in_bulk(self, mock_issue_generic_requests):
+    mock_issue_generic_requests.side_effect = lambda commands, *_, **__: [
+        adb_utils.ShellCommandResult(' '.join(command[1:]), b'', 0)
+        for command in commands
+    ]
+
+    adb_utils.type_text(
+        "It's a long line of text\nthat goes on for a while", self.mock_env
+    )
+
+    mock_issue_generic_requests.assert_called_once_with(
+        [
+            ['shell', 'input', 'text', "'It'\"'\"'s%sa%slong%sline%sof%stext'"],
+            ['shell', 'input', 'keyevent', 'KEYCODE_ENTER'],
+            ['shell', 'input', 'text', 'that%sgoes%son%sfor%sa%swhile'],
+        ],
+        self.mock_env,
+        adb_utils._DEFAULT_TIMEOUT_SECS * 3,
+        stop_on_failure=True,
+    )
+    self.mock_env.execute_adb_call.assert_not_called()
+
+  @mock.patch.object(adb_utils, 'issue_generic_requests', autospec=True)
+  def test_type_text_in_bulk_splits_long_text(
+      self, mock_issue_generic_requests
+  ):
+    mock_issue_generic_requests.side_effect = lambda commands, *_, **__: [
+        adb_utils.ShellCommandResult('', b'', 0)
+    ] * len(commands)
+
+    adb_utils.type_text(' '.join(['word'] * 20), self.mock_env)
+
+    (commands, _, _), _ = mock_issue_generic_requests.call_args
+    self.assertLen(commands, 4)
+    self.assertEqual(
+        ''.join(command[3].strip("'") for command in commands),
+        '%s'.join(['word'] * 20),
+    )
+
+  @mock.patch.object(adb_utils, 'issue_generic_requests', autospec=True)
+  def test_type_text_falls_back_to_words(self, mock_issue_generic_requests):
+    mock_issue_generic_requests.side_effect = lambda commands, *_, **__: [
+        adb_utils.ShellCommandResult('', b'', None)
+    ] * len(commands)
+    self.mock_env.execute_adb_call.return_value = adb_pb2.AdbResponse(
+        status=adb_pb2.AdbResponse.Status.OK
+    )
+
+    adb_utils.type_text('100% done', self.mock_env)
+
+    typed = [
+        c.args[0].input_text.text
+        for c in self.mock_env.execute_adb_call.call_args_list
+    ]
+    # "100%" is never typed in bulk; the rest is retried after bulk failed.
+    self.assertEqual(typed, ['100%', '%s', 'done'])
+    mock_issue_generic_requests.assert_called_once()
+
+  @mock.patch.object(adb_utils, 'issue_generic_requests', autospec=True)
+  def test_type_text_retypes_from_failed_command(
+      self, mock_issue_generic_requests
+  ):
+    # The batch stopped at the enter key, so the last line was not typed.
+    mock_issue_generic_requests.side_effect = lambda commands, *_, **__: [
+        adb_utils.ShellCommandResult('', b'', 0),
+        adb_utils.ShellCommandResult('', b'', 1),
+        adb_utils.ShellCommandResult('', b'', None),
+    ]
+    self.mock_env.execute_adb_call.return_value = adb_pb2.AdbResponse(
+        status=adb_pb2.AdbResponse.Status.OK
+    )
+
+    adb_utils.type_text('first\nsecond', self.mock_env)
+
+    calls = self.mock_env.execute_adb_call.call_args_list
+    self.assertEqual(
+        [c.args[0].WhichOneof('command') for c in calls],
+        ['press_button', 'input_text'],
+    )
+    self.assertEqual(calls[1].args[0].input_text.text, 'second')
+
 
 class TestExtractBroadcastData(absltest.TestCase):
 
@@ -263,5 +346,135 @@ class TestScreenUtils(absltest.TestCase):
     )
 
 
+class ScreenGeometryTest(AdbTestSetup):
+
+  def test_physical_frame_boundary_uses_given_orientation(self):
+    response = adb_pb2.AdbResponse(status=adb_pb2.AdbResponse.Status.OK)
+    response.generic.output = b'physicalFrame=[0, 0, 1080, 2400]'
+    self.mock_issue_generic_request.return_value = response
+
+    boundary = adb_utils.get_physical_frame_boundary(
+        self.mock_env, orientation=1
+    )
+
+    self.assertEqual(boundary, (0, 0, 2400, 1080))
+    self.mock_issue_generic_request.assert_called_once()
+
+  def test_change_orientation_invalidates_geometry_cache(self):
+    env = mock.MagicMock()
+
+    adb_utils.change_orientation('landscape', env)
+
+    env.invalidate_geometry_cache.assert_called_once()
+
+  def test_set_screen_size_invalidates_geometry_cache(self):
+    env = mock.MagicMock()
+
+    adb_utils.set_screen_size(720, 1520, env)
+
+    env.invalidate_geometry_cache.assert_called_once()
+
+
+def _run_in_local_shell(args, env, timeout_sec=None):
+  """Runs a shell request with the local shell standing in for the device."""
+  del env
+  completed = subprocess.run(
+      ['sh', '-c', ' '.join(args[1:])],
+      stdout=subprocess.PIPE,
+      stderr=subprocess.STDOUT,
+      timeout=timeout_sec,
+      check=False,
+  )
+  response = adb_pb2.AdbResponse(status=adb_pb2.AdbResponse.Status.OK)
+  response.generic.output = completed.stdout
+  return response
+
+
+class IssueGenericRequestsTest(AdbTestSetup):
+
+  def test_runs_commands_in_one_request(self):
+    self.mock_issue_generic_request.side_effect = _run_in_local_shell
+
+    results = adb_utils.issue_generic_requests(
+        [
+            'shell echo hello',
+            ['shell', 'printf', 'no-newline'],
+            ['shell', 'echo oops >&2; exit 3'],
+            ['shell', 'cat'],
+        ],
+        self.mock_env,
+    )
+
+    self.mock_issue_generic_request.assert_called_once()
+    self.assertEqual(
+        results,
+        [
+            adb_utils.ShellCommandResult('echo hello', b'hello\n', 0),
+            adb_utils.ShellCommandResult('printf no-newline', b'no-newline', 0),
+            adb_utils.ShellCommandResult(
+                'echo oops >&2; exit 3', b'oops\n', 3
+            ),
+            adb_utils.ShellCommandResult('cat', b'', 0),
+        ],
+    )
+    self.assertFalse(results[2].ok)
+
+  def test_stops_on_failure(self):
+    self.mock_issue_generic_request.side_effect = _run_in_local_shell
+
+    results = adb_utils.issue_generic_requests(
+        ['shell echo a', 'shell exit 2', 'shell echo c'],
+        self.mock_env,
+        stop_on_failure=True,
+    )
+
+    self.assertEqual(
+        results,
+        [
+            adb_utils.ShellCommandResult('echo a', b'a\n', 0),
+            adb_utils.ShellCommandResult('exit 2', b'', 2),
+            adb_utils.ShellCommandResult('echo c', b'', None),
+        ],
+    )
+
+  def test_failed_batch(self):
+    self.mock_issue_generic_request.return_value = adb_pb2.AdbResponse(
+        status=adb_pb2.AdbResponse.Status.TIMEOUT
+    )
+
+    results = adb_utils.issue_generic_requests(
+        ['shell echo a', 'shell echo b'], self.mock_env
+    )
+
+    self.assertEqual([result.exit_code for result in results], [None, None])
+
+  def test_rejects_non_shell_commands(self):
+    with self.assertRaises(ValueError):
+      adb_utils.issue_generic_requests([['root']], self.mock_env)
+
+  def test_grant_several_permissions(self):
+    self.mock_issue_generic_request.side_effect = _run_in_local_shell
+
+    with mock.patch.object(
+        adb_utils,
+        'issue_generic_requests',
+        wraps=adb_utils.issue_generic_requests,
+    ) as mock_issue_generic_requests:
+      adb_utils.grant_permissions(
+          'com.example',
+          ['android.permission.A', 'android.permission.B'],
+          self.mock_env,
+      )
+
+    mock_issue_generic_requests.assert_called_once_with(
+        [
+            ['shell', 'pm', 'grant', 'com.example', 'android.permission.A'],
+            ['shell', 'pm', 'grant', 'com.example', 'android.permission.B'],
+        ],
+        self.mock_env,
+    )
+    self.mock_issue_generic_request.assert_called_once()
+
+
 if __name__ == '__main__':
   absltest.main()
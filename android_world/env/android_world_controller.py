@@ -15,24 +15,36 @@
 """Controller for Android that adds UI tree information to the observation."""
 
 import contextlib
+import copy
+import dataclasses
 import os
+import threading
 import time
 from typing import Any
+from typing import Callable
 from typing import cast
 from typing import Optional
+from typing import TypeVar
 
 from absl import logging
 from android_env import env_interface
 from android_env import loader
 from android_env.components import config_classes
+from android_env.proto import adb_pb2
 from android_env.proto.a11y import android_accessibility_forest_pb2
 from android_env.wrappers import a11y_grpc_wrapper
 from android_env.wrappers import base_wrapper
+from android_world.env import adb_shell
+from android_world.env import adb_tracing
 from android_world.env import adb_utils
-from android_world.env import representation_utils
 from android_world.utils import file_utils
 import dm_env
 
+_T = TypeVar('_T')
+
+# First wait between attempts to read the a11y tree; see `get_a11y_tree`.
+_A11Y_TREE_INITIAL_BACKOFF_SECS = 0.05
+
 
 def _has_wrapper(
     env: env_interface.AndroidEnvInterface,
@@ -55,17 +67,60 @@ def _has_wrapper(
     return False
 
 
+def _provides_a11y_tree(env: env_interface.AndroidEnvInterface) -> bool:
+  """Checks recursively if an environment reads the a11y tree by itself.
+
+  Such environments, e.g. `simulated_device.SimulatedDevice`, implement
+  `accumulate_new_extras` and `attempt_enable_networking` like
+  `a11y_grpc_wrapper.A11yGrpcWrapper` and set `provides_a11y_tree = True`.
+
+  Args:
+    env: The environment object potentially wrapped.
+
+  Returns:
+    True if the environment provides the a11y tree, otherwise False.
+  """
+  if getattr(env, 'provides_a11y_tree', False) is True:
+    return True
+  elif hasattr(env, '_env'):
+    return _provides_a11y_tree(env._env)  # pylint: disable=protected-access
+  else:
+    return False
+
+
+def _ensure_airplane_mode_off(env: a11y_grpc_wrapper.A11yGrpcWrapper) -> None:
+  """Turns networking back on if airplane mode blocks the a11y gRPC channel."""
+  if adb_utils.retry(3)(adb_utils.check_airplane_mode)(env):
+    logging.warning(
+        'Airplane mode is on -- cannot retrieve a11y tree via gRPC. Turning'
+        ' it off...'
+    )
+    logging.info('Enabling networking...')
+    env.attempt_enable_networking()
+    time.sleep(1.0)
+
+
 def get_a11y_tree(
     env: env_interface.AndroidEnvInterface,
     max_retries: int = 5,
     sleep_duration: float = 1.0,
+    check_airplane_mode: bool = True,
 ) -> android_accessibility_forest_pb2.AndroidAccessibilityForest:
   """Gets a11y tree.
 
+  Between attempts the wait starts at `_A11Y_TREE_INITIAL_BACKOFF_SECS` and
+  doubles up to `sleep_duration`, so a forest that arrives late is picked up
+  quickly. Attempts continue until the waits add up to `max_retries *
+  sleep_duration`, the time a forwarder gets to send its first forest after a
+  (re)connect.
+
   Args:
     env: AndroidEnv.
-    max_retries: Maximum number of retries to get a11y tree.
-    sleep_duration: Time to sleep between each retry in seconds.
+    max_retries: Number of `sleep_duration` waits the attempts may span.
+    sleep_duration: Maximum time to sleep between each retry in seconds.
+    check_airplane_mode: Whether to check for airplane mode, which blocks the
+      a11y tree, before reading it. If False, airplane mode is only checked
+      once the tree turns out to be missing.
 
   Returns:
     A11y tree.
@@ -73,34 +128,36 @@ def get_a11y_tree(
   Raises:
     RuntimeError: If the a11y tree was not able to be retrieved.
   """
-  if not _has_wrapper(env, a11y_grpc_wrapper.A11yGrpcWrapper):
+  if not (
+      _has_wrapper(env, a11y_grpc_wrapper.A11yGrpcWrapper)
+      or _provides_a11y_tree(env)
+  ):
     raise ValueError(
         'Must use a11y_grpc_wrapper.A11yGrpcWrapper to get the a11y tree.'
     )
   env = cast(a11y_grpc_wrapper.A11yGrpcWrapper, env)
-  if adb_utils.retry(3)(adb_utils.check_airplane_mode)(env):
-    logging.warning(
-        'Airplane mode is on -- cannot retrieve a11y tree via gRPC. Turning'
-        ' it off...'
-    )
-    logging.info('Enabling networking...')
-    env.attempt_enable_networking()
-    time.sleep(1.0)
+  if check_airplane_mode:
+    _ensure_airplane_mode_off(env)
 
-  forest: Optional[
-      android_accessibility_forest_pb2.AndroidAccessibilityForest
-  ] = None
-  for _ in range(max_retries):
+  backoff = _A11Y_TREE_INITIAL_BACKOFF_SECS
+  max_wait = max_retries * sleep_duration
+  waited = 0.0
+  while True:
     try:
-      forest = env.accumulate_new_extras()['accessibility_tree'][-1]  # pytype:disable=attribute-error
-      return forest
+      return env.accumulate_new_extras()['accessibility_tree'][-1]  # pytype:disable=attribute-error
     except KeyError:
       logging.warning('Could not get a11y tree, retrying.')
-    time.sleep(sleep_duration)
+    if not check_airplane_mode:
+      _ensure_airplane_mode_off(env)
+      check_airplane_mode = True
+    if waited >= max_wait:
+      break
+    wait = min(backoff, sleep_duration, max_wait - waited)
+    time.sleep(wait)
+    waited += wait
+    backoff *= 2
 
-  if forest is None:
-    raise RuntimeError('Could not get a11y tree.')
-  return forest
+  raise RuntimeError('Could not get a11y tree.')
 
 
 _TASK_PATH = '/tmp/default.textproto'
@@ -117,10 +174,39 @@ DEFAULT_ADB_PATH = '~/Android/Sdk/platform-tools/adb'
 # https://developer.android.com/reference/android/accessibilityservice/AccessibilityService
 
 OBSERVATION_KEY_FOREST = 'forest'
-# UI elements are specific nodes extracted from forest. See
+# UI elements are specific nodes extracted from forest. The controller does not
+# add them to observations; interface.State extracts them on demand. See
 # representation_utils.forest_to_ui_elements for details.
 OBSERVATION_KEY_UI_ELEMENTS = 'ui_elements'
 
+@dataclasses.dataclass
+class GeometryCacheStats:
+  """Counters for the controller's device geometry cache.
+
+  Attributes:
+    hits: Lookups served from memory.
+    misses: Lookups that queried the device over ADB.
+    invalidations: Number of times the cache was cleared.
+  """
+
+  hits: int = 0
+  misses: int = 0
+  invalidations: int = 0
+
+
+# Cached geometry that changes with the screen orientation.
+_ORIENTED_GEOMETRY = (
+    'orientation',
+    'logical_screen_size',
+    'physical_frame_boundary',
+)
+
+# Task extras keys whose growth signals UI activity on the device.
+_A11Y_ACTIVITY_KEYS = ('full_event', 'accessibility_tree')
+# Time without a11y activity after which `ping_a11y` fails; longer than the
+# minute between two ticks of the status bar clock.
+_A11Y_MAX_IDLE_SECS = 90.0
+
 
 class AndroidWorldController(base_wrapper.BaseWrapper):
   """Controller for an Android instance that adds accessibility tree data.
@@ -133,30 +219,100 @@ class AndroidWorldController(base_wrapper.BaseWrapper):
   """
 
   def __init__(self, env: env_interface.AndroidEnvInterface):
-    self._env = a11y_grpc_wrapper.A11yGrpcWrapper(
-        env,
-        install_a11y_forwarding=True,
-        start_a11y_service=True,
-        enable_a11y_tree_info=True,
-        latest_a11y_info_only=True,
-    )
+    if _provides_a11y_tree(env):
+      self._env = env
+    else:
+      self._env = a11y_grpc_wrapper.A11yGrpcWrapper(
+          env,
+          install_a11y_forwarding=True,
+          start_a11y_service=True,
+          enable_a11y_tree_info=True,
+          latest_a11y_info_only=True,
+      )
     self._env.reset()  # Initializes required server services in a11y wrapper.
+    self._a11y_activity_counts = None
+    self._last_a11y_activity_time = None
+    # Serializes ADB requests and reads of the a11y forwarder with
+    # reconnections, which may happen on a health monitor's thread.
+    self._env_lock = threading.RLock()
+    self._geometry_cache: dict[str, Any] = {}
+    self._geometry_cache_stats = GeometryCacheStats()
+    self._shell: Optional[adb_shell.PersistentShell] = None
+    self._shell_stats = adb_shell.ShellStats()
+    self._tracer = adb_tracing.get_tracer()
+    # Whether airplane mode was found off since connecting; see
+    # `invalidate_airplane_mode_cache`.
+    self._airplane_mode_checked = False
 
   def _process_timestep(self, timestep: dm_env.TimeStep) -> dm_env.TimeStep:
-    """Adds a11y tree info to the observation."""
+    """Adds the a11y forest to the observation."""
+    self._check_orientation()
     forest = self.get_a11y_forest()
-    ui_elements = representation_utils.forest_to_ui_elements(
-        forest,
-        exclude_invisible_elements=True,
-    )
+    self.last_a11y_event_time()
     timestep.observation[OBSERVATION_KEY_FOREST] = forest
-    timestep.observation[OBSERVATION_KEY_UI_ELEMENTS] = ui_elements
     return timestep
 
+  def _get_cached_geometry(self, key: str, fetch: Callable[[], _T]) -> _T:
+    if key in self._geometry_cache:
+      self._geometry_cache_stats.hits += 1
+      return self._geometry_cache[key]
+    self._geometry_cache_stats.misses += 1
+    value = fetch()
+    self._geometry_cache[key] = value
+    return value
+
+  def _check_orientation(self) -> None:
+    """Drops cached geometry that depends on a changed orientation.
+
+    Apps may rotate the screen by themselves, e.g. when they open after
+    `adb_utils.change_orientation`, so the orientation is read again for every
+    observation. It costs one `dumpsys` call.
+    """
+    try:
+      orientation = adb_utils.get_orientation(self)
+    except Exception:  # pylint: disable=broad-exception-caught
+      logging.warning('Could not read the orientation; dropping it.')
+      orientation = None
+    if self._geometry_cache.get('orientation') == orientation:
+      return
+    if any(key in self._geometry_cache for key in _ORIENTED_GEOMETRY):
+      self._geometry_cache_stats.invalidations += 1
+    for key in _ORIENTED_GEOMETRY:
+      self._geometry_cache.pop(key, None)
+    if orientation is not None:
+      self._geometry_cache['orientation'] = orientation
+
+  def invalidate_geometry_cache(self) -> None:
+    """Clears cached screen geometry.
+
+    `adb_utils.change_orientation` and `adb_utils.set_screen_size` call this
+    automatically, and a changed orientation is detected with each
+    observation; call it directly after changing the screen by other means.
+    """
+    self._geometry_cache.clear()
+    self._geometry_cache_stats.invalidations += 1
+
+  def invalidate_airplane_mode_cache(self) -> None:
+    """Checks airplane mode again before the next a11y tree is read.
+
+    Airplane mode blocks the a11y gRPC channel, but checking it costs an ADB
+    round trip, so it is checked once per connection and otherwise only when
+    the tree is missing. `adb_utils.toggle_airplane_mode` calls this
+    automatically.
+    """
+    self._airplane_mode_checked = False
+
+  @property
+  def geometry_cache_stats(self) -> GeometryCacheStats:
+    """Returns a snapshot of the geometry cache counters."""
+    return copy.copy(self._geometry_cache_stats)
+
   @property
   def device_screen_size(self) -> tuple[int, int]:
     """Returns the physical screen size of the device: (width, height)."""
-    return adb_utils.get_screen_size(self._env)
+    return self._get_cached_geometry(
+        'device_screen_size', lambda: adb_utils.get_screen_size(self._env)
+    )
 
   @property
   def logical_screen_size(self) -> tuple[int, int]:
@@ -165,36 +321,230 @@ class AndroidWorldController(base_wrapper.BaseWrapper):
     This will be different with the physical size if orientation or resolution
     is changed.
     """
-    return adb_utils.get_logical_screen_size(self._env)
+    return self._get_cached_geometry(
+        'logical_screen_size',
+        lambda: adb_utils.get_logical_screen_size(self._env),
+    )
+
+  @property
+  def orientation(self) -> int:
+    """Returns the screen orientation; see `adb_utils.get_orientation`."""
+    return self._get_cached_geometry(
+        'orientation', lambda: adb_utils.get_orientation(self._env)
+    )
+
+  @property
+  def physical_frame_boundary(self) -> tuple[int, int, int, int]:
+    """Returns the physical frame boundary in portrait coordinates."""
+    return self._get_cached_geometry(
+        'physical_frame_boundary',
+        lambda: adb_utils.get_physical_frame_boundary(
+            self._env, orientation=self.orientation
+        ),
+    )
 
   @property
   def env(self) -> env_interface.AndroidEnvInterface:
     return self._env
 
+  def enable_persistent_shell(self, enabled: bool = True) -> None:
+    """Serves shell requests from one long-lived `adb shell` process.
+
+    When enabled, generic `shell` requests and settings get/put requests are
+    written to a persistent shell instead of spawning an adb client each time;
+    this covers `adb_utils.issue_generic_request` and helpers built on it.
+    Non-zero exit codes are reported as an `ADB_ERROR` status. Requests are
+    retried through the regular adb path only if the shell died or timed out
+    before running them, so that no command runs twice; commands interrupted
+    while running are reported as failed.
+
+    Args:
+      enabled: Whether to use the persistent shell.
+    """
+    if self._shell is not None:
+      self._shell.close()
+      self._shell = None
+    if enabled:
+      # pylint: disable=protected-access
+      # pytype: disable=attribute-error
+      adb_controller = self._env._coordinator._simulator._adb_controller
+      self._shell = adb_shell.PersistentShell(
+          adb_controller.command_prefix() + ['shell'],
+          env=adb_controller._os_env_vars,
+      )
+      # pylint: enable=protected-access
+      # pytype: enable=attribute-error
+
+  @property
+  def shell_stats(self) -> adb_shell.ShellStats:
+    """Returns latencies of shell requests, by the path that served them."""
+    return copy.deepcopy(self._shell_stats)
+
+  def _run_in_shell(
+      self, call: adb_pb2.AdbRequest, command: str
+  ) -> Optional[adb_pb2.AdbResponse]:
+    """Runs `command` in the persistent shell; None if it did not start."""
+    try:
+      exit_code, output = self._shell.run(
+          command, timeout_sec=call.timeout_sec or None
+      )
+    except adb_shell.CommandInterruptedError as e:
+      logging.warning('Persistent shell was interrupted running %r.', command)
+      return adb_pb2.AdbResponse(
+          status=(
+              adb_pb2.AdbResponse.Status.TIMEOUT
+              if e.timed_out
+              else adb_pb2.AdbResponse.Status.ADB_ERROR
+          ),
+          error_message=str(e),
+      )
+    except (OSError, TimeoutError, adb_shell.ShellClosedError):
+      logging.warning('Persistent shell failed to run %r.', command)
+      return None
+    return adb_shell.to_response(call, output, exit_code)
+
+  @property
+  def tracer(self) -> adb_tracing.AdbTracer:
+    """Returns the tracer recording this controller's ADB requests."""
+    return self._tracer
+
+  def set_tracer(self, tracer: adb_tracing.AdbTracer) -> None:
+    """Records ADB requests on `tracer` instead of the process-wide one."""
+    self._tracer = tracer
+
+  def execute_adb_call(self, call: adb_pb2.AdbRequest) -> adb_pb2.AdbResponse:
+    with self._env_lock:
+      return adb_tracing.traced_call(
+          self._execute_adb_call, call, self._tracer
+      )
+
+  def _execute_adb_call(
+      self, call: adb_pb2.AdbRequest
+  ) -> adb_pb2.AdbResponse:
+    command = adb_shell.to_shell_command(call)
+    if command is None:
+      if (
+          self._shell is not None
+          and call.WhichOneof('command') == 'generic'
+          and call.generic.args
+          and call.generic.args[0] in adb_shell.SESSION_RESETTING_COMMANDS
+      ):
+        # The shell dies with adbd; reopen it lazily, e.g. as root.
+        self._shell.close()
+      return self._env.execute_adb_call(call)
+
+    start = time.monotonic()
+    if self._shell is not None:
+      response = self._run_in_shell(call, command)
+      if response is not None:
+        self._shell_stats.persistent.add(time.monotonic() - start)
+        return response
+      self._shell_stats.fallbacks += 1
+      self._tracer.record_retry(adb_tracing.classify(call))
+      start = time.monotonic()
+    response = self._env.execute_adb_call(call)
+    self._shell_stats.adb.add(time.monotonic() - start)
+    return response
+
+  def close(self) -> None:
+    if self._shell is not None:
+      self._shell.close()
+    self._env.close()
+
   def refresh_env(self):
-    # pylint: disable=protected-access
-    # pytype: disable=attribute-error
-    # Reconnect to emulator and reload a11y wrapper in case we lose connection.
-    self._env = get_controller(
-        console_port=self.env._coordinator._simulator._config.emulator_launcher.emulator_console_port,
-        adb_path=self.env._coordinator._simulator._config.adb_controller.adb_path,
-    ).env
-    # pylint: enable=protected-access
-    # pytype: enable=attribute-error
+    """Reconnects to the device and restarts a11y forwarding.
+
+    Holds the lock that ADB requests and a11y reads take, so that calls from
+    other threads, e.g. an agent's step while a health monitor reconnects,
+    never see a half torn-down connection.
+    """
+    with self._env_lock:
+      self.invalidate_geometry_cache()
+      self.invalidate_airplane_mode_cache()
+      if self._shell is not None:
+        self._shell.close()
+      if _provides_a11y_tree(self._env):
+        return  # Nothing to reconnect to.
+      # pylint: disable=protected-access
+      # pytype: disable=attribute-error
+      # Reconnect to emulator and reload a11y wrapper in case we lose
+      # connection.
+      config = self.env._coordinator._simulator._config
+      self._env = get_controller(
+          console_port=config.emulator_launcher.emulator_console_port,
+          adb_path=config.adb_controller.adb_path,
+          grpc_port=config.emulator_launcher.grpc_port,
+      ).env
+      # pylint: enable=protected-access
+      # pytype: enable=attribute-error
+      self._a11y_activity_counts = None
+
+  def last_a11y_event_time(self) -> Optional[float]:
+    """Returns the host time of the most recent a11y activity, if known.
+
+    Activity is any accessibility event or forest pushed by the a11y forwarder
+    since the previous check. The returned value is the `time.monotonic()` time
+    at which the activity was first noticed, so it may lag the device slightly.
+    Checking is local to the host and does not issue any ADB calls.
+
+    Returns:
+      The time of the latest activity, or None if it cannot be determined.
+    """
+    with self._env_lock:
+      try:
+        extras = self._env.accumulate_new_extras()  # pytype:disable=attribute-error
+      except Exception:  # pylint: disable=broad-exception-caught
+        logging.warning('Could not read a11y extras to track UI activity.')
+        return None
+      self._track_a11y_activity(extras)
+      return self._last_a11y_activity_time
+
+  def _track_a11y_activity(self, extras: dict[str, Any]) -> None:
+    counts = tuple(len(extras.get(key, ())) for key in _A11Y_ACTIVITY_KEYS)
+    if counts != self._a11y_activity_counts:
+      self._a11y_activity_counts = counts
+      self._last_a11y_activity_time = time.monotonic()
+
+  def ping_a11y(self, max_idle_secs: float = _A11Y_MAX_IDLE_SECS) -> bool:
+    """Returns whether the a11y forwarder has pushed anything recently.
+
+    The forwarder pushes events and forests whenever the UI changes, at the
+    latest when the status bar clock ticks over, so a forwarder that stays
+    silent for `max_idle_secs` is presumed dead. The extras of the a11y
+    wrapper accumulate, so only their growth is new activity; see
+    `last_a11y_event_time`. The first read after (re)connecting counts as
+    activity.
+
+    Unlike `get_a11y_forest`, this neither retries nor reconnects, and issues
+    no ADB calls, so it is cheap enough to call periodically.
+
+    Args:
+      max_idle_secs: How long the forwarder may go without pushing anything.
+    """
+    last_activity = self.last_a11y_event_time()
+    return (
+        last_activity is not None
+        and time.monotonic() - last_activity <= max_idle_secs
+    )
 
   def get_a11y_forest(
       self,
   ) -> android_accessibility_forest_pb2.AndroidAccessibilityForest:
     """Returns the most recent a11y forest from the device."""
-    try:
-      return get_a11y_tree(self._env)
-    except RuntimeError:
-      print(
-          'Could not get a11y tree. Reconnecting to Android, reinitializing'
-          ' AndroidEnv, and restarting a11y forwarding.'
-      )
-      self.refresh_env()
-      return get_a11y_tree(self._env)
+    with self._env_lock:
+      try:
+        forest = get_a11y_tree(
+            self._env, check_airplane_mode=not self._airplane_mode_checked
+        )
+      except RuntimeError:
+        print(
+            'Could not get a11y tree. Reconnecting to Android, reinitializing'
+            ' AndroidEnv, and restarting a11y forwarding.'
+        )
+        self.refresh_env()
+        forest = get_a11y_tree(self._env)
+      self._airplane_mode_checked = True
+      return forest
 
   def pull_file(
       self, remote_db_file_path: str, timeout_sec: Optional[float] = None
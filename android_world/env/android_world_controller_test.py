@@ -14,11 +14,16 @@
 
 import os
 import tempfile
+import threading
+import time
 from unittest import mock
 
 from absl.testing import absltest
 from android_env import env_interface
+from android_env.proto import adb_pb2
 from android_env.wrappers import a11y_grpc_wrapper
+from android_world.env import adb_shell
+from android_world.env import adb_tracing
 from android_world.env import adb_utils
 from android_world.env import android_world_controller
 from android_world.env import representation_utils
@@ -102,19 +107,77 @@ class AndroidWorldControllerTest(absltest.TestCase):
 
     self.assertEqual(env.device_screen_size, (100, 200))
 
-  @mock.patch.object(adb_utils, 'get_logical_screen_size')
+  @mock.patch.object(adb_utils, 'get_physical_frame_boundary')
+  @mock.patch.object(adb_utils, 'get_orientation')
+  def test_geometry_cache(
+      self, mock_get_orientation, mock_get_physical_frame_boundary
+  ):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    mock_get_orientation.return_value = 1
+    mock_get_physical_frame_boundary.return_value = (0, 0, 200, 100)
+
+    for _ in range(3):
+      self.assertEqual(env.orientation, 1)
+      self.assertEqual(env.physical_frame_boundary, (0, 0, 200, 100))
+
+    mock_get_orientation.assert_called_once()
+    mock_get_physical_frame_boundary.assert_called_once_with(
+        env._env, orientation=1
+    )
+    stats = env.geometry_cache_stats
+    self.assertEqual(stats.misses, 2)
+    self.assertEqual(stats.hits, 5)
+
+    adb_utils.change_orientation('portrait', env)
+    self.assertEqual(env.orientation, 1)
+
+    self.assertEqual(mock_get_orientation.call_count, 2)
+    self.assertEqual(env.geometry_cache_stats.invalidations, 1)
+
   @mock.patch.object(android_world_controller, 'get_a11y_tree')
-  @mock.patch.object(representation_utils, 'forest_to_ui_elements')
-  def test_process_timestep(
-      self, mock_forest_to_ui, mock_get_a11y_tree, mock_get_logical_screen_size
+  @mock.patch.object(adb_utils, 'get_physical_frame_boundary')
+  @mock.patch.object(adb_utils, 'get_orientation')
+  def test_observation_detects_rotation(
+      self,
+      mock_get_orientation,
+      mock_get_physical_frame_boundary,
+      unused_mock_get_a11y_tree,
   ):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    mock_get_physical_frame_boundary.side_effect = (
+        lambda unused_env, orientation: (0, 0, orientation, orientation)
+    )
+    observe = lambda: env._process_timestep(
+        dm_env.TimeStep(
+            observation={}, reward=None, discount=None, step_type=None
+        )
+    )
+
+    # The app opened on the home screen keeps portrait.
+    mock_get_orientation.return_value = 0
+    observe()
+    self.assertEqual(env.orientation, 0)
+    self.assertEqual(env.physical_frame_boundary, (0, 0, 0, 0))
+    observe()
+    self.assertEqual(env.physical_frame_boundary, (0, 0, 0, 0))
+    self.assertEqual(mock_get_physical_frame_boundary.call_count, 1)
+
+    # The next app rotates the screen by itself.
+    mock_get_orientation.return_value = 1
+    observe()
+    self.assertEqual(env.orientation, 1)
+    self.assertEqual(env.physical_frame_boundary, (0, 0, 1, 1))
+    self.assertEqual(env.geometry_cache_stats.invalidations, 1)
+
+  @mock.patch.object(android_world_controller, 'get_a11y_tree')
+  @mock.patch.object(representation_utils, 'forest_to_ui_elements')
+  def test_process_timestep(self, mock_forest_to_ui, mock_get_a11y_tree):
     mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
     env = android_world_controller.AndroidWorldController(mock_base_env)
     mock_forest = mock.Mock()
-    mock_ui_elements = mock.Mock()
-    mock_get_logical_screen_size.return_value = (100, 200)
     mock_get_a11y_tree.return_value = mock_forest
-    mock_forest_to_ui.return_value = mock_ui_elements
     timestep = dm_env.TimeStep(
         observation={}, reward=None, discount=None, step_type=None
     )
@@ -122,15 +185,12 @@ class AndroidWorldControllerTest(absltest.TestCase):
     processed_timestep = env._process_timestep(timestep)
 
     self.assertEqual(processed_timestep.observation['forest'], mock_forest)
-    self.assertEqual(
-        processed_timestep.observation['ui_elements'], mock_ui_elements
-    )
-    mock_forest_to_ui.assert_called_with(
-        mock_forest,
-        exclude_invisible_elements=True,
-    )
+    # UI elements are extracted lazily by interface.State.
+    self.assertNotIn('ui_elements', processed_timestep.observation)
+    mock_forest_to_ui.assert_not_called()
 
-  @mock.patch.object(adb_utils, 'check_airplane_mode')
+  @mock.patch.object(time, 'sleep')
+  @mock.patch.object(adb_utils, 'check_airplane_mode', return_value=False)
   @mock.patch.object(android_world_controller, 'get_controller')
   @mock.patch.object(android_world_controller, '_has_wrapper')
   @mock.patch.object(
@@ -142,24 +202,275 @@ class AndroidWorldControllerTest(absltest.TestCase):
       mock_has_wrapper,
       mock_get_controller,
       mock_check_airplane_mode,
+      mock_sleep,
   ):
     del mock_has_wrapper, mock_get_controller, mock_check_airplane_mode
     mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
     env = android_world_controller.AndroidWorldController(mock_base_env)
-    unused_mock_check_airplane_mode = False
-    env._env.accumulate_new_extras.side_effect = [
-        {},
-        {},
-        {},
-        {},
-        {},
+    env._env.accumulate_new_extras.return_value = {}
+    mock_refresh_env.side_effect = lambda: setattr(
+        env._env.accumulate_new_extras,
+        'return_value',
         {'accessibility_tree': ['success']},
-    ]
+    )
 
     forest = env.get_a11y_forest()
 
     self.assertEqual(forest, 'success')
     mock_refresh_env.assert_called_once()
+    # The tree was awaited for about 5 s before reconnecting.
+    self.assertAlmostEqual(
+        sum(c.args[0] for c in mock_sleep.call_args_list), 5.0
+    )
+
+  @mock.patch.object(android_world_controller, 'get_controller')
+  def test_refresh_env_reconnects_to_same_emulator(self, mock_get_controller):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    env._env._coordinator = mock.Mock()
+    config = env._env._coordinator._simulator._config
+    config.emulator_launcher.emulator_console_port = 5556
+    config.emulator_launcher.grpc_port = 8555
+    config.adb_controller.adb_path = '/adb'
+
+    env.refresh_env()
+
+    mock_get_controller.assert_called_once_with(
+        console_port=5556, adb_path='/adb', grpc_port=8555
+    )
+    self.assertIs(env.env, mock_get_controller.return_value.env)
+
+  @mock.patch.object(time, 'sleep')
+  @mock.patch.object(adb_utils, 'check_airplane_mode', return_value=False)
+  @mock.patch.object(android_world_controller, '_has_wrapper')
+  def test_airplane_mode_checked_once_per_session(
+      self, unused_mock_has_wrapper, mock_check_airplane_mode, mock_sleep
+  ):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    env._env.accumulate_new_extras.side_effect = [
+        {'accessibility_tree': ['forest1']},
+        {'accessibility_tree': ['forest2']},
+        {},
+        {'accessibility_tree': ['forest3']},
+        {'accessibility_tree': ['forest4']},
+    ]
+
+    self.assertEqual(env.get_a11y_forest(), 'forest1')
+    self.assertEqual(env.get_a11y_forest(), 'forest2')
+    self.assertEqual(mock_check_airplane_mode.call_count, 1)
+    # A missing tree triggers another check.
+    self.assertEqual(env.get_a11y_forest(), 'forest3')
+    self.assertEqual(mock_check_airplane_mode.call_count, 2)
+    mock_sleep.assert_called_once_with(0.05)
+    adb_utils.toggle_airplane_mode('off', env)
+    self.assertEqual(env.get_a11y_forest(), 'forest4')
+    self.assertEqual(mock_check_airplane_mode.call_count, 3)
+
+  @mock.patch.object(time, 'sleep')
+  @mock.patch.object(adb_utils, 'check_airplane_mode', return_value=False)
+  @mock.patch.object(android_world_controller, '_has_wrapper')
+  def test_get_a11y_tree_backs_off(
+      self, unused_mock_has_wrapper, unused_mock_check_airplane_mode, mock_sleep
+  ):
+    mock_env = mock.Mock()
+    mock_env.accumulate_new_extras.return_value = {}
+
+    with self.assertRaises(RuntimeError):
+      android_world_controller.get_a11y_tree(
+          mock_env, max_retries=5, sleep_duration=0.3
+      )
+
+    # Fast at first, but as patient in total as 5 waits of 0.3 s.
+    sleeps = [c.args[0] for c in mock_sleep.call_args_list]
+    self.assertSequenceAlmostEqual(
+        sleeps, [0.05, 0.1, 0.2, 0.3, 0.3, 0.3, 0.25]
+    )
+    self.assertAlmostEqual(sum(sleeps), 1.5)
+    self.assertEqual(mock_env.accumulate_new_extras.call_count, 8)
+
+  @mock.patch('time.monotonic')
+  def test_last_a11y_event_time(self, mock_monotonic):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    env._env.accumulate_new_extras.side_effect = [
+        {'accessibility_tree': ['forest']},
+        {'accessibility_tree': ['forest']},
+        {'accessibility_tree': ['forest'], 'full_event': ['event']},
+    ]
+    mock_monotonic.side_effect = [10.0, 20.0]
+
+    self.assertEqual(env.last_a11y_event_time(), 10.0)
+    self.assertEqual(env.last_a11y_event_time(), 10.0)
+    self.assertEqual(env.last_a11y_event_time(), 20.0)
+
+  @mock.patch('time.monotonic')
+  def test_ping_a11y(self, mock_monotonic):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    # Extras accumulate, like those of the a11y wrapper.
+    env._env.accumulate_new_extras.side_effect = [
+        {'accessibility_tree': ['forest']},
+        {'accessibility_tree': ['forest']},
+        {'accessibility_tree': ['forest']},
+        {'accessibility_tree': ['forest', 'forest']},
+        RuntimeError('server is gone'),
+    ]
+    mock_monotonic.side_effect = [
+        0.0,  # Activity noticed.
+        0.0,
+        50.0,
+        100.0,
+        110.0,  # Activity noticed.
+        110.0,
+    ]
+
+    self.assertTrue(env.ping_a11y(max_idle_secs=60.0))
+    self.assertTrue(env.ping_a11y(max_idle_secs=60.0))
+    # The forwarder went silent.
+    self.assertFalse(env.ping_a11y(max_idle_secs=60.0))
+    self.assertTrue(env.ping_a11y(max_idle_secs=60.0))
+    self.assertFalse(env.ping_a11y(max_idle_secs=60.0))
+    env._env.execute_adb_call.assert_not_called()
+
+  @mock.patch.object(android_world_controller, 'get_controller')
+  def test_adb_calls_wait_for_refresh_env(self, mock_get_controller):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    env._env._coordinator = mock.Mock()
+    old_env = env._env
+    new_env = mock_get_controller.return_value.env
+    new_env.execute_adb_call.return_value = adb_pb2.AdbResponse()
+    reconnecting = threading.Event()
+    resume = threading.Event()
+
+    def reconnect(**unused_kwargs):
+      reconnecting.set()
+      resume.wait(timeout=10)
+      return mock.DEFAULT
+
+    mock_get_controller.side_effect = reconnect
+    refresh = threading.Thread(target=env.refresh_env)
+    refresh.start()
+    reconnecting.wait(timeout=10)
+    responses = []
+    call = threading.Thread(
+        target=lambda: responses.append(
+            env.execute_adb_call(adb_pb2.AdbRequest())
+        )
+    )
+    call.start()
+    call.join(timeout=0.1)
+    self.assertEmpty(responses)
+    resume.set()
+    refresh.join()
+    call.join()
+
+    self.assertLen(responses, 1)
+    old_env.execute_adb_call.assert_not_called()
+    new_env.execute_adb_call.assert_called_once()
+
+  def test_last_a11y_event_time_unavailable(self):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    env._env.accumulate_new_extras.side_effect = RuntimeError('no reset')
+
+    self.assertIsNone(env.last_a11y_event_time())
+
+  @mock.patch.object(adb_shell, 'PersistentShell', autospec=True)
+  def test_persistent_shell(self, mock_shell_cls):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    env._env._coordinator = mock.MagicMock()
+    env._env.execute_adb_call.return_value = (
+        fake_adb_responses.create_successful_generic_response('slow')
+    )
+    mock_shell = mock_shell_cls.return_value
+    mock_shell.run.side_effect = [
+        (0, b'fast'),
+        (1, b'No such file'),
+        TimeoutError(),
+        adb_shell.CommandInterruptedError('interrupted', timed_out=True),
+        adb_shell.ShellClosedError(),
+    ]
+    shell_request = adb_pb2.AdbRequest(
+        generic=adb_pb2.AdbRequest.GenericRequest(args=['shell', 'ls', '/'])
+    )
+
+    env.enable_persistent_shell()
+    fast = env.execute_adb_call(shell_request)
+    failed = env.execute_adb_call(shell_request)
+    timed_out = env.execute_adb_call(shell_request)
+    interrupted = env.execute_adb_call(shell_request)
+    closed = env.execute_adb_call(shell_request)
+    env.execute_adb_call(
+        adb_pb2.AdbRequest(
+            generic=adb_pb2.AdbRequest.GenericRequest(args=['root'])
+        )
+    )
+
+    self.assertEqual(fast.generic.output, b'fast')
+    mock_shell.run.assert_called_with('ls /', timeout_sec=None)
+    # Commands that ran are not run again through adb.
+    self.assertEqual(failed.status, adb_pb2.AdbResponse.Status.ADB_ERROR)
+    self.assertEqual(failed.generic.output, b'No such file')
+    self.assertEqual(interrupted.status, adb_pb2.AdbResponse.Status.TIMEOUT)
+    # Commands that did not start fall back to adb.
+    self.assertEqual(timed_out.generic.output, b'slow')
+    self.assertEqual(closed.generic.output, b'slow')
+    self.assertEqual(env._env.execute_adb_call.call_count, 3)
+    mock_shell.close.assert_called_once()
+    stats = env.shell_stats
+    self.assertEqual(stats.persistent.count, 3)
+    self.assertEqual(stats.adb.count, 2)
+    self.assertEqual(stats.fallbacks, 2)
+
+  def test_shell_requests_without_persistent_shell(self):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+
+    adb_utils.put_settings(
+        adb_pb2.AdbRequest.SettingsRequest.Namespace.GLOBAL, 'key', '1', env
+    )
+
+    env._env.execute_adb_call.assert_called_once()
+    self.assertEqual(env.shell_stats.adb.count, 1)
+    self.assertEqual(env.shell_stats.persistent.count, 0)
+
+  def test_adb_calls_are_traced(self):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    env._env.execute_adb_call.return_value = (
+        fake_adb_responses.create_successful_generic_response('')
+    )
+    tracer = adb_tracing.AdbTracer()
+    env.set_tracer(tracer)
+
+    with adb_tracing.task_context('TapTask'):
+      env.execute_adb_call(
+          adb_pb2.AdbRequest(
+              generic=adb_pb2.AdbRequest.GenericRequest(
+                  args=['shell', 'input', 'tap', '1', '2']
+              )
+          )
+      )
+      with adb_tracing.step_context(0):
+        env.execute_adb_call(
+            adb_pb2.AdbRequest(
+                generic=adb_pb2.AdbRequest.GenericRequest(
+                    args=['shell', 'dumpsys', 'window']
+                )
+            )
+        )
+
+    histograms = tracer.histograms()
+    self.assertEqual(histograms[adb_tracing.TAP].count, 1)
+    self.assertEqual(histograms[adb_tracing.DUMPSYS].count, 1)
+    self.assertEqual(tracer.task_stats()['TapTask'].count, 2)
+    self.assertCountEqual(
+        [(s.task, s.step) for s in tracer.slowest()],
+        [('TapTask', None), ('TapTask', 0)],
+    )
 
   def test_pull_file(self):
     file_contents = 'test file contents'
@@ -0,0 +1,120 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""asyncio front end for `interface.AsyncEnv`.
+
+Device calls block on ADB and gRPC, so `AsyncioEnv` runs them in the event
+loop's default executor. A thread is only borrowed while a call is in flight,
+so one event loop can drive several emulators and overlap their device calls
+with LLM requests and other coroutines:
+
+```
+async def main():
+  envs = [asyncio_env.AsyncioEnv(env) for env in pool.envs]
+  states = await asyncio.gather(*(env.get_state() for env in envs))
+```
+
+Calls on the same device are serialized, like they are for a synchronous
+caller.
+"""
+
+import asyncio
+from collections.abc import Callable
+from typing import Any, Optional, TypeVar
+
+from android_world.env import android_world_controller
+from android_world.env import interface
+from android_world.env import json_action
+from android_world.env import ui_stability
+
+_T = TypeVar('_T')
+
+
+class AsyncioEnv:
+  """Awaitable wrapper of an `interface.AsyncEnv`."""
+
+  def __init__(self, env: interface.AsyncEnv):
+    self._env = env
+    self._lock = asyncio.Lock()
+
+  @property
+  def env(self) -> interface.AsyncEnv:
+    """Returns the wrapped, synchronous environment."""
+    return self._env
+
+  @property
+  def controller(self) -> android_world_controller.AndroidWorldController:
+    return self._env.controller
+
+  async def _call(self, fn: Callable[..., _T], *args: Any, **kwargs: Any) -> _T:
+    async with self._lock:
+      return await asyncio.to_thread(fn, *args, **kwargs)
+
+  async def reset(self, go_home: bool = False) -> interface.State:
+    """See `interface.AsyncEnv.reset`."""
+    return await self._call(self._env.reset, go_home=go_home)
+
+  async def get_state(self, wait_to_stabilize: bool = False) -> interface.State:
+    """See `interface.AsyncEnv.get_state`."""
+    return await self._call(
+        self._env.get_state, wait_to_stabilize=wait_to_stabilize
+    )
+
+  async def execute_action(
+      self,
+      action: json_action.JSONAction,
+      state: Optional[interface.State] = None,
+  ) -> None:
+    """See `interface.AsyncEnv.execute_action`."""
+    await self._call(self._env.execute_action, action, state=state)
+
+  async def wait_for_transition(
+      self, policy: Optional[ui_stability.WaitPolicy] = None
+  ) -> interface.State:
+    """See `interface.AsyncEnv.wait_for_transition`."""
+    return await self._call(self._env.wait_for_transition, policy)
+
+  async def display_message(self, message: str, header: str = '') -> None:
+    """See `interface.AsyncEnv.display_message`."""
+    await self._call(self._env.display_message, message, header=header)
+
+  async def hide_automation_ui(self) -> None:
+    """See `interface.AsyncEnv.hide_automation_ui`."""
+    await self._call(self._env.hide_automation_ui)
+
+  async def foreground_activity_name(self) -> str:
+    """See `interface.AsyncEnv.foreground_activity_name`."""
+    return await self._call(lambda: self._env.foreground_activity_name)
+
+  async def device_screen_size(self) -> tuple[int, int]:
+    """See `interface.AsyncEnv.device_screen_size`."""
+    return await self._call(lambda: self._env.device_screen_size)
+
+  async def logical_screen_size(self) -> tuple[int, int]:
+    """See `interface.AsyncEnv.logical_screen_size`."""
+    return await self._call(lambda: self._env.logical_screen_size)
+
+  async def orientation(self) -> int:
+    """See `AndroidWorldController.orientation`."""
+    return await self._call(lambda: self._env.controller.orientation)
+
+  async def physical_frame_boundary(self) -> tuple[int, int, int, int]:
+    """See `AndroidWorldController.physical_frame_boundary`."""
+    return await self._call(
+        lambda: self._env.controller.physical_frame_boundary
+    )
+
+  async def close(self) -> None:
+    """See `interface.AsyncEnv.close`."""
+    await self._call(self._env.close)
@@ -0,0 +1,86 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import threading
+
+from absl.testing import absltest
+from android_world.env import asyncio_env
+from android_world.env import interface
+from android_world.env import json_action
+from android_world.utils import test_utils
+
+
+class _BlockingEnv(test_utils.FakeAsyncEnv):
+  """Fake env whose get_state blocks until `barrier` is passed."""
+
+  def __init__(self, barrier: threading.Barrier):
+    super().__init__()
+    self._barrier = barrier
+    self.active = 0
+    self.max_active = 0
+    self._active_lock = threading.Lock()
+
+  def get_state(self, wait_to_stabilize: bool = False) -> interface.State:
+    with self._active_lock:
+      self.active += 1
+      self.max_active = max(self.max_active, self.active)
+    try:
+      self._barrier.wait()
+      return super().get_state(wait_to_stabilize)
+    finally:
+      with self._active_lock:
+        self.active -= 1
+
+
+class AsyncioEnvTest(absltest.TestCase):
+
+  def test_drives_several_devices_concurrently(self):
+    # Both calls must be in flight at once to pass the barrier.
+    barrier = threading.Barrier(2, timeout=10)
+    envs = [asyncio_env.AsyncioEnv(_BlockingEnv(barrier)) for _ in range(2)]
+
+    async def main():
+      return await asyncio.gather(*(env.get_state() for env in envs))
+
+    states = asyncio.run(main())
+
+    self.assertLen(states, 2)
+    self.assertIsInstance(states[0], interface.State)
+
+  def test_serializes_calls_on_one_device(self):
+    blocking_env = _BlockingEnv(threading.Barrier(1))
+    env = asyncio_env.AsyncioEnv(blocking_env)
+
+    async def main():
+      await asyncio.gather(*(env.get_state() for _ in range(5)))
+
+    asyncio.run(main())
+
+    self.assertEqual(blocking_env.max_active, 1)
+
+  def test_forwards_calls(self):
+    fake_env = test_utils.FakeAsyncEnv()
+    env = asyncio_env.AsyncioEnv(fake_env)
+
+    async def main():
+      await env.execute_action(json_action.JSONAction(action_type='wait'))
+      return await env.logical_screen_size()
+
+    self.assertEqual(asyncio.run(main()), (100, 100))
+    self.assertIs(env.controller, fake_env.controller)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -97,6 +97,7 @@ def load_and_setup_env(
     freeze_datetime: bool = True,
     adb_path: str = android_world_controller.DEFAULT_ADB_PATH,
     grpc_port: int = 8554,
+    persistent_adb_shell: bool = False,
 ) -> interface.AsyncEnv:
   """Create environment with `get_env()` and perform env setup and validation.
 
@@ -116,10 +117,15 @@ def load_and_setup_env(
       2023, to ensure consistent benchmarking.
     adb_path: The location of the adb binary.
     grpc_port: The port for gRPC communication with the emulator.
+    persistent_adb_shell: Whether to serve shell ADB requests from one
+      persistent `adb shell` process; see
+      `AndroidWorldController.enable_persistent_shell`.
 
   Returns:
     An interactable Android environment.
   """
   env = _get_env(console_port, adb_path, grpc_port)
+  if persistent_adb_shell:
+    env.controller.enable_persistent_shell()
   setup_env(env, emulator_setup, freeze_datetime)
   return env
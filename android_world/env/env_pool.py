@@ -0,0 +1,310 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pool of environments that drives many emulators from one process.
+
+Emulators must be launched beforehand on consecutive ports, e.g.:
+
+```
+for i in 0 1 2 3; do
+  ~/Android/Sdk/emulator/emulator -avd $AVD_NAME -no-snapshot \\
+      -port $((5554 + 2 * i)) -grpc $((8554 + i)) &
+done
+```
+
+Workers lease environments from the pool:
+
+```
+pool = env_pool.EnvPool(num_envs=4)
+with pool.lease() as env:
+  ...
+```
+"""
+
+from collections.abc import Callable, Iterator
+import concurrent.futures
+import contextlib
+import copy
+import dataclasses
+import queue
+import threading
+import time
+from typing import Optional
+
+from absl import logging
+from android_world.env import android_world_controller
+from android_world.env import env_launcher
+from android_world.env import health_monitor
+from android_world.env import interface
+
+# Console ports of consecutive emulators are 2 apart, since each emulator also
+# uses console_port + 1 for adb.
+CONSOLE_PORT_STRIDE = 2
+
+# Granularity at which blocked lease() calls notice that the pool emptied.
+_LEASE_POLL_SECS = 1.0
+
+EnvFactory = Callable[[int, int], interface.AsyncEnv]
+
+
+@dataclasses.dataclass
+class DeviceStats:
+  """Utilization statistics for one pooled device.
+
+  Attributes:
+    console_port: Emulator console port.
+    grpc_port: Emulator gRPC port.
+    created_at: `time.monotonic()` time the environment was created.
+    leases: Number of completed leases.
+    busy_secs: Total time the device spent leased.
+    failures: Number of failed health checks.
+    recycles: Number of successful reconnections via `refresh_env`.
+    is_healthy: False once the device could not be recovered; it is then no
+      longer leased out.
+    health: Statistics of the device's background health monitor, if any.
+  """
+
+  console_port: int
+  grpc_port: int
+  created_at: float
+  leases: int = 0
+  busy_secs: float = 0.0
+  failures: int = 0
+  recycles: int = 0
+  is_healthy: bool = True
+  health: Optional[health_monitor.HealthStats] = None
+
+  def utilization(self, now: Optional[float] = None) -> float:
+    """Returns the fraction of the device's lifetime spent leased."""
+    now = time.monotonic() if now is None else now
+    lifetime = now - self.created_at
+    return self.busy_secs / lifetime if lifetime > 0 else 0.0
+
+
+def is_healthy(env: interface.AsyncEnv) -> bool:
+  """Returns whether the device answers a trivial ADB shell command."""
+  return health_monitor.ping_adb(env.controller)
+
+
+class EnvPool:
+  """Creates, health-checks and leases environments on consecutive ports.
+
+  Environment i is connected to console port
+  `first_console_port + CONSOLE_PORT_STRIDE * i` and gRPC port
+  `first_grpc_port + i`. All methods are thread-safe.
+  """
+
+  def __init__(
+      self,
+      num_envs: int,
+      first_console_port: int = 5554,
+      first_grpc_port: int = 8554,
+      adb_path: str = android_world_controller.DEFAULT_ADB_PATH,
+      emulator_setup: bool = False,
+      freeze_datetime: bool = True,
+      env_factory: Optional[EnvFactory] = None,
+      health_check_interval_secs: Optional[float] = None,
+  ):
+    """Connects to `num_envs` running emulators.
+
+    Args:
+      num_envs: Number of environments in the pool.
+      first_console_port: Console port of the first emulator.
+      first_grpc_port: gRPC port of the first emulator.
+      adb_path: The location of the adb binary.
+      emulator_setup: Perform first-time app setup on each environment.
+      freeze_datetime: Whether to freeze each device's datetime.
+      env_factory: Creates an environment from (console_port, grpc_port).
+        Defaults to `env_launcher.load_and_setup_env`.
+      health_check_interval_secs: If set, each device is health-checked and
+        reconnected in the background at this interval, while leased or not;
+        see `health_monitor.HealthMonitor`.
+
+    Raises:
+      RuntimeError: If no environment passes its initial health check.
+    """
+    if num_envs < 1:
+      raise ValueError(f'num_envs must be positive, got {num_envs}.')
+    if env_factory is None:
+      env_factory = lambda console_port, grpc_port: (
+          env_launcher.load_and_setup_env(
+              console_port=console_port,
+              emulator_setup=emulator_setup,
+              freeze_datetime=freeze_datetime,
+              adb_path=adb_path,
+              grpc_port=grpc_port,
+          )
+      )
+    self._lock = threading.Lock()
+    self._available: queue.Queue[interface.AsyncEnv] = queue.Queue()
+    self._envs: list[interface.AsyncEnv] = []
+    self._stats: dict[int, DeviceStats] = {}
+    self._monitors: dict[int, health_monitor.HealthMonitor] = {}
+
+    ports = [
+        (first_console_port + CONSOLE_PORT_STRIDE * i, first_grpc_port + i)
+        for i in range(num_envs)
+    ]
+    # Connecting and setting up a device takes a while, so do it in parallel.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_envs) as pool:
+      futures = [pool.submit(env_factory, *port) for port in ports]
+    for (console_port, grpc_port), future in zip(ports, futures):
+      try:
+        env = future.result()
+      except Exception:  # pylint: disable=broad-exception-caught
+        logging.exception(
+            'Could not create environment on console port %d.', console_port
+        )
+        continue
+      self._stats[id(env)] = DeviceStats(
+          console_port=console_port,
+          grpc_port=grpc_port,
+          created_at=time.monotonic(),
+      )
+      if self._check_health(env):
+        self._envs.append(env)
+        self._available.put(env)
+      else:
+        self._close_env(env)
+    if not self._envs:
+      raise RuntimeError('No environment in the pool passed health checks.')
+    if health_check_interval_secs is not None:
+      for env in self._envs:
+        monitor = health_monitor.HealthMonitor(
+            env.controller, interval_secs=health_check_interval_secs
+        )
+        monitor.start()
+        self._monitors[id(env)] = monitor
+    logging.info('Environment pool ready with %d devices.', len(self._envs))
+
+  def __len__(self) -> int:
+    """Returns the number of healthy environments, leased or not."""
+    with self._lock:
+      return sum(self._stats[id(env)].is_healthy for env in self._envs)
+
+  @property
+  def envs(self) -> list[interface.AsyncEnv]:
+    """Returns the environments that passed their initial health check."""
+    return list(self._envs)
+
+  def _check_health(self, env: interface.AsyncEnv) -> bool:
+    """Health-checks `env`, reconnecting once if needed."""
+    if is_healthy(env):
+      return True
+    stats = self._stats[id(env)]
+    with self._lock:
+      stats.failures += 1
+    logging.warning(
+        'Device on console port %d is unhealthy; reconnecting.',
+        stats.console_port,
+    )
+    try:
+      env.controller.refresh_env()
+    except Exception:  # pylint: disable=broad-exception-caught
+      logging.exception('Reconnecting to device failed.')
+    recovered = is_healthy(env)
+    with self._lock:
+      if recovered:
+        stats.recycles += 1
+      else:
+        stats.is_healthy = False
+    if not recovered:
+      logging.error(
+          'Removing device on console port %d from the pool.',
+          stats.console_port,
+      )
+    return recovered
+
+  @contextlib.contextmanager
+  def lease(
+      self, timeout: Optional[float] = None
+  ) -> Iterator[interface.AsyncEnv]:
+    """Leases an environment for the duration of the context.
+
+    If the body raises, the environment is health-checked and recycled through
+    `refresh_env` before being returned to the pool; environments that cannot
+    be recovered are retired.
+
+    Args:
+      timeout: Maximum time to wait for a free environment; None waits until
+        one is released.
+
+    Yields:
+      An environment that is not leased to anyone else.
+
+    Raises:
+      TimeoutError: If no environment became available within `timeout`.
+      RuntimeError: If every environment in the pool has been retired.
+    """
+    env = self._acquire(timeout)
+    stats = self._stats[id(env)]
+    start = time.monotonic()
+    healthy = True
+    try:
+      yield env
+    except Exception:
+      healthy = self._check_health(env)
+      raise
+    finally:
+      with self._lock:
+        stats.leases += 1
+        stats.busy_secs += time.monotonic() - start
+      if healthy:
+        self._available.put(env)
+      else:
+        self._retire(env)
+
+  def _acquire(self, timeout: Optional[float]) -> interface.AsyncEnv:
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+      wait = _LEASE_POLL_SECS
+      if deadline is not None:
+        wait = min(wait, max(0.0, deadline - time.monotonic()))
+      try:
+        return self._available.get(timeout=wait)
+      except queue.Empty:
+        pass
+      if not len(self):
+        raise RuntimeError('Every environment in the pool has been retired.')
+      if deadline is not None and time.monotonic() >= deadline:
+        raise TimeoutError(f'No environment became free in {timeout} s.')
+
+  def stats(self) -> list[DeviceStats]:
+    """Returns a snapshot of per-device statistics, ordered by console port."""
+    with self._lock:
+      snapshot = {key: copy.copy(stats) for key, stats in self._stats.items()}
+    for key, monitor in self._monitors.items():
+      snapshot[key].health = monitor.stats()
+    return sorted(snapshot.values(), key=lambda stats: stats.console_port)
+
+  def close(self) -> None:
+    """Closes every environment in the pool."""
+    for monitor in self._monitors.values():
+      monitor.stop()
+    for env in self._envs:
+      if self._stats[id(env)].is_healthy:  # Retired envs are closed already.
+        self._close_env(env)
+
+  def _retire(self, env: interface.AsyncEnv) -> None:
+    """Stops monitoring and closes an environment removed from the pool."""
+    monitor = self._monitors.get(id(env))
+    if monitor is not None:
+      monitor.stop()
+    self._close_env(env)
+
+  def _close_env(self, env: interface.AsyncEnv) -> None:
+    try:
+      env.close()
+    except Exception:  # pylint: disable=broad-exception-caught
+      logging.exception('Failed to close environment.')
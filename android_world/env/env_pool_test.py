@@ -0,0 +1,186 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+from absl.testing import absltest
+from android_world.env import adb_utils
+from android_world.env import env_pool
+from android_world.env import health_monitor
+from android_world.utils import fake_adb_responses
+from android_world.utils import test_utils
+
+
+class EnvPoolTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.created = []
+    self.created_envs = []
+    self.unhealthy_ports = set()
+    self.mock_issue_generic_request = self.enter_context(
+        mock.patch.object(
+            adb_utils,
+            'issue_generic_request',
+            side_effect=self._fake_health_check,
+        )
+    )
+
+  def _env_factory(self, console_port, grpc_port):
+    env = test_utils.FakeAsyncEnv()
+    env.controller.console_port = console_port
+    env.close = mock.MagicMock()
+    self.created.append((console_port, grpc_port))
+    self.created_envs.append(env)
+    return env
+
+  def _fake_health_check(self, args, env, timeout_sec=None):
+    del args, timeout_sec
+    output = '' if env.console_port in self.unhealthy_ports else 'ok'
+    return fake_adb_responses.create_successful_generic_response(output)
+
+  def test_creates_envs_on_consecutive_ports(self):
+    pool = env_pool.EnvPool(num_envs=3, env_factory=self._env_factory)
+
+    self.assertLen(pool, 3)
+    self.assertCountEqual(
+        self.created, [(5554, 8554), (5556, 8555), (5558, 8556)]
+    )
+    self.assertEqual(
+        [stats.console_port for stats in pool.stats()], [5554, 5556, 5558]
+    )
+
+  def test_lease_hands_out_distinct_envs(self):
+    pool = env_pool.EnvPool(num_envs=2, env_factory=self._env_factory)
+
+    with pool.lease() as env1, pool.lease() as env2:
+      self.assertIsNot(env1, env2)
+      with self.assertRaises(TimeoutError):
+        with pool.lease(timeout=0.01):
+          pass
+
+    with pool.lease() as env3:
+      self.assertIn(env3, (env1, env2))
+    self.assertEqual(sum(stats.leases for stats in pool.stats()), 3)
+
+  def test_failed_env_is_recycled(self):
+    pool = env_pool.EnvPool(num_envs=1, env_factory=self._env_factory)
+
+    with self.assertRaises(ValueError):
+      with pool.lease() as env:
+        self.unhealthy_ports.add(5554)
+        env.controller.refresh_env.side_effect = (
+            lambda: self.unhealthy_ports.clear()
+        )
+        raise ValueError('device crashed')
+
+    env.controller.refresh_env.assert_called_once()
+    (stats,) = pool.stats()
+    self.assertEqual(stats.failures, 1)
+    self.assertEqual(stats.recycles, 1)
+    self.assertTrue(stats.is_healthy)
+    with pool.lease(timeout=0.01) as leased:
+      self.assertIs(leased, env)
+
+  def test_unrecoverable_env_is_retired(self):
+    pool = env_pool.EnvPool(num_envs=2, env_factory=self._env_factory)
+
+    with self.assertRaises(ValueError):
+      with pool.lease() as env:
+        self.unhealthy_ports.add(env.controller.console_port)
+        raise ValueError('device crashed')
+
+    self.assertLen(pool, 1)
+    with pool.lease(timeout=0.01) as leased:
+      self.assertIsNot(leased, env)
+    [stats] = [
+        stats
+        for stats in pool.stats()
+        if stats.console_port == env.controller.console_port
+    ]
+    self.assertEqual(stats.failures, 1)
+    self.assertFalse(stats.is_healthy)
+    env.close.assert_called_once()
+    pool.close()
+    env.close.assert_called_once()
+
+  def test_retired_env_stops_being_monitored(self):
+    pool = env_pool.EnvPool(
+        num_envs=2,
+        env_factory=self._env_factory,
+        health_check_interval_secs=60.0,
+    )
+
+    stop = self.enter_context(
+        mock.patch.object(
+            health_monitor.HealthMonitor,
+            'stop',
+            autospec=True,
+            side_effect=health_monitor.HealthMonitor.stop,
+        )
+    )
+
+    with self.assertRaises(ValueError):
+      with pool.lease() as env:
+        self.unhealthy_ports.add(env.controller.console_port)
+        raise ValueError('device crashed')
+
+    stop.assert_called_once()
+    env.close.assert_called_once()
+    pool.close()
+
+  def test_unhealthy_at_startup_is_skipped(self):
+    self.unhealthy_ports.add(5556)
+
+    pool = env_pool.EnvPool(num_envs=2, env_factory=self._env_factory)
+
+    self.assertLen(pool, 1)
+    self.assertEqual(pool.envs[0].controller.console_port, 5554)
+    [rejected] = [
+        env
+        for env in self.created_envs
+        if env.controller.console_port == 5556
+    ]
+    rejected.close.assert_called_once()
+    pool.envs[0].close.assert_not_called()
+
+  def test_raises_if_no_env_is_healthy(self):
+    self.unhealthy_ports.update([5554, 5556])
+
+    with self.assertRaises(RuntimeError):
+      env_pool.EnvPool(num_envs=2, env_factory=self._env_factory)
+
+  def test_monitors_health_in_background(self):
+    pool = env_pool.EnvPool(
+        num_envs=1,
+        env_factory=self._env_factory,
+        health_check_interval_secs=60.0,
+    )
+
+    (stats,) = pool.stats()
+    pool.close()
+
+    self.assertIsNotNone(stats.health)
+    self.assertTrue(stats.health.is_healthy)
+
+  def test_utilization(self):
+    stats = env_pool.DeviceStats(
+        console_port=5554, grpc_port=8554, created_at=10.0, busy_secs=5.0
+    )
+
+    self.assertEqual(stats.utilization(now=20.0), 0.5)
+
+
+if __name__ == '__main__':
+  absltest.main()
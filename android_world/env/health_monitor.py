@@ -0,0 +1,229 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Monitors the connection to a device and reconnects before it is needed.
+
+Without monitoring, a dead connection is only noticed when an observation
+fails, after `get_a11y_tree` has exhausted its retries, so every failure costs
+the agent a step or more. A `HealthMonitor` pings ADB and the a11y forwarder
+from a background thread instead, and reconnects via `refresh_env` once the
+device fails consecutive checks:
+
+```
+monitor = health_monitor.HealthMonitor(env.controller, interval_secs=30)
+monitor.start()
+... run ...
+monitor.stop()
+print(monitor.stats())
+```
+"""
+
+import copy
+import dataclasses
+import threading
+import time
+from typing import Optional
+
+from absl import logging
+from android_world.env import adb_utils
+from android_world.env import android_world_controller
+
+DEFAULT_INTERVAL_SECS = 30.0
+
+# Timeout of the ADB ping. A device this slow to echo is not usable anyway.
+_ADB_PING_TIMEOUT_SECS = 10.0
+
+
+def ping_adb(
+    controller: android_world_controller.AndroidWorldController,
+    timeout_sec: float = _ADB_PING_TIMEOUT_SECS,
+) -> bool:
+  """Returns whether the device answers a trivial ADB shell command."""
+  try:
+    response = adb_utils.issue_generic_request(
+        ['shell', 'echo', 'ok'], controller, timeout_sec=timeout_sec
+    )
+  except Exception:  # pylint: disable=broad-exception-caught
+    logging.exception('ADB ping failed.')
+    return False
+  return response.generic.output.decode('utf-8').strip() == 'ok'
+
+
+@dataclasses.dataclass
+class HealthStats:
+  """Health statistics of one monitored device.
+
+  Attributes:
+    started_at: `time.monotonic()` time monitoring started.
+    checks: Number of completed health checks.
+    adb_failures: Number of checks in which ADB did not answer.
+    a11y_failures: Number of checks in which the a11y forwarder had been
+      silent for too long; see `AndroidWorldController.ping_a11y`.
+    reconnects: Number of reconnections that restored the device.
+    failed_reconnects: Number of reconnections after which the device still
+      failed its check.
+    downtime_secs: Total time from a failed check until the next passing one.
+    down_since: `time.monotonic()` time of the first failed check of the
+      current outage, or None if the device is healthy.
+  """
+
+  started_at: float
+  checks: int = 0
+  adb_failures: int = 0
+  a11y_failures: int = 0
+  reconnects: int = 0
+  failed_reconnects: int = 0
+  downtime_secs: float = 0.0
+  down_since: Optional[float] = None
+
+  @property
+  def is_healthy(self) -> bool:
+    return self.down_since is None
+
+  def uptime(self, now: Optional[float] = None) -> float:
+    """Returns the fraction of the monitored time the device was healthy."""
+    now = time.monotonic() if now is None else now
+    lifetime = now - self.started_at
+    if lifetime <= 0:
+      return 1.0
+    downtime = self.downtime_secs
+    if self.down_since is not None:
+      downtime += now - self.down_since
+    return max(0.0, 1.0 - downtime / lifetime)
+
+
+class HealthMonitor:
+  """Periodically checks a device and reconnects it when it stops answering.
+
+  A check pings ADB and the a11y forwarder. After `failures_to_reconnect`
+  consecutive failed checks, the monitor calls the controller's `refresh_env`
+  and checks again. Reads of the a11y tree wait for the reconnection to finish,
+  so an observation taken meanwhile sees the new connection. All methods are
+  thread-safe.
+  """
+
+  def __init__(
+      self,
+      controller: android_world_controller.AndroidWorldController,
+      interval_secs: float = DEFAULT_INTERVAL_SECS,
+      failures_to_reconnect: int = 2,
+  ):
+    """Initializes the monitor; call `start` to check in the background.
+
+    Args:
+      controller: The device to monitor.
+      interval_secs: Time between checks.
+      failures_to_reconnect: Number of consecutive failed checks after which to
+        reconnect.
+    """
+    if interval_secs <= 0:
+      raise ValueError(f'interval_secs must be positive, got {interval_secs}.')
+    self._controller = controller
+    self._interval_secs = interval_secs
+    self._failures_to_reconnect = max(1, failures_to_reconnect)
+    self._consecutive_failures = 0
+    self._check_lock = threading.Lock()
+    self._lock = threading.Lock()
+    self._stats = HealthStats(started_at=time.monotonic())
+    self._stop = threading.Event()
+    self._thread: Optional[threading.Thread] = None
+
+  def _probe(self) -> bool:
+    adb_ok = ping_adb(self._controller)
+    a11y_ok = self._controller.ping_a11y()
+    with self._lock:
+      self._stats.checks += 1
+      self._stats.adb_failures += not adb_ok
+      self._stats.a11y_failures += not a11y_ok
+    return adb_ok and a11y_ok
+
+  def _set_healthy(self, healthy: bool) -> None:
+    now = time.monotonic()
+    with self._lock:
+      if healthy:
+        if self._stats.down_since is not None:
+          self._stats.downtime_secs += now - self._stats.down_since
+          self._stats.down_since = None
+      elif self._stats.down_since is None:
+        self._stats.down_since = now
+
+  def check(self) -> bool:
+    """Checks the device once, reconnecting it if due.
+
+    Returns:
+      Whether the device is healthy after the check.
+    """
+    with self._check_lock:
+      return self._check()
+
+  def _check(self) -> bool:
+    if self._probe():
+      self._consecutive_failures = 0
+      self._set_healthy(True)
+      return True
+    self._set_healthy(False)
+    self._consecutive_failures += 1
+    if self._consecutive_failures < self._failures_to_reconnect:
+      return False
+
+    logging.warning(
+        'Device failed %d consecutive health checks; reconnecting.',
+        self._consecutive_failures,
+    )
+    try:
+      self._controller.refresh_env()
+    except Exception:  # pylint: disable=broad-exception-caught
+      logging.exception('Reconnecting to device failed.')
+    recovered = self._probe()
+    with self._lock:
+      if recovered:
+        self._stats.reconnects += 1
+      else:
+        self._stats.failed_reconnects += 1
+    if recovered:
+      self._consecutive_failures = 0
+      self._set_healthy(True)
+    else:
+      logging.error('Device is still unhealthy after reconnecting.')
+    return recovered
+
+  def _run(self) -> None:
+    while not self._stop.wait(self._interval_secs):
+      try:
+        self.check()
+      except Exception:  # pylint: disable=broad-exception-caught
+        logging.exception('Health check raised.')
+
+  def start(self) -> None:
+    """Starts checking in a background thread."""
+    if self._thread is not None:
+      return
+    self._stop.clear()
+    self._thread = threading.Thread(
+        target=self._run, name='health-monitor', daemon=True
+    )
+    self._thread.start()
+
+  def stop(self) -> None:
+    """Stops the background thread, waiting for a running check to finish."""
+    if self._thread is None:
+      return
+    self._stop.set()
+    self._thread.join()
+    self._thread = None
+
+  def stats(self) -> HealthStats:
+    """Returns a snapshot of the statistics."""
+    with self._lock:
+      return copy.copy(self._stats)
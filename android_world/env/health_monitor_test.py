@@ -0,0 +1,101 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from unittest import mock
+
+from absl.testing import absltest
+from android_world.env import adb_utils
+from android_world.env import health_monitor
+from android_world.utils import fake_adb_responses
+
+
+class HealthMonitorTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.adb_up = True
+    self.enter_context(
+        mock.patch.object(
+            adb_utils, 'issue_generic_request', side_effect=self._fake_ping
+        )
+    )
+    self.controller = mock.Mock()
+    self.controller.ping_a11y.return_value = True
+
+  def _fake_ping(self, args, env, timeout_sec=None):
+    del args, env, timeout_sec
+    return fake_adb_responses.create_successful_generic_response(
+        'ok' if self.adb_up else ''
+    )
+
+  def test_healthy_device(self):
+    monitor = health_monitor.HealthMonitor(self.controller)
+
+    self.assertTrue(monitor.check())
+
+    stats = monitor.stats()
+    self.assertEqual(stats.checks, 1)
+    self.assertTrue(stats.is_healthy)
+    self.controller.refresh_env.assert_not_called()
+
+  def test_reconnects_after_consecutive_failures(self):
+    monitor = health_monitor.HealthMonitor(
+        self.controller, failures_to_reconnect=2
+    )
+    self.controller.ping_a11y.return_value = False
+    self.controller.refresh_env.side_effect = lambda: setattr(
+        self.controller.ping_a11y, 'return_value', True
+    )
+
+    self.assertFalse(monitor.check())
+    self.controller.refresh_env.assert_not_called()
+    self.assertTrue(monitor.check())
+
+    stats = monitor.stats()
+    self.assertEqual(stats.checks, 3)
+    self.assertEqual(stats.a11y_failures, 2)
+    self.assertEqual(stats.reconnects, 1)
+    self.assertTrue(stats.is_healthy)
+    self.assertGreaterEqual(stats.downtime_secs, 0)
+
+  def test_failed_reconnect(self):
+    monitor = health_monitor.HealthMonitor(
+        self.controller, failures_to_reconnect=1
+    )
+    self.adb_up = False
+    self.controller.refresh_env.side_effect = RuntimeError('emulator is gone')
+
+    self.assertFalse(monitor.check())
+
+    stats = monitor.stats()
+    self.assertEqual(stats.adb_failures, 2)
+    self.assertEqual(stats.failed_reconnects, 1)
+    self.assertFalse(stats.is_healthy)
+    self.assertLess(stats.uptime(), 1.0)
+
+  def test_checks_in_background(self):
+    monitor = health_monitor.HealthMonitor(self.controller, interval_secs=0.01)
+
+    monitor.start()
+    deadline = time.monotonic() + 10
+    while monitor.stats().checks < 2 and time.monotonic() < deadline:
+      time.sleep(0.01)
+    monitor.stop()
+
+    self.assertGreaterEqual(monitor.stats().checks, 2)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -17,17 +17,25 @@
 import abc
 import dataclasses
 import time
-from typing import Any, Optional, Self
+from typing import Any, Callable, Optional, Self
 
+from absl import logging
 from android_env.components import action_type
+from android_env.proto.a11y import android_accessibility_forest_pb2
+from android_env.proto.a11y import android_accessibility_window_info_pb2
 from android_world.env import actuation
 from android_world.env import adb_utils
 from android_world.env import android_world_controller
 from android_world.env import json_action
 from android_world.env import representation_utils
+from android_world.env import ui_stability
 import dm_env
 import numpy as np
 
+_WindowInfo = (
+    android_accessibility_window_info_pb2.AndroidAccessibilityWindowInfo
+)
+
 
 def _get_no_op_action() -> dict[str, Any]:
   """Creates a no-op action; used to retrieve screen & UI tree."""
@@ -37,34 +45,214 @@ def _get_no_op_action() -> dict[str, Any]:
   }
 
 
-@dataclasses.dataclass(frozen=True)
+class _UIElementsInference:
+  """Infers UI elements from a forest; picklable, unlike a closure.
+
+  Attributes:
+    fingerprint: Fingerprint of the inferred elements, set by the call.
+  """
+
+  def __init__(
+      self,
+      forest: Any,
+      screen_size: Optional[tuple[int, int]],
+      exclude_invisible_elements: bool,
+  ):
+    self.forest = forest
+    self.screen_size = screen_size
+    self.exclude_invisible_elements = exclude_invisible_elements
+    self.fingerprint: Optional[representation_utils.UIFingerprint] = None
+
+  def __call__(self) -> list[representation_utils.UIElement]:
+    fingerprinter = representation_utils.UIFingerprinter()
+    elements = representation_utils.forest_to_ui_elements(
+        self.forest,
+        exclude_invisible_elements=self.exclude_invisible_elements,
+        screen_size=self.screen_size,
+        fingerprinter=fingerprinter,
+    )
+    self.fingerprint = fingerprinter.fingerprint()
+    return elements
+
+
 class State:
   """State of the Android environment.
 
+  States are read-only. Their expensive parts are computed on first access and
+  memoized, so a caller only pays for the data it reads: UI elements inferred
+  from the forest are extracted when `ui_elements` or `fingerprint` is first
+  read, and pixels given as a `pixels_loader` are loaded (e.g. decoded) when
+  `pixels` is first read. States compare equal if their attributes are equal,
+  and pickle with their UI elements still to be inferred.
+
   Attributes:
     pixels: RGB array of current screen.
     forest: Raw UI forest; see android_world_controller.py for more info.
     ui_elements: Processed children and stateful UI elements extracted from
       forest.
+    fingerprint: Structural fingerprint of `ui_elements`.
   """
 
-  pixels: np.ndarray
-  forest: Any
-  ui_elements: list[representation_utils.UIElement]
+  __slots__ = (
+      '_pixels',
+      '_pixels_loader',
+      '_forest',
+      '_ui_elements',
+      '_ui_elements_loader',
+      '_fingerprint',
+  )
+
+  def __init__(
+      self,
+      pixels: Optional[np.ndarray] = None,
+      forest: Any = None,
+      ui_elements: Optional[list[representation_utils.UIElement]] = None,
+      fingerprint: Optional[representation_utils.UIFingerprint] = None,
+      *,
+      pixels_loader: Optional[Callable[[], np.ndarray]] = None,
+      ui_elements_loader: Optional[
+          Callable[[], list[representation_utils.UIElement]]
+      ] = None,
+  ):
+    """Initializes the state.
+
+    Args:
+      pixels: RGB array of current screen.
+      forest: Raw UI forest.
+      ui_elements: UI elements of the screen.
+      fingerprint: Fingerprint of `ui_elements`; computed from them if not
+        provided.
+      pixels_loader: Returns the pixels on first access; used if `pixels` is
+        None.
+      ui_elements_loader: Returns the UI elements on first access; used if
+        `ui_elements` is None.
+    """
+    self._pixels = pixels
+    self._pixels_loader = pixels_loader if pixels is None else None
+    self._forest = forest
+    self._ui_elements = ui_elements
+    self._ui_elements_loader = (
+        ui_elements_loader if ui_elements is None else None
+    )
+    self._fingerprint = fingerprint
 
   @classmethod
   def create_and_infer_elements(
       cls,
-      pixels: np.ndarray,
+      pixels: Optional[np.ndarray],
       forest: Any,
       screen_size: Optional[tuple[int, int]] = None,
+      exclude_invisible_elements: bool = False,
+      pixels_loader: Optional[Callable[[], np.ndarray]] = None,
   ) -> Self:
-    """Creates a new instance, inferring UI elements from the forest."""
+    """Creates a new instance whose UI elements are inferred from the forest.
 
-    elements = representation_utils.forest_to_ui_elements(
-        forest, screen_size=screen_size
+    The forest is converted on first access to `ui_elements` or `fingerprint`.
+
+    Args:
+      pixels: RGB array of current screen.
+      forest: Raw UI forest.
+      screen_size: The size of the device screen in pixels, used to normalize
+        bounding boxes.
+      exclude_invisible_elements: True if invisible elements should be
+        dropped.
+      pixels_loader: See `__init__`.
+
+    Returns:
+      The new state.
+    """
+    return cls(
+        pixels,
+        forest,
+        pixels_loader=pixels_loader,
+        ui_elements_loader=_UIElementsInference(
+            forest, screen_size, exclude_invisible_elements
+        ),
+    )
+
+  @property
+  def pixels(self) -> np.ndarray:
+    if self._pixels is None and self._pixels_loader is not None:
+      self._pixels = self._pixels_loader()
+      self._pixels_loader = None
+    return self._pixels
+
+  @property
+  def forest(self) -> Any:
+    return self._forest
+
+  @property
+  def ui_elements(self) -> list[representation_utils.UIElement]:
+    if self._ui_elements is None:
+      if self._ui_elements_loader is not None:
+        loader = self._ui_elements_loader
+        self._ui_elements = loader()
+        self._ui_elements_loader = None
+        if self._fingerprint is None:
+          self._fingerprint = getattr(loader, 'fingerprint', None)
+      else:
+        self._ui_elements = []
+    return self._ui_elements
+
+  @property
+  def fingerprint(self) -> representation_utils.UIFingerprint:
+    ui_elements = self.ui_elements  # May set the fingerprint as a side effect.
+    if self._fingerprint is None:
+      self._fingerprint = representation_utils.fingerprint_ui_elements(
+          ui_elements
+      )
+    return self._fingerprint
+
+  @property
+  def package_name(self) -> str:
+    """Package of the app window in the forest, or '' if there is none."""
+    forest = self._forest
+    if not isinstance(
+        forest, android_accessibility_forest_pb2.AndroidAccessibilityForest
+    ):
+      return ''
+    for window in forest.windows:
+      if (
+          window.window_type == _WindowInfo.TYPE_APPLICATION
+          and window.tree.nodes
+      ):
+        return window.tree.nodes[0].package_name
+    return ''
+
+  @property
+  def is_materialized(self) -> bool:
+    """Whether the pixels and UI elements have both been computed."""
+    return self._pixels_loader is None and self._ui_elements_loader is None
+
+  def __repr__(self) -> str:
+    return (
+        f'State(forest={self._forest!r}, ui_elements={self._ui_elements!r},'
+        f' materialized={self.is_materialized})'
     )
-    return cls(pixels, forest, elements)
+
+  def __eq__(self, other: Any) -> bool:
+    if other.__class__ is not self.__class__:
+      return NotImplemented
+    return (self.pixels, self.forest, self.ui_elements, self.fingerprint) == (
+        other.pixels,
+        other.forest,
+        other.ui_elements,
+        other.fingerprint,
+    )
+
+  __hash__ = None
+
+  def __getstate__(self) -> dict[str, Any]:
+    # Pixels loaders are typically closures, so the pixels are loaded first.
+    # Inference from the forest pickles as is and stays lazy.
+    self.pixels  # pylint: disable=pointless-statement
+    if not isinstance(self._ui_elements_loader, _UIElementsInference):
+      self.ui_elements  # pylint: disable=pointless-statement
+    return {name: getattr(self, name) for name in self.__slots__}
+
+  def __setstate__(self, state: dict[str, Any]) -> None:
+    for name, value in state.items():
+      setattr(self, name, value)
 
 
 class AsyncEnv(abc.ABC):
@@ -112,8 +300,34 @@ class AsyncEnv(abc.ABC):
     """Displays a message on the screen."""
 
   @abc.abstractmethod
-  def execute_action(self, action: json_action.JSONAction) -> None:
-    """Executes action on the environment."""
+  def execute_action(
+      self, action: json_action.JSONAction, state: Optional[State] = None
+  ) -> None:
+    """Executes action on the environment.
+
+    Args:
+      action: The action to execute.
+      state: The state the action was chosen in, if the caller holds it. Its
+        UI elements resolve `action.index` instead of a new observation.
+    """
+
+  def wait_for_transition(
+      self, policy: Optional[ui_stability.WaitPolicy] = None
+  ) -> State:
+    """Waits for the effect of the last executed action and gets the state.
+
+    By default this pauses for the policy's cap; implementations that can
+    observe the UI return as soon as it has reacted and settled.
+
+    Args:
+      policy: How long to wait.
+
+    Returns:
+      The state after the transition.
+    """
+    policy = policy or ui_stability.WaitPolicy()
+    time.sleep(policy.max_wait_secs)
+    return self.get_state(wait_to_stabilize=False)
 
   @property
   @abc.abstractmethod
@@ -155,18 +369,40 @@ class AsyncEnv(abc.ABC):
 
 
 def _process_timestep(timestep: dm_env.TimeStep) -> State:
-  """Parses timestep observation and returns State."""
-  return State(
+  """Parses timestep observation and returns State.
+
+  UI elements are only extracted from the forest if the caller reads them.
+
+  Args:
+    timestep: Timestep returned by the controller.
+
+  Returns:
+    The lazily-evaluated state.
+  """
+  return State.create_and_infer_elements(
       pixels=timestep.observation['pixels'],
       forest=timestep.observation[
           android_world_controller.OBSERVATION_KEY_FOREST
       ],
-      ui_elements=timestep.observation[
-          android_world_controller.OBSERVATION_KEY_UI_ELEMENTS
-      ],
+      exclude_invisible_elements=True,
   )
 
 
+@dataclasses.dataclass(frozen=True)
+class _Transition:
+  """An executed action whose effect has not been waited for yet.
+
+  Attributes:
+    action_type: The type of the action.
+    time: The `time.monotonic()` time the action was executed.
+    before: The state the action was executed in, if known.
+  """
+
+  action_type: str
+  time: float
+  before: Optional[State]
+
+
 class AsyncAndroidEnv(AsyncEnv):
   """Async environment interface using AndroidEnv to communicate with device."""
 
@@ -177,6 +413,22 @@ class AsyncAndroidEnv(AsyncEnv):
   ):
     self._controller = controller
     self._prior_state = None
+    # Report from the most recent get_state(wait_to_stabilize=True) call.
+    self.last_stability_report: Optional[ui_stability.StabilityReport] = None
+    # Number of actions executed so far, and the most recent observation with
+    # the number of actions executed before it was taken. The observation
+    # shows the current screen while no action was executed since.
+    self._action_epoch = 0
+    self._last_state: Optional[State] = None
+    self._last_state_epoch = -1
+    # How `wait_for_transition` waits for the effect of actions.
+    self.wait_policy = ui_stability.WaitPolicy()
+    # The action `wait_for_transition` waits for, if any.
+    self._pending_transition: Optional[_Transition] = None
+    # Report from the most recent wait_for_transition call.
+    self.last_transition_report: Optional[ui_stability.TransitionReport] = (
+        None
+    )
     # Variable used to temporarily save interactions between agent and user.
     # Like when agent use answer action to answer user questions, we
     # use this to save the agent response. Or later on when agent has the
@@ -192,10 +444,32 @@ class AsyncAndroidEnv(AsyncEnv):
       adb_utils.press_home_button(self.controller)
     self.interaction_cache = ''
 
-    return _process_timestep(self.controller.reset())
+    self._pending_transition = None
+    self._action_epoch += 1
+    return self._remember(_process_timestep(self.controller.reset()))
+
+  def _remember(self, state: State) -> State:
+    """Caches `state` as the latest observation."""
+    self._last_state = state
+    self._last_state_epoch = self._action_epoch
+    return state
 
   def _get_state(self):
-    return _process_timestep(self.controller.step(_get_no_op_action()))
+    return self._remember(
+        _process_timestep(self.controller.step(_get_no_op_action()))
+    )
+
+  def _get_cached_state(self) -> Optional[State]:
+    """Returns the latest observation unless an action was executed since."""
+    if self._last_state_epoch == self._action_epoch:
+      return self._last_state
+    return None
+
+  def _get_current_state(self) -> State:
+    state = self._get_cached_state()
+    if state is not None:
+      return state
+    return self.get_state(wait_to_stabilize=False)
 
   def _get_stable_state(
       self,
@@ -224,7 +498,7 @@ class AsyncAndroidEnv(AsyncEnv):
     current_state = self._get_state()
 
     while stable_checks < stability_threshold and elapsed_time < timeout:
-      if self._prior_state.ui_elements == current_state.ui_elements:
+      if self._prior_state.fingerprint == current_state.fingerprint:
         stable_checks += 1
         if stable_checks == stability_threshold:
           break  # Exit early if stability is achieved.
@@ -238,25 +512,131 @@ class AsyncAndroidEnv(AsyncEnv):
 
     return current_state
 
+  def _wait_for_stable_state(
+      self,
+      quiet_window_secs: float = ui_stability.DEFAULT_QUIET_WINDOW_SECS,
+      timeout_secs: float = ui_stability.DEFAULT_TIMEOUT_SECS,
+  ) -> State:
+    """Gets state once the UI has been quiet for `quiet_window_secs`.
+
+    Unlike `_get_stable_state`, this uses a11y event arrival times reported by
+    the controller, so a screen that stopped changing before the call returns
+    after a single observation.
+
+    Args:
+      quiet_window_secs: How long the UI must be unchanged to be stable.
+      timeout_secs: Maximum time in seconds to wait for UI to become stable.
+
+    Returns:
+      The most recent state.
+    """
+    state, report = ui_stability.wait_for_stable_state(
+        get_state=self._get_state,
+        fingerprint_fn=lambda s: s.fingerprint.content,
+        last_event_time_fn=self.controller.last_a11y_event_time,
+        quiet_window_secs=quiet_window_secs,
+        timeout_secs=timeout_secs,
+    )
+    self.last_stability_report = report
+    if not report.is_stable:
+      logging.warning(
+          'UI did not stabilize within %.1f seconds.', report.wait_secs
+      )
+    return state
+
   def get_state(self, wait_to_stabilize: bool = False) -> State:
     if wait_to_stabilize:
-      return self._get_stable_state()
+      return self._wait_for_stable_state()
     return self._get_state()
 
-  def execute_action(self, action: json_action.JSONAction) -> None:
+  def execute_action(
+      self, action: json_action.JSONAction, state: Optional[State] = None
+  ) -> None:
+    """See base class.
+
+    Only actions that refer to an element by index need the UI elements. If
+    `state` is not given, they come from the latest observation, which is only
+    fetched again if an action was executed since. Screen changes made other
+    than through this environment, e.g. via `controller`, are not tracked;
+    call `get_state` first or pass `state` after making any.
+
+    Args:
+      action: The action to execute.
+      state: The state the action was chosen in.
+    """
+    self._pending_transition = None
     if action.action_type == json_action.ANSWER:
       self.interaction_cache = action.text
       if action.text:
+        self._action_epoch += 1
         self.display_message(action.text, header='Agent answered:')
       return
-    state = self.get_state(wait_to_stabilize=False)
+    ui_elements = []
+    if actuation.needs_ui_elements(action):
+      if state is None:
+        state = self._get_current_state()
+      ui_elements = state.ui_elements
+    elif state is None:
+      state = self._get_cached_state()
+    # Absorb UI activity from before the action, so that any activity seen by
+    # `wait_for_transition` was caused by it.
+    self.controller.last_a11y_event_time()
+    self._pending_transition = _Transition(
+        action_type=action.action_type or '',
+        time=time.monotonic(),
+        before=state,
+    )
+    self._action_epoch += 1
     actuation.execute_adb_action(
         action,
-        state.ui_elements,
+        ui_elements,
         self.logical_screen_size,
         self.controller,
     )
 
+  def wait_for_transition(
+      self, policy: Optional[ui_stability.WaitPolicy] = None
+  ) -> State:
+    """Waits for the UI to react to the last action and settle.
+
+    The wait ends early once the UI has reacted and stayed quiet; see
+    `ui_stability.wait_for_transition`. Its duration is reported to
+    `ui_stability.get_settle_time_recorder()` by app and action type.
+
+    Args:
+      policy: How long to wait; defaults to `wait_policy`. Its policy for the
+        app the action was executed in and the action type applies.
+
+    Returns:
+      The state after the transition.
+    """
+    policy = policy or self.wait_policy
+    transition, self._pending_transition = self._pending_transition, None
+    if transition is None:
+      return self._wait_for_stable_state(
+          quiet_window_secs=policy.quiet_window_secs,
+          timeout_secs=policy.max_wait_secs,
+      )
+    app = transition.before.package_name if transition.before else ''
+    policy = policy.for_app(app).for_action(transition.action_type)
+    state, report = ui_stability.wait_for_transition(
+        get_state=self._get_state,
+        fingerprint_fn=lambda s: s.fingerprint.content,
+        action_time=transition.time,
+        before_fingerprint=(
+            transition.before.fingerprint.content
+            if transition.before
+            else None
+        ),
+        last_event_time_fn=self.controller.last_a11y_event_time,
+        policy=policy,
+    )
+    self.last_transition_report = report
+    ui_stability.get_settle_time_recorder().record(
+        app, transition.action_type, report
+    )
+    return state
+
   def hide_automation_ui(self) -> None:
     """Hides the coordinates on screen."""
     adb_utils.issue_generic_request(
@@ -285,7 +665,7 @@ class AsyncAndroidEnv(AsyncEnv):
 
   @property
   def logical_screen_size(self) -> tuple[int, int]:
-    return adb_utils.get_logical_screen_size(self.controller)
+    return self.controller.logical_screen_size
 
   def close(self) -> None:
     return self.controller.close()
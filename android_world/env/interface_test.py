@@ -12,11 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import pickle
 from unittest import mock
 
 from absl.testing import absltest
+from android_env.proto.a11y import android_accessibility_forest_pb2
+from android_world.env import actuation
 from android_world.env import interface
+from android_world.env import json_action
 from android_world.env import representation_utils
+from android_world.env import simulated_device
+from android_world.env import ui_stability
 import numpy as np
 
 
@@ -90,5 +96,171 @@ class InterfaceTest(absltest.TestCase):
     )
 
 
+  @mock.patch("time.sleep", return_value=None)
+  def test_get_state_returns_immediately_when_device_is_quiet(
+      self, unused_mocked_time_sleep
+  ):
+    state = interface.State(
+        ui_elements=[representation_utils.UIElement(text="Stable")],
+        pixels=np.empty([1, 2, 3]),
+        forest=None,
+    )
+    controller = mock.MagicMock()
+    controller.last_a11y_event_time.return_value = 0.0
+    env = interface.AsyncAndroidEnv(controller)
+    env._get_state = mock.MagicMock(return_value=state)
+
+    self.assertEqual(env.get_state(wait_to_stabilize=True), state)
+    env._get_state.assert_called_once()
+    self.assertTrue(env.last_stability_report.is_stable)
+    self.assertTrue(env.last_stability_report.used_a11y_events)
+
+
+  @mock.patch.object(actuation, "execute_adb_action")
+  @mock.patch.object(interface, "_process_timestep")
+  def test_execute_action_reuses_latest_state(
+      self, mock_process_timestep, mock_execute_adb_action
+  ):
+    states = [
+        interface.State(
+            ui_elements=[representation_utils.UIElement(text=f"Element{i}")],
+            pixels=np.empty([1, 2, 3]),
+            forest=None,
+        )
+        for i in range(2)
+    ]
+    mock_process_timestep.side_effect = states
+    controller = mock.MagicMock()
+    env = interface.AsyncAndroidEnv(controller)
+    click = json_action.JSONAction(action_type="click", index=0)
+
+    env.get_state()
+    env.execute_action(click)
+    env.execute_action(json_action.JSONAction(action_type="navigate_back"))
+    env.execute_action(click)
+
+    self.assertEqual(controller.step.call_count, 2)
+    self.assertEqual(
+        [c.args[1] for c in mock_execute_adb_action.call_args_list],
+        [states[0].ui_elements, [], states[1].ui_elements],
+    )
+
+  @mock.patch.object(actuation, "execute_adb_action")
+  def test_execute_action_uses_given_state(self, mock_execute_adb_action):
+    state = interface.State(
+        ui_elements=[representation_utils.UIElement(text="Given")],
+        pixels=np.empty([1, 2, 3]),
+        forest=None,
+    )
+    controller = mock.MagicMock()
+    env = interface.AsyncAndroidEnv(controller)
+
+    env.execute_action(
+        json_action.JSONAction(action_type="click", index=0), state=state
+    )
+
+    controller.step.assert_not_called()
+    self.assertEqual(
+        mock_execute_adb_action.call_args.args[1], state.ui_elements
+    )
+
+  def test_wait_for_transition_records_time_to_settle(self):
+    env = simulated_device.create_env(num_nodes=3)
+    env.wait_policy = ui_stability.WaitPolicy(quiet_window_secs=0.05)
+    recorder = ui_stability.get_settle_time_recorder()
+    recorder.reset()
+    before = env.get_state()
+
+    env.execute_action(json_action.JSONAction(action_type="click", index=0))
+    after = env.wait_for_transition()
+
+    self.assertNotEqual(after.fingerprint, before.fingerprint)
+    self.assertTrue(env.last_transition_report.changed)
+    self.assertTrue(env.last_transition_report.is_stable)
+    package = simulated_device.HOME_ACTIVITY.split("/")[0]
+    self.assertEqual(before.package_name, package)
+    self.assertEqual(list(recorder.samples()), [(package, "click")])
+
+  def test_state_fingerprint_is_inferred_from_elements(self):
+    elements = [representation_utils.UIElement(text="a")]
+
+    state = interface.State(
+        pixels=np.empty([1, 2, 3]), forest=None, ui_elements=elements
+    )
+
+    self.assertEqual(
+        state.fingerprint,
+        representation_utils.fingerprint_ui_elements(elements),
+    )
+
+
+  @mock.patch.object(representation_utils, "forest_to_ui_elements")
+  def test_state_infers_elements_lazily(self, mock_forest_to_ui_elements):
+    elements = [representation_utils.UIElement(text="a")]
+
+    def convert(forest, exclude_invisible_elements, screen_size, fingerprinter):
+      del forest, exclude_invisible_elements, screen_size
+      for element in elements:
+        fingerprinter.update(element)
+      return elements
+
+    mock_forest_to_ui_elements.side_effect = convert
+    state = interface.State.create_and_infer_elements(
+        pixels=np.empty([1, 2, 3]), forest="forest"
+    )
+
+    self.assertEqual(state.forest, "forest")
+    self.assertEqual(state.pixels.shape, (1, 2, 3))
+    mock_forest_to_ui_elements.assert_not_called()
+    self.assertFalse(state.is_materialized)
+
+    self.assertEqual(
+        state.fingerprint,
+        representation_utils.fingerprint_ui_elements(elements),
+    )
+    self.assertIs(state.ui_elements, elements)
+    mock_forest_to_ui_elements.assert_called_once()
+    self.assertTrue(state.is_materialized)
+
+  def test_state_loads_pixels_once(self):
+    pixels_loader = mock.MagicMock(return_value=np.zeros([1, 2, 3]))
+    state = interface.State(
+        forest=None, ui_elements=[], pixels_loader=pixels_loader
+    )
+
+    pixels_loader.assert_not_called()
+    self.assertEqual(state.pixels.shape, (1, 2, 3))
+    self.assertIs(state.pixels, state.pixels)
+    pixels_loader.assert_called_once()
+
+  def test_state_pickles_before_inferring_elements(self):
+    state = interface.State.create_and_infer_elements(
+        pixels=None,
+        forest=android_accessibility_forest_pb2.AndroidAccessibilityForest(),
+        pixels_loader=lambda: np.zeros([1, 2, 3]),
+    )
+
+    restored = pickle.loads(pickle.dumps(state))
+
+    self.assertFalse(restored.is_materialized)
+    self.assertEqual(restored.pixels.shape, (1, 2, 3))
+    self.assertEqual(restored.ui_elements, [])
+    self.assertEqual(restored.fingerprint, state.fingerprint)
+
+  def test_states_compare_by_value(self):
+    elements = [representation_utils.UIElement(text="a")]
+    state = interface.State(pixels=None, forest="forest", ui_elements=elements)
+
+    self.assertEqual(
+        state,
+        interface.State(
+            pixels=None, forest="forest", ui_elements=list(elements)
+        ),
+    )
+    self.assertNotEqual(
+        state, interface.State(pixels=None, forest="forest", ui_elements=[])
+    )
+
+
 if __name__ == "__main__":
   absltest.main()
@@ -14,10 +14,16 @@
 
 """Tools for processing and representing accessibility trees."""
 
+from collections.abc import Iterable, Iterator
 import dataclasses
+import hashlib
+import itertools
+import operator
+import sys
 from typing import Any, Optional
 
 from absl import logging
+import numpy as np
 
 
 @dataclasses.dataclass
@@ -132,10 +138,89 @@ def _normalize_bounding_box(
   )
 
 
+@dataclasses.dataclass(frozen=True)
+class UIFingerprint:
+  """Structural fingerprint of a list of UI elements.
+
+  Two screens with equal fingerprints have, with overwhelming probability,
+  equal UI elements; comparing fingerprints is O(1).
+
+  Attributes:
+    layout: 64-bit hash of element classes, resource and package names,
+      bounding boxes and structural flags (clickable, scrollable, ...). It is
+      unaffected by text edits or toggling checkboxes.
+    content: 64-bit hash of everything in `layout` plus text, content
+      descriptions, hints and state flags (checked, focused, ...).
+  """
+
+  layout: int
+  content: int
+
+
+class UIFingerprinter:
+  """Incrementally computes the `UIFingerprint` of a sequence of elements."""
+
+  def __init__(self):
+    self._layout = hashlib.blake2b(digest_size=8)
+    self._content = hashlib.blake2b(digest_size=8)
+
+  def update(self, element: UIElement) -> None:
+    """Adds the next element to the fingerprint."""
+    bounds = element.bbox_pixels
+    if bounds is not None:
+      bounds = (bounds.x_min, bounds.x_max, bounds.y_min, bounds.y_max)
+    layout = (
+        element.class_name,
+        element.resource_name,
+        element.package_name,
+        bounds,
+        element.is_checkable,
+        element.is_clickable,
+        element.is_editable,
+        element.is_focusable,
+        element.is_long_clickable,
+        element.is_scrollable,
+        element.is_visible,
+    )
+    content = (
+        element.text,
+        element.content_description,
+        element.hint_text,
+        element.tooltip,
+        element.is_checked,
+        element.is_enabled,
+        element.is_focused,
+        element.is_selected,
+    )
+    # The record separator keeps adjacent elements from running together.
+    layout_bytes = (repr(layout) + '\x1e').encode('utf-8', 'surrogatepass')
+    self._layout.update(layout_bytes)
+    self._content.update(layout_bytes)
+    self._content.update(
+        (repr(content) + '\x1e').encode('utf-8', 'surrogatepass')
+    )
+
+  def fingerprint(self) -> UIFingerprint:
+    """Returns the fingerprint of all elements added so far."""
+    return UIFingerprint(
+        layout=int.from_bytes(self._layout.digest(), 'big'),
+        content=int.from_bytes(self._content.digest(), 'big'),
+    )
+
+
+def fingerprint_ui_elements(elements: Iterable[UIElement]) -> UIFingerprint:
+  """Returns the fingerprint of already-extracted UI elements."""
+  fingerprinter = UIFingerprinter()
+  for element in elements:
+    fingerprinter.update(element)
+  return fingerprinter.fingerprint()
+
+
 def forest_to_ui_elements(
     forest: Any,
     exclude_invisible_elements: bool = False,
     screen_size: Optional[tuple[int, int]] = None,
+    fingerprinter: Optional[UIFingerprinter] = None,
 ) -> list[UIElement]:
   """Extracts nodes from accessibility forest and converts to UI elements.
 
@@ -147,6 +232,8 @@ def forest_to_ui_elements(
     exclude_invisible_elements: True if invisible elements should not be
       returned.
     screen_size: The size of the device screen in pixels.
+    fingerprinter: If provided, every extracted element is added to it, so the
+      state fingerprint is computed in the same pass as the conversion.
 
   Returns:
     The extracted UI elements.
@@ -162,6 +249,218 @@ def forest_to_ui_elements(
       if not node.child_ids or node.content_description or node.is_scrollable:
         if exclude_invisible_elements and not node.is_visible_to_user:
           continue
-        else:
-          elements.append(_accessibility_node_to_ui_element(node, screen_size))
+        element = _accessibility_node_to_ui_element(node, screen_size)
+        if fingerprinter is not None:
+          fingerprinter.update(element)
+        elements.append(element)
   return elements
+
+
+# Columns of UIElementTable.flags, with the a11y node field each is read from.
+_FLAG_FIELDS = (
+    ('is_checked', 'is_checked'),
+    ('is_checkable', 'is_checkable'),
+    ('is_clickable', 'is_clickable'),
+    ('is_editable', 'is_editable'),
+    ('is_enabled', 'is_enabled'),
+    ('is_focused', 'is_focused'),
+    ('is_focusable', 'is_focusable'),
+    ('is_long_clickable', 'is_long_clickable'),
+    ('is_scrollable', 'is_scrollable'),
+    ('is_selected', 'is_selected'),
+    ('is_visible', 'is_visible_to_user'),
+)
+_FLAG_COLUMNS = {name: i for i, (name, _) in enumerate(_FLAG_FIELDS)}
+
+# UIElementTable.strings fields, with the a11y node field each is read from.
+_STRING_FIELDS = (
+    ('text', 'text'),
+    ('content_description', 'content_description'),
+    ('class_name', 'class_name'),
+    ('hint_text', 'hint_text'),
+    ('package_name', 'package_name'),
+    ('resource_name', 'view_id_resource_name'),
+)
+
+
+def _intern_or_none(text: str) -> Optional[str]:
+  """Returns None for empty strings, else an interned copy of `text`."""
+  return sys.intern(text) if text else None
+
+
+@dataclasses.dataclass(frozen=True)
+class UIElementTable:
+  """Columnar representation of the UI elements in a forest.
+
+  Produced by `forest_to_ui_element_table`. Row i of every array describes the
+  same element; `len(table)` elements are present. Strings are interned, so
+  repeated class and package names share a single object across rows and
+  observations.
+
+  Indexing or iterating yields `UIElementView`s, which expose the same
+  attributes as `UIElement` without materializing one per row.
+
+  Attributes:
+    bbox_pixels: int32 array of shape (n, 4) with (x_min, x_max, y_min, y_max).
+    bbox: float64 array of shape (n, 4) with normalized coordinates, or None if
+      no screen size was given.
+    flags: bool array of shape (n, len(_FLAG_FIELDS)).
+    strings: Mapping from string field name to a per-row list of values.
+  """
+
+  bbox_pixels: np.ndarray
+  bbox: Optional[np.ndarray]
+  flags: np.ndarray
+  strings: dict[str, list[Optional[str]]]
+
+  def __len__(self) -> int:
+    return self.bbox_pixels.shape[0]
+
+  def __getitem__(self, index: int) -> 'UIElementView':
+    if index < 0:
+      index += len(self)
+    if not 0 <= index < len(self):
+      raise IndexError(f'UI element index out of range: {index}')
+    return UIElementView(self, index)
+
+  def __iter__(self) -> Iterator['UIElementView']:
+    for index in range(len(self)):
+      yield UIElementView(self, index)
+
+  def flag(self, name: str) -> np.ndarray:
+    """Returns the boolean column for flag `name`, e.g. 'is_clickable'."""
+    return self.flags[:, _FLAG_COLUMNS[name]]
+
+  def to_ui_elements(self) -> list[UIElement]:
+    """Materializes the table as `UIElement`s."""
+    return [view.to_ui_element() for view in self]
+
+
+def _string_property(name: str) -> property:
+  return property(lambda self: self._table.strings[name][self._index])  # pylint: disable=protected-access
+
+
+def _flag_property(column: int) -> property:
+  return property(lambda self: bool(self._table.flags[self._index, column]))  # pylint: disable=protected-access
+
+
+class UIElementView:
+  """Read-only view of one row of a `UIElementTable`.
+
+  Exposes the attributes of `UIElement`, so it can be passed to code that reads
+  UI elements. Bounding boxes are materialized on access.
+  """
+
+  __slots__ = ('_table', '_index')
+
+  def __init__(self, table: UIElementTable, index: int):
+    self._table = table
+    self._index = index
+
+  # String and flag attributes are attached below the class definition.
+  tooltip = None
+  resource_id = None
+
+  @property
+  def bbox_pixels(self) -> BoundingBox:
+    return BoundingBox(*self._table.bbox_pixels[self._index].tolist())
+
+  @property
+  def bbox(self) -> Optional[BoundingBox]:
+    if self._table.bbox is None:
+      return None
+    return BoundingBox(*self._table.bbox[self._index].tolist())
+
+  def to_ui_element(self) -> UIElement:
+    return UIElement(
+        **{
+            field.name: getattr(self, field.name)
+            for field in dataclasses.fields(UIElement)
+        }
+    )
+
+  def __eq__(self, other: Any) -> bool:
+    if isinstance(other, (UIElement, UIElementView)):
+      return self.to_ui_element() == (
+          other if isinstance(other, UIElement) else other.to_ui_element()
+      )
+    return NotImplemented
+
+  __hash__ = None
+
+  def __repr__(self) -> str:
+    return f'UIElementView({self.to_ui_element()!r})'
+
+
+for _name, _ in _STRING_FIELDS:
+  setattr(UIElementView, _name, _string_property(_name))
+for _name, _column in _FLAG_COLUMNS.items():
+  setattr(UIElementView, _name, _flag_property(_column))
+
+
+def forest_to_ui_element_table(
+    forest: Any,
+    exclude_invisible_elements: bool = False,
+    screen_size: Optional[tuple[int, int]] = None,
+) -> UIElementTable:
+  """Columnar version of `forest_to_ui_elements`.
+
+  Selects the same nodes in the same order, but stores them in arrays instead
+  of allocating a `UIElement` and two `BoundingBox`es per node. Visibility
+  filtering and bounding box normalization are array operations.
+
+  Args:
+    forest: The forest to extract leaf nodes from.
+    exclude_invisible_elements: True if invisible elements should not be
+      returned.
+    screen_size: The size of the device screen in pixels.
+
+  Returns:
+    The extracted UI elements.
+  """
+  candidates = [
+      node
+      for window in forest.windows
+      for node in window.tree.nodes
+      if not node.child_ids or node.content_description or node.is_scrollable
+  ]
+  num_flags = len(_FLAG_FIELDS)
+  get_flags = operator.attrgetter(*(field for _, field in _FLAG_FIELDS))
+  flags = np.fromiter(
+      itertools.chain.from_iterable(map(get_flags, candidates)),
+      dtype=bool,
+      count=len(candidates) * num_flags,
+  ).reshape(-1, num_flags)
+  if exclude_invisible_elements:
+    visible = flags[:, _FLAG_COLUMNS['is_visible']]
+    flags = flags[visible]
+    kept_nodes = list(itertools.compress(candidates, visible.tolist()))
+  else:
+    kept_nodes = candidates
+
+  get_bounds = operator.attrgetter('left', 'right', 'top', 'bottom')
+  bbox_pixels = np.fromiter(
+      itertools.chain.from_iterable(
+          get_bounds(node.bounds_in_screen) for node in kept_nodes
+      ),
+      dtype=np.int32,
+      count=len(kept_nodes) * 4,
+  ).reshape(-1, 4)
+  bbox = None
+  if screen_size is not None:
+    width, height = screen_size
+    bbox = bbox_pixels / np.array([width, width, height, height], dtype=float)
+  get_strings = operator.attrgetter(*(field for _, field in _STRING_FIELDS))
+  columns = list(zip(*[get_strings(node) for node in kept_nodes]))
+  if not columns:
+    columns = [()] * len(_STRING_FIELDS)
+  strings = {
+      name: [_intern_or_none(text) for text in column]
+      for (name, _), column in zip(_STRING_FIELDS, columns)
+  }
+  return UIElementTable(
+      bbox_pixels=bbox_pixels,
+      bbox=bbox,
+      flags=flags,
+      strings=strings,
+  )
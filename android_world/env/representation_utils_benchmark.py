@@ -0,0 +1,148 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks forest_to_ui_elements against forest_to_ui_element_table.
+
+Usage:
+  python -m android_world.env.representation_utils_benchmark \\
+      --num_nodes=100,1000,5000
+"""
+
+from collections.abc import Sequence
+import functools
+import gc
+import random
+import timeit
+import tracemalloc
+
+from absl import app
+from absl import flags
+from android_env.proto.a11y import android_accessibility_forest_pb2
+from android_world.env import representation_utils
+
+_NUM_NODES = flags.DEFINE_list(
+    'num_nodes',
+    ['100', '1000', '5000'],
+    'Forest sizes, in nodes, to benchmark.',
+)
+_REPEATS = flags.DEFINE_integer(
+    'repeats', 20, 'Number of conversions timed per forest size.'
+)
+_SCREEN_SIZE = (1080, 2400)
+
+
+def make_forest(
+    num_nodes: int, seed: int = 0
+) -> android_accessibility_forest_pb2.AndroidAccessibilityForest:
+  """Creates a list-like forest, similar to a long Joplin or Files screen.
+
+  Args:
+    num_nodes: Total number of nodes in the forest.
+    seed: Random seed.
+
+  Returns:
+    A forest with a single scrollable list whose rows each hold two labels.
+    Only the top half of the rows is visible.
+  """
+  rng = random.Random(seed)
+  forest = android_accessibility_forest_pb2.AndroidAccessibilityForest()
+  tree = forest.windows.add().tree
+  root = tree.nodes.add(
+      unique_id=0,
+      class_name='androidx.recyclerview.widget.RecyclerView',
+      package_name='net.cozic.joplin',
+      is_scrollable=True,
+      is_visible_to_user=True,
+  )
+  for i in range(1, num_nodes):
+    top = (i * 40) % _SCREEN_SIZE[1]
+    is_row = i % 3 == 1
+    node = tree.nodes.add(
+        unique_id=i,
+        class_name=(
+            'android.view.ViewGroup' if is_row else 'android.widget.TextView'
+        ),
+        package_name='net.cozic.joplin',
+        text='' if is_row else f'Note title {rng.randrange(10_000)}',
+        view_id_resource_name='net.cozic.joplin:id/note_row',
+        is_clickable=is_row,
+        is_enabled=True,
+        is_visible_to_user=top < _SCREEN_SIZE[1] // 2,
+    )
+    node.bounds_in_screen.left = 0
+    node.bounds_in_screen.right = _SCREEN_SIZE[0]
+    node.bounds_in_screen.top = top
+    node.bounds_in_screen.bottom = top + 40
+    if is_row:
+      node.child_ids.extend([i + 1, i + 2])
+      root.child_ids.append(i)
+  return forest
+
+
+def _measure(fn) -> tuple[float, int, int]:
+  """Measures one conversion function.
+
+  Args:
+    fn: Function performing one conversion.
+
+  Returns:
+    The best wall time per call, the peak allocation of one call in bytes and
+    the number of GC-tracked objects kept alive by the result.
+  """
+  gc.collect()
+  seconds = min(timeit.repeat(fn, number=1, repeat=_REPEATS.value))
+  tracemalloc.start()
+  fn()
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  gc.collect()
+  num_objects_before = len(gc.get_objects())
+  result = fn()
+  num_objects = len(gc.get_objects()) - num_objects_before
+  del result
+  return seconds, peak, num_objects
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+
+  print(
+      f'{"nodes":>8} {"path":>6} {"ms/call":>9} {"peak KiB":>9}'
+      f' {"objects":>8} {"speedup":>8}'
+  )
+  for num_nodes in [int(n) for n in _NUM_NODES.value]:
+    forest = make_forest(num_nodes)
+    baseline_secs = None
+    for path, convert in (
+        ('list', representation_utils.forest_to_ui_elements),
+        ('table', representation_utils.forest_to_ui_element_table),
+    ):
+      secs, peak, num_objects = _measure(
+          functools.partial(
+              convert,
+              forest,
+              exclude_invisible_elements=True,
+              screen_size=_SCREEN_SIZE,
+          )
+      )
+      baseline_secs = baseline_secs or secs
+      print(
+          f'{num_nodes:>8} {path:>6} {secs * 1e3:>9.2f} {peak / 1024:>9.1f}'
+          f' {num_objects:>8} {baseline_secs / secs:>7.2f}x'
+      )
+
+
+if __name__ == '__main__':
+  app.run(main)
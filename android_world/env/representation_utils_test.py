@@ -17,6 +17,7 @@ from unittest import mock
 
 from absl.testing import absltest
 from absl.testing import parameterized
+from android_env.proto.a11y import android_accessibility_forest_pb2
 from android_world.env import representation_utils
 
 
@@ -115,5 +116,158 @@ class TestAccessibilityNodeToUIElement(parameterized.TestCase):
     self.assertEqual(ui_element.bbox, expected_normalized_bbox)
 
 
+def _create_forest() -> (
+    android_accessibility_forest_pb2.AndroidAccessibilityForest
+):
+  forest = android_accessibility_forest_pb2.AndroidAccessibilityForest()
+  tree = forest.windows.add().tree
+  tree.nodes.add(
+      unique_id=0,
+      class_name='android.widget.FrameLayout',
+      child_ids=[1, 2, 3],
+      is_visible_to_user=True,
+  )
+  tree.nodes.add(
+      unique_id=1,
+      class_name='android.widget.TextView',
+      text='Hello',
+      package_name='com.example',
+      is_clickable=True,
+      is_visible_to_user=True,
+  )
+  tree.nodes.add(
+      unique_id=2,
+      class_name='android.widget.ListView',
+      child_ids=[4],
+      is_scrollable=True,
+      is_visible_to_user=True,
+  )
+  tree.nodes.add(
+      unique_id=3,
+      class_name='android.widget.TextView',
+      text='Hidden',
+      is_visible_to_user=False,
+  )
+  for i, node in enumerate(tree.nodes):
+    node.bounds_in_screen.left = 10 * i
+    node.bounds_in_screen.right = 10 * i + 50
+    node.bounds_in_screen.top = 20 * i
+    node.bounds_in_screen.bottom = 20 * i + 40
+  return forest
+
+
+class ForestToUIElementTableTest(parameterized.TestCase):
+
+  @parameterized.product(
+      exclude_invisible_elements=[True, False],
+      screen_size=[None, (100, 200)],
+  )
+  def test_matches_forest_to_ui_elements(
+      self, exclude_invisible_elements, screen_size
+  ):
+    forest = _create_forest()
+
+    expected = representation_utils.forest_to_ui_elements(
+        forest,
+        exclude_invisible_elements=exclude_invisible_elements,
+        screen_size=screen_size,
+    )
+    table = representation_utils.forest_to_ui_element_table(
+        forest,
+        exclude_invisible_elements=exclude_invisible_elements,
+        screen_size=screen_size,
+    )
+
+    self.assertLen(table, len(expected))
+    self.assertEqual(table.to_ui_elements(), expected)
+    self.assertEqual(list(table), expected)
+    for view, element in zip(table, expected):
+      self.assertEqual(view.text, element.text)
+      self.assertEqual(view.is_scrollable, element.is_scrollable)
+      self.assertEqual(view.bbox_pixels, element.bbox_pixels)
+      self.assertEqual(view.bbox, element.bbox)
+
+  def test_views_are_slotted_and_strings_interned(self):
+    forest = _create_forest()
+    forest.windows[0].tree.nodes[3].class_name = ''.join(
+        ['android.widget.', 'TextView']
+    )
+
+    table = representation_utils.forest_to_ui_element_table(forest)
+
+    with self.assertRaises(AttributeError):
+      table[0].__dict__  # pylint: disable=pointless-statement
+    self.assertIs(table[0].class_name, table[2].class_name)
+    self.assertEqual(table[-1].text, 'Hidden')
+    self.assertEqual(
+        table.flag('is_clickable').tolist(), [True, False, False]
+    )
+
+  def test_empty_forest(self):
+    forest = android_accessibility_forest_pb2.AndroidAccessibilityForest()
+
+    table = representation_utils.forest_to_ui_element_table(
+        forest, screen_size=(100, 200)
+    )
+
+    self.assertEmpty(table)
+    self.assertEqual(table.to_ui_elements(), [])
+
+
+class UIFingerprintTest(absltest.TestCase):
+
+  def test_incremental_fingerprint_matches_element_fingerprint(self):
+    forest = _create_forest()
+    fingerprinter = representation_utils.UIFingerprinter()
+
+    elements = representation_utils.forest_to_ui_elements(
+        forest, fingerprinter=fingerprinter
+    )
+
+    self.assertEqual(
+        fingerprinter.fingerprint(),
+        representation_utils.fingerprint_ui_elements(elements),
+    )
+
+  def test_text_change_only_changes_content(self):
+    forest = _create_forest()
+    before = representation_utils.fingerprint_ui_elements(
+        representation_utils.forest_to_ui_elements(forest)
+    )
+    forest.windows[0].tree.nodes[1].text = 'Goodbye'
+
+    after = representation_utils.fingerprint_ui_elements(
+        representation_utils.forest_to_ui_elements(forest)
+    )
+
+    self.assertEqual(before.layout, after.layout)
+    self.assertNotEqual(before.content, after.content)
+
+  def test_layout_change_changes_both(self):
+    forest = _create_forest()
+    before = representation_utils.fingerprint_ui_elements(
+        representation_utils.forest_to_ui_elements(forest)
+    )
+    forest.windows[0].tree.nodes[1].bounds_in_screen.top += 1
+
+    after = representation_utils.fingerprint_ui_elements(
+        representation_utils.forest_to_ui_elements(forest)
+    )
+
+    self.assertNotEqual(before.layout, after.layout)
+    self.assertNotEqual(before.content, after.content)
+
+  def test_element_order_matters(self):
+    elements = [
+        representation_utils.UIElement(text='a'),
+        representation_utils.UIElement(text='b'),
+    ]
+
+    self.assertNotEqual(
+        representation_utils.fingerprint_ui_elements(elements),
+        representation_utils.fingerprint_ui_elements(elements[::-1]),
+    )
+
+
 if __name__ == '__main__':
   absltest.main()
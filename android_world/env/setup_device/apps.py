@@ -323,17 +323,11 @@ class SimpleCalendarProApp(AppSetup):
     )
     adb_utils.grant_permissions(
         calendar_package,
-        "android.permission.READ_CALENDAR",
-        env.controller,
-    )
-    adb_utils.grant_permissions(
-        calendar_package,
-        "android.permission.WRITE_CALENDAR",
-        env.controller,
-    )
-    adb_utils.grant_permissions(
-        calendar_package,
-        "android.permission.POST_NOTIFICATIONS",
+        [
+            "android.permission.READ_CALENDAR",
+            "android.permission.WRITE_CALENDAR",
+            "android.permission.POST_NOTIFICATIONS",
+        ],
         env.controller,
     )
 
@@ -380,8 +374,7 @@ class SimpleGalleryProApp(AppSetup):
     package = adb_utils.extract_package_name(
         adb_utils.get_adb_activity(cls.app_name)
     )
-    for permission in cls.PERMISSIONS:
-      adb_utils.grant_permissions(package, permission, env.controller)
+    adb_utils.grant_permissions(package, cls.PERMISSIONS, env.controller)
 
     adb_utils.launch_app("simple gallery pro", env.controller)
     try:
@@ -435,12 +428,10 @@ class AudioRecorder(AppSetup):
     super().setup(env)
     adb_utils.grant_permissions(
         "com.dimowner.audiorecorder",
-        "android.permission.RECORD_AUDIO",
-        env.controller,
-    )
-    adb_utils.grant_permissions(
-        "com.dimowner.audiorecorder",
-        "android.permission.POST_NOTIFICATIONS",
+        [
+            "android.permission.RECORD_AUDIO",
+            "android.permission.POST_NOTIFICATIONS",
+        ],
         env.controller,
     )
 
@@ -566,25 +557,29 @@ class OsmAndApp(AppSetup):
     package = adb_utils.extract_package_name(
         adb_utils.get_adb_activity(cls.app_name)
     )
-    for permission in cls.PERMISSIONS:
-      adb_utils.grant_permissions(package, permission, env.controller)
+    adb_utils.grant_permissions(package, cls.PERMISSIONS, env.controller)
 
     # Copy maps to data directory.
     cls._copy_data_to_device(cls.MAP_NAMES, cls.DEVICE_MAPS_PATH, env)
 
     # Make sure security context is correct so that the files can be accessed.
-    for map_file in cls.MAP_NAMES:
-      adb_utils.check_ok(
-          adb_utils.issue_generic_request(
-              [
-                  "shell",
-                  "chcon",
-                  "u:object_r:media_rw_data_file:s0",
-                  os.path.join(cls.DEVICE_MAPS_PATH, map_file),
-              ],
-              env.controller,
-          )
-      )
+    results = adb_utils.issue_generic_requests(
+        [
+            [
+                "shell",
+                "chcon",
+                "u:object_r:media_rw_data_file:s0",
+                os.path.join(cls.DEVICE_MAPS_PATH, map_file),
+            ]
+            for map_file in cls.MAP_NAMES
+        ],
+        env.controller,
+    )
+    for result in results:
+      if not result.ok:
+        raise RuntimeError(
+            f"ADB command failed: {result.command}: {result.output.decode()}"
+        )
 
     adb_utils.close_app(cls.app_name, env.controller)
 
@@ -606,17 +601,11 @@ class OpenTracksApp(AppSetup):
     )
     adb_utils.grant_permissions(
         open_tracks_package,
-        "android.permission.ACCESS_COARSE_LOCATION",
-        env.controller,
-    )
-    adb_utils.grant_permissions(
-        open_tracks_package,
-        "android.permission.ACCESS_FINE_LOCATION",
-        env.controller,
-    )
-    adb_utils.grant_permissions(
-        open_tracks_package,
-        "android.permission.POST_NOTIFICATIONS",
+        [
+            "android.permission.ACCESS_COARSE_LOCATION",
+            "android.permission.ACCESS_FINE_LOCATION",
+            "android.permission.POST_NOTIFICATIONS",
+        ],
         env.controller,
     )
     time.sleep(2.0)
@@ -694,12 +683,10 @@ class JoplinApp(AppSetup):
     )
     adb_utils.grant_permissions(
         joplin_package,
-        "android.permission.ACCESS_COARSE_LOCATION",
-        env.controller,
-    )
-    adb_utils.grant_permissions(
-        joplin_package,
-        "android.permission.ACCESS_FINE_LOCATION",
+        [
+            "android.permission.ACCESS_COARSE_LOCATION",
+            "android.permission.ACCESS_FINE_LOCATION",
+        ],
         env.controller,
     )
 
@@ -749,8 +736,7 @@ class RetroMusicApp(AppSetup):
     package = adb_utils.extract_package_name(
         adb_utils.get_adb_activity("retro music")
     )
-    for permission in cls.PERMISSIONS:
-      adb_utils.grant_permissions(package, permission, env.controller)
+    adb_utils.grant_permissions(package, cls.PERMISSIONS, env.controller)
 
     adb_utils.launch_app(cls.app_name, env.controller)
     time.sleep(2.0)
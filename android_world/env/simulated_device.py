@@ -0,0 +1,739 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-process Android device simulator for throughput testing.
+
+`SimulatedDevice` implements `AndroidEnvInterface` without an emulator. It
+keeps settings, files, content providers and the foreground activity in
+memory, answers the ADB requests the harness commonly issues from that model,
+produces synthetic a11y forests of configurable size and sleeps according to a
+`LatencyModel`. Hundreds of them fit in one process, which makes it possible to
+load-test the suite runner, checkpointing and the parallel modes:
+
+```
+pool = env_pool.EnvPool(
+    num_envs=200,
+    env_factory=lambda console_port, grpc_port: simulated_device.create_env(
+        latency=simulated_device.EMULATOR_LATENCY, seed=console_port
+    ),
+)
+```
+
+The simulator does not run apps, so it is no substitute for an emulator when
+evaluating agents. Shell commands it does not model succeed with no output and
+are counted in `SimulatedDevice.unhandled_commands`.
+"""
+
+import collections
+from collections.abc import Mapping
+import dataclasses
+import fnmatch
+import math
+import os
+import posixpath
+import random
+import re
+import shlex
+import threading
+import time
+from typing import Any, Optional
+
+from android_env import env_interface
+from android_env.proto import adb_pb2
+from android_env.proto.a11y import android_accessibility_forest_pb2
+from android_env.proto.a11y import android_accessibility_window_info_pb2
+from android_world.env import adb_tracing
+from android_world.env import android_world_controller
+from android_world.env import interface
+import dm_env
+from dm_env import specs
+import numpy as np
+
+_Forest = android_accessibility_forest_pb2.AndroidAccessibilityForest
+_WindowInfo = (
+    android_accessibility_window_info_pb2.AndroidAccessibilityWindowInfo
+)
+
+HOME_ACTIVITY = 'com.google.android.apps.nexuslauncher/.NexusLauncherActivity'
+
+_DEFAULT_SETTINGS = {
+    ('global', 'airplane_mode_on'): '0',
+    ('global', 'auto_time'): '1',
+    ('global', 'auto_time_zone'): '1',
+    ('system', 'screen_brightness'): '128',
+    ('system', 'pointer_location'): '0',
+}
+
+_DEFAULT_DIRECTORIES = (
+    '/sdcard',
+    '/sdcard/Android',
+    '/sdcard/DCIM',
+    '/sdcard/Documents',
+    '/sdcard/Download',
+    '/sdcard/Movies',
+    '/sdcard/Music',
+    '/sdcard/Pictures',
+    '/data',
+    '/data/data',
+)
+
+# The script `file_utils.check_file_exists` runs to test a path.
+_FILE_TEST_SCRIPT = re.compile(r'if \[ (-[def]) "(.*?)" \]; then')
+
+# One command of a script built by `adb_utils.issue_generic_requests`.
+_BATCH_COMMAND = re.compile(
+    r"\( (.*?)\n\) </dev/null 2>&1; (?:s=\$\?; )?"
+    r"printf '\\n(__android_world_batch_\w+?__) %d\\n' \$[?s]"
+    r"(; \[ \$s -eq 0 \] \|\| exit 0)?\n",
+    re.DOTALL,
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class LatencyModel:
+  """Log-normally distributed latencies of simulated device operations.
+
+  Attributes:
+    default_median_secs: Median latency of an ADB request.
+    median_secs: Median latency by `adb_tracing` command class, overriding
+      `default_median_secs`.
+    step_median_secs: Median latency of capturing an observation.
+    sigma: Standard deviation of the logarithm of latencies. 0 makes every
+      latency equal to its median; 0.5 gives a long tail similar to emulators.
+    timeout_rate: Fraction of ADB requests that time out. A timed out request
+      takes `timeout_secs` and has no effect.
+    timeout_secs: Latency of timed out requests.
+  """
+
+  default_median_secs: float = 0.0
+  median_secs: Mapping[str, float] = dataclasses.field(default_factory=dict)
+  step_median_secs: float = 0.0
+  sigma: float = 0.0
+  timeout_rate: float = 0.0
+  timeout_secs: float = 1.0
+
+  def sample(self, median_secs: float, rng: random.Random) -> float:
+    """Returns a latency with the given median."""
+    if median_secs <= 0:
+      return 0.0
+    if self.sigma <= 0:
+      return median_secs
+    return median_secs * math.exp(rng.gauss(0.0, self.sigma))
+
+  def sample_adb(self, command_class: str, rng: random.Random) -> float:
+    """Returns the latency of an ADB request of the given class."""
+    return self.sample(
+        self.median_secs.get(command_class, self.default_median_secs), rng
+    )
+
+
+# No latency at all; the default.
+NO_LATENCY = LatencyModel()
+
+# Rough latencies of a local emulator.
+EMULATOR_LATENCY = LatencyModel(
+    default_median_secs=0.03,
+    median_secs={
+        adb_tracing.TAP: 0.1,
+        adb_tracing.SWIPE: 0.3,
+        adb_tracing.TEXT: 0.1,
+        adb_tracing.KEYEVENT: 0.1,
+        adb_tracing.DUMPSYS: 0.08,
+        adb_tracing.CONTENT_QUERY: 0.05,
+        adb_tracing.FILE_TRANSFER: 0.15,
+        adb_tracing.ACTIVITY: 0.3,
+        adb_tracing.BATCH: 0.05,
+    },
+    step_median_secs=0.06,
+    sigma=0.5,
+)
+
+
+def _generic_response(output: str | bytes = b'') -> adb_pb2.AdbResponse:
+  if isinstance(output, str):
+    output = output.encode('utf-8')
+  return adb_pb2.AdbResponse(
+      status=adb_pb2.AdbResponse.Status.OK,
+      generic=adb_pb2.AdbResponse.GenericResponse(output=output),
+  )
+
+
+def _split_command(line: str) -> list[str]:
+  try:
+    return shlex.split(line)
+  except ValueError:
+    return line.split()
+
+
+class SimulatedDevice(env_interface.AndroidEnvInterface):
+  """A virtual Android device backed by an in-memory model.
+
+  Any UI input (taps, swipes, text, key events, app launches) moves the device
+  to a new screen, whose forest has `num_nodes` elements with different text.
+  All methods are thread-safe.
+  """
+
+  # Tells `AndroidWorldController` that a11y forests are built in, so it does
+  # not need to forward them from the device over gRPC.
+  provides_a11y_tree = True
+
+  def __init__(
+      self,
+      screen_size: tuple[int, int] = (1080, 2400),
+      num_nodes: int = 50,
+      latency: LatencyModel = NO_LATENCY,
+      seed: int = 0,
+  ):
+    """Initializes the device.
+
+    Args:
+      screen_size: Screen (width, height) in pixels.
+      num_nodes: Number of UI elements on each screen.
+      latency: Latencies of device operations.
+      seed: Seed of the latency samples.
+    """
+    self._default_screen_size = screen_size
+    self._screen_size = screen_size
+    self._num_nodes = num_nodes
+    self._latency = latency
+    self._rng = random.Random(seed)
+    self._lock = threading.RLock()
+    self._pixels = self._create_pixels()
+
+    self.settings: dict[tuple[str, str], str] = dict(_DEFAULT_SETTINGS)
+    self.files: dict[str, bytes] = {}
+    self.directories: set[str] = set(_DEFAULT_DIRECTORIES)
+    self.content: dict[str, list[dict[str, str]]] = {}
+    self.foreground_activity = HOME_ACTIVITY
+    self.orientation = 0
+    # Number of times each shell command (its first word) was not modeled.
+    self.unhandled_commands: collections.Counter[str] = collections.Counter()
+
+    self._screen = 0
+    self._forest: Optional[_Forest] = None
+    self._new_events = 0
+    # Screen of the last forest sent to the accumulated extras.
+    self._sent_screen: Optional[int] = None
+    self._accumulated_extras: dict[str, list[Any]] = {}
+    self._num_requests = 0
+    self._num_steps = 0
+
+  def _create_pixels(self) -> np.ndarray:
+    width, height = self._screen_size
+    # Shared by all observations, so it must not be written to.
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    pixels.flags.writeable = False
+    return pixels
+
+  def _sleep(self, secs: float) -> None:
+    if secs > 0:
+      time.sleep(secs)
+
+  def _capture(self) -> dict[str, Any]:
+    """Returns an observation after the time it takes to capture it."""
+    self._sleep(self._latency.sample(self._latency.step_median_secs, self._rng))
+    return self._observation()
+
+  def _on_input(self) -> None:
+    """Moves to a new screen."""
+    self._screen += 1
+    self._forest = None
+    self._new_events += 1
+
+  # AndroidEnvInterface.
+
+  def action_spec(self) -> dict[str, specs.Array]:
+    return {
+        'action_type': specs.DiscreteArray(num_values=3, name='action_type'),
+        'touch_position': specs.BoundedArray(
+            shape=(2,),
+            dtype=np.float32,
+            minimum=0.0,
+            maximum=1.0,
+            name='touch_position',
+        ),
+    }
+
+  def observation_spec(self) -> dict[str, specs.Array]:
+    width, height = self._screen_size
+    return {
+        'pixels': specs.Array(
+            shape=(height, width, 3), dtype=np.uint8, name='pixels'
+        ),
+        'timedelta': specs.Array(shape=(), dtype=np.int64, name='timedelta'),
+        'orientation': specs.Array(
+            shape=(4,), dtype=np.uint8, name='orientation'
+        ),
+    }
+
+  def _observation(self) -> dict[str, Any]:
+    orientation = np.zeros(4, dtype=np.uint8)
+    orientation[self.orientation] = 1
+    return {
+        'pixels': self._pixels,
+        'timedelta': np.array(0, dtype=np.int64),
+        'orientation': orientation,
+    }
+
+  def reset(self) -> dm_env.TimeStep:
+    with self._lock:
+      # Like `A11yGrpcWrapper.reset`, which starts a new accumulation. The
+      # forwarder sends the current forest again once it is resumed.
+      self._accumulated_extras = {}
+      self._sent_screen = None
+      self._new_events = 0
+      return dm_env.restart(self._capture())
+
+  def step(self, action: dict[str, np.ndarray]) -> dm_env.TimeStep:
+    with self._lock:
+      self._num_steps += 1
+      return dm_env.transition(reward=0.0, observation=self._capture())
+
+  def close(self) -> None:
+    pass
+
+  def stats(self) -> dict[str, Any]:
+    with self._lock:
+      return {
+          'num_adb_requests': self._num_requests,
+          'num_steps': self._num_steps,
+          'num_screens': self._screen + 1,
+          'unhandled_commands': dict(self.unhandled_commands),
+      }
+
+  # Extensions of `a11y_grpc_wrapper.A11yGrpcWrapper`.
+
+  def accumulate_new_extras(self) -> dict[str, Any]:
+    """Returns all the forests and a11y events accumulated since the reset.
+
+    Like `A11yGrpcWrapper.accumulate_new_extras`, the new forest and events are
+    appended to those of earlier calls, so the lengths only grow when the
+    device is active.
+    """
+    with self._lock:
+      # Like the gRPC forwarder, which needs networking.
+      if self.settings.get(('global', 'airplane_mode_on')) != '1':
+        for key, values in self._new_extras().items():
+          self._accumulated_extras.setdefault(key, []).extend(values)
+      return {
+          key: list(values) for key, values in self._accumulated_extras.items()
+      }
+
+  def _new_extras(self) -> dict[str, list[Any]]:
+    """Returns the forest and events the forwarder sent since the last call."""
+    extras = {}
+    if self._sent_screen != self._screen:
+      self._sent_screen = self._screen
+      extras['accessibility_tree'] = [self._current_forest()]
+    if self._new_events:
+      extras['full_event'] = [f'event {self._screen}'] * self._new_events
+      self._new_events = 0
+    return extras
+
+  def attempt_enable_networking(self) -> None:
+    with self._lock:
+      self.settings['global', 'airplane_mode_on'] = '0'
+
+  def _current_forest(self) -> _Forest:
+    if self._forest is None:
+      self._forest = self._create_forest()
+    return self._forest
+
+  def _create_forest(self) -> _Forest:
+    """Builds a list screen of `num_nodes` rows below a root layout."""
+    width, height = self._screen_size
+    package = self.foreground_activity.split('/')[0]
+    forest = _Forest()
+    tree = forest.windows.add(
+        id=0, window_type=_WindowInfo.TYPE_APPLICATION
+    ).tree
+    root = tree.nodes.add(
+        unique_id=0,
+        class_name='android.widget.FrameLayout',
+        package_name=package,
+        is_visible_to_user=True,
+        is_enabled=True,
+    )
+    root.bounds_in_screen.right = width
+    root.bounds_in_screen.bottom = height
+    row_height = max(1, height // max(1, self._num_nodes))
+    for i in range(self._num_nodes):
+      top = min(i * row_height, height - 1)
+      node = tree.nodes.add(
+          unique_id=i + 1,
+          class_name='android.widget.TextView',
+          package_name=package,
+          text=f'Item {i} on screen {self._screen}',
+          view_id_resource_name=f'{package}:id/item_{i}',
+          is_clickable=True,
+          is_enabled=True,
+          is_focusable=True,
+          is_visible_to_user=True,
+      )
+      node.bounds_in_screen.top = top
+      node.bounds_in_screen.right = width
+      node.bounds_in_screen.bottom = min(top + row_height, height)
+      root.child_ids.append(i + 1)
+    return forest
+
+  # ADB.
+
+  def execute_adb_call(self, call: adb_pb2.AdbRequest) -> adb_pb2.AdbResponse:
+    with self._lock:
+      self._num_requests += 1
+      if self._rng.random() < self._latency.timeout_rate:
+        self._sleep(self._latency.timeout_secs)
+        return adb_pb2.AdbResponse(
+            status=adb_pb2.AdbResponse.Status.TIMEOUT,
+            error_message='Simulated timeout.',
+        )
+      self._sleep(
+          self._latency.sample_adb(adb_tracing.classify(call), self._rng)
+      )
+      return self._execute(call)
+
+  def _execute(self, call: adb_pb2.AdbRequest) -> adb_pb2.AdbResponse:
+    """Applies a request to the model and returns its response."""
+    command = call.WhichOneof('command')
+    if command == 'generic':
+      return self._execute_generic(list(call.generic.args))
+    response = adb_pb2.AdbResponse(status=adb_pb2.AdbResponse.Status.OK)
+    if command == 'get_current_activity':
+      response.get_current_activity.full_activity = self.foreground_activity
+    elif command == 'start_activity':
+      self._start_activity(call.start_activity.full_activity)
+      response.start_activity.full_activity = self.foreground_activity
+    elif command == 'press_button':
+      if call.press_button.button == adb_pb2.AdbRequest.PressButton.HOME:
+        self.foreground_activity = HOME_ACTIVITY
+      self._on_input()
+    elif command == 'force_stop':
+      self._force_stop(call.force_stop.package_name)
+    elif command in ('tap', 'input_text'):
+      self._on_input()
+    elif command == 'get_orientation':
+      response.get_orientation.orientation = self.orientation
+    elif command == 'push':
+      self._write_file(call.push.path, call.push.content)
+    elif command == 'pull':
+      if call.pull.path not in self.files:
+        return adb_pb2.AdbResponse(
+            status=adb_pb2.AdbResponse.Status.ADB_ERROR,
+            error_message=f'{call.pull.path}: No such file or directory',
+        )
+      response.pull.content = self.files[call.pull.path]
+    return response
+
+  def _execute_generic(self, args: list[str]) -> adb_pb2.AdbResponse:
+    if not args:
+      return _generic_response()
+    if args[0] == 'shell':
+      line = ' '.join(args[1:])
+      if _BATCH_COMMAND.match(line):
+        return _generic_response(self._run_batch(line))
+      output, _ = self._run_shell(line)
+      return _generic_response(output)
+    if args[0] == 'push' and len(args) == 3:
+      return self._push(args[1], args[2])
+    if args[0] == 'pull' and len(args) == 3:
+      return self._pull(args[1], args[2])
+    # root, wait-for-device, ...
+    return _generic_response()
+
+  def _push(self, local_path: str, remote_path: str) -> adb_pb2.AdbResponse:
+    if self._is_directory(remote_path):
+      remote_path = posixpath.join(remote_path, os.path.basename(local_path))
+    with open(local_path, 'rb') as f:
+      self._write_file(remote_path, f.read())
+    return _generic_response(f'{local_path}: 1 file pushed.')
+
+  def _pull(self, remote_path: str, local_path: str) -> adb_pb2.AdbResponse:
+    """Copies a file or directory to the host, like `adb pull`."""
+    remote_path = posixpath.normpath(remote_path)
+    if os.path.isdir(local_path):
+      local_path = os.path.join(local_path, posixpath.basename(remote_path))
+    if remote_path in self.files:
+      copies = {local_path: self.files[remote_path]}
+    elif self._is_directory(remote_path):
+      os.makedirs(local_path, exist_ok=True)
+      copies = {
+          os.path.join(local_path, posixpath.relpath(path, remote_path)): data
+          for path, data in self.files.items()
+          if path.startswith(remote_path + '/')
+      }
+    else:
+      return adb_pb2.AdbResponse(
+          status=adb_pb2.AdbResponse.Status.ADB_ERROR,
+          error_message=f'{remote_path}: No such file or directory',
+      )
+    for path, data in copies.items():
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      with open(path, 'wb') as f:
+        f.write(data)
+    return _generic_response(f'{remote_path}: {len(copies)} files pulled.')
+
+  def _run_batch(self, script: str) -> str:
+    output = []
+    for line, marker, stop_on_failure in _BATCH_COMMAND.findall(script):
+      command_output, exit_code = self._run_shell(line)
+      output.append(f'{command_output}\n{marker} {exit_code}\n')
+      if exit_code and stop_on_failure:
+        break
+    return ''.join(output)
+
+  def _run_shell(self, line: str) -> tuple[str, int]:
+    """Runs a shell command line and returns its output and exit code."""
+    match = _FILE_TEST_SCRIPT.search(line)
+    if match:
+      exists = self._test_path(match.group(1), match.group(2))
+      return ('Exists\n' if exists else 'Does not exist\n'), 0
+
+    line, _, grep = line.partition(' | grep ')
+    output, exit_code = self._run_command(_split_command(line))
+    if grep:
+      pattern = grep.strip().strip('\'"')
+      output = ''.join(
+          l for l in output.splitlines(keepends=True) if pattern in l
+      )
+    return output, exit_code
+
+  def _run_command(self, argv: list[str]) -> tuple[str, int]:
+    """Runs one shell command; see `_run_shell`."""
+    if not argv:
+      return '', 0
+    program, args = argv[0], argv[1:]
+    if program == 'echo':
+      return ' '.join(args) + '\n', 0
+    if program == 'wm' and args[:1] == ['size']:
+      return self._wm_size(args[1:]), 0
+    if program == 'dumpsys':
+      return self._dumpsys(args), 0
+    if program == 'settings':
+      return self._settings(args)
+    if program == 'content':
+      return self._content(args)
+    if program == 'input':
+      if args[:2] == ['keyevent', 'KEYCODE_HOME']:
+        self.foreground_activity = HOME_ACTIVITY
+      self._on_input()
+      return '', 0
+    if program == 'am':
+      return self._am(args)
+    if program == 'getprop' and args == ['ro.build.version.sdk']:
+      return '33\n', 0
+    if program in ('ls', 'test', 'rm', 'mkdir', 'cat', 'touch'):
+      return self._file_command(program, args)
+    if program == 'pm' and args[:1] == ['clear']:
+      return 'Success\n', 0
+    if program in ('pm', 'svc', 'sqlite3'):
+      return '', 0
+    self.unhandled_commands[program] += 1
+    return '', 0
+
+  def _wm_size(self, args: list[str]) -> str:
+    if args:
+      if args == ['reset']:
+        self._screen_size = self._default_screen_size
+      else:
+        width, height = args[0].split('x')
+        self._screen_size = (int(width), int(height))
+      self._pixels = self._create_pixels()
+      self._on_input()
+    width, height = self._screen_size
+    return f'Physical size: {width}x{height}\n'
+
+  def _dumpsys(self, args: list[str]) -> str:
+    width, height = self._screen_size
+    if self.orientation % 2:
+      width, height = height, width
+    service = args[0] if args else ''
+    if service == 'input':
+      return (
+          'Viewport INTERNAL:'
+          f' logicalFrame=[0, 0, {width}, {height}],'
+          f' physicalFrame=[0, 0, {width}, {height}]\n'
+      )
+    if service == 'window':
+      return f'  mCurrentRotation=ROTATION_{self.orientation * 90}\n'
+    if service == 'activity' and args[1:2] == ['recents']:
+      return 'ACTIVITY MANAGER RECENT TASKS (dumpsys activity recents)\n'
+    return ''
+
+  def _settings(self, args: list[str]) -> tuple[str, int]:
+    if len(args) >= 3 and args[0] == 'get':
+      return self.settings.get((args[1], args[2]), 'null') + '\n', 0
+    if len(args) >= 4 and args[0] == 'put':
+      self.settings[args[1], args[2]] = ' '.join(args[3:])
+      return '', 0
+    if len(args) >= 3 and args[0] == 'delete':
+      self.settings.pop((args[1], args[2]), None)
+      return 'Deleted 1 rows\n', 0
+    if len(args) >= 2 and args[0] == 'list':
+      return ''.join(
+          f'{key}={value}\n'
+          for (namespace, key), value in sorted(self.settings.items())
+          if namespace == args[1]
+      ), 0
+    return 'Invalid command\n', 1
+
+  def _content(self, args: list[str]) -> tuple[str, int]:
+    """Emulates `content query|insert|delete --uri URI`."""
+    options = collections.defaultdict(list)
+    for flag, value in zip(args[1::2], args[2::2]):
+      options[flag].append(value)
+    if not options['--uri']:
+      return 'Error: --uri is required\n', 1
+    rows = self.content.setdefault(options['--uri'][0], [])
+    if args[0] == 'query':
+      if not rows:
+        return 'No result found.\n', 0
+      projection = None
+      if options['--projection']:
+        projection = options['--projection'][0].split(':')
+      return ''.join(
+          f'Row: {i} '
+          + ', '.join(
+              f'{key}={value}'
+              for key, value in row.items()
+              if projection is None or key in projection
+          )
+          + '\n'
+          for i, row in enumerate(rows)
+      ), 0
+    if args[0] == 'insert':
+      row = {'_id': str(len(rows) + 1)}
+      for binding in options['--bind']:
+        key, _, value = binding.split(':', 2)
+        row[key] = value
+      rows.append(row)
+      return '', 0
+    if args[0] == 'delete':
+      rows.clear()
+      return '', 0
+    return f'Unsupported argument: {args[0]}\n', 1
+
+  def _am(self, args: list[str]) -> tuple[str, int]:
+    if not args:
+      return '', 1
+    if args[0] == 'start':
+      activity = next(
+          (a for flag, a in zip(args, args[1:]) if flag == '-n'), None
+      )
+      if activity:
+        self._start_activity(activity)
+      return f'Starting: Intent {{ cmp={activity} }}\n', 0
+    if args[0] == 'force-stop' and len(args) > 1:
+      self._force_stop(args[1])
+      return '', 0
+    if args[0] == 'broadcast':
+      return 'Broadcasting: Intent\nBroadcast completed: result=0\n', 0
+    return '', 0
+
+  def _start_activity(self, activity: str) -> None:
+    self.foreground_activity = activity
+    self._on_input()
+
+  def _force_stop(self, package: str) -> None:
+    if self.foreground_activity.split('/')[0] == package:
+      self.foreground_activity = HOME_ACTIVITY
+      self._on_input()
+
+  # Files.
+
+  def _is_directory(self, path: str) -> bool:
+    path = posixpath.normpath(path)
+    return path in self.directories or any(
+        p.startswith(path + '/') for p in self.files
+    )
+
+  def _test_path(self, flag: str, path: str) -> bool:
+    path = posixpath.normpath(path)
+    if flag == '-d':
+      return self._is_directory(path)
+    if flag == '-f':
+      return path in self.files
+    return path in self.files or self._is_directory(path)
+
+  def _write_file(self, path: str, content: bytes) -> None:
+    path = posixpath.normpath(path)
+    self.files[path] = content
+    self.directories.add(posixpath.dirname(path))
+
+  def _list(self, path: str) -> list[str]:
+    prefix = posixpath.normpath(path) + '/'
+    names = set()
+    for p in list(self.files) + list(self.directories):
+      if p.startswith(prefix):
+        names.add(p[len(prefix) :].split('/')[0])
+    return sorted(names)
+
+  def _file_command(self, program: str, args: list[str]) -> tuple[str, int]:
+    """Emulates basic file commands on the in-memory file system."""
+    flags = [a for a in args if a.startswith('-')]
+    paths = [a for a in args if not a.startswith('-')]
+    if program == 'test':
+      exists = bool(paths) and self._test_path(
+          (flags or ['-e'])[0], paths[0]
+      )
+      return '', 0 if exists else 1
+    if program == 'ls':
+      output = []
+      for path in paths or ['/']:
+        if path in self.files:
+          output.append(posixpath.basename(path))
+        elif self._is_directory(path):
+          output.extend(self._list(path))
+        else:
+          return f'ls: {path}: No such file or directory\n', 1
+      return ''.join(f'{name}\n' for name in output), 0
+    if program == 'cat':
+      if not paths or paths[0] not in self.files:
+        return f'cat: {paths[:1]}: No such file or directory\n', 1
+      return self.files[paths[0]].decode('utf-8', errors='replace'), 0
+    if program == 'touch':
+      for path in paths:
+        self._write_file(path, self.files.get(path, b''))
+      return '', 0
+    if program == 'mkdir':
+      for path in paths:
+        self.directories.add(posixpath.normpath(path))
+      return '', 0
+    # rm: supports trailing globs like `dir/*`.
+    for pattern in paths:
+      pattern = posixpath.normpath(pattern)
+      for path in [
+          p
+          for p in self.files
+          if fnmatch.fnmatch(p, pattern) or p.startswith(pattern + '/')
+      ]:
+        del self.files[path]
+      self.directories -= {
+          d
+          for d in self.directories
+          if fnmatch.fnmatch(d, pattern) or d.startswith(pattern + '/')
+      }
+    return '', 0
+
+
+def create_env(**kwargs: Any) -> interface.AsyncAndroidEnv:
+  """Returns an environment on a new `SimulatedDevice`.
+
+  Args:
+    **kwargs: `SimulatedDevice` arguments.
+  """
+  return interface.AsyncAndroidEnv(
+      android_world_controller.AndroidWorldController(
+          SimulatedDevice(**kwargs)
+      )
+  )
@@ -0,0 +1,183 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+from unittest import mock
+
+from absl.testing import absltest
+from android_env.proto import adb_pb2
+from android_world.env import adb_tracing
+from android_world.env import adb_utils
+from android_world.env import env_pool
+from android_world.env import json_action
+from android_world.env import simulated_device
+from android_world.utils import file_utils
+
+
+class SimulatedDeviceTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.env = simulated_device.create_env(screen_size=(100, 200), num_nodes=20)
+    self.device = self.env.controller.env
+
+  def test_produces_forests_of_configured_size(self):
+    state = self.env.get_state()
+
+    self.assertLen(state.ui_elements, 20)
+    self.assertEqual(state.pixels.shape, (200, 100, 3))
+
+    self.env.execute_action(
+        json_action.JSONAction(action_type='click', index=3)
+    )
+
+    self.assertNotEqual(
+        self.env.get_state().ui_elements[0].text, state.ui_elements[0].text
+    )
+
+  def test_accumulates_extras_like_grpc_wrapper(self):
+    self.device.reset()
+    extras = self.device.accumulate_new_extras()
+    self.assertLen(extras['accessibility_tree'], 1)
+    self.assertNotIn('full_event', extras)
+
+    # Nothing new without input, but earlier extras are still returned.
+    self.assertEqual(self.device.accumulate_new_extras(), extras)
+
+    self.env.execute_action(
+        json_action.JSONAction(action_type='click', index=3)
+    )
+    extras = self.device.accumulate_new_extras()
+    self.assertLen(extras['accessibility_tree'], 2)
+    self.assertLen(extras['full_event'], 1)
+
+    self.device.reset()
+    extras = self.device.accumulate_new_extras()
+    self.assertLen(extras['accessibility_tree'], 1)
+    self.assertNotIn('full_event', extras)
+
+  def test_answers_device_queries(self):
+    self.assertEqual(adb_utils.get_screen_size(self.env.controller), (100, 200))
+    self.assertEqual(self.env.logical_screen_size, (100, 200))
+    self.assertEqual(adb_utils.get_orientation(self.env.controller), 0)
+    self.assertEqual(
+        adb_utils.get_physical_frame_boundary(self.env.controller),
+        (0, 0, 100, 200),
+    )
+
+    adb_utils.start_activity('com.example/.Main', None, self.env.controller)
+    self.assertEqual(self.env.foreground_activity_name, 'com.example/.Main')
+    adb_utils.close_app('example', self.env.controller)
+    adb_utils.press_home_button(self.env.controller)
+    self.assertEqual(
+        self.env.foreground_activity_name, simulated_device.HOME_ACTIVITY
+    )
+    self.assertEmpty(self.device.unhandled_commands)
+
+  def test_settings_and_content(self):
+    adb_utils.toggle_airplane_mode('on', self.env.controller)
+    self.assertTrue(adb_utils.check_airplane_mode(self.env.controller))
+    # Reading the forest turns networking back on.
+    self.env.controller.invalidate_airplane_mode_cache()
+    self.env.get_state()
+    self.assertFalse(adb_utils.check_airplane_mode(self.env.controller))
+
+    uri = 'content://sms/inbox'
+    adb_utils.issue_generic_request(
+        ['shell', 'content', 'insert', '--uri', uri, '--bind', 'body:s:hi'],
+        self.env.controller,
+    )
+    response = adb_utils.issue_generic_request(
+        ['shell', 'content', 'query', '--uri', uri], self.env.controller
+    )
+    self.assertEqual(response.generic.output, b'Row: 0 _id=1, body=hi\n')
+
+  def test_file_system(self):
+    self.device.files['/sdcard/Download/a.txt'] = b'a'
+    results = adb_utils.issue_generic_requests(
+        ['shell mkdir -p /sdcard/new', 'shell ls /sdcard/Download'],
+        self.env.controller,
+    )
+    self.assertEqual([r.exit_code for r in results], [0, 0])
+    self.assertEqual(results[1].output, b'a.txt\n')
+
+    results = adb_utils.issue_generic_requests(
+        ['shell ls /sdcard/missing', 'shell mkdir -p /sdcard/other'],
+        self.env.controller,
+        stop_on_failure=True,
+    )
+    self.assertEqual([r.exit_code for r in results], [1, None])
+    self.assertFalse(
+        file_utils.check_directory_exists('/sdcard/other', self.env.controller)
+    )
+    self.assertTrue(
+        file_utils.check_directory_exists('/sdcard/new', self.env.controller)
+    )
+
+    self.enter_context(
+        mock.patch.object(
+            file_utils,
+            'TMP_LOCAL_LOCATION',
+            self.enter_context(tempfile.TemporaryDirectory()),
+        )
+    )
+    with self.env.controller.pull_file('/sdcard/Download/a.txt') as directory:
+      with open(os.path.join(directory, 'a.txt'), 'rb') as f:
+        self.assertEqual(f.read(), b'a')
+
+    file_utils.clear_directory('/sdcard/Download', self.env.controller)
+    self.assertEmpty(self.device.files)
+
+  def test_latency_model(self):
+    latency = simulated_device.LatencyModel(
+        default_median_secs=0.5,
+        median_secs={adb_tracing.TAP: 0.25},
+        timeout_rate=0.0,
+    )
+    device = simulated_device.SimulatedDevice(latency=latency)
+    mock_sleep = self.enter_context(mock.patch('time.sleep'))
+
+    adb_utils.issue_generic_request('shell input tap 1 2', device)
+    adb_utils.issue_generic_request('shell ls', device)
+
+    self.assertEqual(
+        [c.args[0] for c in mock_sleep.call_args_list], [0.25, 0.5]
+    )
+
+  def test_timeouts(self):
+    device = simulated_device.SimulatedDevice(
+        latency=simulated_device.LatencyModel(timeout_rate=1.0)
+    )
+    self.enter_context(mock.patch('time.sleep'))
+
+    response = adb_utils.issue_generic_request('shell ls', device)
+
+    self.assertEqual(response.status, adb_pb2.AdbResponse.Status.TIMEOUT)
+
+  def test_env_pool_of_many_devices(self):
+    pool = env_pool.EnvPool(
+        num_envs=100,
+        env_factory=lambda console_port, grpc_port: simulated_device.create_env(
+            num_nodes=5, seed=console_port
+        ),
+    )
+
+    self.assertLen(pool, 100)
+    with pool.lease() as env:
+      self.assertLen(env.get_state().ui_elements, 5)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -0,0 +1,178 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Learned time-to-settle of actions, per app and action type.
+
+Apps differ widely in how long they take to settle after an action: maps and
+browsers keep loading for seconds, while Clock or Settings settle almost at
+once. A `TimingProfile` accumulates the times to settle measured by
+`ui_stability.SettleTimeRecorder` across runs and turns them into a
+`ui_stability.WaitPolicy` with per-app and per-action waits:
+
+```
+profile = timing_profile.TimingProfile.load(path)
+env.wait_policy = profile.to_wait_policy(env.wait_policy)
+... run ...
+profile.update_from(ui_stability.get_settle_time_recorder())
+profile.save(path)
+```
+"""
+
+import collections
+from collections.abc import Iterable, Sequence
+import json
+import os
+
+from android_world.env import ui_stability
+
+_VERSION = 1
+
+# Number of samples kept per (app, action type), across runs.
+_MAX_SAMPLES = 200
+
+
+def _percentile(ordered: Sequence[float], percentile: float) -> float:
+  """Returns the nearest-rank percentile of sorted samples."""
+  return ordered[round((len(ordered) - 1) * percentile / 100)]
+
+
+class TimingProfile:
+  """Times to settle by app and action type, persisted across runs."""
+
+  def __init__(self, max_samples: int = _MAX_SAMPLES):
+    self._max_samples = max_samples
+    self._samples: dict[tuple[str, str], collections.deque[float]] = {}
+
+  def add(self, app: str, action_type: str, samples: Iterable[float]) -> None:
+    """Adds times to settle, dropping the oldest beyond the sample limit."""
+    key = (app, action_type)
+    if key not in self._samples:
+      self._samples[key] = collections.deque(maxlen=self._max_samples)
+    self._samples[key].extend(samples)
+
+  def update_from(self, recorder: ui_stability.SettleTimeRecorder) -> None:
+    """Adds the samples of a recorder, e.g. at the end of a run."""
+    for (app, action_type), samples in recorder.samples().items():
+      self.add(app, action_type, samples)
+
+  def samples(self) -> dict[tuple[str, str], list[float]]:
+    """Returns the times to settle by (app, action type)."""
+    return {key: list(samples) for key, samples in self._samples.items()}
+
+  def to_wait_policy(
+      self,
+      base: ui_stability.WaitPolicy = ui_stability.WaitPolicy(),
+      initial_percentile: float = 10,
+      timeout_percentile: float = 95,
+      timeout_margin: float = 1.5,
+      max_wait_secs: float = ui_stability.DEFAULT_TIMEOUT_SECS,
+      min_samples: int = 5,
+  ) -> ui_stability.WaitPolicy:
+    """Derives a wait policy from the profile.
+
+    Apps and action types with at least `min_samples` samples get their own
+    policy. The cap is a high percentile of the times to settle with some
+    margin, so that slow apps get more time than the base cap and fast ones
+    less. The initial wait skips checks the UI is unlikely to pass yet: a low
+    percentile of the times to settle, less the quiet window that is part of
+    every time to settle.
+
+    Args:
+      base: The policy for apps without enough samples, whose quiet window and
+        poll interval are kept throughout.
+      initial_percentile: Percentile of the times to settle to wait initially.
+      timeout_percentile: Percentile of the times to settle to cap waits at.
+      timeout_margin: Factor applied to the cap percentile.
+      max_wait_secs: Upper bound of the derived caps.
+      min_samples: Minimum number of samples to derive a policy from.
+
+    Returns:
+      The base policy with per-app and per-action policies.
+    """
+
+    def derive(samples: list[float], **kwargs) -> ui_stability.WaitPolicy:
+      ordered = sorted(samples)
+      cap = _percentile(ordered, timeout_percentile) * timeout_margin
+      cap = min(max(cap, base.quiet_window_secs), max_wait_secs)
+      initial_wait = _percentile(ordered, initial_percentile)
+      initial_wait = max(0.0, initial_wait - base.quiet_window_secs)
+      return ui_stability.WaitPolicy(
+          max_wait_secs=cap,
+          quiet_window_secs=base.quiet_window_secs,
+          poll_interval_secs=base.poll_interval_secs,
+          initial_wait_secs=min(initial_wait, cap),
+          **kwargs,
+      )
+
+    by_app: dict[str, dict[str, list[float]]] = {}
+    for (app, action_type), samples in self._samples.items():
+      if app:
+        by_app.setdefault(app, {})[action_type] = list(samples)
+    per_app = dict(base.per_app)
+    for app, by_action in by_app.items():
+      all_samples = [secs for samples in by_action.values() for secs in samples]
+      if len(all_samples) < min_samples:
+        continue
+      per_app[app] = derive(
+          all_samples,
+          per_action={
+              action_type: derive(samples)
+              for action_type, samples in by_action.items()
+              if len(samples) >= min_samples
+          },
+      )
+    return ui_stability.WaitPolicy(
+        max_wait_secs=base.max_wait_secs,
+        quiet_window_secs=base.quiet_window_secs,
+        poll_interval_secs=base.poll_interval_secs,
+        initial_wait_secs=base.initial_wait_secs,
+        per_app=per_app,
+        per_action=base.per_action,
+    )
+
+  def save(self, path: str) -> None:
+    """Writes the profile to `path` as JSON, replacing it atomically."""
+    samples: dict[str, dict[str, list[float]]] = {}
+    for (app, action_type), values in sorted(self._samples.items()):
+      samples.setdefault(app, {})[action_type] = list(values)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+      json.dump({'version': _VERSION, 'samples': samples}, f, indent=2)
+    os.replace(tmp_path, path)
+
+  @classmethod
+  def load(cls, path: str, max_samples: int = _MAX_SAMPLES) -> 'TimingProfile':
+    """Reads a profile written by `save`.
+
+    Args:
+      path: The profile file.
+      max_samples: Number of samples to keep per app and action type.
+
+    Returns:
+      The profile, or an empty one if `path` does not exist.
+
+    Raises:
+      ValueError: If the file is not a supported profile.
+    """
+    profile = cls(max_samples=max_samples)
+    if not os.path.exists(path):
+      return profile
+    with open(path) as f:
+      data = json.load(f)
+    if not isinstance(data, dict) or data.get('version') != _VERSION:
+      raise ValueError(f'{path} is not a timing profile.')
+    for app, by_action in data['samples'].items():
+      for action_type, samples in by_action.items():
+        profile.add(app, action_type, samples)
+    return profile
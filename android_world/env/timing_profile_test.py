@@ -0,0 +1,81 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+
+from absl.testing import absltest
+from android_world.env import timing_profile
+from android_world.env import ui_stability
+
+
+def _report(settle_secs: float) -> ui_stability.TransitionReport:
+  return ui_stability.TransitionReport(
+      changed=True, is_stable=True, settle_secs=settle_secs, num_observations=1
+  )
+
+
+class TimingProfileTest(absltest.TestCase):
+
+  def test_derives_per_app_and_per_action_policies(self):
+    profile = timing_profile.TimingProfile()
+    profile.add('com.maps', 'click', [2.0, 2.5, 3.0, 3.5, 4.0])
+    profile.add('com.maps', 'scroll', [1.0])
+    profile.add('com.clock', 'click', [0.3, 0.3, 0.4, 0.4, 0.5])
+    profile.add('com.rare', 'click', [5.0])
+    base = ui_stability.WaitPolicy(max_wait_secs=2.0, quiet_window_secs=0.25)
+
+    policy = profile.to_wait_policy(base, max_wait_secs=5.0)
+
+    self.assertEqual(policy.max_wait_secs, 2.0)
+    self.assertIs(policy.for_app('com.rare'), policy)
+    maps = policy.for_app('com.maps')
+    self.assertEqual(maps.max_wait_secs, 5.0)
+    self.assertEqual(maps.quiet_window_secs, 0.25)
+    self.assertIs(maps.for_action('scroll'), maps)
+    self.assertEqual(maps.for_action('click').initial_wait_secs, 1.75)
+    clock = policy.for_app('com.clock').for_action('click')
+    self.assertAlmostEqual(clock.max_wait_secs, 0.75)
+    self.assertAlmostEqual(clock.initial_wait_secs, 0.05)
+
+  def test_persists_samples_across_runs(self):
+    path = os.path.join(
+        self.enter_context(tempfile.TemporaryDirectory()), 'profile.json'
+    )
+    recorder = ui_stability.SettleTimeRecorder()
+    recorder.record('com.app', 'click', _report(0.5))
+
+    profile = timing_profile.TimingProfile.load(path)
+    self.assertEmpty(profile.samples())
+    profile.update_from(recorder)
+    profile.save(path)
+    profile = timing_profile.TimingProfile.load(path, max_samples=2)
+    profile.update_from(recorder)
+    profile.update_from(recorder)
+
+    self.assertEqual(profile.samples(), {('com.app', 'click'): [0.5, 0.5]})
+
+  def test_rejects_other_files(self):
+    path = os.path.join(
+        self.enter_context(tempfile.TemporaryDirectory()), 'profile.json'
+    )
+    with open(path, 'w') as f:
+      f.write('[]')
+
+    with self.assertRaises(ValueError):
+      timing_profile.TimingProfile.load(path)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -0,0 +1,445 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Records a run on a device and replays it without an emulator.
+
+`RecordingEnv` wraps a live environment and writes every observation, action,
+screen property and answer, and the screen geometry and ADB requests/responses
+of its controller, to a trace file. `ReplayEnv` serves the trace back, so agent
+and harness code (UI element extraction, prompt building, ...) can be
+benchmarked offline, deterministically and at full speed:
+
+```
+env = trace_env.RecordingEnv(env_launcher.load_and_setup_env(...), path)
+... run an agent ...
+env.close()
+
+env = trace_env.ReplayEnv(path)
+... run the same agent ...
+```
+
+A trace is a sequence of pickled `(kind, payload)` records. Screenshots and
+forests are zlib-compressed individually and only decompressed when read.
+"""
+
+from collections.abc import Callable, Iterator
+import collections
+import dataclasses
+import pickle
+import threading
+from typing import Any, Optional
+import zlib
+
+from absl import logging
+from android_env.proto import adb_pb2
+from android_env.proto.a11y import android_accessibility_forest_pb2
+from android_world.env import android_world_controller
+from android_world.env import interface
+from android_world.env import json_action
+from android_world.env import ui_stability
+import numpy as np
+
+_Forest = android_accessibility_forest_pb2.AndroidAccessibilityForest
+
+_FORMAT = 'android_world_trace'
+_VERSION = 1
+
+# Record kinds.
+_HEADER = 'header'
+_STATE = 'state'
+_ACTION = 'action'
+_ADB = 'adb'
+_VALUE = 'value'
+
+
+class TraceMismatchError(RuntimeError):
+  """Raised when a replayed run diverges from the recorded one."""
+
+
+class TraceExhaustedError(RuntimeError):
+  """Raised when a replayed run asks for more observations than recorded."""
+
+
+@dataclasses.dataclass(frozen=True)
+class _StateRecord:
+  """A compressed observation."""
+
+  pixels: Optional[bytes]
+  shape: tuple[int, ...]
+  dtype: str
+  forest: Optional[bytes]
+
+  @classmethod
+  def from_state(cls, state: interface.State) -> '_StateRecord':
+    pixels = state.pixels
+    forest = state.forest
+    return cls(
+        pixels=None if pixels is None else zlib.compress(pixels.tobytes(), 1),
+        shape=() if pixels is None else pixels.shape,
+        dtype='' if pixels is None else pixels.dtype.str,
+        forest=(
+            zlib.compress(forest.SerializeToString())
+            if isinstance(forest, _Forest)
+            else None
+        ),
+    )
+
+  def to_state(self) -> interface.State:
+    forest = None
+    if self.forest is not None:
+      forest = _Forest.FromString(zlib.decompress(self.forest))
+    pixels_loader = None
+    if self.pixels is not None:
+      pixels_loader = lambda: np.frombuffer(
+          zlib.decompress(self.pixels), dtype=self.dtype
+      ).reshape(self.shape)
+    if forest is None:
+      return interface.State(pixels_loader=pixels_loader, ui_elements=[])
+    return interface.State.create_and_infer_elements(
+        pixels=None,
+        forest=forest,
+        exclude_invisible_elements=True,
+        pixels_loader=pixels_loader,
+    )
+
+
+class TraceWriter:
+  """Appends records to a trace file. All methods are thread-safe."""
+
+  def __init__(self, path: str):
+    self._file = open(path, 'wb')
+    self._lock = threading.Lock()
+    self.write(_HEADER, {'format': _FORMAT, 'version': _VERSION})
+
+  def write(self, kind: str, payload: Any) -> None:
+    with self._lock:
+      pickle.dump((kind, payload), self._file, protocol=pickle.HIGHEST_PROTOCOL)
+
+  def close(self) -> None:
+    with self._lock:
+      self._file.close()
+
+
+def read_trace(path: str) -> Iterator[tuple[str, Any]]:
+  """Yields the `(kind, payload)` records of a trace, after the header.
+
+  A record truncated by an interrupted recording ends the trace.
+
+  Args:
+    path: The trace file.
+
+  Raises:
+    ValueError: If the file is not a trace.
+  """
+  with open(path, 'rb') as f:
+    try:
+      kind, header = pickle.load(f)
+    except (EOFError, pickle.UnpicklingError) as e:
+      raise ValueError(f'{path} is not a trace file.') from e
+    if kind != _HEADER or header.get('format') != _FORMAT:
+      raise ValueError(f'{path} is not a trace file.')
+    if header['version'] > _VERSION:
+      raise ValueError(f'Unsupported trace version {header["version"]}.')
+    while True:
+      try:
+        yield pickle.load(f)
+      except EOFError:
+        return
+      except pickle.UnpicklingError:
+        logging.warning('Trace %s ends with a truncated record.', path)
+        return
+
+
+class _RecordingController:
+  """Controller proxy that records screen geometry and ADB requests."""
+
+  def __init__(
+      self,
+      controller: android_world_controller.AndroidWorldController,
+      writer: TraceWriter,
+  ):
+    self._controller = controller
+    self._writer = writer
+
+  def execute_adb_call(self, call: adb_pb2.AdbRequest) -> adb_pb2.AdbResponse:
+    response = self._controller.execute_adb_call(call)
+    self._writer.write(
+        _ADB, (call.SerializeToString(), response.SerializeToString())
+    )
+    return response
+
+  def _record_value(self, name: str, value: Any) -> Any:
+    self._writer.write(_VALUE, (f'controller.{name}', value))
+    return value
+
+  @property
+  def logical_screen_size(self) -> tuple[int, int]:
+    return self._record_value(
+        'logical_screen_size', self._controller.logical_screen_size
+    )
+
+  @property
+  def orientation(self) -> int:
+    return self._record_value('orientation', self._controller.orientation)
+
+  @property
+  def physical_frame_boundary(self) -> tuple[int, int, int, int]:
+    return self._record_value(
+        'physical_frame_boundary', self._controller.physical_frame_boundary
+    )
+
+  def __getattr__(self, name: str) -> Any:
+    return getattr(self._controller, name)
+
+
+class RecordingEnv(interface.AsyncEnv):
+  """Wraps an environment and records the run to a trace file.
+
+  ADB requests are recorded if they are issued through `controller`, which is
+  how tasks initialize, evaluate and tear down. Requests the wrapped
+  environment issues internally, e.g. to execute actions, are not needed for
+  replay and are not recorded.
+  """
+
+  def __init__(self, env: interface.AsyncEnv, path: str):
+    self._env = env
+    self._writer = TraceWriter(path)
+    self._controller = _RecordingController(env.controller, self._writer)
+
+  @property
+  def controller(self) -> android_world_controller.AndroidWorldController:
+    return self._controller  # pytype: disable=bad-return-type
+
+  def _record_state(self, state: interface.State) -> interface.State:
+    self._writer.write(_STATE, _StateRecord.from_state(state))
+    return state
+
+  def _record_value(self, name: str, value: Any) -> Any:
+    self._writer.write(_VALUE, (name, value))
+    return value
+
+  def reset(self, go_home: bool = False) -> interface.State:
+    return self._record_state(self._env.reset(go_home=go_home))
+
+  def get_state(self, wait_to_stabilize: bool = False) -> interface.State:
+    return self._record_state(
+        self._env.get_state(wait_to_stabilize=wait_to_stabilize)
+    )
+
+  def display_message(self, message: str, header: str = '') -> None:
+    self._env.display_message(message, header=header)
+
+  def execute_action(
+      self,
+      action: json_action.JSONAction,
+      state: Optional[interface.State] = None,
+  ) -> None:
+    self._writer.write(_ACTION, action.json_str())
+    self._env.execute_action(action, state=state)
+    if action.action_type == json_action.ANSWER:
+      # Information retrieval tasks are evaluated on the answer.
+      self._record_value('interaction_cache', self._env.interaction_cache)
+
+  def wait_for_transition(
+      self, policy: Optional[ui_stability.WaitPolicy] = None
+  ) -> interface.State:
+    return self._record_state(self._env.wait_for_transition(policy))
+
+  @property
+  def foreground_activity_name(self) -> str:
+    return self._record_value(
+        'foreground_activity_name', self._env.foreground_activity_name
+    )
+
+  @property
+  def device_screen_size(self) -> tuple[int, int]:
+    return self._record_value(
+        'device_screen_size', self._env.device_screen_size
+    )
+
+  @property
+  def logical_screen_size(self) -> tuple[int, int]:
+    return self._record_value(
+        'logical_screen_size', self._env.logical_screen_size
+    )
+
+  @property
+  def interaction_cache(self) -> str:
+    return self._env.interaction_cache
+
+  @interaction_cache.setter
+  def interaction_cache(self, value: str) -> None:
+    self._env.interaction_cache = value
+
+  def hide_automation_ui(self) -> None:
+    self._env.hide_automation_ui()
+
+  def close(self) -> None:
+    self._writer.close()
+    self._env.close()
+
+
+class _ReplayController:
+  """Serves recorded screen geometry and ADB responses in place of a device.
+
+  Each response of a request is served in recorded order; once they run out,
+  the last one is served again, since most repeated requests are reads.
+  """
+
+  def __init__(
+      self,
+      responses: dict[bytes, list[bytes]],
+      value: Callable[[str], Any],
+  ):
+    """Initializes the controller.
+
+    Args:
+      responses: The serialized responses of each serialized request.
+      value: Returns the next recorded value of a property, by name.
+    """
+    self._responses = {
+        request: collections.deque(recorded)
+        for request, recorded in responses.items()
+    }
+    self._value = value
+
+  @property
+  def logical_screen_size(self) -> tuple[int, int]:
+    return self._value('controller.logical_screen_size')
+
+  @property
+  def orientation(self) -> int:
+    return self._value('controller.orientation')
+
+  @property
+  def physical_frame_boundary(self) -> tuple[int, int, int, int]:
+    return self._value('controller.physical_frame_boundary')
+
+  def execute_adb_call(self, call: adb_pb2.AdbRequest) -> adb_pb2.AdbResponse:
+    responses = self._responses.get(call.SerializeToString())
+    if not responses:
+      raise TraceMismatchError(f'ADB request not in trace: {call}')
+    response = responses[0] if len(responses) == 1 else responses.popleft()
+    return adb_pb2.AdbResponse.FromString(response)
+
+  def __getattr__(self, name: str) -> Any:
+    raise AttributeError(
+        f'{name!r} is not available when replaying a trace; only ADB requests'
+        ' and screen geometry are.'
+    )
+
+
+class ReplayEnv(interface.AsyncEnv):
+  """Serves a trace recorded by `RecordingEnv`, without a device."""
+
+  def __init__(self, path: str, check_actions: bool = False):
+    """Loads the trace.
+
+    Args:
+      path: The trace file.
+      check_actions: Whether to raise `TraceMismatchError` if the agent
+        executes a different action than the recorded one.
+    """
+    self._check_actions = check_actions
+    self._interaction_cache = ''
+    self._states: collections.deque[_StateRecord] = collections.deque()
+    self._actions: collections.deque[str] = collections.deque()
+    self._values: dict[str, collections.deque[Any]] = {}
+    responses: dict[bytes, list[bytes]] = {}
+    for kind, payload in read_trace(path):
+      if kind == _STATE:
+        self._states.append(payload)
+      elif kind == _ACTION:
+        self._actions.append(payload)
+      elif kind == _ADB:
+        request, response = payload
+        responses.setdefault(request, []).append(response)
+      elif kind == _VALUE:
+        name, value = payload
+        self._values.setdefault(name, collections.deque()).append(value)
+    self._controller = _ReplayController(responses, self._value)
+
+  @property
+  def controller(self) -> android_world_controller.AndroidWorldController:
+    return self._controller  # pytype: disable=bad-return-type
+
+  @property
+  def num_remaining_states(self) -> int:
+    return len(self._states)
+
+  def _next_state(self) -> interface.State:
+    if not self._states:
+      raise TraceExhaustedError('No more recorded observations.')
+    return self._states.popleft().to_state()
+
+  def _value(self, name: str) -> Any:
+    values = self._values.get(name)
+    if not values:
+      raise TraceMismatchError(f'{name} was never read while recording.')
+    return values[0] if len(values) == 1 else values.popleft()
+
+  def reset(self, go_home: bool = False) -> interface.State:
+    del go_home
+    self._interaction_cache = ''
+    return self._next_state()
+
+  def get_state(self, wait_to_stabilize: bool = False) -> interface.State:
+    del wait_to_stabilize
+    return self._next_state()
+
+  def execute_action(
+      self,
+      action: json_action.JSONAction,
+      state: Optional[interface.State] = None,
+  ) -> None:
+    del state
+    recorded = self._actions.popleft() if self._actions else None
+    if self._check_actions and recorded != action.json_str():
+      raise TraceMismatchError(
+          f'Executed {action.json_str()}, but recorded {recorded}.'
+      )
+    if action.action_type == json_action.ANSWER:
+      self._interaction_cache = self._value('interaction_cache')
+
+  def wait_for_transition(
+      self, policy: Optional[ui_stability.WaitPolicy] = None
+  ) -> interface.State:
+    del policy
+    return self._next_state()
+
+  @property
+  def foreground_activity_name(self) -> str:
+    return self._value('foreground_activity_name')
+
+  @property
+  def device_screen_size(self) -> tuple[int, int]:
+    return self._value('device_screen_size')
+
+  @property
+  def logical_screen_size(self) -> tuple[int, int]:
+    return self._value('logical_screen_size')
+
+  @property
+  def interaction_cache(self) -> str:
+    return self._interaction_cache
+
+  @interaction_cache.setter
+  def interaction_cache(self, value: str) -> None:
+    self._interaction_cache = value
+
+  def hide_automation_ui(self) -> None:
+    pass
+
+  def close(self) -> None:
+    pass
@@ -0,0 +1,260 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+
+from absl.testing import absltest
+from android_env.proto.a11y import android_accessibility_forest_pb2
+from android_world.agents import base_agent
+from android_world.agents import m3a
+from android_world.agents import m3a_test
+from android_world.agents import t3a
+from android_world.agents import t3a_test
+from android_world.env import adb_utils
+from android_world.env import interface
+from android_world.env import json_action
+from android_world.env import trace_env
+from android_world.utils import fake_adb_responses
+from android_world.utils import test_utils
+import numpy as np
+
+
+def _create_forest(
+    text: str,
+) -> android_accessibility_forest_pb2.AndroidAccessibilityForest:
+  forest = android_accessibility_forest_pb2.AndroidAccessibilityForest()
+  node = forest.windows.add().tree.nodes.add(
+      unique_id=0,
+      class_name='android.widget.TextView',
+      text=text,
+      is_visible_to_user=True,
+      is_clickable=True,
+  )
+  node.bounds_in_screen.right = 3
+  node.bounds_in_screen.bottom = 4
+  return forest
+
+
+class _LiveEnv(test_utils.FakeAsyncEnv):
+  """Fake device whose screens show increasing numbers."""
+
+  def __init__(self):
+    super().__init__()
+    self.num_states = 0
+    self.actions = []
+    self.controller.execute_adb_call.return_value = (
+        fake_adb_responses.create_successful_generic_response('hello')
+    )
+    self.controller.logical_screen_size = (3, 4)
+    self.controller.orientation = 0
+    self.controller.physical_frame_boundary = (0, 0, 3, 4)
+
+  def get_state(self, wait_to_stabilize: bool = False) -> interface.State:
+    self.num_states += 1
+    return interface.State.create_and_infer_elements(
+        pixels=np.full((4, 3, 3), self.num_states, dtype=np.uint8),
+        forest=_create_forest(str(self.num_states)),
+        exclude_invisible_elements=True,
+    )
+
+  def reset(self, go_home: bool = False) -> interface.State:
+    return self.get_state()
+
+  def execute_action(self, action: json_action.JSONAction, state=None):
+    del state
+    self.actions.append(action)
+    if action.action_type == json_action.ANSWER:
+      self.interaction_cache = action.text
+
+
+class TraceEnvTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.path = os.path.join(
+        self.enter_context(tempfile.TemporaryDirectory()), 'trace'
+    )
+
+  def _record(self) -> _LiveEnv:
+    live_env = _LiveEnv()
+    env = trace_env.RecordingEnv(live_env, self.path)
+    env.reset(go_home=True)
+    env.execute_action(json_action.JSONAction(action_type='click', index=0))
+    env.get_state()
+    adb_utils.issue_generic_request('shell echo hello', env.controller)
+    self.assertEqual(env.logical_screen_size, (100, 100))
+    env.close()
+    return live_env
+
+  def test_replays_recorded_run(self):
+    live_env = self._record()
+
+    env = trace_env.ReplayEnv(self.path, check_actions=True)
+
+    first = env.reset(go_home=True)
+    self.assertEqual(first.pixels.tolist(), np.ones((4, 3, 3)).tolist())
+    self.assertEqual([e.text for e in first.ui_elements], ['1'])
+    env.execute_action(json_action.JSONAction(action_type='click', index=0))
+    second = env.get_state()
+    self.assertEqual([e.text for e in second.ui_elements], ['2'])
+    response = adb_utils.issue_generic_request(
+        'shell echo hello', env.controller
+    )
+    self.assertEqual(response.generic.output, b'hello')
+    self.assertEqual(env.logical_screen_size, (100, 100))
+    self.assertLen(live_env.actions, 1)
+
+  def test_replays_answer(self):
+    live_env = _LiveEnv()
+    env = trace_env.RecordingEnv(live_env, self.path)
+    env.interaction_cache = ''
+    env.reset()
+    env.execute_action(
+        json_action.JSONAction(action_type='answer', text='42 apples')
+    )
+    self.assertEqual(env.interaction_cache, '42 apples')
+    env.close()
+
+    env = trace_env.ReplayEnv(self.path, check_actions=True)
+    env.interaction_cache = ''
+    env.reset()
+    self.assertEqual(env.interaction_cache, '')
+    env.execute_action(
+        json_action.JSONAction(action_type='answer', text='42 apples')
+    )
+
+    self.assertEqual(env.interaction_cache, '42 apples')
+
+  def test_replays_controller_geometry(self):
+    live_env = _LiveEnv()
+    env = trace_env.RecordingEnv(live_env, self.path)
+    self.assertEqual(env.controller.orientation, 0)
+    self.assertEqual(env.controller.physical_frame_boundary, (0, 0, 3, 4))
+    self.assertEqual(env.controller.logical_screen_size, (3, 4))
+    env.close()
+
+    env = trace_env.ReplayEnv(self.path)
+
+    self.assertEqual(env.controller.orientation, 0)
+    self.assertEqual(env.controller.physical_frame_boundary, (0, 0, 3, 4))
+    self.assertEqual(env.controller.logical_screen_size, (3, 4))
+    with self.assertRaisesRegex(AttributeError, 'not available'):
+      _ = env.controller.env
+
+  def _run_agent(
+      self, agent: base_agent.EnvironmentInteractingAgent
+  ) -> list[base_agent.AgentInteractionResult]:
+    agent.transition_pause = 0
+    agent.reset()
+    results = [agent.step('Click the first element.') for _ in range(2)]
+    agent.env.close()
+    return results
+
+  def test_replays_m3a(self):
+    def run(env: interface.AsyncEnv):
+      llm = m3a_test.MockMultimodalLlmWrapper([
+          (
+              "Reason: open it.\nAction: {'action_type': 'click', 'index': 0}",
+              'raw response',
+          ),
+          ('Clicked the first element.', 'raw response'),
+          (
+              "Reason: done.\nAction: {'action_type': 'status',"
+              " 'goal_status': 'complete'}",
+              'raw response',
+          ),
+      ])
+      return self._run_agent(m3a.M3A(env, llm))
+
+    live_env = _LiveEnv()
+    recorded = run(trace_env.RecordingEnv(live_env, self.path))
+    replayed = run(trace_env.ReplayEnv(self.path, check_actions=True))
+
+    self.assertLen(live_env.actions, 1)
+    self.assertEqual(
+        [result.done for result in replayed],
+        [result.done for result in recorded],
+    )
+    self.assertEqual(
+        replayed[0].data['action_prompt'], recorded[0].data['action_prompt']
+    )
+    np.testing.assert_array_equal(
+        replayed[0].data['before_screenshot_with_som'],
+        recorded[0].data['before_screenshot_with_som'],
+    )
+
+  def test_replays_t3a(self):
+    def run(env: interface.AsyncEnv):
+      llm = t3a_test.MockLlmWrapper([
+          (
+              "Reason: open it.\nAction: {'action_type': 'click', 'index': 0}",
+              'raw response',
+          ),
+          ('Clicked the first element.', 'raw response'),
+          (
+              "Reason: done.\nAction: {'action_type': 'status',"
+              " 'goal_status': 'complete'}",
+              'raw response',
+          ),
+      ])
+      return self._run_agent(t3a.T3A(env, llm))
+
+    live_env = _LiveEnv()
+    recorded = run(trace_env.RecordingEnv(live_env, self.path))
+    replayed = run(trace_env.ReplayEnv(self.path, check_actions=True))
+
+    self.assertLen(live_env.actions, 1)
+    self.assertEqual(
+        [result.done for result in replayed],
+        [result.done for result in recorded],
+    )
+    self.assertEqual(
+        replayed[0].data['action_prompt'], recorded[0].data['action_prompt']
+    )
+
+  def test_raises_on_divergence(self):
+    self._record()
+    env = trace_env.ReplayEnv(self.path, check_actions=True)
+
+    with self.assertRaises(trace_env.TraceMismatchError):
+      env.execute_action(json_action.JSONAction(action_type='scroll'))
+    with self.assertRaises(trace_env.TraceMismatchError):
+      adb_utils.issue_generic_request('shell ls', env.controller)
+    env.get_state()
+    env.get_state()
+    with self.assertRaises(trace_env.TraceExhaustedError):
+      env.get_state()
+
+  def test_tolerates_truncated_trace(self):
+    self._record()
+    with open(self.path, 'rb') as f:
+      data = f.read()
+    with open(self.path, 'wb') as f:
+      f.write(data[:-10])
+
+    env = trace_env.ReplayEnv(self.path)
+
+    self.assertEqual(env.num_remaining_states, 2)
+
+  def test_rejects_other_files(self):
+    with open(self.path, 'wb') as f:
+      f.write(b'not a trace')
+
+    with self.assertRaises(ValueError):
+      trace_env.ReplayEnv(self.path)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -0,0 +1,410 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Detects when the UI has stopped changing.
+
+The detector combines two signals:
+
+  * The host time of the most recent accessibility event (or forest) received
+    from the device. When the a11y forwarder reports no activity for a quiet
+    window, the screen is considered stable and the detector can return after a
+    single observation.
+  * A cheap structural fingerprint of each observation. When no event signal is
+    available, the screen is considered stable once the fingerprint stays the
+    same for the quiet window.
+
+`wait_for_transition` uses the same signals to wait for the effect of an
+action, in place of a fixed pause: it returns as soon as the UI has reacted and
+settled, within the cap of a `WaitPolicy`.
+"""
+
+import collections
+from collections.abc import Callable, Hashable, Mapping
+import dataclasses
+import threading
+import time
+from typing import Any, Optional, TypeVar
+
+_StateT = TypeVar('_StateT')
+
+# Defaults for AsyncAndroidEnv.get_state(wait_to_stabilize=True).
+DEFAULT_QUIET_WINDOW_SECS = 0.5
+DEFAULT_POLL_INTERVAL_SECS = 0.1
+DEFAULT_TIMEOUT_SECS = 6.0
+
+# Number of time-to-settle samples kept per (app, action type).
+_MAX_SETTLE_SAMPLES = 1000
+
+
+@dataclasses.dataclass(frozen=True)
+class StabilityReport:
+  """Outcome of a stability wait.
+
+  Attributes:
+    is_stable: Whether the UI was quiet for the full quiet window; False if the
+      wait timed out.
+    wait_secs: Wall time spent waiting, including observation time.
+    num_observations: Number of full observations that were fetched.
+    used_a11y_events: Whether accessibility events drove the decision, as
+      opposed to comparing fingerprints of consecutive observations.
+  """
+
+  is_stable: bool
+  wait_secs: float
+  num_observations: int
+  used_a11y_events: bool
+
+
+def wait_for_stable_state(
+    get_state: Callable[[], _StateT],
+    fingerprint_fn: Callable[[_StateT], Hashable],
+    last_event_time_fn: Optional[Callable[[], Optional[float]]] = None,
+    quiet_window_secs: float = DEFAULT_QUIET_WINDOW_SECS,
+    poll_interval_secs: float = DEFAULT_POLL_INTERVAL_SECS,
+    timeout_secs: float = DEFAULT_TIMEOUT_SECS,
+) -> tuple[_StateT, StabilityReport]:
+  """Waits until the UI has been quiet for `quiet_window_secs`.
+
+  Args:
+    get_state: Fetches a full observation.
+    fingerprint_fn: Maps an observation to a hashable structural fingerprint.
+    last_event_time_fn: Returns the `time.monotonic()` time of the most recent
+      UI activity reported by the device, or None if no activity signal is
+      available. Expected to be cheap; it is polled between observations.
+    quiet_window_secs: How long the UI must stay unchanged.
+    poll_interval_secs: Time to sleep between checks.
+    timeout_secs: Maximum time to wait before returning the latest observation.
+
+  Returns:
+    The latest observation and a report describing the wait.
+  """
+  start = time.monotonic()
+  state = get_state()
+  num_observations = 1
+  observed_at = time.monotonic()
+  fingerprint = fingerprint_fn(state)
+  # Time the current fingerprint was first observed, and the last time it was
+  # seen to change (None while it has not changed during this wait).
+  fingerprint_since = observed_at
+  fingerprint_changed_at = None
+  used_a11y_events = False
+
+  while True:
+    now = time.monotonic()
+    event_time = last_event_time_fn() if last_event_time_fn else None
+    if event_time is not None:
+      used_a11y_events = True
+      # A fingerprint change that the event stream missed still counts as
+      # activity.
+      quiet_since = event_time
+      if fingerprint_changed_at is not None:
+        quiet_since = max(quiet_since, fingerprint_changed_at)
+      quiet_for = now - quiet_since
+      # The held observation must postdate the last activity to be returned.
+      is_stale = (
+          event_time > observed_at or fingerprint_changed_at == observed_at
+      )
+      if quiet_for >= quiet_window_secs and not is_stale:
+        is_stable = True
+        break
+      # Some screens emit events continuously (e.g. a blinking cursor) without
+      # changing their structure; fall back to the fingerprint for those.
+      if (
+          num_observations > 1
+          and observed_at - fingerprint_since >= quiet_window_secs
+      ):
+        is_stable = True
+        break
+      # Polling the event time is cheap, so only fetch a new observation once
+      # the device has gone quiet or a quiet window has passed without one.
+      needs_observation = (
+          quiet_for >= quiet_window_secs
+          or now - observed_at >= quiet_window_secs
+      )
+      sleep_secs = min(poll_interval_secs, quiet_window_secs - quiet_for)
+    else:
+      if observed_at - fingerprint_since >= quiet_window_secs:
+        is_stable = True
+        break
+      is_stale = False
+      needs_observation = True
+      sleep_secs = fingerprint_since + quiet_window_secs - now
+
+    if now - start >= timeout_secs:
+      is_stable = False
+      if is_stale:
+        state = get_state()
+        num_observations += 1
+      break
+
+    if not needs_observation or event_time is None:
+      time.sleep(max(0.0, min(sleep_secs, start + timeout_secs - now)))
+    if not needs_observation:
+      continue
+
+    previous_observed_at = observed_at
+    state = get_state()
+    num_observations += 1
+    observed_at = time.monotonic()
+    new_fingerprint = fingerprint_fn(state)
+    if new_fingerprint != fingerprint:
+      fingerprint = new_fingerprint
+      fingerprint_since = observed_at
+      # Changes already explained by an event need no further confirmation.
+      if event_time is None or event_time <= previous_observed_at:
+        fingerprint_changed_at = observed_at
+
+  return state, StabilityReport(
+      is_stable=is_stable,
+      wait_secs=time.monotonic() - start,
+      num_observations=num_observations,
+      used_a11y_events=used_a11y_events,
+  )
+
+
+@dataclasses.dataclass(frozen=True)
+class WaitPolicy:
+  """How long to wait for the UI to react to an action and settle.
+
+  Attributes:
+    max_wait_secs: Cap on the wait, counted from the action. An action whose
+      effect is not detected costs the full cap.
+    quiet_window_secs: How long the UI must stay unchanged once it reacted.
+    poll_interval_secs: Time to sleep between checks.
+    initial_wait_secs: Time after the action during which the UI is not
+      checked, because it is not expected to have settled yet.
+    per_app: Policies to use instead of this one for actions in the given apps,
+      keyed by package name.
+    per_action: Policies to use instead of this one for the given action types.
+  """
+
+  max_wait_secs: float = 2.0
+  quiet_window_secs: float = 0.3
+  poll_interval_secs: float = DEFAULT_POLL_INTERVAL_SECS
+  initial_wait_secs: float = 0.0
+  per_app: Mapping[str, 'WaitPolicy'] = dataclasses.field(default_factory=dict)
+  per_action: Mapping[str, 'WaitPolicy'] = dataclasses.field(
+      default_factory=dict
+  )
+
+  def for_app(self, package: Optional[str]) -> 'WaitPolicy':
+    """Returns the policy for actions in the app with the given package."""
+    return self.per_app.get(package, self) if package else self
+
+  def for_action(self, action_type: Optional[str]) -> 'WaitPolicy':
+    """Returns the policy for actions of the given type."""
+    return self.per_action.get(action_type, self) if action_type else self
+
+
+@dataclasses.dataclass(frozen=True)
+class TransitionReport:
+  """Outcome of waiting for the effect of an action.
+
+  Attributes:
+    changed: Whether the UI reacted to the action within the cap.
+    is_stable: Whether the UI reacted and then settled within the cap.
+    settle_secs: Time from the action until the UI settled or the wait ended.
+    num_observations: Number of full observations that were fetched.
+  """
+
+  changed: bool
+  is_stable: bool
+  settle_secs: float
+  num_observations: int
+
+
+def wait_for_transition(
+    get_state: Callable[[], _StateT],
+    fingerprint_fn: Callable[[_StateT], Hashable],
+    action_time: float,
+    before_fingerprint: Optional[Hashable] = None,
+    last_event_time_fn: Optional[Callable[[], Optional[float]]] = None,
+    policy: WaitPolicy = WaitPolicy(),
+) -> tuple[_StateT, TransitionReport]:
+  """Waits until the UI has reacted to an action and settled.
+
+  The UI has reacted once the device reports activity after the action, or the
+  fingerprint of an observation differs from `before_fingerprint`. It has then
+  settled once it is quiet for the policy's quiet window; see
+  `wait_for_stable_state`. Neither is checked before the policy's initial wait
+  has passed.
+
+  Args:
+    get_state: Fetches a full observation.
+    fingerprint_fn: Maps an observation to a hashable structural fingerprint.
+    action_time: The `time.monotonic()` time the action was executed.
+    before_fingerprint: Fingerprint of the screen the action was executed on,
+      if known.
+    last_event_time_fn: See `wait_for_stable_state`. Activity the device
+      reported before the action must already have been polled.
+    policy: How long to wait.
+
+  Returns:
+    The latest observation and a report describing the wait.
+  """
+  deadline = action_time + policy.max_wait_secs
+  initial_wait_secs = min(policy.initial_wait_secs, policy.max_wait_secs)
+  remaining_initial_wait = action_time + initial_wait_secs - time.monotonic()
+  if remaining_initial_wait > 0:
+    time.sleep(remaining_initial_wait)
+  # Without either signal a reaction cannot be detected, only waited out.
+  changed = before_fingerprint is None and last_event_time_fn is None
+  state = None
+  num_observations = 0
+  observed_at = None
+  while not changed:
+    now = time.monotonic()
+    event_time = last_event_time_fn() if last_event_time_fn else None
+    if event_time is not None and event_time > action_time:
+      changed = True
+      break
+    # Events are cheap to poll, so observe only every quiet window while they
+    # are available, in case the device did not report the change.
+    if before_fingerprint is not None and (
+        event_time is None
+        or observed_at is None
+        or now - observed_at >= policy.quiet_window_secs
+    ):
+      state = get_state()
+      num_observations += 1
+      observed_at = time.monotonic()
+      if fingerprint_fn(state) != before_fingerprint:
+        changed = True
+        break
+    now = time.monotonic()
+    if now >= deadline:
+      break
+    time.sleep(min(policy.poll_interval_secs, deadline - now))
+
+  is_stable = False
+  if changed:
+    state, report = wait_for_stable_state(
+        get_state,
+        fingerprint_fn,
+        last_event_time_fn=last_event_time_fn,
+        quiet_window_secs=policy.quiet_window_secs,
+        poll_interval_secs=policy.poll_interval_secs,
+        timeout_secs=max(0.0, deadline - time.monotonic()),
+    )
+    is_stable = report.is_stable
+    num_observations += report.num_observations
+  elif state is None:
+    state = get_state()
+    num_observations += 1
+  return state, TransitionReport(
+      changed=changed,
+      is_stable=is_stable,
+      settle_secs=time.monotonic() - action_time,
+      num_observations=num_observations,
+  )
+
+
+def wait_for_activity(
+    last_event_time_fn: Callable[[], Optional[float]],
+    since: float,
+    quiet_window_secs: float,
+    max_wait_secs: float,
+    poll_interval_secs: float = DEFAULT_POLL_INTERVAL_SECS,
+) -> bool:
+  """Waits until the device reported activity after `since` and went quiet.
+
+  Unlike `wait_for_transition`, this never fetches an observation.
+
+  Args:
+    last_event_time_fn: See `wait_for_stable_state`. Activity the device
+      reported before `since` must already have been polled.
+    since: The `time.monotonic()` time after which activity is expected.
+    quiet_window_secs: How long the device must be quiet after the activity.
+    max_wait_secs: Cap on the wait, counted from `since`.
+    poll_interval_secs: Time to sleep between checks.
+
+  Returns:
+    Whether the activity happened and settled within the cap.
+  """
+  deadline = since + max_wait_secs
+  while True:
+    now = time.monotonic()
+    event_time = last_event_time_fn()
+    if (
+        event_time is not None
+        and event_time > since
+        and now - event_time >= quiet_window_secs
+    ):
+      return True
+    if now >= deadline:
+      return False
+    time.sleep(min(poll_interval_secs, deadline - now))
+
+
+class SettleTimeRecorder:
+  """Records time-to-settle of actions by app and action type.
+
+  Only the latest samples of each (app, action type) are kept. Actions the UI
+  did not react to have no time to settle and are not recorded. All methods are
+  thread-safe.
+  """
+
+  def __init__(self, max_samples: int = _MAX_SETTLE_SAMPLES):
+    self._max_samples = max_samples
+    self._lock = threading.Lock()
+    self._samples: dict[tuple[str, str], collections.deque[float]] = {}
+    self._timeouts: collections.Counter[tuple[str, str]] = (
+        collections.Counter()
+    )
+
+  def reset(self) -> None:
+    with self._lock:
+      self._samples.clear()
+      self._timeouts.clear()
+
+  def record(
+      self, app: str, action_type: str, report: TransitionReport
+  ) -> None:
+    if not report.changed:
+      return
+    key = (app, action_type)
+    with self._lock:
+      if key not in self._samples:
+        self._samples[key] = collections.deque(maxlen=self._max_samples)
+      self._samples[key].append(report.settle_secs)
+      if not report.is_stable:
+        self._timeouts[key] += 1
+
+  def samples(self) -> dict[tuple[str, str], list[float]]:
+    """Returns the recorded times to settle by (app, action type)."""
+    with self._lock:
+      return {key: list(samples) for key, samples in self._samples.items()}
+
+  def summary(self) -> dict[str, dict[str, Any]]:
+    """Returns statistics by `app/action_type`, for logging or tuning caps."""
+    with self._lock:
+      summary = {}
+      for (app, action_type), samples in sorted(self._samples.items()):
+        ordered = sorted(samples)
+        summary[f'{app}/{action_type}'] = {
+            'count': len(ordered),
+            'timeouts': self._timeouts[app, action_type],
+            'p50_secs': ordered[(len(ordered) - 1) // 2],
+            'p90_secs': ordered[(len(ordered) - 1) * 9 // 10],
+            'max_secs': ordered[-1],
+        }
+      return summary
+
+
+_RECORDER = SettleTimeRecorder()
+
+
+def get_settle_time_recorder() -> SettleTimeRecorder:
+  """Returns the process-wide recorder that environments report to."""
+  return _RECORDER
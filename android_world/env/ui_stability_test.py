@@ -0,0 +1,306 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import dataclasses
+from unittest import mock
+
+from absl.testing import absltest
+from android_world.env import ui_stability
+
+
+class _FakeClock:
+  """Clock whose time only advances when sleeping or observing."""
+
+  def __init__(self, observation_secs: float = 0.0):
+    self.now = 100.0
+    self.observation_secs = observation_secs
+
+  def monotonic(self) -> float:
+    return self.now
+
+  def sleep(self, secs: float) -> None:
+    self.now += secs
+
+
+class WaitForStableStateTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.clock = _FakeClock()
+    self.enter_context(
+        mock.patch('time.monotonic', side_effect=self.clock.monotonic)
+    )
+    self.enter_context(mock.patch('time.sleep', side_effect=self.clock.sleep))
+
+  def _state_fn(self, values):
+    """Returns a get_state function that yields `values` in order."""
+    values = iter(values)
+
+    def get_state():
+      self.clock.now += self.clock.observation_secs
+      return next(values)
+
+    return get_state
+
+  def test_quiet_events_return_after_one_observation(self):
+    get_state = self._state_fn(['a'])
+
+    state, report = ui_stability.wait_for_stable_state(
+        get_state,
+        fingerprint_fn=lambda s: s,
+        last_event_time_fn=lambda: self.clock.now - 10.0,
+    )
+
+    self.assertEqual(state, 'a')
+    self.assertTrue(report.is_stable)
+    self.assertTrue(report.used_a11y_events)
+    self.assertEqual(report.num_observations, 1)
+    self.assertEqual(report.wait_secs, 0.0)
+
+  def test_recent_event_waits_for_quiet_window(self):
+    event_time = self.clock.now
+    get_state = self._state_fn(['a'])
+
+    _, report = ui_stability.wait_for_stable_state(
+        get_state,
+        fingerprint_fn=lambda s: s,
+        last_event_time_fn=lambda: event_time,
+        quiet_window_secs=0.5,
+    )
+
+    self.assertTrue(report.is_stable)
+    self.assertEqual(report.num_observations, 1)
+    self.assertAlmostEqual(report.wait_secs, 0.5)
+
+  def test_event_after_observation_refetches_state(self):
+    self.clock.observation_secs = 0.2
+    event_time = self.clock.now + 0.3
+    get_state = self._state_fn(['old', 'new'])
+
+    state, report = ui_stability.wait_for_stable_state(
+        get_state,
+        fingerprint_fn=lambda s: s,
+        last_event_time_fn=lambda: event_time,
+        quiet_window_secs=0.5,
+    )
+
+    self.assertEqual(state, 'new')
+    self.assertTrue(report.is_stable)
+    self.assertEqual(report.num_observations, 2)
+
+  def test_fingerprint_fallback_without_events(self):
+    get_state = self._state_fn(['a', 'b', 'b'])
+
+    state, report = ui_stability.wait_for_stable_state(
+        get_state,
+        fingerprint_fn=lambda s: s,
+        last_event_time_fn=lambda: None,
+        quiet_window_secs=0.5,
+    )
+
+    self.assertEqual(state, 'b')
+    self.assertTrue(report.is_stable)
+    self.assertFalse(report.used_a11y_events)
+    self.assertEqual(report.num_observations, 3)
+    self.assertAlmostEqual(report.wait_secs, 1.0)
+
+  def test_continuous_events_fall_back_to_fingerprint(self):
+    get_state = self._state_fn(['a'] * 10)
+
+    state, report = ui_stability.wait_for_stable_state(
+        get_state,
+        fingerprint_fn=lambda s: s,
+        last_event_time_fn=lambda: self.clock.now,
+        quiet_window_secs=0.5,
+        timeout_secs=6.0,
+    )
+
+    self.assertEqual(state, 'a')
+    self.assertTrue(report.is_stable)
+    self.assertLess(report.wait_secs, 1.0)
+
+  def test_timeout(self):
+    get_state = self._state_fn([str(i) for i in range(100)])
+
+    state, report = ui_stability.wait_for_stable_state(
+        get_state,
+        fingerprint_fn=lambda s: s,
+        quiet_window_secs=0.5,
+        timeout_secs=2.0,
+    )
+
+    self.assertFalse(report.is_stable)
+    self.assertAlmostEqual(report.wait_secs, 2.0)
+    self.assertEqual(state, str(report.num_observations - 1))
+
+
+class WaitForTransitionTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.clock = _FakeClock()
+    self.enter_context(
+        mock.patch('time.monotonic', side_effect=self.clock.monotonic)
+    )
+    self.enter_context(mock.patch('time.sleep', side_effect=self.clock.sleep))
+    self.action_time = self.clock.now
+    # Binary fractions keep the fake clock exact.
+    self.policy = ui_stability.WaitPolicy(
+        max_wait_secs=2.0, quiet_window_secs=0.25, poll_interval_secs=0.125
+    )
+
+  def _event_at(self, event_time):
+    """Returns a last_event_time_fn that reports activity at `event_time`."""
+    return lambda: event_time if self.clock.now >= event_time else 0.0
+
+  def test_returns_once_ui_reacted_and_settled(self):
+    change_time = self.action_time + 0.25
+    state, report = ui_stability.wait_for_transition(
+        get_state=lambda: 'b' if self.clock.now >= change_time else 'a',
+        fingerprint_fn=lambda s: s,
+        action_time=self.action_time,
+        before_fingerprint='a',
+        last_event_time_fn=self._event_at(change_time),
+        policy=self.policy,
+    )
+
+    self.assertEqual(state, 'b')
+    self.assertTrue(report.changed)
+    self.assertTrue(report.is_stable)
+    self.assertEqual(report.settle_secs, 0.5)
+    self.assertEqual(report.num_observations, 2)
+
+  def test_detects_change_by_fingerprint_without_events(self):
+    states = iter(['a', 'b', 'b', 'b', 'b', 'b'])
+
+    state, report = ui_stability.wait_for_transition(
+        get_state=lambda: next(states),
+        fingerprint_fn=lambda s: s,
+        action_time=self.action_time,
+        before_fingerprint='a',
+        policy=self.policy,
+    )
+
+    self.assertEqual(state, 'b')
+    self.assertTrue(report.changed)
+    self.assertTrue(report.is_stable)
+    self.assertLess(report.settle_secs, 1.0)
+
+  def test_unchanged_ui_costs_the_cap(self):
+    state, report = ui_stability.wait_for_transition(
+        get_state=lambda: 'a',
+        fingerprint_fn=lambda s: s,
+        action_time=self.action_time,
+        before_fingerprint='a',
+        last_event_time_fn=lambda: 0.0,
+        policy=self.policy,
+    )
+
+    self.assertEqual(state, 'a')
+    self.assertFalse(report.changed)
+    self.assertFalse(report.is_stable)
+    self.assertAlmostEqual(report.settle_secs, 2.0)
+
+  def test_per_app_policy(self):
+    slow = ui_stability.WaitPolicy(max_wait_secs=10.0)
+    policy = ui_stability.WaitPolicy(per_app={'com.slow': slow})
+
+    self.assertIs(policy.for_app('com.slow'), slow)
+    self.assertIs(policy.for_app('com.fast'), policy)
+    self.assertIs(policy.for_app(''), policy)
+
+  def test_per_action_policy(self):
+    typing = ui_stability.WaitPolicy(max_wait_secs=0.5)
+    policy = ui_stability.WaitPolicy(per_action={'input_text': typing})
+
+    self.assertIs(policy.for_action('input_text'), typing)
+    self.assertIs(policy.for_action('click'), policy)
+
+  def test_initial_wait_skips_early_checks(self):
+    change_time = self.action_time + 0.25
+    policy = dataclasses.replace(self.policy, initial_wait_secs=0.5)
+
+    state, report = ui_stability.wait_for_transition(
+        get_state=lambda: 'b' if self.clock.now >= change_time else 'a',
+        fingerprint_fn=lambda s: s,
+        action_time=self.action_time,
+        before_fingerprint='a',
+        last_event_time_fn=self._event_at(change_time),
+        policy=policy,
+    )
+
+    self.assertEqual(state, 'b')
+    self.assertTrue(report.is_stable)
+    self.assertEqual(report.settle_secs, 0.5)
+    self.assertEqual(report.num_observations, 1)
+
+  def test_wait_for_activity(self):
+    self.assertTrue(
+        ui_stability.wait_for_activity(
+            self._event_at(self.action_time + 0.1),
+            self.action_time,
+            quiet_window_secs=0.2,
+            max_wait_secs=1.0,
+        )
+    )
+    self.assertLess(self.clock.now - self.action_time, 0.5)
+
+    self.assertFalse(
+        ui_stability.wait_for_activity(
+            lambda: None, self.clock.now, 0.2, max_wait_secs=1.0
+        )
+    )
+
+
+class SettleTimeRecorderTest(absltest.TestCase):
+
+  def test_summary(self):
+    recorder = ui_stability.SettleTimeRecorder(max_samples=3)
+    for secs in [4.0, 0.25, 0.5, 2.0]:
+      recorder.record(
+          'com.app',
+          'click',
+          ui_stability.TransitionReport(
+              changed=True,
+              is_stable=secs < 1.0,
+              settle_secs=secs,
+              num_observations=1,
+          ),
+      )
+
+    recorder.record(
+        'com.app',
+        'click',
+        ui_stability.TransitionReport(
+            changed=False, is_stable=False, settle_secs=8.0, num_observations=1
+        ),
+    )
+
+    self.assertEqual(recorder.samples(), {('com.app', 'click'): [0.25, 0.5, 2.0]})
+    self.assertEqual(
+        recorder.summary(),
+        {
+            'com.app/click': {
+                'count': 3,
+                'timeouts': 2,
+                'p50_secs': 0.5,
+                'p90_secs': 0.5,
+                'max_secs': 2.0,
+            }
+        },
+    )
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -14,12 +14,15 @@
 
 """Runs an agent on the environment."""
 
+import asyncio
 import dataclasses
+import functools
 from typing import Any, Callable, Optional
 
 from android_env import env_interface
 from android_world import constants
 from android_world.agents import base_agent
+from android_world.env import adb_tracing
 import termcolor
 
 
@@ -67,6 +70,57 @@ def run_episode(
   Returns:
     Data collected during running agent on goal.
   """
+  return base_agent.run_calls(
+      _episode(goal, agent, max_n_steps, start_on_home_screen, termination_fn)
+  )
+
+
+async def run_episode_async(
+    goal: str,
+    agent: base_agent.EnvironmentInteractingAgent,
+    max_n_steps: int = 10,
+    start_on_home_screen: bool = False,
+    termination_fn: (
+        Callable[[env_interface.AndroidEnvInterface], float] | None
+    ) = None,
+) -> EpisodeResult:
+  """Like `run_episode`, but awaits `agent.astep` instead of blocking.
+
+  Episodes on different environments can run concurrently on one event loop:
+
+  ```
+  results = await asyncio.gather(
+      run_episode_async(goal1, agent1), run_episode_async(goal2, agent2)
+  )
+  ```
+
+  Args:
+    goal: The goal instruction for the agent.
+    agent: The agent to run on the environment.
+    max_n_steps: The max number of steps to allow an agent to run before ending
+      an episode.
+    start_on_home_screen: Whether to start episode from the home screen or just
+      the current screen.
+    termination_fn: If provided, a determines whether to terminate an episode.
+
+  Returns:
+    Data collected during running agent on goal.
+  """
+  return await base_agent.arun_calls(
+      _episode(goal, agent, max_n_steps, start_on_home_screen, termination_fn)
+  )
+
+
+def _episode(
+    goal: str,
+    agent: base_agent.EnvironmentInteractingAgent,
+    max_n_steps: int,
+    start_on_home_screen: bool,
+    termination_fn: (
+        Callable[[env_interface.AndroidEnvInterface], float] | None
+    ),
+) -> base_agent.CallGenerator[EpisodeResult]:
+  """Runs an episode, shared by `run_episode` and `run_episode_async`."""
   if max_n_steps == 0:
     return EpisodeResult(done=False, step_data={})
   if termination_fn is None:
@@ -74,16 +128,22 @@ def run_episode(
 
   if agent.name == "human_agent":
     max_n_steps = 1000
-  
-  agent.reset(start_on_home_screen)
+
+  yield base_agent.Call(agent.reset, agent.areset, (start_on_home_screen,))
 
   output = []
   for step_n in range(max_n_steps):
-    result = agent.step(goal)
-    print('Completed step {:d}.'.format(step_n + 1))
-    assert constants.STEP_NUMBER not in result.data
-    output.append(result.data | {constants.STEP_NUMBER: step_n})
-    if termination_fn(agent.env.controller):
+    with adb_tracing.step_context(step_n):
+      result = yield base_agent.Call(agent.step, agent.astep, (goal,))
+      print('Completed step {:d}.'.format(step_n + 1))
+      assert constants.STEP_NUMBER not in result.data
+      output.append(result.data | {constants.STEP_NUMBER: step_n})
+      terminated = yield base_agent.Call(
+          termination_fn,
+          functools.partial(asyncio.to_thread, termination_fn),
+          (agent.env.controller,),
+      )
+    if terminated:
       print('Environment ends episode.')
       return EpisodeResult(
           done=True,
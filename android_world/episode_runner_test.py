@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 from typing import Any
 from unittest import mock
 from absl.testing import absltest
@@ -90,5 +91,53 @@ class EpisodeRunnerTest(absltest.TestCase):
     mock_agent.env.reset.assert_called_with(go_home=True)
 
 
+class RunEpisodeAsyncTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.env = mock.create_autospec(interface.AsyncAndroidEnv)
+
+  def test_max_steps_reached(self):
+    agent = FakeEnvironmentInteractingAgent(self.env, 'fake_agent')
+
+    result = asyncio.run(
+        episode_runner.run_episode_async('test_goal', agent, max_n_steps=2)
+    )
+
+    self.assertFalse(result.done)
+    self.assertLen(result.step_data[constants.STEP_NUMBER], 2)
+    self.assertEqual(agent.call_count, 2)
+    self.env.reset.assert_called_with(go_home=False)
+
+  def test_agent_done(self):
+    agent = FakeEnvironmentInteractingAgent(
+        self.env, 'fake_agent', return_done=True
+    )
+
+    result = asyncio.run(episode_runner.run_episode_async('test_goal', agent))
+
+    self.assertTrue(result.done)
+    self.assertEqual(agent.call_count, 1)
+
+  def test_episodes_share_one_event_loop(self):
+    agents = [
+        FakeEnvironmentInteractingAgent(
+            mock.create_autospec(interface.AsyncAndroidEnv), f'agent{i}'
+        )
+        for i in range(3)
+    ]
+
+    async def main():
+      return await asyncio.gather(*(
+          episode_runner.run_episode_async('test_goal', agent, max_n_steps=3)
+          for agent in agents
+      ))
+
+    results = asyncio.run(main())
+
+    self.assertLen(results, 3)
+    self.assertTrue(all(agent.call_count == 3 for agent in agents))
+
+
 if __name__ == '__main__':
   absltest.main()
@@ -1,8 +1,5 @@
 # constants
 
-# Wait a few seconds for the screen to stabilize after executing an action.
-WAIT_AFTER_ACTION_SECONDS = 1.5
-
 MAX_SCROLL_NUM = 4
 
 MAX_DEPENDENCE_DEPTH = 4
@@ -19,7 +19,7 @@ from android_world.script_utils import tools
 from android_world.script_utils.api_doc import ApiDoc
 from android_world.script_utils.err import XPathError, APIError, ActionError, NotFoundError
 
-from . import WAIT_AFTER_ACTION_SECONDS, MAX_SCROLL_NUM, MAX_ACTION_COUNT, IS_LOG_SCREENSHOT, MAX_DEPENDENCE_DEPTH, MAX_DEPENDENCE_WIDTH
+from . import MAX_SCROLL_NUM, MAX_ACTION_COUNT, IS_LOG_SCREENSHOT, MAX_DEPENDENCE_DEPTH, MAX_DEPENDENCE_WIDTH
 
 api_names = [
     'long_tap', 'tap', 'set_text', 'scroll', 'get_text', 'get_attributes',
@@ -209,11 +209,11 @@ class CodeStatus:
   def __init__(self):
     # internal
     self.action_count = 0
-    self.last_screen_html_str = None
+    self.last_screen_fingerprint = None
     
   def reset(self):
     self.action_count = 0
-    self.last_screen_html_str = None
+    self.last_screen_fingerprint = None
     
   def check_action_count(self):
     if self.action_count >= MAX_ACTION_COUNT:
@@ -221,13 +221,17 @@ class CodeStatus:
       pass
     self.action_count += 1
   
-  def check_last_screen(self, screen_html_str: str):
+  def check_last_screen(self, screen_fingerprint: int):
+    '''
+    compare the fingerprint of the current screen with the last one, see
+    representation_utils.UIFingerprint
+    '''
     is_same = False
-    if not self.last_screen_html_str:
-      self.last_screen_html_str = screen_html_str
+    if self.last_screen_fingerprint is None:
+      self.last_screen_fingerprint = screen_fingerprint
     else:
-      is_same = self.last_screen_html_str == screen_html_str
-      self.last_screen_html_str = screen_html_str
+      is_same = self.last_screen_fingerprint == screen_fingerprint
+      self.last_screen_fingerprint = screen_fingerprint
     return is_same
 
 
@@ -260,8 +264,12 @@ class Verifier:
       self._element_tree = agent_utils.forest_to_element_tree(self.state.forest, self.env.logical_screen_size)
     return self._element_tree
   
-  def update_state(self):
-    self._state = self.env.get_state(True)
+  def update_state(self, after_action=False):
+    if after_action:
+      # Returns once the UI has reacted to the action and settled.
+      self._state = self.env.wait_for_transition()
+    else:
+      self._state = self.env.get_state(True)
     self._element_tree = agent_utils.forest_to_element_tree(self._state.forest, self.env.logical_screen_size)
   
   @property
@@ -273,10 +281,10 @@ class Verifier:
   
   @property
   def last_screen(self):
-    return self.status.last_screen_html_str
+    return self.status.last_screen_fingerprint
   
   def check_last_screen_html(self):
-    is_same = self.status.check_last_screen(self.element_tree.str)
+    is_same = self.status.check_last_screen(self.state.fingerprint.content)
     return is_same
 
   def scroll_and_find_target_ele(self,
@@ -338,8 +346,7 @@ class Verifier:
                       "index": target_ele.local_id,
                       "direction": dir
                   }))
-          time.sleep(WAIT_AFTER_ACTION_SECONDS)
-          self.update_state()
+          self.update_state(after_action=True)
           is_same = self.check_last_screen_html()
           if is_same:
             break
@@ -386,8 +393,7 @@ class Verifier:
                 "index": target_ele.local_id, # scroll down target element
                 "direction": 'down' # it happens nothing when it is not scrollable
             }))
-        time.sleep(WAIT_AFTER_ACTION_SECONDS)
-        self.update_state()
+        self.update_state(after_action=True)
         self.check_last_screen_html()
         element_tree = self.element_tree
         target_ele = element_tree.get_ele_by_xpath(xpath)
@@ -443,8 +449,7 @@ class Verifier:
                     json_action.JSONAction(**{
                         "action_type": "navigate_back"
                     }))
-                time.sleep(WAIT_AFTER_ACTION_SECONDS)
-                self.update_state()
+                self.update_state(after_action=True)
                 self.check_last_screen_html()
                 is_match = True
                 continue
@@ -481,8 +486,7 @@ class Verifier:
               # if executable_action.get('action_type') == 'wait':
               #   raise ActionError(f'Fail to {action.action_type}({action.api_name})', None, None, action.action_type, action.api_name)
               self.env.execute_action(json_action.JSONAction(**executable_action))
-              time.sleep(WAIT_AFTER_ACTION_SECONDS)
-              self.update_state()
+              self.update_state(after_action=True)
               self.check_last_screen_html()
 
             if dep_id >= len(action_list) - 1:
@@ -523,8 +527,7 @@ class Verifier:
       if executable_action.get('action_type') == 'wait':
         raise ActionError(f'Fail to {action_type}({api_name})', None, None, action_type, api_name)
       self.env.execute_action(json_action.JSONAction(**executable_action))
-      time.sleep(WAIT_AFTER_ACTION_SECONDS)
-      self.update_state()
+      self.update_state(after_action=True)
       self.check_last_screen_html()
     else:
       _save2log(
@@ -882,15 +885,13 @@ class Verifier:
         screenshot=state.pixels.copy())
 
     self.env.execute_action(json_action.JSONAction(**{"action_type": "navigate_back"}))
-    time.sleep(WAIT_AFTER_ACTION_SECONDS)
+    self.update_state(after_action=True)
     
     foreground_activity_name = self.env.foreground_activity_name
     # out of the app
     if foreground_activity_name and foreground_activity_name.startswith('com.google.android.apps.nexuslauncher'):
       self.env.execute_action(json_action.JSONAction(**{"action_type": "open_app", "app_name": self.app_name}))
-      time.sleep(WAIT_AFTER_ACTION_SECONDS)
-    
-    self.update_state()
+      self.update_state(after_action=True)
     self.check_last_screen_html()
     self.check_action_count()
 
@@ -936,8 +937,8 @@ class ElementList:
   def check_last_screen_html(self):
     return self.verifier.check_last_screen_html()
   
-  def update_state(self):
-    self.verifier.update_state()
+  def update_state(self, after_action=False):
+    self.verifier.update_state(after_action)
 
   def check_api_name(self, api_name):
     if api_name not in self.api_xpaths.keys():  # not found xpath
@@ -1144,8 +1145,7 @@ class ElementList:
       raise ActionError(f'Fail to tap({button_api_name}) in {self.api_name}[{self.element_list_xpath}]', self.api_name, self.element_list_xpath, 'touch', button_api_name)
     
     self.env.execute_action(json_action.JSONAction(**converted_action))
-    time.sleep(WAIT_AFTER_ACTION_SECONDS)
-    self.update_state()
+    self.update_state(after_action=True)
     self.check_last_screen_html()
     
     self.check_action_count()
@@ -1179,8 +1179,7 @@ class ElementList:
       raise ActionError(f'Fail to long_tap({button_api_name}) in {self.api_name}[{self.element_list_xpath}]', self.api_name, self.element_list_xpath, 'long_touch', button_api_name)
     
     self.env.execute_action(json_action.JSONAction(**converted_action))
-    time.sleep(WAIT_AFTER_ACTION_SECONDS)
-    self.update_state()
+    self.update_state(after_action=True)
     self.check_last_screen_html()
     
     self.check_action_count()
@@ -1213,8 +1212,7 @@ class ElementList:
       raise ActionError(f'Fail to set_text({input_api}) in {self.api_name}[{self.element_list_xpath}]', self.api_name, self.element_list_xpath, 'set_text', input_api)
     
     self.env.execute_action(json_action.JSONAction(**converted_action))
-    time.sleep(WAIT_AFTER_ACTION_SECONDS)
-    self.update_state()
+    self.update_state(after_action=True)
     self.check_last_screen_html()
     
     self.check_action_count()
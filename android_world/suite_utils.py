@@ -14,21 +14,28 @@
 
 """Utilities for evaluating automation agents."""
 
+import concurrent.futures
+import dataclasses
 import datetime
+import functools
 import hashlib
+import math
 import os
 import random
+import threading
 import time
 import traceback
 import json
-from typing import Any, Callable, Type
+from typing import Any, Callable, Optional, Type
 
 from android_env import env_interface
 from android_world import checkpointer as checkpointer_lib
 from android_world import constants
 from android_world import episode_runner
 from android_world.agents import base_agent
+from android_world.env import adb_tracing
 from android_world.env import adb_utils
+from android_world.env import env_pool as env_pool_lib
 from android_world.env import interface
 from android_world.task_evals import task_eval
 from android_world.task_evals.miniwob import miniwob_base
@@ -40,6 +47,17 @@ import pandas as pd
 _FIXED_SEED = 123
 _TASK_TEMPLATE_COLUMN = 'task_template'
 _TASK_PROMPT_COLUMN = 'task_prompt'
+_DIFFICULTY_RANK = {'easy': 0, 'medium': 1, 'hard': 2}
+# Written to the checkpoint directory; see `adb_tracing.AdbTracer.summary`.
+ADB_PROFILE_FILENAME = 'adb_profile.json'
+
+
+class _EpisodeError(Exception):
+  """Signals to the environment pool that an episode errored out."""
+
+  def __init__(self, episode: dict[str, Any]):
+    super().__init__(episode[constants.EpisodeConstants.EXCEPTION_INFO])
+    self.episode = episode
 
 
 class Suite(dict[str, list[task_eval.TaskEval]]):
@@ -276,14 +294,135 @@ def _run_task(
     return result
 
 
-def _get_task_info(episodes: list[dict[str, Any]]) -> tuple[set[str], set[str]]:
-  completed, failed = [], []
+def _write_adb_profile(checkpointer: checkpointer_lib.Checkpointer) -> None:
+  """Writes the ADB latency profile of this process next to the checkpoint."""
+  if not isinstance(checkpointer, checkpointer_lib.IncrementalCheckpointer):
+    return
+  try:
+    adb_tracing.get_tracer().write_summary(
+        os.path.join(checkpointer.directory, ADB_PROFILE_FILENAME)
+    )
+  except OSError as e:
+    print(f'Could not write the ADB profile: {e}')
+
+
+def _instance_id(template: str, params: dict[str, Any], agent_name: str) -> str:
+  seed = params.get(constants.EpisodeConstants.SEED)
+  # Params are derived from the seed, when there is one.
+  key = {'seed': seed} if seed is not None else {'params': params}
+  data = json.dumps(
+      {'template': template, 'agent': agent_name, **key},
+      sort_keys=True,
+      default=str,
+  )
+  return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+
+def instance_id(task: task_eval.TaskEval, agent_name: str) -> str:
+  """Returns an ID of a task instance run by an agent, stable across runs.
+
+  Instances created from a seed are identified by their template and seed, and
+  others by their template and params.
+
+  Args:
+    task: The task instance.
+    agent_name: The name of the agent running it.
+  """
+  return _instance_id(task.name, task.params, agent_name)
+
+
+def _episode_instance_id(episode: dict[str, Any]) -> str | None:
+  """Returns the instance ID of an episode, if it can be determined."""
+  if constants.EpisodeConstants.INSTANCE_ID in episode:
+    return episode[constants.EpisodeConstants.INSTANCE_ID]
+  # Episodes saved before instance IDs were recorded.
+  seed = episode.get(constants.EpisodeConstants.SEED)
+  if seed is None:
+    return None
+  return _instance_id(
+      episode[constants.EpisodeConstants.TASK_TEMPLATE],
+      {constants.EpisodeConstants.SEED: seed},
+      episode.get(constants.EpisodeConstants.AGENT_NAME, ''),
+  )
+
+
+def _is_errored(episode: dict[str, Any]) -> bool:
+  return episode.get(constants.EpisodeConstants.EXCEPTION_INFO) is not None
+
+
+def _plan_resume(
+    suite: Suite, episodes: list[dict[str, Any]], agent_name: str
+) -> dict[str, list[int]]:
+  """Returns the indices of the instances of each task left to run.
+
+  An instance is done if a saved episode without error has its instance ID.
+  Episodes without a seed cannot be matched to an instance, since instances
+  without a seed get new params in every run; the task's remaining instances
+  are done for as many of them as were saved by the same agent.
+
+  Args:
+    suite: The suite to run.
+    episodes: The metadata of the episodes saved by previous runs.
+    agent_name: The name of the agent.
+  """
+  saved: dict[str, dict[str | None, list[dict[str, Any]]]] = {}
   for episode in episodes:
-    if episode.get(constants.EpisodeConstants.EXCEPTION_INFO) is not None:
-      failed.append(episode[constants.EpisodeConstants.TASK_TEMPLATE])
-    else:
-      completed.append(episode[constants.EpisodeConstants.TASK_TEMPLATE])
-  return set(completed), set(failed)
+    if not _is_errored(episode):
+      saved.setdefault(
+          episode[constants.EpisodeConstants.TASK_TEMPLATE], {}
+      ).setdefault(_episode_instance_id(episode), []).append(episode)
+
+  pending = {}
+  for name, instances in suite.items():
+    by_id = saved.get(name, {})
+    left = []
+    for i, instance in enumerate(instances):
+      matches = by_id.get(instance_id(instance, agent_name))
+      if matches:
+        matches.pop()
+      else:
+        left.append(i)
+    unseeded = sum(
+        episode.get(constants.EpisodeConstants.SEED) is None
+        and episode.get(constants.EpisodeConstants.AGENT_NAME, agent_name)
+        == agent_name
+        for matches in by_id.values()
+        for episode in matches
+    )
+    pending[name] = left[unseeded:]
+  return pending
+
+
+def _drop_errored_episodes(
+    suite: Suite,
+    episodes: list[dict[str, Any]],
+    checkpointer: checkpointer_lib.Checkpointer,
+) -> list[dict[str, Any]]:
+  """Drops saved episodes that errored out of tasks about to be re-run.
+
+  Args:
+    suite: The suite to run.
+    episodes: The metadata of the episodes saved by previous runs.
+    checkpointer: The checkpointer that saved them.
+
+  Returns:
+    The metadata of the kept episodes.
+  """
+  stale = {
+      episode[constants.EpisodeConstants.TASK_TEMPLATE]
+      for episode in episodes
+      if _is_errored(episode)
+  }
+  for name in sorted(stale & set(suite)):
+    checkpointer.drop_episodes(name, _is_errored)
+  return [
+      episode
+      for episode in episodes
+      if not (
+          _is_errored(episode)
+          and episode[constants.EpisodeConstants.TASK_TEMPLATE] in suite
+      )
+  ]
 
 
 def _run_task_suite(
@@ -306,28 +445,38 @@ def _run_task_suite(
 
   Returns:
     A list of dict data for each episode, including the scripted reward.
+    Episodes saved by previous runs are included as their metadata; see
+    `Checkpointer.load_metadata`.
   """
-  all_episodes = checkpointer.load()
-  completed_tasks, failed_tasks = _get_task_info(all_episodes)
+  all_episodes = checkpointer.load_metadata()
+  pending = _plan_resume(suite, all_episodes, agent_name)
+  all_episodes = _drop_errored_episodes(suite, all_episodes, checkpointer)
+  results = ResultsAggregator()
+  for episode in all_episodes:
+    results.add(episode)
 
   correct, total = 0, 0
   for name, instances in suite.items():
-    already_processed = name in completed_tasks and name not in failed_tasks
-    if already_processed:
+    if not pending[name]:
       continue
 
     msg = 'Running task: ' + name
     print(msg + '\n' + '=' * len(msg))
 
-    task_episodes = []
-    for instance in instances:
-      episode = _run_task(instance, run_episode, env, demo_mode=demo_mode)
+    for i in pending[name]:
+      instance = instances[i]
+      with adb_tracing.task_context(name):
+        episode = _run_task(instance, run_episode, env, demo_mode=demo_mode)
       episode[constants.EpisodeConstants.AGENT_NAME] = agent_name
-      task_episodes.append(episode)
-      checkpointer.save_episodes(task_episodes, name)
+      episode[constants.EpisodeConstants.INSTANCE_ID] = instance_id(
+          instance, agent_name
+      )
+      checkpointer.append_episode(episode, name)
+      _write_adb_profile(checkpointer)
       all_episodes.append(episode)
 
-      process_episodes(all_episodes, print_summary=True)
+      results.add(episode)
+      results.print_progress()
 
       if episode[constants.EpisodeConstants.EXCEPTION_INFO] is not None:
         # Don't include episode in tally if execution/eval logic errored out.
@@ -338,30 +487,120 @@ def _run_task_suite(
         _update_scoreboard(correct, total, env.controller)
     print()
 
+  if any(pending.values()):
+    results.summarize(print_summary=True)
   return all_episodes
 
 
-def run(
+def _estimate_task_cost(
+    task: task_eval.TaskEval, metadata: pd.DataFrame
+) -> tuple[int, int, int]:
+  """Returns a sort key estimating how long `task` takes to run.
+
+  Failing episodes run until the step budget is exhausted, so the budget is the
+  primary key. Ties are broken by the human-optimal number of steps and the
+  difficulty from task_metadata.json; tasks missing from the metadata (e.g.
+  MiniWoB) rank lowest on both.
+
+  Args:
+    task: The task instance.
+    metadata: Output of `_extract_task_metadata`.
+  """
+  try:
+    budget = _allocate_step_budget(task.complexity)
+  except (NotImplementedError, TypeError, ValueError):
+    budget = 0
+  optimal_steps, difficulty = 0, -1
+  if task.name in metadata.index:
+    row = metadata.loc[task.name]
+    try:
+      optimal_steps = int(row['optimal_steps'])
+    except (TypeError, ValueError):
+      pass
+    difficulty = _DIFFICULTY_RANK.get(row['difficulty'], -1)
+  return budget, optimal_steps, difficulty
+
+
+def _run_task_suite_parallel(
     suite: Suite,
-    agent: base_agent.EnvironmentInteractingAgent,
+    run_on: Callable[
+        [interface.AsyncEnv, task_eval.TaskEval], dict[str, Any]
+    ],
+    env_pool: env_pool_lib.EnvPool,
     checkpointer: checkpointer_lib.Checkpointer = checkpointer_lib.NullCheckpointer(),
-    demo_mode: bool = False,
+    agent_name: str = '',
 ) -> list[dict[str, Any]]:
-  """Create suite and runs eval suite.
+  """Runs e2e system on suite, spreading instances across `env_pool`.
+
+  Checkpointing matches `_run_task_suite`: every finished instance is saved
+  to its task, in the order instances finish, and instances that completed in
+  a previous run are skipped.
 
   Args:
-    suite: The suite of tasks to run on.
-    agent: An agent that interacts on the environment.
-    checkpointer: Checkpointer that loads from existing run and resumes from
-      there. NOTE: It will resume from the last fully completed task template.
-      Relatedly, data for a task template will not be saved until all instances
-      are executed.
-    demo_mode: Whether to run in demo mode, which displays a scoreboard and the
-      task instruction as a notification.
+    suite: The suite to run it on.
+    run_on: Runs a task instance on an environment and returns its episode.
+    env_pool: The environments to run on.
+    checkpointer: See docstring from `run`.
+    agent_name: The name of the agent.
 
   Returns:
-    Step-by-step data from each episode.
+    A list of dict data for each episode, in suite order. Episodes saved by
+    previous runs come first, as their metadata; see
+    `Checkpointer.load_metadata`.
   """
+  all_episodes = checkpointer.load_metadata()
+  pending = _plan_resume(suite, all_episodes, agent_name)
+  all_episodes = _drop_errored_episodes(suite, all_episodes, checkpointer)
+
+  work = []
+  for name, instances in suite.items():
+    for i in pending[name]:
+      work.append((name, i, instances[i]))
+  metadata = _extract_task_metadata()
+  work.sort(key=lambda w: _estimate_task_cost(w[2], metadata), reverse=True)
+
+  lock = threading.Lock()
+  task_episodes: dict[str, dict[int, dict[str, Any]]] = {}
+
+  def run_instance(name: str, i: int, instance: task_eval.TaskEval):
+    try:
+      with env_pool.lease() as env:
+        episode = run_on(env, instance)
+        if episode[constants.EpisodeConstants.EXCEPTION_INFO] is not None:
+          # Let the pool health-check the device before it is reused.
+          raise _EpisodeError(episode)
+    except _EpisodeError as e:
+      episode = e.episode
+    episode[constants.EpisodeConstants.INSTANCE_ID] = instance_id(
+        instance, agent_name
+    )
+    with lock:
+      episodes = task_episodes.setdefault(name, {})
+      episodes[i] = episode
+      checkpointer.append_episode(episode, name)
+      _write_adb_profile(checkpointer)
+      finished = sum(len(e) for e in task_episodes.values())
+    print(f'Finished {name} ({finished}/{len(work)} instances).')
+
+  with concurrent.futures.ThreadPoolExecutor(
+      max_workers=len(env_pool)
+  ) as executor:
+    futures = [executor.submit(run_instance, *w) for w in work]
+    for future in concurrent.futures.as_completed(futures):
+      future.result()
+
+  for name in suite:
+    episodes = task_episodes.get(name, {})
+    all_episodes.extend(episodes[i] for i in sorted(episodes))
+  if all_episodes:
+    process_episodes(all_episodes, print_summary=True)
+  return all_episodes
+
+
+def _make_run_episode(
+    agent: base_agent.EnvironmentInteractingAgent, demo_mode: bool
+) -> Callable[[task_eval.TaskEval], episode_runner.EpisodeResult]:
+  """Returns a function that runs `agent` on a task."""
 
   def run_episode(task: task_eval.TaskEval) -> episode_runner.EpisodeResult:
     if demo_mode:
@@ -381,6 +620,30 @@ def run(
         ),
     )
 
+  return run_episode
+
+
+def run(
+    suite: Suite,
+    agent: base_agent.EnvironmentInteractingAgent,
+    checkpointer: checkpointer_lib.Checkpointer = checkpointer_lib.NullCheckpointer(),
+    demo_mode: bool = False,
+) -> list[dict[str, Any]]:
+  """Create suite and runs eval suite.
+
+  Args:
+    suite: The suite of tasks to run on.
+    agent: An agent that interacts on the environment.
+    checkpointer: Checkpointer that loads from existing run and resumes from
+      there. Every finished instance is saved, and only the instances that did
+      not complete without error are run again; see `instance_id`.
+    demo_mode: Whether to run in demo mode, which displays a scoreboard and the
+      task instruction as a notification.
+
+  Returns:
+    Step-by-step data from each episode run. Episodes saved by previous runs
+    are included as their metadata only; load them with `checkpointer.load`.
+  """
   if demo_mode:
     adb_utils.send_android_intent(
         'broadcast',
@@ -391,7 +654,7 @@ def run(
 
   results = _run_task_suite(
       suite,
-      run_episode,
+      _make_run_episode(agent, demo_mode),
       agent.env,
       checkpointer=checkpointer,
       demo_mode=demo_mode,
@@ -401,6 +664,58 @@ def run(
   return results
 
 
+def run_parallel(
+    suite: Suite,
+    agent_factory: Callable[
+        [interface.AsyncEnv], base_agent.EnvironmentInteractingAgent
+    ],
+    env_pool: env_pool_lib.EnvPool,
+    checkpointer: checkpointer_lib.Checkpointer = checkpointer_lib.NullCheckpointer(),
+) -> list[dict[str, Any]]:
+  """Runs an eval suite across a pool of environments.
+
+  Task instances are spread across the environments in `env_pool`, longest
+  first, so that the run is not held up by a long task started last. Demo mode
+  is not supported, since there is no single screen to show a scoreboard on.
+
+  Args:
+    suite: The suite of tasks to run on.
+    agent_factory: Creates an agent interacting with the given environment. It
+      is called once per environment; agents are never shared across
+      environments.
+    env_pool: The environments to run on.
+    checkpointer: See docstring from `run`. Must be safe to call from several
+      threads, like `IncrementalCheckpointer`.
+
+  Returns:
+    Step-by-step data from each episode run, as for `run`.
+  """
+  # The agent name is needed upfront to tell which instances are done.
+  first_env = env_pool.envs[0]
+  agents = {id(first_env): agent_factory(first_env)}
+  agents_lock = threading.Lock()
+
+  def run_on(env: interface.AsyncEnv, task: task_eval.TaskEval):
+    with agents_lock:
+      if id(env) not in agents:
+        agents[id(env)] = agent_factory(env)
+      agent = agents[id(env)]
+    with adb_tracing.task_context(task.name):
+      episode = _run_task(
+          task, _make_run_episode(agent, demo_mode=False), env, demo_mode=False
+      )
+    episode[constants.EpisodeConstants.AGENT_NAME] = agent.name
+    return episode
+
+  return _run_task_suite_parallel(
+      suite,
+      run_on,
+      env_pool,
+      checkpointer=checkpointer,
+      agent_name=agents[id(first_env)].name,
+  )
+
+
 def _allocate_step_budget(task_complexity: int) -> int:
   """Allocates number of steps dynamically based on the complexity score.
 
@@ -498,8 +813,8 @@ def _update_scoreboard(
   )
 
 
-def _extract_task_metadata() -> pd.DataFrame:
-  """Extracts metadata from task_metadata.json."""
+@functools.cache
+def _read_task_metadata() -> pd.DataFrame:
   name = 'task_metadata.json'
   filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
   df = pd.read_json(filepath)
@@ -510,6 +825,11 @@ def _extract_task_metadata() -> pd.DataFrame:
   ]
 
 
+def _extract_task_metadata() -> pd.DataFrame:
+  """Extracts metadata from task_metadata.json, which is read only once."""
+  return _read_task_metadata().copy()
+
+
 def _print_results_by_tag(result_df: pd.DataFrame) -> None:
   exploded_df = result_df.explode('tags').reset_index()
   exploded_df.tags.replace(regex=r'', value='untagged', inplace=True)
@@ -581,56 +901,219 @@ def process_episodes(
     A dataframe aggregating results of run.
   """
 
-  df = pd.DataFrame(list(episodes))
+  aggregator = ResultsAggregator()
+  for episode in episodes:
+    aggregator.add(episode)
+  return aggregator.summarize(print_summary=print_summary)
+
 
-  # Add exeception info for backwards compatibility.
-  df = df.assign(**{
-      constants.EpisodeConstants.EXCEPTION_INFO: df.get(
-          constants.EpisodeConstants.EXCEPTION_INFO, np.nan
-      )
-  })
-
-  result_df = df.groupby('task_template', dropna=True).agg({
-      constants.EpisodeConstants.IS_SUCCESSFUL: ['count', 'mean'],
-      constants.EpisodeConstants.EPISODE_LENGTH: 'mean',
-      constants.EpisodeConstants.RUN_TIME: 'sum',
-      constants.EpisodeConstants.EXCEPTION_INFO: [
-          ('none_count', lambda x: x.notnull().sum())
-      ],
-  })
-  result_df = result_df.sort_index()
-  result_df.columns = [
-      'num_complete_trials',
-      'mean_success_rate',
-      'mean_episode_length',
-      'total_runtime_s',
-      'num_fail_trials',
-  ]
-  result_df['total_runtime_s'] = result_df['total_runtime_s'].map(
-      lambda x: float('{:.1f}'.format(x))
-  )
+def _is_missing(value: Any) -> bool:
+  return value is None or (isinstance(value, float) and math.isnan(value))
 
-  # Extract metadata and merge with the results table.
-  metadata_df = _extract_task_metadata()
-  tagged_result_df = result_df.merge(
-      metadata_df, on=[_TASK_TEMPLATE_COLUMN], how='left'
-  )
 
-  if print_summary:
-    avg = result_df.mean(axis=0)
-    avg.name = '========= Average ========='
+@dataclasses.dataclass
+class _TemplateStats:
+  """Running statistics of the episodes of one task template."""
+
+  num_successes_known: int = 0
+  sum_success: float = 0.0
+  num_lengths_known: int = 0
+  sum_length: float = 0.0
+  total_runtime_s: float = 0.0
+  num_fail_trials: int = 0
+
+  @property
+  def mean_success_rate(self) -> Optional[float]:
+    if not self.num_successes_known:
+      return None
+    return self.sum_success / self.num_successes_known
+
+
+@dataclasses.dataclass
+class _SuccessRateStats:
+  """Running mean of the success rates of several task templates."""
+
+  num_templates: int = 0
+  sum_success_rate: float = 0.0
+
+  def update(self, old: Optional[float], new: Optional[float]) -> None:
+    """Replaces a template's success rate `old` by `new`; None if unknown."""
+    if old is not None:
+      self.num_templates -= 1
+      self.sum_success_rate -= old
+    if new is not None:
+      self.num_templates += 1
+      self.sum_success_rate += new
+
+  @property
+  def mean(self) -> float:
+    if not self.num_templates:
+      return np.nan
+    return self.sum_success_rate / self.num_templates
+
+
+def _tag_keys(template: str) -> list[tuple[str, str]]:
+  """Returns the (tag, difficulty) pairs of a template, as in the tag table."""
+  metadata = _read_task_metadata()
+  if template not in metadata.index:
+    return []
+  row = metadata.loc[template]
+  return [(tag or 'untagged', row['difficulty']) for tag in row['tags']]
+
+
+class ResultsAggregator:
+  """Aggregates task suite results one episode at a time.
+
+  Adding an episode updates running statistics per task template and per tag,
+  in time proportional to the number of tags of its template. A run can thus
+  print its progress after every episode without reprocessing the earlier
+  ones, and the full tables once at the end:
+
+  ```
+  aggregator = ResultsAggregator()
+  for episode in episodes:
+    aggregator.add(episode)
+    aggregator.print_progress()
+  aggregator.summarize(print_summary=True)
+  ```
+
+  `summarize` returns and prints the same tables as `process_episodes`.
+  """
+
+  def __init__(self):
+    self._stats: dict[str, _TemplateStats] = {}
+    self._overall = _SuccessRateStats()
+    self._by_tag: dict[tuple[str, str], _SuccessRateStats] = {}
+    self._last_template: Optional[str] = None
+
+  def add(self, episode: dict[str, Any]) -> None:
+    """Adds the result of an episode, or its metadata."""
+    template = episode.get(constants.EpisodeConstants.TASK_TEMPLATE)
+    if _is_missing(template):
+      return
+    self._last_template = template
+    stats = self._stats.setdefault(template, _TemplateStats())
+    success = episode.get(constants.EpisodeConstants.IS_SUCCESSFUL)
+    if not _is_missing(success):
+      old_rate = stats.mean_success_rate
+      stats.num_successes_known += 1
+      stats.sum_success += float(success)
+      new_rate = stats.mean_success_rate
+      self._overall.update(old_rate, new_rate)
+      for key in _tag_keys(template):
+        self._by_tag.setdefault(key, _SuccessRateStats()).update(
+            old_rate, new_rate
+        )
+    length = episode.get(constants.EpisodeConstants.EPISODE_LENGTH)
+    if not _is_missing(length):
+      stats.num_lengths_known += 1
+      stats.sum_length += float(length)
+    run_time = episode.get(constants.EpisodeConstants.RUN_TIME)
+    if not _is_missing(run_time):
+      stats.total_runtime_s += float(run_time)
+    if not _is_missing(episode.get(constants.EpisodeConstants.EXCEPTION_INFO)):
+      stats.num_fail_trials += 1
+
+  def success_rates_by_tag(self) -> dict[tuple[str, str], float]:
+    """Returns the mean success rate of the templates by tag and difficulty.
+
+    Like the tag table printed by `summarize`, each template with a known
+    success rate counts once, whatever its number of episodes.
+    """
+    return {key: stats.mean for key, stats in self._by_tag.items()}
+
+  def print_progress(self) -> None:
+    """Prints the running results of the template of the last added episode.
+
+    Unlike `summarize`, this does not rebuild the tables, so it can be called
+    after every episode.
+    """
+    template = self._last_template
+    if template is None:
+      return
+    stats = self._stats[template]
+    rate = stats.mean_success_rate
+    print(
+        f'{template}: {stats.num_successes_known} complete trials, mean'
+        f' success rate {np.nan if rate is None else rate:.2f},'
+        f' {stats.num_fail_trials} failed trials.'
+    )
+    print(
+        f'Average success rate of {self._overall.num_templates} templates:'
+        f' {self._overall.mean:.2f}.'
+    )
+    for tag, difficulty in _tag_keys(template):
+      tag_stats = self._by_tag.get((tag, difficulty))
+      if tag_stats is not None:
+        print(
+            f'  {tag} ({difficulty}): {tag_stats.mean:.2f} over'
+            f' {tag_stats.num_templates} templates.'
+        )
+
+  def _result_df(self) -> pd.DataFrame:
+    """Returns the per-template table, indexed by task template."""
+    rows = {}
+    for template in sorted(self._stats):
+      stats = self._stats[template]
+      rows[template] = {
+          'num_complete_trials': stats.num_successes_known,
+          'mean_success_rate': (
+              stats.sum_success / stats.num_successes_known
+              if stats.num_successes_known
+              else np.nan
+          ),
+          'mean_episode_length': (
+              stats.sum_length / stats.num_lengths_known
+              if stats.num_lengths_known
+              else np.nan
+          ),
+          'total_runtime_s': float('{:.1f}'.format(stats.total_runtime_s)),
+          'num_fail_trials': stats.num_fail_trials,
+      }
+    result_df = pd.DataFrame.from_dict(
+        rows,
+        orient='index',
+        columns=[
+            'num_complete_trials',
+            'mean_success_rate',
+            'mean_episode_length',
+            'total_runtime_s',
+            'num_fail_trials',
+        ],
+    )
+    result_df.index.name = _TASK_TEMPLATE_COLUMN
+    return result_df
+
+  def summarize(self, print_summary: bool = False) -> pd.DataFrame:
+    """Returns the results so far, tagged with the task metadata.
+
+    Args:
+      print_summary: Whether to print the results with a summary row, and the
+        mean success rate by tag and difficulty.
+    """
+    result_df = self._result_df()
+
+    # Extract metadata and merge with the results table.
+    metadata_df = _extract_task_metadata()
+    tagged_result_df = result_df.merge(
+        metadata_df, on=[_TASK_TEMPLATE_COLUMN], how='left'
+    )
+
+    if print_summary:
+      avg = result_df.mean(axis=0)
+      avg.name = '========= Average ========='
 
-    result = pd.concat([result_df, avg.to_frame().T])
-    result.index.name = 'task'
-    result.insert(0, 'task_num', list(range(len(result) - 1)) + [0])
-    result.task_num = result.task_num.astype(int)
-    pd.set_option('display.max_columns', 100)
-    pd.set_option('display.width', 1000)
-    print(f'\n\n{result}')
+      result = pd.concat([result_df, avg.to_frame().T])
+      result.index.name = 'task'
+      result.insert(0, 'task_num', list(range(len(result) - 1)) + [0])
+      result.task_num = result.task_num.astype(int)
+      pd.set_option('display.max_columns', 100)
+      pd.set_option('display.width', 1000)
+      print(f'\n\n{result}')
 
-    # Add a chart that shows mean success rate by tag and difficulty.
-    tags_df = _print_results_by_tag(tagged_result_df)
-    pd.set_option('display.precision', 2)
-    print(f'\n\n{tags_df}')
+      # Add a chart that shows mean success rate by tag and difficulty.
+      tags_df = _print_results_by_tag(tagged_result_df)
+      pd.set_option('display.precision', 2)
+      print(f'\n\n{tags_df}')
 
-  return tagged_result_df
+    return tagged_result_df
@@ -14,7 +14,11 @@
 
 """Tests for suite utils."""
 
+import contextlib
 import copy
+import io
+import os
+import tempfile
 import time
 from typing import Any
 from unittest import mock
@@ -27,7 +31,9 @@ from android_world import registry
 from android_world import suite_utils
 from android_world.agents import base_agent
 from android_world.env import adb_utils
+from android_world.env import env_pool
 from android_world.env import interface
+from android_world.utils import fake_adb_responses
 from android_world.utils import test_utils
 import dm_env
 import numpy as np
@@ -459,7 +465,7 @@ class RunTaskSuiteTest(absltest.TestCase):
       unused_mock_sleep,
   ):
     # Simulating already completed Task1
-    mock_checkpointer.load.return_value = [
+    mock_checkpointer.load_metadata.return_value = [
         {
             'is_successful': 0.0,
             'goal': 'Current state eval',
@@ -515,11 +521,11 @@ class RunTaskSuiteTest(absltest.TestCase):
     )
 
     self.assertTaskResults(result)
-    mock_checkpointer.load.assert_called_once()
+    mock_checkpointer.load_metadata.assert_called_once()
     # Don't need to run task 1.
     # Task 2.
     mock_run_e2e.assert_called_once()  # Task 2 has one instance.
-    mock_checkpointer.save_episodes.assert_has_calls([
+    mock_checkpointer.append_episode.assert_has_calls([
         mock.call(mock.ANY, 'Task2'),
     ])
 
@@ -534,7 +540,7 @@ class RunTaskSuiteTest(absltest.TestCase):
       mock_env,
       unused_mock_sleep,
   ):
-    mock_checkpointer.load.return_value = []
+    mock_checkpointer.load_metadata.return_value = []
     mock_env.get_state.return_value = (
         dm_env.TimeStep(
             observation={'pixels': np.zeros((3, 3, 3))},
@@ -584,9 +590,10 @@ class RunTaskSuiteTest(absltest.TestCase):
 
     self.assertTaskResults(result)
     self.assertEqual(mock_run_e2e.call_count, 3)
-    mock_checkpointer.load.assert_called_once()
-    mock_checkpointer.save_episodes.assert_has_calls(
+    mock_checkpointer.load_metadata.assert_called_once()
+    mock_checkpointer.append_episode.assert_has_calls(
         [
+            mock.call(mock.ANY, 'Task1'),
             mock.call(mock.ANY, 'Task1'),
             mock.call(mock.ANY, 'Task2'),
         ],
@@ -604,7 +611,7 @@ class RunTaskSuiteTest(absltest.TestCase):
       mock_env,
       unused_mock_sleep,
   ):
-    mock_checkpointer.load.return_value = [
+    mock_checkpointer.load_metadata.return_value = [
         {
             'is_successful': 0,
             'goal': 'Current state eval',
@@ -643,9 +650,242 @@ class RunTaskSuiteTest(absltest.TestCase):
 
     self.assertTaskResults(result)
     mock_run_e2e.assert_not_called()
-    mock_checkpointer.load.assert_called_once()
+    mock_checkpointer.load_metadata.assert_called_once()
     mock_checkpointer.save.assert_not_called()
 
 
+class RunTaskSuiteParallelTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.enter_context(
+        mock.patch.object(
+            adb_utils,
+            'issue_generic_request',
+            return_value=fake_adb_responses.create_successful_generic_response(
+                'ok'
+            ),
+        )
+    )
+    self.suite = suite_utils.Suite(
+        Task1=[
+            test_utils.FakeCurrentStateEval(
+                test_utils.FakeCurrentStateEval.generate_random_params()
+            )
+            for _ in range(2)
+        ],
+        Task2=[
+            test_utils.FakeAdbEval(
+                test_utils.FakeAdbEval.generate_random_params()
+            )
+        ],
+    )
+    self.suite['Task2'][0].complexity = 3
+    self.suite.suite_family = 'android'
+
+  def _make_pool(self, num_envs: int) -> env_pool.EnvPool:
+    return env_pool.EnvPool(
+        num_envs=num_envs,
+        env_factory=lambda *unused_ports: test_utils.FakeAsyncEnv(),
+    )
+
+  def _run_on(self, env, task):
+    del env
+    return {
+        'goal': task.goal,
+        'task_template': task.name,
+        'is_successful': 1.0,
+        'episode_length': 1,
+        'run_time': 0,
+        'exception_info': None,
+    }
+
+  def test_runs_longest_tasks_first(self):
+    started = []
+
+    def run_on(env, task):
+      started.append(task.name)
+      return self._run_on(env, task)
+
+    result = suite_utils._run_task_suite_parallel(
+        self.suite, run_on, self._make_pool(1)
+    )
+
+    self.assertEqual(
+        started, ['FakeAdbEval', 'FakeCurrentStateEval', 'FakeCurrentStateEval']
+    )
+    self.assertEqual(
+        [episode['task_template'] for episode in result],
+        ['FakeCurrentStateEval', 'FakeCurrentStateEval', 'FakeAdbEval'],
+    )
+
+  def test_checkpoints_and_resumes(self):
+    mock_checkpointer = mock.create_autospec(
+        checkpointer.Checkpointer, instance=True
+    )
+    mock_checkpointer.load_metadata.return_value = [
+        self._run_on(None, self.suite['Task2'][0]) | {'task_template': 'Task2'}
+    ]
+    run_on = mock.MagicMock(side_effect=self._run_on)
+
+    result = suite_utils._run_task_suite_parallel(
+        self.suite, run_on, self._make_pool(2), mock_checkpointer
+    )
+
+    self.assertEqual(run_on.call_count, 2)
+    self.assertLen(result, 3)
+    appended = [
+        c.args for c in mock_checkpointer.append_episode.call_args_list
+    ]
+    self.assertEqual([name for _, name in appended], ['Task1', 'Task1'])
+    mock_checkpointer.save_episodes.assert_not_called()
+
+  def test_resumes_only_unfinished_instances(self):
+    directory = self.enter_context(tempfile.TemporaryDirectory())
+    suite = suite_utils.Suite(
+        FakeCurrentStateEval=[
+            test_utils.FakeCurrentStateEval({'Number': i, 'seed': i})
+            for i in range(3)
+        ]
+    )
+    suite.suite_family = 'android'
+
+    def crash_on_last(env, task):
+      if task.params['seed'] == 2:
+        return self._run_on(env, task) | {'exception_info': 'Traceback'}
+      return self._run_on(env, task)
+
+    suite_utils._run_task_suite_parallel(
+        suite,
+        crash_on_last,
+        self._make_pool(1),
+        checkpointer.IncrementalCheckpointer(directory),
+    )
+    run_on = mock.MagicMock(side_effect=self._run_on)
+    result = suite_utils._run_task_suite_parallel(
+        suite,
+        run_on,
+        self._make_pool(1),
+        checkpointer.IncrementalCheckpointer(directory),
+    )
+
+    run_on.assert_called_once()
+    self.assertEqual(run_on.call_args.args[1].params['seed'], 2)
+    self.assertLen(result, 3)
+    saved = checkpointer.IncrementalCheckpointer(directory).load()
+    self.assertLen(saved, 3)
+    self.assertFalse(any(episode['exception_info'] for episode in saved))
+
+  def test_instance_id(self):
+    task = test_utils.FakeCurrentStateEval({'Number': 1, 'seed': 7})
+    same_seed = test_utils.FakeCurrentStateEval({'Number': 2, 'seed': 7})
+    other_seed = test_utils.FakeCurrentStateEval({'Number': 1, 'seed': 8})
+
+    self.assertEqual(
+        suite_utils.instance_id(task, 'agent'),
+        suite_utils.instance_id(same_seed, 'agent'),
+    )
+    self.assertNotEqual(
+        suite_utils.instance_id(task, 'agent'),
+        suite_utils.instance_id(other_seed, 'agent'),
+    )
+    self.assertNotEqual(
+        suite_utils.instance_id(task, 'agent'),
+        suite_utils.instance_id(task, 'other agent'),
+    )
+
+  def test_writes_adb_profile_next_to_checkpoint(self):
+    directory = self.enter_context(tempfile.TemporaryDirectory())
+    incremental = checkpointer.IncrementalCheckpointer(directory)
+
+    suite_utils._run_task_suite_parallel(
+        self.suite, self._run_on, self._make_pool(1), incremental
+    )
+
+    self.assertIn(suite_utils.ADB_PROFILE_FILENAME, os.listdir(directory))
+
+  def test_failed_episode_is_health_checked(self):
+    pool = self._make_pool(1)
+
+    def run_on(env, task):
+      return self._run_on(env, task) | {'exception_info': 'Traceback'}
+
+    result = suite_utils._run_task_suite_parallel(self.suite, run_on, pool)
+
+    self.assertLen(result, 3)
+    self.assertEqual(pool.stats()[0].leases, 3)
+    self.assertEqual(pool.stats()[0].failures, 0)
+    # One initial check plus one after each failed episode.
+    self.assertEqual(adb_utils.issue_generic_request.call_count, 4)
+
+
+class ResultsAggregatorTest(absltest.TestCase):
+
+  def _episode(self, template, success, length=3, run_time=1.25, error=None):
+    return {
+        'task_template': template,
+        'is_successful': success,
+        'episode_length': length,
+        'run_time': run_time,
+        'exception_info': error,
+    }
+
+  def test_aggregates_per_template(self):
+    aggregator = suite_utils.ResultsAggregator()
+    aggregator.add(self._episode('ContactsAddContact', 1.0, length=2))
+    aggregator.add(self._episode('ContactsAddContact', 0.0, length=4))
+    aggregator.add(
+        self._episode('ContactsAddContact', np.nan, length=np.nan, error='tb')
+    )
+    aggregator.add(self._episode('ClockStopWatchRunning', 1.0))
+
+    result = aggregator.summarize()
+
+    contacts = result.loc['ContactsAddContact']
+    self.assertEqual(contacts['num_complete_trials'], 2)
+    self.assertEqual(contacts['mean_success_rate'], 0.5)
+    self.assertEqual(contacts['mean_episode_length'], 3)
+    self.assertEqual(contacts['total_runtime_s'], 3.8)
+    self.assertEqual(contacts['num_fail_trials'], 1)
+    self.assertEqual(contacts['difficulty'], 'easy')
+    self.assertEqual(
+        list(result.index), ['ClockStopWatchRunning', 'ContactsAddContact']
+    )
+
+  def test_success_rates_by_tag_match_tag_table(self):
+    aggregator = suite_utils.ResultsAggregator()
+    aggregator.add(self._episode('ContactsAddContact', 1.0))
+    aggregator.add(self._episode('ContactsAddContact', 0.0))
+    aggregator.add(self._episode('ClockStopWatchRunning', 1.0))
+    aggregator.add(self._episode('SimpleCalendarAddOneEvent', 0.0))
+
+    by_tag = aggregator.success_rates_by_tag()
+
+    # pylint: disable-next=protected-access
+    table = suite_utils._print_results_by_tag(aggregator.summarize())
+    expected = {
+        (tag, difficulty): rate
+        for (_, difficulty), column in table.items()
+        for tag, rate in column.items()
+        if rate != '-'
+    }
+    self.assertEqual(by_tag, expected)
+    self.assertEqual(by_tag[('data_entry', 'easy')], 0.5)
+
+  def test_print_progress(self):
+    aggregator = suite_utils.ResultsAggregator()
+    aggregator.add(self._episode('ContactsAddContact', 1.0))
+    aggregator.add(self._episode('ContactsAddContact', 0.0))
+
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+      aggregator.print_progress()
+
+    self.assertIn(
+        'ContactsAddContact: 2 complete trials, mean success rate 0.50',
+        output.getvalue(),
+    )
+    self.assertIn('data_entry (easy): 0.50 over 1 templates', output.getvalue())
+
+
 if __name__ == '__main__':
   absltest.main()
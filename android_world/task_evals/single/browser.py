@@ -63,13 +63,15 @@ class BrowserTask(task_eval.TaskEval):
     )
 
     html = self.HTML.replace('%%SEED%%', str(self.params['browser_task_seed']))
-    with open('/tmp/task.html', 'w') as f:
-      f.write(html)
-    file_utils.copy_data_to_device(
-        '/tmp/task.html',
-        os.path.join(device_constants.DOWNLOAD_DATA, 'task.html'),
-        env.controller,
-    )
+    with file_utils.tmp_local_directory() as directory:
+      local_path = os.path.join(directory, 'task.html')
+      with open(local_path, 'w') as f:
+        f.write(html)
+      file_utils.copy_data_to_device(
+          local_path,
+          os.path.join(device_constants.DOWNLOAD_DATA, 'task.html'),
+          env.controller,
+      )
 
   def tear_down(self, env: interface.AsyncEnv):
     super().tear_down(env)
@@ -807,12 +807,14 @@ class MarkorTranscribeReceipt(task_eval.TaskEval):
     """Initializes the task for creating a receipt markdown file."""
     super().initialize_task(env)
     self.create_file_task.initialize_task(env)
-    self.img.save("/tmp/receipt.png")
-    file_utils.copy_data_to_device(
-        "/tmp/receipt.png",
-        device_constants.GALLERY_DATA,
-        env.controller,
-    )
+    with file_utils.tmp_local_directory() as directory:
+      local_path = os.path.join(directory, "receipt.png")
+      self.img.save(local_path)
+      file_utils.copy_data_to_device(
+          local_path,
+          device_constants.GALLERY_DATA,
+          env.controller,
+      )
 
   def is_successful(self, env: interface.AsyncEnv) -> float:
     super().is_successful(env)
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import datetime
+import os
 from unittest import mock
 
 from absl.testing import absltest
@@ -346,9 +347,11 @@ class GalleryMarkorTest(test_utils.AdbEvalTestBase):
 
     task.initialize_task(mock_env)
 
-    task.img.save.assert_called_once_with('/tmp/receipt.png')
+    task.img.save.assert_called_once()
+    local_path = task.img.save.call_args.args[0]
+    self.assertEqual(os.path.basename(local_path), 'receipt.png')
     mock_copy_data_to_device.assert_called_once_with(
-        '/tmp/receipt.png',
+        local_path,
         device_constants.GALLERY_DATA,
         mock_env.controller,
     )
@@ -43,13 +43,14 @@ class SaveCopyOfReceiptTaskEval(task_eval.TaskEval):
     super().initialize_task(env)
     user_data_generation.clear_device_storage(env)
     receipt_image = self.params.pop("receipt_image")
-    temp_storage_location = os.path.join("/tmp/", self.params["file_name"])
-    receipt_image.save(temp_storage_location)
-    file_utils.copy_data_to_device(
-        temp_storage_location,
-        device_constants.GALLERY_DATA,
-        env.controller,
-    )
+    with file_utils.tmp_local_directory() as directory:
+      temp_storage_location = os.path.join(directory, self.params["file_name"])
+      receipt_image.save(temp_storage_location)
+      file_utils.copy_data_to_device(
+          temp_storage_location,
+          device_constants.GALLERY_DATA,
+          env.controller,
+      )
 
   def tear_down(self, env: interface.AsyncEnv):
     super().tear_down(env)
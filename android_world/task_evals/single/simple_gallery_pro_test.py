@@ -14,7 +14,6 @@
 
 import itertools
 import os
-import tempfile
 from unittest import mock
 
 from absl.testing import absltest
@@ -28,13 +27,12 @@ from android_world.utils import fake_adb_responses
 from PIL import Image
 
 
-def _touch_temp_file(file_name):
-  """Creates an empty file in the /tmp/ directory.
+def _touch_file(path):
+  """Creates an empty file, standing in for saving an image.
 
   Args:
-    file_name: The name of the file.
+    path: The path of the file.
   """
-  path = os.path.join(tempfile.gettempdir(), file_name)
   with open(path, "w") as f:
     f.write("")
 
@@ -50,14 +48,13 @@ class SaveCopyOfReceiptTaskEvalTest(absltest.TestCase):
             autospec=True,
         )
     )
+    receipt_image = mock.create_autospec(Image.Image)
+    receipt_image.save.side_effect = _touch_file
     self.mock_receipt_generator = self.enter_context(
         mock.patch.object(
             receipt_generator,
             "create_receipt",
-            return_value=(
-                mock.create_autospec(Image.Image),
-                "receipt_test.jpg",
-            ),
+            return_value=(receipt_image, "receipt_test.jpg"),
         )
     )
     self.mock_restore_snapshot = self.enter_context(
@@ -72,7 +69,6 @@ class SaveCopyOfReceiptTaskEvalTest(absltest.TestCase):
       eval_task: simple_gallery_pro.SaveCopyOfReceiptTaskEval,
       env: interface.AsyncEnv,
   ):
-    _touch_temp_file(eval_task.params["file_name"])
     env.controller.execute_adb_call.side_effect = list(
         itertools.chain(
             fake_adb_responses.create_taskeval_initialize_responses(
@@ -12,8 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import concurrent.futures
 import os
 import sqlite3
+import tempfile
+import threading
 from unittest import mock
 
 from absl.testing import absltest
@@ -22,6 +25,7 @@ from android_env.wrappers import a11y_grpc_wrapper
 from android_world.env import adb_utils
 from android_world.env import android_world_controller
 from android_world.env import interface
+from android_world.env import simulated_device
 from android_world.task_evals.utils import sqlite_schema_utils
 from android_world.task_evals.utils import sqlite_test_utils
 from android_world.task_evals.utils import sqlite_utils
@@ -140,5 +144,64 @@ class SqliteUtilsTest(absltest.TestCase):
     self.assertEqual(retrieved, original_rows + [new_row])
 
 
+class ConcurrentReadTest(absltest.TestCase):
+
+  def test_reads_databases_of_two_devices_at_once(self):
+    self.enter_context(
+        mock.patch.object(
+            file_utils,
+            'TMP_LOCAL_LOCATION',
+            self.enter_context(tempfile.TemporaryDirectory()),
+        )
+    )
+    db_path = sqlite_test_utils.setup_test_db()
+    with open(db_path, 'rb') as f:
+      full = f.read()
+    with sqlite3.connect(db_path) as conn:
+      conn.execute('DELETE FROM events WHERE id = 1')
+    with open(db_path, 'rb') as f:
+      reduced = f.read()
+    remote_db_path = '/data/data/com.example/databases/events.db'
+    envs = []
+    for content in (full, reduced):
+      env = simulated_device.create_env(num_nodes=1)
+      env.controller.env.files[remote_db_path] = content
+      envs.append(env)
+
+    # Both devices hold their pulled databases while either is read.
+    both_pulled = threading.Barrier(2, timeout=10)
+    execute_query = sqlite_utils.execute_query
+
+    def execute_query_once_both_pulled(*args, **kwargs):
+      both_pulled.wait()
+      return execute_query(*args, **kwargs)
+
+    self.enter_context(
+        mock.patch.object(
+            sqlite_utils,
+            'execute_query',
+            side_effect=execute_query_once_both_pulled,
+        )
+    )
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+      results = list(
+          pool.map(
+              lambda env: sqlite_utils.get_rows_from_remote_device(
+                  'events',
+                  remote_db_path,
+                  sqlite_schema_utils.CalendarEvent,
+                  env,
+                  n_retries=1,
+              ),
+              envs,
+          )
+      )
+
+    expected = sqlite_test_utils.get_db_rows()
+    self.assertEqual(results[0], expected)
+    self.assertEqual(results[1], expected[1:])
+    self.assertEmpty(os.listdir(file_utils.TMP_LOCAL_LOCATION))
+
+
 if __name__ == '__main__':
   absltest.main()
@@ -54,9 +54,6 @@ def get_font_path() -> str:
     raise RuntimeError("No suitable font found.") from exc
 
 
-_TMP = "/tmp"
-
-
 def generate_random_string(length: int) -> str:
   """Generate a random string consists of English letter and digit with a given length.
 
@@ -164,14 +161,14 @@ def write_to_gallery(
   """
 
   image = _draw_text(data)
-  temp_storage_location = os.path.join(_TMP, file_name)
-  image.save(temp_storage_location)
-  file_utils.copy_data_to_device(
-      temp_storage_location,
-      device_constants.GALLERY_DATA,
-      env.controller,
-  )
-  os.remove(temp_storage_location)
+  with file_utils.tmp_local_directory() as directory:
+    temp_storage_location = os.path.join(directory, file_name)
+    image.save(temp_storage_location)
+    file_utils.copy_data_to_device(
+        temp_storage_location,
+        device_constants.GALLERY_DATA,
+        env.controller,
+    )
   adb_utils.close_app("simple gallery", env.controller)
 
 
@@ -179,16 +176,16 @@ def _copy_data_to_device(
     data: str, file_name: str, location: str, env: interface.AsyncEnv
 ):
   """Copies data to device by first writing locally, then copying.."""
-  temp_storage_location = os.path.join(_TMP, file_name)
-  with open(temp_storage_location, "w") as temp_file:
-    temp_file.write(data)
-
-  file_utils.copy_data_to_device(
-      temp_storage_location,
-      location,
-      env.controller,
-  )
-  os.remove(temp_storage_location)
+  with file_utils.tmp_local_directory() as directory:
+    temp_storage_location = os.path.join(directory, file_name)
+    with open(temp_storage_location, "w") as temp_file:
+      temp_file.write(data)
+
+    file_utils.copy_data_to_device(
+        temp_storage_location,
+        location,
+        env.controller,
+    )
 
 
 def write_to_markor(
@@ -271,20 +268,21 @@ def write_video_file_to_device(
   if messages is None:
     messages = ["test" + str(random.randint(0, 1_000_000))]
 
-  _create_mpeg_with_messages(
-      os.path.join(_TMP, file_name),
-      messages,
-      display_time=message_display_time,
-      width=width,
-      height=height,
-      fps=fps,
-  )
+  with file_utils.tmp_local_directory() as directory:
+    _create_mpeg_with_messages(
+        os.path.join(directory, file_name),
+        messages,
+        display_time=message_display_time,
+        width=width,
+        height=height,
+        fps=fps,
+    )
 
-  file_utils.copy_data_to_device(
-      os.path.join(_TMP, file_name),
-      location,
-      env.controller,
-  )
+    file_utils.copy_data_to_device(
+        os.path.join(directory, file_name),
+        location,
+        env.controller,
+    )
 
 
 def _create_test_mp3(
@@ -324,19 +322,19 @@ def write_mp3_file_to_device(
     title: The title of the song.
     duration_milliseconds: The duration of the MP3 file in milliseconds.
   """
-  local = os.path.join(_TMP, os.path.basename(remote_path))
-  _create_test_mp3(
-      local,
-      artist=artist,
-      title=title,
-      duration_milliseconds=duration_milliseconds,
-  )
-  file_utils.copy_data_to_device(
-      local,
-      remote_path,
-      env.controller,
-  )
-  os.remove(local)
+  with file_utils.tmp_local_directory() as directory:
+    local = os.path.join(directory, os.path.basename(remote_path))
+    _create_test_mp3(
+        local,
+        artist=artist,
+        title=title,
+        duration_milliseconds=duration_milliseconds,
+    )
+    file_utils.copy_data_to_device(
+        local,
+        remote_path,
+        env.controller,
+    )
 
 
 def dict_to_notes(input_dict: dict[str, tuple[str, str]]) -> str:
@@ -0,0 +1,272 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Content-addressed storage for large arrays, e.g. episode screenshots.
+
+Agents keep several full-resolution screenshots per step in their step data.
+`BlobStore.offload` moves such arrays into a directory of files named by the
+hash of their content, so identical screenshots are stored once, and leaves
+small `BlobRef`s in their place. References are loaded on access:
+
+```
+store = blob_store.BlobStore(os.path.join(checkpoint_dir, 'blobs'))
+light = store.offload(episode)  # Pickles small.
+...
+with store.resolving():
+  episode = pickle.loads(data)
+pixels = np.asarray(episode['episode_data']['raw_screenshot'][0])
+```
+
+Images are stored as PNG, other arrays as zlib-compressed `.npy` files.
+"""
+
+from collections.abc import Iterator
+import contextlib
+import contextvars
+import copy
+import dataclasses
+import hashlib
+import io
+import os
+import tempfile
+from typing import Any, Optional
+import zlib
+
+import cv2
+import numpy as np
+
+# Arrays smaller than this are left in place.
+DEFAULT_MIN_BYTES = 16 * 1024
+
+_PNG = 'png'
+_NPY = 'npy'
+
+# PNG compression level (0-9). Low levels compress screenshots nearly as well
+# as high ones, several times faster.
+_PNG_COMPRESSION = 1
+_NPY_COMPRESSION = 1
+
+
+def _is_image(array: np.ndarray) -> bool:
+  return array.dtype == np.uint8 and (
+      array.ndim == 2 or (array.ndim == 3 and array.shape[2] in (1, 3, 4))
+  )
+
+
+def _encode(array: np.ndarray) -> tuple[str, bytes]:
+  """Returns the format and file contents of an array."""
+  if _is_image(array):
+    image = array
+    if array.ndim == 3 and array.shape[2] in (3, 4):
+      # OpenCV expects BGR(A); swap so the files display correctly.
+      image = array[..., [2, 1, 0] + ([3] if array.shape[2] == 4 else [])]
+    ok, encoded = cv2.imencode(
+        '.png', image, [cv2.IMWRITE_PNG_COMPRESSION, _PNG_COMPRESSION]
+    )
+    if ok:
+      return _PNG, encoded.tobytes()
+  buffer = io.BytesIO()
+  np.save(buffer, array, allow_pickle=False)
+  return _NPY, zlib.compress(buffer.getbuffer(), _NPY_COMPRESSION)
+
+
+def _decode(
+    fmt: str, data: bytes, shape: tuple[int, ...], dtype: str
+) -> np.ndarray:
+  """Inverse of `_encode`."""
+  if fmt == _PNG:
+    image = cv2.imdecode(
+        np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED
+    )
+    if image.ndim == 3 and image.shape[2] in (3, 4):
+      image = image[..., [2, 1, 0] + ([3] if image.shape[2] == 4 else [])]
+    return image.reshape(shape).astype(dtype, copy=False)
+  return np.load(io.BytesIO(zlib.decompress(data)), allow_pickle=False)
+
+
+def content_digest(array: np.ndarray) -> str:
+  """Returns the hash identifying an array by its dtype, shape and values."""
+  digest = hashlib.sha256()
+  digest.update(f'{array.dtype.str}{array.shape}'.encode())
+  digest.update(np.ascontiguousarray(array).data)
+  return digest.hexdigest()
+
+
+# Store that references unpickled in a `BlobStore.resolving` context load from.
+_RESOLVING: contextvars.ContextVar[Optional['BlobStore']] = (
+    contextvars.ContextVar('blob_store_resolving', default=None)
+)
+
+
+@dataclasses.dataclass(eq=False)
+class BlobRef:
+  """Reference to an array in a `BlobStore`, loaded on access.
+
+  `np.asarray(ref)` and `ref.load()` return the array. The shape and dtype are
+  available without loading it.
+
+  Attributes:
+    digest: Content hash of the array.
+    format: How the array is stored.
+    shape: Shape of the array.
+    dtype: Dtype of the array, as a `np.dtype.str`.
+    store: The store to load from; not pickled.
+  """
+
+  digest: str
+  format: str
+  shape: tuple[int, ...]
+  dtype: str
+  store: Optional['BlobStore'] = None
+
+  def load(self) -> np.ndarray:
+    """Reads the array from the store."""
+    if self.store is None:
+      raise ValueError(
+          f'Blob {self.digest} is not bound to a store; unpickle it within'
+          ' BlobStore.resolving().'
+      )
+    return self.store.get(self)
+
+  def __array__(self, dtype=None, copy=None) -> np.ndarray:
+    del copy
+    array = self.load()
+    return array if dtype is None else array.astype(dtype, copy=False)
+
+  def __eq__(self, other: Any) -> bool:
+    return isinstance(other, BlobRef) and self.digest == other.digest
+
+  def __hash__(self) -> int:
+    return hash(self.digest)
+
+  def __getstate__(self) -> dict[str, Any]:
+    state = dict(self.__dict__)
+    state['store'] = None
+    return state
+
+  def __setstate__(self, state: dict[str, Any]) -> None:
+    self.__dict__.update(state)
+    self.store = _RESOLVING.get()
+
+
+class BlobStore:
+  """Content-addressed, deduplicated files of arrays in a directory.
+
+  Blobs are written atomically, so concurrent writers and interrupted runs
+  never leave a partial blob behind. All methods are thread-safe.
+  """
+
+  def __init__(self, directory: str, min_bytes: int = DEFAULT_MIN_BYTES):
+    """Initializes the store.
+
+    Args:
+      directory: Directory of the blobs; created on the first write.
+      min_bytes: Arrays smaller than this are not offloaded by `offload`.
+    """
+    self.directory = directory
+    self.min_bytes = min_bytes
+
+  def _path(self, digest: str, fmt: str) -> str:
+    return os.path.join(self.directory, digest[:2], f'{digest[2:]}.{fmt}')
+
+  def _stored_format(self, digest: str) -> Optional[str]:
+    """Returns the format of the blob with the digest, or None if not stored."""
+    for fmt in (_PNG, _NPY):
+      if os.path.exists(self._path(digest, fmt)):
+        return fmt
+    return None
+
+  def put(self, array: np.ndarray) -> BlobRef:
+    """Stores an array, unless an identical one is stored already."""
+    digest = content_digest(array)
+    fmt = self._stored_format(digest)
+    if fmt is None:
+      fmt, data = _encode(array)
+      path = self._path(digest, fmt)
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+      try:
+        with os.fdopen(fd, 'wb') as f:
+          f.write(data)
+        os.replace(tmp_path, path)
+      except BaseException:
+        os.remove(tmp_path)
+        raise
+    return BlobRef(
+        digest=digest,
+        format=fmt,
+        shape=tuple(array.shape),
+        dtype=array.dtype.str,
+        store=self,
+    )
+
+  def get(self, ref: BlobRef) -> np.ndarray:
+    """Reads a stored array."""
+    with open(self._path(ref.digest, ref.format), 'rb') as f:
+      data = f.read()
+    return _decode(ref.format, data, ref.shape, ref.dtype)
+
+  def offload(self, value: Any) -> Any:
+    """Returns `value` with its large arrays replaced by references.
+
+    Dicts, lists and tuples are searched recursively and copied where they
+    contain an offloaded array; `value` itself is not modified. Arrays inside
+    other objects are left in place.
+
+    Args:
+      value: E.g. an episode.
+    """
+    if isinstance(value, np.ndarray):
+      if value.dtype.hasobject or value.nbytes < self.min_bytes:
+        return value
+      return self.put(value)
+    if isinstance(value, dict):
+      items = {key: self.offload(item) for key, item in value.items()}
+      if all(items[key] is value[key] for key in value):
+        return value
+      copied = copy.copy(value)
+      copied.update(items)
+      return copied
+    if isinstance(value, (list, tuple)) and not hasattr(value, '_fields'):
+      items = [self.offload(item) for item in value]
+      if all(new is old for new, old in zip(items, value)):
+        return value
+      return type(value)(items)
+    return value
+
+  @contextlib.contextmanager
+  def resolving(self) -> Iterator[None]:
+    """Binds the references unpickled within the context to this store."""
+    token = _RESOLVING.set(self)
+    try:
+      yield
+    finally:
+      _RESOLVING.reset(token)
+
+
+def materialize(value: Any) -> Any:
+  """Returns `value` with its references replaced by the arrays they point to.
+
+  Args:
+    value: E.g. an episode loaded from a checkpoint.
+  """
+  if isinstance(value, BlobRef):
+    return value.load()
+  if isinstance(value, dict):
+    copied = copy.copy(value)
+    copied.update((key, materialize(item)) for key, item in value.items())
+    return copied
+  if isinstance(value, (list, tuple)) and not hasattr(value, '_fields'):
+    return type(value)(materialize(item) for item in value)
+  return value
@@ -0,0 +1,97 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pickle
+import tempfile
+from unittest import mock
+
+from absl.testing import absltest
+from absl.testing import parameterized
+from android_world.utils import blob_store
+import numpy as np
+
+
+class BlobStoreTest(parameterized.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.directory = self.enter_context(tempfile.TemporaryDirectory())
+    self.store = blob_store.BlobStore(self.directory, min_bytes=100)
+
+  @parameterized.named_parameters(
+      ('rgb', (40, 30, 3), np.uint8),
+      ('rgba', (40, 30, 4), np.uint8),
+      ('gray', (40, 30), np.uint8),
+      ('single_channel', (40, 30, 1), np.uint8),
+      ('float', (40, 30), np.float32),
+  )
+  def test_round_trip(self, shape, dtype):
+    array = (np.random.default_rng(0).random(shape) * 255).astype(dtype)
+
+    ref = self.store.put(array)
+
+    self.assertEqual(ref.shape, shape)
+    loaded = ref.load()
+    self.assertEqual(loaded.dtype, array.dtype)
+    np.testing.assert_array_equal(loaded, array)
+
+  def test_deduplicates(self):
+    array = np.zeros((40, 30, 3), dtype=np.uint8)
+
+    self.assertEqual(self.store.put(array), self.store.put(array.copy()))
+    self.assertNotEqual(self.store.put(array), self.store.put(array + 1))
+    files = [f for _, _, files in os.walk(self.directory) for f in files]
+    self.assertLen(files, 2)
+
+  def test_finds_blob_stored_in_other_format(self):
+    array = np.zeros((40, 30, 3), dtype=np.uint8)
+    with mock.patch.object(
+        blob_store.cv2, 'imencode', return_value=(False, None)
+    ):
+      fallback = self.store.put(array)
+    self.assertEqual(fallback.format, 'npy')
+
+    with mock.patch.object(
+        blob_store, '_encode', wraps=blob_store._encode
+    ) as encode:
+      ref = self.store.put(array)
+
+    encode.assert_not_called()
+    self.assertEqual(ref.format, 'npy')
+    np.testing.assert_array_equal(ref.load(), array)
+
+  def test_offload_and_resolve(self):
+    large = np.ones((40, 30, 3), dtype=np.uint8)
+    episode = {'data': {'screens': [large], 'tiny': np.ones(3)}, 'goal': 'g'}
+
+    light = self.store.offload(episode)
+    self.assertIs(episode['data']['screens'][0], large)
+    self.assertIs(light['data']['tiny'], episode['data']['tiny'])
+    data = pickle.dumps(light)
+    self.assertLess(len(data), large.nbytes)
+
+    with self.assertRaises(ValueError):
+      pickle.loads(data)['data']['screens'][0].load()
+    with self.store.resolving():
+      loaded = pickle.loads(data)
+    screen = loaded['data']['screens'][0]
+    np.testing.assert_array_equal(np.asarray(screen), large)
+    np.testing.assert_array_equal(
+        blob_store.materialize(loaded)['data']['screens'][0], large
+    )
+
+
+if __name__ == '__main__':
+  absltest.main()
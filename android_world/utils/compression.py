@@ -0,0 +1,283 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compressed pickles with pluggable codecs.
+
+`dumps` pickles with protocol 5, so NumPy arrays are passed to the compressor
+as out-of-band buffers instead of being copied into the pickle, and streams
+the pickle and the buffers through the codec without joining them first:
+
+```
+data = compression.dumps(episode, codec='zstd', level=3)
+episode = compression.loads(data)
+```
+
+The codec is recorded in the output, so `loads` needs no arguments. Contiguous
+arrays loaded by `loads` share the decompressed buffer and are read-only. zlib
+is always available; zstd and lz4 require the `zstandard` and `lz4` packages.
+"""
+
+import abc
+import pickle
+import struct
+from typing import Any, Optional
+import zlib
+
+try:
+  import lz4.frame  # pylint: disable=g-import-not-at-top
+except ImportError:
+  lz4 = None
+try:
+  import zstandard  # pylint: disable=g-import-not-at-top
+except ImportError:
+  zstandard = None
+
+# Lengths of the pickle and of the out-of-band buffers, followed by the pickle
+# and the buffers, each starting at a multiple of _ALIGNMENT.
+_HEADER = struct.Struct('<II')
+_BUFFER_LENGTH = struct.Struct('<Q')
+_ALIGNMENT = 8
+
+
+class _Compressor(abc.ABC):
+  """Compresses a stream of chunks."""
+
+  @abc.abstractmethod
+  def compress(self, data: memoryview) -> bytes:
+    """Compresses a chunk, returning the output produced so far."""
+
+  @abc.abstractmethod
+  def flush(self) -> bytes:
+    """Returns the rest of the output."""
+
+
+class Codec(abc.ABC):
+  """A compression algorithm.
+
+  Attributes:
+    name: The name to select the codec by.
+    codec_id: Identifies the codec in compressed data.
+    default_level: The compression level used if none is given.
+  """
+
+  name: str
+  codec_id: int
+  default_level: int
+
+  @property
+  @abc.abstractmethod
+  def available(self) -> bool:
+    """Whether the codec's package is installed."""
+
+  @abc.abstractmethod
+  def compressor(self, level: int) -> _Compressor:
+    """Returns a compressor of a new stream."""
+
+  @abc.abstractmethod
+  def decompress(self, data: bytes) -> bytes:
+    """Decompresses a whole stream."""
+
+
+class _ZlibCompressor(_Compressor):
+
+  def __init__(self, level: int):
+    self._compressor = zlib.compressobj(level)
+
+  def compress(self, data: memoryview) -> bytes:
+    return self._compressor.compress(data)
+
+  def flush(self) -> bytes:
+    return self._compressor.flush()
+
+
+class _ZlibCodec(Codec):
+  """zlib (DEFLATE), as in gzip."""
+
+  name = 'zlib'
+  codec_id = 0
+  default_level = 5
+
+  @property
+  def available(self) -> bool:
+    return True
+
+  def compressor(self, level: int) -> _Compressor:
+    return _ZlibCompressor(level)
+
+  def decompress(self, data: bytes) -> bytes:
+    return zlib.decompress(data)
+
+
+class _ZstdCompressor(_Compressor):
+
+  def __init__(self, level: int):
+    self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+  def compress(self, data: memoryview) -> bytes:
+    return self._compressor.compress(data)
+
+  def flush(self) -> bytes:
+    return self._compressor.flush()
+
+
+class _ZstdCodec(Codec):
+  """Zstandard; compresses about as well as zlib, several times faster."""
+
+  name = 'zstd'
+  codec_id = 1
+  default_level = 3
+
+  @property
+  def available(self) -> bool:
+    return zstandard is not None
+
+  def compressor(self, level: int) -> _Compressor:
+    return _ZstdCompressor(level)
+
+  def decompress(self, data: bytes) -> bytes:
+    # Streamed frames do not record their size, which `decompress` requires.
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+class _Lz4Compressor(_Compressor):
+
+  def __init__(self, level: int):
+    self._compressor = lz4.frame.LZ4FrameCompressor(compression_level=level)
+    self._header = self._compressor.begin()
+
+  def compress(self, data: memoryview) -> bytes:
+    output = self._header + self._compressor.compress(data)
+    self._header = b''
+    return output
+
+  def flush(self) -> bytes:
+    output = self._header + self._compressor.flush()
+    self._header = b''
+    return output
+
+
+class _Lz4Codec(Codec):
+  """LZ4; the fastest, at the cost of larger output."""
+
+  name = 'lz4'
+  codec_id = 2
+  default_level = 0
+
+  @property
+  def available(self) -> bool:
+    return lz4 is not None
+
+  def compressor(self, level: int) -> _Compressor:
+    return _Lz4Compressor(level)
+
+  def decompress(self, data: bytes) -> bytes:
+    return lz4.frame.decompress(data)
+
+
+_CODECS = (_ZlibCodec(), _ZstdCodec(), _Lz4Codec())
+CODEC_NAMES = tuple(codec.name for codec in _CODECS)
+DEFAULT_CODEC = 'zlib'
+
+
+def get_codec(name: str) -> Codec:
+  """Returns the codec called `name`.
+
+  Raises:
+    ValueError: If there is no such codec, or its package is not installed.
+  """
+  for codec in _CODECS:
+    if codec.name == name:
+      if not codec.available:
+        raise ValueError(
+            f'Codec {name} requires a package that is not installed; see'
+            ' https://pypi.org/project/zstandard and'
+            ' https://pypi.org/project/lz4.'
+        )
+      return codec
+  raise ValueError(f'Unknown codec {name}; expected one of {CODEC_NAMES}.')
+
+
+def _get_codec_by_id(codec_id: int) -> Codec:
+  for codec in _CODECS:
+    if codec.codec_id == codec_id:
+      return get_codec(codec.name)
+  raise ValueError(f'Data compressed with unknown codec {codec_id}.')
+
+
+def _padding(length: int) -> bytes:
+  return bytes(-length % _ALIGNMENT)
+
+
+def dumps(
+    obj: Any, codec: str = DEFAULT_CODEC, level: Optional[int] = None
+) -> bytes:
+  """Pickles and compresses `obj`.
+
+  Args:
+    obj: The object to pickle.
+    codec: The name of the codec to compress with.
+    level: The compression level, or None for the codec's default.
+
+  Returns:
+    The codec's ID followed by the compressed data.
+  """
+  selected = get_codec(codec)
+  buffers = []
+  data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+  views = [buffer.raw() for buffer in buffers]
+
+  compressor = selected.compressor(
+      selected.default_level if level is None else level
+  )
+  chunks = [bytes([selected.codec_id])]
+  header = _HEADER.pack(len(data), len(views)) + b''.join(
+      _BUFFER_LENGTH.pack(view.nbytes) for view in views
+  )
+  chunks.append(compressor.compress(header + _padding(len(header))))
+  chunks.append(compressor.compress(data))
+  chunks.append(compressor.compress(_padding(len(data))))
+  for view in views:
+    chunks.append(compressor.compress(view))
+    chunks.append(compressor.compress(_padding(view.nbytes)))
+  chunks.append(compressor.flush())
+  return b''.join(chunks)
+
+
+def loads(data: bytes) -> Any:
+  """Inverse of `dumps`.
+
+  Contiguous arrays are restored in place in the decompressed data, without
+  copying them. They are therefore read-only; copy an array, e.g. with
+  `np.array`, to modify it.
+
+  Raises:
+    ValueError: If the data was compressed with a codec that is not installed.
+  """
+  codec = _get_codec_by_id(data[0])
+  raw = memoryview(codec.decompress(memoryview(data)[1:]))
+  pickle_length, num_buffers = _HEADER.unpack_from(raw)
+  offset = _HEADER.size
+  lengths = []
+  for _ in range(num_buffers):
+    (length,) = _BUFFER_LENGTH.unpack_from(raw, offset)
+    lengths.append(length)
+    offset += _BUFFER_LENGTH.size
+  offset += -offset % _ALIGNMENT
+  pickled = raw[offset : offset + pickle_length]
+  offset += pickle_length + -pickle_length % _ALIGNMENT
+  buffers = []
+  for length in lengths:
+    buffers.append(raw[offset : offset + length])
+    offset += length + -length % _ALIGNMENT
+  return pickle.loads(pickled, buffers=buffers)
@@ -0,0 +1,70 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+from absl.testing import absltest
+from absl.testing import parameterized
+from android_world.utils import compression
+import numpy as np
+
+
+class CompressionTest(parameterized.TestCase):
+
+  @parameterized.parameters((codec,) for codec in compression.CODEC_NAMES)
+  def test_round_trip(self, codec):
+    try:
+      compression.get_codec(codec)
+    except ValueError:
+      self.skipTest(f'{codec} is not installed.')
+    screenshot = np.zeros((64, 32, 3), dtype=np.uint8)
+    screenshot[10:20] = 255
+    episode = {
+        'goal': 'Open the clock.',
+        'raw_screenshot': [screenshot, np.asfortranarray(screenshot)],
+        'strided': np.arange(10.0)[::3],
+        'is_successful': 1.0,
+    }
+
+    data = compression.dumps(episode, codec=codec, level=1)
+    loaded = compression.loads(data)
+
+    self.assertLess(len(data), screenshot.nbytes)
+    self.assertEqual(loaded['goal'], episode['goal'])
+    for array, expected in zip(
+        loaded['raw_screenshot'] + [loaded['strided']],
+        episode['raw_screenshot'] + [episode['strided']],
+    ):
+      np.testing.assert_array_equal(array, expected)
+    # Contiguous arrays share the decompressed buffer; others are copied.
+    for array in loaded['raw_screenshot']:
+      self.assertFalse(array.flags.writeable)
+    self.assertTrue(loaded['strided'].flags.writeable)
+    self.assertTrue(loaded['raw_screenshot'][1].flags.f_contiguous)
+
+  def test_unknown_codec(self):
+    with self.assertRaisesRegex(ValueError, 'Unknown codec'):
+      compression.dumps({}, codec='brotli')
+
+  def test_codec_not_installed(self):
+    data = compression.dumps({'key': 1})
+    with mock.patch.object(compression._ZlibCodec, 'available', False):
+      with self.assertRaisesRegex(ValueError, 'not installed'):
+        compression.dumps({}, codec='zlib')
+      with self.assertRaisesRegex(ValueError, 'not installed'):
+        compression.loads(data)
+
+
+if __name__ == '__main__':
+  absltest.main()
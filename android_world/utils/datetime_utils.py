@@ -19,8 +19,8 @@ import random
 import time
 import zoneinfo
 
+from absl import logging
 from android_env import env_interface
-from android_env.proto import adb_pb2
 from android_world.env import adb_utils
 from android_world.env import device_constants
 
@@ -106,9 +106,17 @@ def setup_datetime(env: env_interface.AndroidEnvInterface) -> None:
     env: AndroidEnv instance.
   """
   adb_utils.issue_generic_request(['root'], env)
-  _disable_auto_settings(env)
-  _enable_24_hour_format(env)
-  _set_timezone_to_utc(env)
+  results = adb_utils.issue_generic_requests(
+      _DISABLE_AUTO_SETTINGS_COMMANDS
+      + _ENABLE_24_HOUR_FORMAT_COMMANDS
+      + _SET_TIMEZONE_TO_UTC_COMMANDS,
+      env,
+  )
+  for result in results:
+    if not result.ok:
+      logging.warning(
+          'Datetime setup command %r failed: %r', result.command, result.output
+      )
   time.sleep(5.0)  # Takes a while to fully propagate.
 
 
@@ -153,43 +161,22 @@ def advance_system_time(
   )
 
 
-def _disable_auto_settings(env: env_interface.AndroidEnvInterface) -> None:
-  """Disables the automatic date, time, and timezone settings.
-
-  This is to maintain benchmark consistency and prevent external time updates.
+# Disables the automatic date, time, and timezone settings. This is to maintain
+# benchmark consistency and prevent external time updates.
+_DISABLE_AUTO_SETTINGS_COMMANDS = [
+    ['shell', 'settings', 'put', 'global', 'auto_time', '0'],
+    ['shell', 'settings', 'put', 'global', 'auto_time_zone', '0'],
+]
 
-  Args:
-    env: AndroidEnv instance.
-  """
-  adb_utils.put_settings(
-      adb_pb2.AdbRequest.SettingsRequest.Namespace.GLOBAL, 'auto_time', '0', env
-  )
-  adb_utils.put_settings(
-      adb_pb2.AdbRequest.SettingsRequest.Namespace.GLOBAL,
-      'auto_time_zone',
-      '0',
-      env,
-  )
+# Sets to 24-hour time format to be consistent and region-independent.
+_ENABLE_24_HOUR_FORMAT_COMMANDS = [
+    ['shell', 'settings', 'put', 'system', 'time_12_24', '24'],
+]
 
-
-def _enable_24_hour_format(env: env_interface.AndroidEnvInterface) -> None:
-  """Sets to 24-hour time format to be consistent and region-independent."""
-  adb_utils.put_settings(
-      adb_pb2.AdbRequest.SettingsRequest.Namespace.SYSTEM,
-      'time_12_24',
-      '24',
-      env,
-  )
-
-
-def _set_timezone_to_utc(env: env_interface.AndroidEnvInterface) -> None:
-  """Sets the Android device's timezone to UTC.
-
-  Args:
-      env: An instance of AndroidEnv interface.
-  """
-  adb_command = ['shell', 'service', 'call', 'alarm', '3', 's16', 'UTC']
-  adb_utils.issue_generic_request(adb_command, env)
+# Sets the Android device's timezone to UTC.
+_SET_TIMEZONE_TO_UTC_COMMANDS = [
+    ['shell', 'service', 'call', 'alarm', '3', 's16', 'UTC'],
+]
 
 
 def _set_datetime(env: env_interface.AndroidEnvInterface) -> None:
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import datetime
+import time
 from unittest import mock
 import zoneinfo
 
@@ -39,43 +40,31 @@ class AdbDatetimeManagerTest(absltest.TestCase):
     ]
     mock_issue_generic_request.assert_has_calls(expected_calls, any_order=False)
 
-  @mock.patch.object(adb_utils, 'put_settings')
+  @mock.patch.object(adb_utils, 'issue_generic_requests')
+  @mock.patch.object(time, 'sleep')
   def test_setup_datetime_environment(
-      self, mock_put_settings, mock_issue_generic_request
+      self,
+      unused_mock_sleep,
+      mock_issue_generic_requests,
+      mock_issue_generic_request,
   ):
     env_mock = mock.create_autospec(env_interface.AndroidEnvInterface)
+    mock_issue_generic_requests.return_value = [
+        adb_utils.ShellCommandResult('', b'', 0)
+    ] * 4
 
     datetime_utils.setup_datetime(env_mock)
 
-    expected_calls = [
-        mock.call(['root'], env_mock),
-        mock.call(
-            ['shell', 'service', 'call', 'alarm', '3', 's16', 'UTC'], env_mock
-        ),
-    ]
-    mock_issue_generic_request.assert_has_calls(expected_calls, any_order=False)
-
-    expected_calls = [
-        mock.call(
-            adb_pb2.AdbRequest.SettingsRequest.Namespace.GLOBAL,
-            'auto_time',
-            '0',
-            env_mock,
-        ),
-        mock.call(
-            adb_pb2.AdbRequest.SettingsRequest.Namespace.GLOBAL,
-            'auto_time_zone',
-            '0',
-            env_mock,
-        ),
-        mock.call(
-            adb_pb2.AdbRequest.SettingsRequest.Namespace.SYSTEM,
-            'time_12_24',
-            '24',
-            env_mock,
-        ),
-    ]
-    mock_put_settings.assert_has_calls(expected_calls, any_order=False)
+    mock_issue_generic_request.assert_called_once_with(['root'], env_mock)
+    mock_issue_generic_requests.assert_called_once_with(
+        [
+            ['shell', 'settings', 'put', 'global', 'auto_time', '0'],
+            ['shell', 'settings', 'put', 'global', 'auto_time_zone', '0'],
+            ['shell', 'settings', 'put', 'system', 'time_12_24', '24'],
+            ['shell', 'service', 'call', 'alarm', '3', 's16', 'UTC'],
+        ],
+        env_mock,
+    )
 
   def test_advance_system_time(self, mock_issue_generic_request):
     env_mock = mock.create_autospec(env_interface.AndroidEnvInterface)
@@ -21,6 +21,7 @@ import os
 import random
 import shutil
 import string
+import tempfile
 from typing import Iterator
 from typing import Optional
 
@@ -87,14 +88,19 @@ def clear_directory(
   Raises:
     RuntimeError when directory exists a failure occured while deleting files.
   """
-  if not check_directory_exists(directory_path, env):
-    return
-
-  # Check if the folder is empty
-  res = adb_utils.issue_generic_request(
-      ["shell", "ls", "-1", directory_path], env
+  # Check whether the folder exists and is empty in a single round trip.
+  exists, listing = adb_utils.issue_generic_requests(
+      [
+          ["shell", "test", "-d", f'"{directory_path}"'],
+          ["shell", "ls", "-1", directory_path],
+      ],
+      env,
   )
-  folder_contents = res.generic.output.decode().strip()
+  if exists.exit_code is None:
+    raise errors.AdbControllerError("Unexpected output from directory check")
+  if not exists.ok:
+    return
+  folder_contents = listing.output.decode().strip()
 
   if folder_contents:
     adb_utils.check_ok(
@@ -280,6 +286,25 @@ def check_directory_exists(
   return check_file_exists(path, env, bash_file_test="-d")
 
 
+@contextlib.contextmanager
+def tmp_local_directory() -> Iterator[str]:
+  """Creates a local temporary directory, private to the caller.
+
+  Tasks running in parallel each get their own directory, so that files of the
+  same name do not collide.
+
+  Yields:
+    The path of a new, empty directory under TMP_LOCAL_LOCATION that is
+    automatically deleted after use.
+  """
+  os.makedirs(TMP_LOCAL_LOCATION, exist_ok=True)
+  directory = tempfile.mkdtemp(dir=TMP_LOCAL_LOCATION)
+  try:
+    yield directory
+  finally:
+    shutil.rmtree(directory, ignore_errors=True)
+
+
 @contextlib.contextmanager
 def tmp_directory_from_device(
     device_path: str,
@@ -298,27 +323,22 @@ def tmp_directory_from_device(
     automatically deleted after use.
 
   Raises:
-    FileExistsError: If the temp directory already exists.
     FileNotFoundError: If the remote directory does not exist.
     RuntimeError: If there is an adb communication error.
   """
   directory_name = os.path.split(device_path)[-1]
-  tmp_directory = os.path.join(TMP_LOCAL_LOCATION, directory_name)
-  logging.info(
-      "Copying %s directory to local tmp %s", device_path, tmp_directory
-  )
-
   adb_utils.issue_generic_request(["root"], env, timeout_sec)
 
-  if os.path.exists(tmp_directory):
-    raise FileExistsError(f"{tmp_directory} already exists.")
-
-  try:
+  with tmp_local_directory() as parent_directory:
+    tmp_directory = os.path.join(parent_directory, directory_name)
+    logging.info(
+        "Copying %s directory to local tmp %s", device_path, tmp_directory
+    )
     if not check_directory_exists(device_path, env):
       raise FileNotFoundError(f"{device_path} does not exist.")
 
     response = adb_utils.issue_generic_request(
-        ["pull", device_path, TMP_LOCAL_LOCATION], env, timeout_sec
+        ["pull", device_path, parent_directory], env, timeout_sec
     )
     if response.status != adb_pb2.AdbResponse.OK:
       raise RuntimeError(
@@ -328,9 +348,6 @@ def tmp_directory_from_device(
 
     yield tmp_directory
 
-  finally:
-    shutil.rmtree(tmp_directory)
-
 
 @contextlib.contextmanager
 def tmp_file_from_device(
@@ -351,18 +368,15 @@ def tmp_file_from_device(
     RuntimeError: If there is an adb communication error.
   """
   file_name = os.path.split(device_file)[-1]
-  local_file = os.path.join(TMP_LOCAL_LOCATION, file_name)
-  logging.info("Copying %s to local tmp %s", device_file, local_file)
-  try:
+  with tmp_local_directory() as directory:
+    local_file = os.path.join(directory, file_name)
+    logging.info("Copying %s to local tmp %s", device_file, local_file)
     # Need root access to access many directories.
     adb_utils.issue_generic_request(["root"], env)
 
     if not check_file_exists(device_file, env):
       raise FileNotFoundError(f"{device_file} does not exist.")
 
-    if not os.path.exists(TMP_LOCAL_LOCATION):
-      os.makedirs(TMP_LOCAL_LOCATION)
-
     # ADB pull command arguments for the file
     adb_args = ["pull", device_file, local_file]
 
@@ -370,8 +384,6 @@ def tmp_file_from_device(
     adb_utils.check_ok(adb_utils.issue_generic_request(adb_args, env))
 
     yield local_file
-  finally:
-    os.remove(local_file)
 
 
 def copy_data_to_device(
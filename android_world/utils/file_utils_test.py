@@ -14,7 +14,7 @@
 
 import datetime
 import os
-import shutil
+import tempfile
 from unittest import mock
 
 from absl.testing import absltest
@@ -53,40 +53,38 @@ class FilesTest(parameterized.TestCase):
     )
     self.assertFalse(result)
 
-  @mock.patch.object(os.path, 'exists')
   @mock.patch.object(file_utils, 'check_directory_exists')
-  @mock.patch.object(shutil, 'rmtree')
-  def test_tmp_directory_from_device(
-      self, mock_rmtree, mock_check_directory_exists, mock_path_exists
-  ):
+  def test_tmp_directory_from_device(self, mock_check_directory_exists):
     """Test if tmp_directory_from_device correctly copies a directory and handles exceptions."""
+    tmp_local_location = self.enter_context(tempfile.TemporaryDirectory())
+    self.enter_context(
+        mock.patch.object(file_utils, 'TMP_LOCAL_LOCATION', tmp_local_location)
+    )
     mock_response = adb_pb2.AdbResponse()
     mock_response.status = adb_pb2.AdbResponse.OK
     self.mock_issue_generic_request.return_value = mock_response
-    mock_path_exists.return_value = False
     mock_check_directory_exists.return_value = True
 
-    tmp_local_directory = os.path.join(file_utils.TMP_LOCAL_LOCATION, 'dir')
     with file_utils.tmp_directory_from_device(
         '/remote/dir', self.mock_env
     ) as tmp_directory:
-      self.assertEqual(tmp_local_directory, tmp_directory)
+      parent_directory = os.path.dirname(tmp_directory)
+      self.assertEqual(os.path.basename(tmp_directory), 'dir')
+      self.assertEqual(os.path.dirname(parent_directory), tmp_local_location)
       self.mock_issue_generic_request.assert_called_with(
-          ['pull', '/remote/dir', file_utils.TMP_LOCAL_LOCATION],
+          ['pull', '/remote/dir', parent_directory],
           self.mock_env,
           None,
       )
-      mock_rmtree.assert_not_called()
-    mock_rmtree.assert_called_with(tmp_local_directory)
-
-    # Test FileExistsError
-    mock_path_exists.return_value = True
-    with self.assertRaises(FileExistsError):
-      with file_utils.tmp_directory_from_device('/remote/dir', self.mock_env):
-        pass
+      # Each call gets its own directory, so concurrent calls do not collide.
+      with file_utils.tmp_directory_from_device(
+          '/remote/dir', self.mock_env
+      ) as other_tmp_directory:
+        self.assertNotEqual(other_tmp_directory, tmp_directory)
+      self.assertTrue(os.path.isdir(parent_directory))
+    self.assertEmpty(os.listdir(tmp_local_location))
 
     # Test FileNotFoundError
-    mock_path_exists.return_value = False
     mock_check_directory_exists.return_value = False
     with self.assertRaises(FileNotFoundError):
       with file_utils.tmp_directory_from_device(
@@ -16,7 +16,7 @@
 
 import random
 import time
-from typing import Any
+from typing import Any, Optional
 from unittest import mock
 
 from absl.testing import absltest
@@ -26,6 +26,7 @@ from android_world.env import android_world_controller
 from android_world.env import interface
 from android_world.env import json_action
 from android_world.env import representation_utils
+from android_world.env import ui_stability
 from android_world.task_evals import task_eval
 from android_world.task_evals.common_validators import phone_validators
 from android_world.task_evals.utils import user_data_generation
@@ -230,8 +231,18 @@ class FakeAsyncEnv(interface.AsyncAndroidEnv):
         ui_elements=[],
     )
 
-  def execute_action(self, action: json_action.JSONAction):
-    del action
+  def execute_action(
+      self,
+      action: json_action.JSONAction,
+      state: Optional[interface.State] = None,
+  ):
+    del action, state
+
+  def wait_for_transition(
+      self, policy: Optional[ui_stability.WaitPolicy] = None
+  ) -> interface.State:
+    del policy
+    return self.get_state()
 
   def run_adb_command(self, command: str) -> adb_pb2.AdbResponse:
     del command
@@ -23,6 +23,7 @@ command-line flags.
 from collections.abc import Sequence
 import os
 import sys
+from typing import Optional
 
 from absl import app
 from absl import flags
@@ -38,7 +39,13 @@ from android_world.agents import seeact
 from android_world.agents import t3a
 from android_world.agents import code_agent
 from android_world.env import env_launcher
+from android_world.env import env_pool
+from android_world.env import health_monitor
 from android_world.env import interface
+from android_world.env import timing_profile
+from android_world.env import trace_env
+from android_world.env import ui_stability
+from android_world.utils import compression
 
 
 def _find_adb_directory() -> str:
@@ -77,6 +84,44 @@ _DEVICE_CONSOLE_PORT = flags.DEFINE_integer(
     ' first connected device is port 5554, the second is 5556, and'
     ' so on.',
 )
+_NUM_ENVS = flags.DEFINE_integer(
+    'num_envs',
+    1,
+    'Number of emulators to run tasks on in parallel. The emulators must already'
+    ' be running on consecutive ports, starting from --console_port for the'
+    ' console port and --grpc_port for the gRPC port.',
+)
+_PERSISTENT_ADB_SHELL = flags.DEFINE_boolean(
+    'persistent_adb_shell',
+    False,
+    'Whether to serve shell ADB requests from one persistent `adb shell`'
+    ' process per device instead of spawning adb for every request.',
+)
+_RECORD_TRACE = flags.DEFINE_string(
+    'record_trace',
+    None,
+    'If set, records observations and ADB traffic to this file, to be replayed'
+    ' offline with trace_env.ReplayEnv. Not supported with --num_envs > 1.',
+)
+_TIMING_PROFILE = flags.DEFINE_string(
+    'timing_profile',
+    None,
+    'If set, waits after actions as long as the apps took to settle in'
+    ' previous runs, as recorded in this file, and adds the times measured in'
+    ' this run to it.',
+)
+_HEALTH_CHECK_INTERVAL = flags.DEFINE_float(
+    'health_check_interval',
+    0.0,
+    'If positive, pings ADB and the a11y forwarder of each device at this'
+    ' interval in seconds from a background thread, and reconnects devices'
+    ' that stop answering.',
+)
+_GRPC_PORT = flags.DEFINE_integer(
+    'grpc_port',
+    8554,
+    'The gRPC port of the first emulator. Only used when --num_envs > 1.',
+)
 
 _SUITE_FAMILY = flags.DEFINE_enum(
     'suite_family',
@@ -116,6 +161,18 @@ _CHECKPOINT_DIR = flags.DEFINE_string(
     ' the latest checkpoint. If the directory is empty or does not exist, a new'
     ' directory will be created.',
 )
+_CHECKPOINT_CODEC = flags.DEFINE_enum(
+    'checkpoint_codec',
+    compression.DEFAULT_CODEC,
+    list(compression.CODEC_NAMES),
+    'Codec to compress checkpointed episodes with. zstd and lz4 are faster'
+    ' than zlib, but require the zstandard and lz4 packages.',
+)
+_CHECKPOINT_COMPRESSION_LEVEL = flags.DEFINE_integer(
+    'checkpoint_compression_level',
+    None,
+    'Compression level of --checkpoint_codec. Defaults to the codec default.',
+)
 _OUTPUT_PATH = flags.DEFINE_string(
     'output_path',
     os.path.expanduser('~/android_world/runs'),
@@ -205,17 +262,132 @@ def _get_agent(
     agent.set_task_guidelines(_MINIWOB_ADDITIONAL_GUIDELINES)
   agent.name = _AGENT_NAME.value
 
+  if family and family.startswith('miniwob'):
+    # MiniWoB pages change quickly, don't need to wait for screen to stabilize.
+    agent.transition_pause = _MINIWOB_TRANSITION_PAUSE
+  else:
+    agent.transition_pause = None
+
   return agent
 
 
+def _load_timing_profile(
+    envs: Sequence[interface.AsyncEnv],
+) -> Optional[timing_profile.TimingProfile]:
+  """Applies the wait policy learned in previous runs to `envs`."""
+  if not _TIMING_PROFILE.value:
+    return None
+  profile = timing_profile.TimingProfile.load(_TIMING_PROFILE.value)
+  for env in envs:
+    if isinstance(env, interface.AsyncAndroidEnv):
+      env.wait_policy = profile.to_wait_policy(env.wait_policy)
+  return profile
+
+
+def _save_timing_profile(
+    profile: Optional[timing_profile.TimingProfile],
+) -> None:
+  """Adds the times to settle measured in this run to the profile."""
+  if profile is None:
+    return
+  profile.update_from(ui_stability.get_settle_time_recorder())
+  profile.save(_TIMING_PROFILE.value)
+  print(f'Wrote timing profile to {_TIMING_PROFILE.value}.')
+
+
+def _make_checkpointer(
+    checkpoint_dir: str,
+) -> checkpointer_lib.IncrementalCheckpointer:
+  return checkpointer_lib.IncrementalCheckpointer(
+      checkpoint_dir,
+      codec=_CHECKPOINT_CODEC.value,
+      compression_level=_CHECKPOINT_COMPRESSION_LEVEL.value,
+  )
+
+
+def _print_health(stats: health_monitor.HealthStats) -> None:
+  print(
+      f'  {stats.uptime():.1%} uptime, {stats.reconnects} reconnects,'
+      f' {stats.failed_reconnects} failed reconnects over {stats.checks}'
+      ' health checks.'
+  )
+
+
+def _main_parallel() -> None:
+  """Runs eval suite on several emulators in parallel."""
+  pool = env_pool.EnvPool(
+      num_envs=_NUM_ENVS.value,
+      first_console_port=_DEVICE_CONSOLE_PORT.value,
+      first_grpc_port=_GRPC_PORT.value,
+      adb_path=_ADB_PATH.value,
+      emulator_setup=_EMULATOR_SETUP.value,
+      health_check_interval_secs=_HEALTH_CHECK_INTERVAL.value or None,
+  )
+  for env in pool.envs:
+    env_launcher.verify_api_level(env)
+    if _PERSISTENT_ADB_SHELL.value:
+      env.controller.enable_persistent_shell()
+  profile = _load_timing_profile(pool.envs)
+
+  task_registry = registry.TaskRegistry()
+  suite = suite_utils.create_suite(
+      task_registry.get_registry(family=_SUITE_FAMILY.value),
+      n_task_combinations=_N_TASK_COMBINATIONS.value,
+      seed=_TASK_RANDOM_SEED.value,
+      tasks=_TASKS.value,
+      use_identical_params=_FIXED_TASK_SEED.value,
+  )
+  suite.suite_family = _SUITE_FAMILY.value
+
+  if _CHECKPOINT_DIR.value:
+    checkpoint_dir = _CHECKPOINT_DIR.value
+  else:
+    checkpoint_dir = checkpointer_lib.create_run_directory(_OUTPUT_PATH.value)
+
+  print(
+      f'Starting eval with agent {_AGENT_NAME.value} on {len(pool)} devices'
+      f' and writing to {checkpoint_dir}'
+  )
+  suite_utils.run_parallel(
+      suite,
+      agent_factory=lambda env: _get_agent(env, _SUITE_FAMILY.value),
+      env_pool=pool,
+      checkpointer=_make_checkpointer(checkpoint_dir),
+  )
+  _save_timing_profile(profile)
+  for stats in pool.stats():
+    print(
+        f'Device on port {stats.console_port}: {stats.leases} episodes,'
+        f' {stats.utilization():.0%} utilization, {stats.failures} failed'
+        ' health checks.'
+    )
+    if stats.health is not None:
+      _print_health(stats.health)
+  print(
+      f'Finished running agent {_AGENT_NAME.value} on {_SUITE_FAMILY.value}'
+      f' family. Wrote to {checkpoint_dir}.'
+  )
+  pool.close()
+
+
 def _main() -> None:
   """Runs eval suite and gets rewards back."""
   env = env_launcher.load_and_setup_env(
       console_port=_DEVICE_CONSOLE_PORT.value,
       emulator_setup=_EMULATOR_SETUP.value,
       adb_path=_ADB_PATH.value,
+      persistent_adb_shell=_PERSISTENT_ADB_SHELL.value,
   )
   env_launcher.verify_api_level(env)
+  profile = _load_timing_profile([env])
+  monitor = None
+  if _HEALTH_CHECK_INTERVAL.value > 0:
+    monitor = health_monitor.HealthMonitor(
+        env.controller, interval_secs=_HEALTH_CHECK_INTERVAL.value
+    )
+    monitor.start()
+  if _RECORD_TRACE.value:
+    env = trace_env.RecordingEnv(env, _RECORD_TRACE.value)
 
   n_task_combinations = _N_TASK_COMBINATIONS.value
   task_registry = registry.TaskRegistry()
@@ -230,12 +402,6 @@ def _main() -> None:
 
   agent = _get_agent(env, _SUITE_FAMILY.value)
 
-  if _SUITE_FAMILY.value.startswith('miniwob'):
-    # MiniWoB pages change quickly, don't need to wait for screen to stabilize.
-    agent.transition_pause = _MINIWOB_TRANSITION_PAUSE
-  else:
-    agent.transition_pause = None
-
   if _CHECKPOINT_DIR.value:
     checkpoint_dir = _CHECKPOINT_DIR.value
   else:
@@ -257,9 +423,13 @@ def _main() -> None:
   suite_utils.run(
       suite,
       agent,
-      checkpointer=checkpointer_lib.IncrementalCheckpointer(checkpoint_dir),
+      checkpointer=_make_checkpointer(checkpoint_dir),
       demo_mode=False,
   )
+  _save_timing_profile(profile)
+  if monitor is not None:
+    monitor.stop()
+    _print_health(monitor.stats())
   print(
       f'Finished running agent {_AGENT_NAME.value} on {_SUITE_FAMILY.value}'
       f' family. Wrote to {checkpoint_dir}.'
@@ -269,7 +439,10 @@ def _main() -> None:
 
 def main(argv: Sequence[str]) -> None:
   del argv
-  _main()
+  if _NUM_ENVS.value > 1:
+    _main_parallel()
+  else:
+    _main()
 
 
 if __name__ == '__main__':